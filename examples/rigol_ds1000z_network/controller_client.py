@@ -104,7 +104,7 @@ async def periodic_capture():
 			"relay_id": args.relay_id,
 			"channel": channel,
 			"captured_at": time.time(),
-			"waveform": waveform,
+			"waveform": waveform.to_dict(), # Plain lists - OscilloscopeWaveform holds NumPy arrays
 		}).encode("utf-8")
 
 		dataset_id = await upload_dataset(bank_ingest, payload, relay_id=args.relay_id, meta={"channel": channel})
@@ -0,0 +1,54 @@
+""" Benchmarks the binary state codec (constellation.state_codec) against the stardust
+serialized-dict path (to_serial_dict + JSON, as used by labmesh broadcasts) for a dummy
+oscilloscope state holding waveforms of increasing length.
+
+Run with:
+	python state_codec_benchmark.py
+"""
+
+from constellation.all import *
+from constellation.state_codec import encode_state, decode_state
+import json
+import time
+import numpy as np
+
+log = plf.LogPile()
+log.terminal_level = plf.WARNING
+
+osc = RigolDS1000Z("TCPIP0::192.168.0.70::INSTR", log=log, relay=DirectSCPIRelay(), dummy=True)
+
+def best_time(func, repeats:int=5):
+	''' Returns the fastest of `repeats` calls to func, and its result. '''
+	best = None
+	for _ in range(repeats):
+		t0 = time.perf_counter()
+		rv = func()
+		dt = time.perf_counter()-t0
+		if best is None or dt < best:
+			best = dt
+	return best, rv
+
+def set_waveforms(npoints:int):
+	for ch in range(osc.first_channel, osc.first_channel+osc.max_channels):
+		t = np.linspace(-1e-3, 1e-3, npoints)
+		osc.state.channels[ch].waveform = {"time_s":t, "volt_V":np.sin(t*2e4*ch), "channel":ch}
+
+print(f"{'points/ch':>10} | {'dict+JSON enc':>14} {'dec':>10} {'size':>10} | {'codec enc':>10} {'dec':>10} {'size':>10}")
+
+for npoints in (0, 1000, 100000, 1000000):
+
+	if npoints == 0:
+		include_data = False # Settings only, as in poll()
+	else:
+		include_data = True
+		set_waveforms(npoints)
+
+	with state_serialization(include_data=include_data):
+		t_enc_json, js = best_time(lambda: json.dumps(to_serial_dict(osc.state)))
+		t_dec_json, _ = best_time(lambda: from_serial_dict(json.loads(js)))
+
+		t_enc_bin, data = best_time(lambda: encode_state(osc.state))
+		t_dec_bin, _ = best_time(lambda: decode_state(data))
+
+	label = "settings" if npoints == 0 else str(npoints)
+	print(f"{label:>10} | {t_enc_json*1e3:>11.2f} ms {t_dec_json*1e3:>7.2f} ms {len(js)/1e3:>7.1f} kB | {t_enc_bin*1e3:>7.2f} ms {t_dec_bin*1e3:>7.2f} ms {len(data)/1e3:>7.1f} kB")
@@ -3,5 +3,9 @@ from constellation.relay import *
 from constellation.helpers import *
 from constellation.instrument_control.instrument_control import *
 from constellation.instrument_control.all import *
+from constellation.state_io import *
+from constellation.h5_writer import *
+from constellation.state_journal import *
+from constellation.decimation import *
 from constellation.networking.labmesh_net import *
 from constellation.ui import *
\ No newline at end of file
@@ -15,7 +15,12 @@ from stardust.serializer import Serializable, to_serial_dict, from_serial_dict
 from stardust.io import hdf_to_dict, dict_to_hdf
 import datetime
 import numbers
+import threading
+from contextlib import contextmanager
+from collections.abc import Mapping
 from stardust.io import dict_summary
+from constellation.state_codec import encode_state, decode_state, pack_state_bytes, unpack_state_message, STATE_CODEC_EXTENSION
+from constellation.state_io import state_format_for
 from colorama import Fore, Style
 from enum import Enum
 
@@ -183,6 +188,45 @@ def param_idx_to_str(params:list, indices:list=None) -> str:
 	
 	return s
 
+class _VersionCounter:
+	''' Thread-safe, monotonically increasing counter shared by every InstrumentState and
+	IndexedList. Because it's shared, a single integer works as a "changes since" watermark
+	for a whole state tree.'''
+
+	def __init__(self):
+		self._lock = threading.Lock()
+		self._value = 0
+
+	def next(self) -> int:
+		with self._lock:
+			self._value += 1
+			return self._value
+
+	def current(self) -> int:
+		return self._value
+
+_STATE_VERSIONS = _VersionCounter()
+
+def current_state_version() -> int:
+	''' Returns the most recently issued state version. Any change made after this call
+	is guaranteed to receive a larger version number.'''
+	return _STATE_VERSIONS.current()
+
+_MISSING = object()
+_SCALAR_TYPES = (bool, int, float, complex, str, type(None))
+
+def _unchanged(old, new) -> bool:
+	''' Cheap check of whether assigning `new` over `old` changes a parameter. Only scalars
+	are compared by value - containers and objects always count as changed (re-assigning
+	the same dict after editing it in place is how such an edit gets recorded), so large
+	waveforms are never compared element by element.'''
+
+	if type(old) is not type(new):
+		return False
+	if isinstance(new, _SCALAR_TYPES):
+		return old == new
+	return False
+
 class IndexedList(Serializable):
 	''' Used in driver.state and driver.data structures to organize values
 	for parameters which apply to more than one index.
@@ -208,9 +252,45 @@ class IndexedList(Serializable):
 		#TODO: Save this as a string and add it to __stat_fields__
 		self.validate_type = validate_type
 	
+	def __post_deserialize__(self):
+		# validate_type isn't a state field (see TODO above)
+		if not hasattr(self, "validate_type"):
+			self.validate_type = None
+	
 	def clear(self):
 		self.index_data = {}
-	
+		self._clear_version = _STATE_VERSIONS.next()
+
+	def idx_version(self, index:int) -> int:
+		''' Returns the version at which the value at `index` was last assigned (0 if
+		never assigned since this object was created or deserialized).'''
+		return getattr(self, "_idx_versions", {}).get(index, 0)
+
+	def clear_version(self) -> int:
+		''' Returns the version at which the list was last cleared (0 if never).'''
+		return getattr(self, "_clear_version", 0)
+
+	def structure_version(self) -> int:
+		''' Returns the version at which any index was last assigned or the list was last
+		cleared. Unlike latest_version(), changes inside nested InstrumentStates don't count.'''
+		return max(self.clear_version(), max(getattr(self, "_idx_versions", {}).values(), default=0))
+
+	def latest_version(self) -> int:
+		''' Returns the newest version of anything in the list, including nested
+		InstrumentStates.'''
+
+		v = self.clear_version()
+		for idx, item in self.populated_items():
+			v = max(v, self.idx_version(idx))
+			if isinstance(item, InstrumentState):
+				v = max(v, item.latest_version())
+		return v
+
+	def _touch_idx(self, index:int):
+		if not hasattr(self, "_idx_versions"):
+			self._idx_versions = {}
+		self._idx_versions[index] = _STATE_VERSIONS.next()
+
 	def get_populated(self):	
 		''' Returns a list of all populated indices that can
 		be iterated over. Easy way to iterate over all populated elements.
@@ -250,6 +330,7 @@ class IndexedList(Serializable):
 			raise KeyError(f"Index {key} out of range.")
 		
 		self.index_data[f"idx-{key}"] = value
+		self._touch_idx(key)
 	
 	def summarize(self, indent:str=""):
 		
@@ -310,6 +391,7 @@ class IndexedList(Serializable):
 		
 		chan = self.get_valid_idx(index)
 		self.index_data[f"idx-{chan}"] = value
+		self._touch_idx(chan)
 	
 	def get_idx_val(self, index:int):
 		''' Get the value assigned to the index.
@@ -373,6 +455,28 @@ class IndexedList(Serializable):
 	def get_range(self):
 		return range(self.first_index, self.first_index+self.num_indices)
 	
+# Per-thread serialization options, read by InstrumentState.get_state_dict(). Thread-local
+# rather than module-global because a bridge's worker thread may be serializing settings-only
+# state for a poll while another thread dumps the full state (including data) to disk.
+_SERIALIZE_OPTS = threading.local()
+
+@contextmanager
+def state_serialization(include_data:bool=True):
+	''' Context manager controlling how InstrumentStates are serialized by the calling
+	thread. With include_data=False, every parameter registered with add_param(..., is_data=True)
+	is left out of the serialized state, so polls/broadcasts only carry settings.
+
+	Args:
+		include_data (bool): Include is_data parameters. Default = True.
+	'''
+
+	prev = getattr(_SERIALIZE_OPTS, "include_data", True)
+	_SERIALIZE_OPTS.include_data = include_data
+	try:
+		yield
+	finally:
+		_SERIALIZE_OPTS.include_data = prev
+
 class InstrumentState(Serializable):
 	""" Used to describe the state of a Driver or instrument.
 	"""
@@ -398,11 +502,8 @@ class InstrumentState(Serializable):
 		self.units = {}
 		
 		# Used to specify which parameters are "data" and don't need to be considered
-		# state information.
-		#
-		# TODO: In the current version of Serializable there is no suppport for skipping certian
-		# 'data' parameters, hwoever I'd like to add this in the future. HOwever, until then,
-		# is_data is not used.
+		# state information. These are skipped when serializing inside a
+		# state_serialization(include_data=False) block (see get_state_dict()).
 		self.is_data = []
 		
 		# List of all properly added parameters (helpful for listing state in printout)
@@ -410,7 +511,145 @@ class InstrumentState(Serializable):
 		
 		# Dict of state fragments for expanding with mixins
 		self.state_fragments = {}
-	
+
+	# Attributes describing the state object itself, rather than instrument parameters.
+	# These aren't versioned.
+	_UNVERSIONED_ATTRS = frozenset(("log", "surpress_warnings", "units", "is_data", "valid_params", "state_fragments"))
+
+	def __setattr__(self, name:str, value):
+		''' Records a new version for a parameter each time its value changes, so
+		state_delta() can report only what changed. '''
+
+		if name[0] != "_" and name not in InstrumentState._UNVERSIONED_ATTRS:
+			if not _unchanged(self.__dict__.get(name, _MISSING), value):
+				if "_param_versions" not in self.__dict__:
+					object.__setattr__(self, "_param_versions", {})
+				self._param_versions[name] = _STATE_VERSIONS.next()
+
+		object.__setattr__(self, name, value)
+
+	def param_version(self, name:str) -> int:
+		''' Returns the version at which parameter `name` last changed (0 if never). '''
+		return self.__dict__.get("_param_versions", {}).get(name, 0)
+
+	def latest_version(self) -> int:
+		''' Returns the newest version of any parameter in the state tree, including
+		IndexedLists, nested states and state fragments. '''
+
+		v = max([self.param_version(name) for name in self.valid_params], default=0)
+		for name in self.valid_params:
+			val = getattr(self, name, None)
+			if isinstance(val, (IndexedList, InstrumentState)):
+				v = max(v, val.latest_version())
+		for frag in self.state_fragments.values():
+			v = max(v, frag.latest_version())
+		return v
+
+	def state_delta(self, since_version:int=0, include_data:bool=False, serialize:bool=True) -> dict:
+		''' Serializes only the parameters that changed after `since_version`. Changes
+		inside IndexedLists and nested states are reported at the deepest level that
+		changed, so editing one channel's div_volt sends just that float.
+
+		Args:
+			since_version (int): Version watermark, typically the 'version' of the
+				previous delta (or metadata['state_version'] of a full state dict).
+				Default = 0, reports every parameter.
+			include_data (bool): Include is_data parameters. Default = False.
+			serialize (bool): Serialize values with stardust (JSON-compatible). Set to
+				False to return the values themselves, eg. to pass the delta straight
+				to state_codec.encode_state(). Default = True.
+
+		Returns:
+			dict: Delta with keys 'base_version' (since_version), 'version' (watermark
+				to pass as since_version next time) and 'changes', a list of dicts with
+				keys 'params', 'indices', 'fragment' and 'value'.
+		'''
+
+		# Take the watermark before scanning: a change racing the scan may then be
+		# reported twice, but can never be missed.
+		version = current_state_version()
+
+		changes = []
+		self._collect_changes(since_version, include_data, (), (), None, changes)
+		for frag_name, frag in self.state_fragments.items():
+			frag._collect_changes(since_version, include_data, (), (), frag_name, changes)
+
+		if serialize:
+			with state_serialization(include_data=include_data):
+				changes_out = [{"params":list(p), "indices":list(i), "fragment":f, "value":Serializable.serialize(v)} for p, i, f, v in changes]
+		else:
+			changes_out = [{"params":list(p), "indices":list(i), "fragment":f, "value":v} for p, i, f, v in changes]
+
+		return {"base_version":since_version, "version":version, "changes":changes_out}
+
+	def _collect_changes(self, since:int, include_data:bool, params:tuple, indices:tuple, fragment:str, changes:list):
+		''' Appends (params, indices, fragment, value) for each change after `since`.'''
+
+		for name in self.valid_params:
+
+			if (not include_data) and (name in self.is_data):
+				continue
+
+			val = getattr(self, name, None)
+			path = params+(name,)
+
+			if self.param_version(name) > since:
+				changes.append((path, indices+(None,), fragment, val))
+			elif isinstance(val, IndexedList):
+
+				# Items may have been removed - resend the whole list
+				if val.clear_version() > since:
+					changes.append((path, indices+(None,), fragment, val))
+					continue
+
+				for idx, item in val.populated_items():
+					if val.idx_version(idx) > since:
+						changes.append((path, indices+(idx,), fragment, item))
+					elif isinstance(item, InstrumentState):
+						item._collect_changes(since, include_data, path, indices+(idx,), fragment, changes)
+
+			elif isinstance(val, InstrumentState):
+				val._collect_changes(since, include_data, path, indices+(None,), fragment, changes)
+
+	def apply_delta(self, delta:dict) -> bool:
+		''' Applies a delta created by state_delta() (typically on another machine, to a
+		state reconstructed from a full state dict).
+
+		Args:
+			delta (dict): Delta from state_delta().
+
+		Returns:
+			bool: True if every change was applied. False means the state no longer
+				matches the sender's layout and should be rebuilt from a full state.
+		'''
+
+		for change in delta["changes"]:
+
+			try:
+				target = self
+				if change["fragment"] is not None:
+					target = self.state_fragments[change["fragment"]]
+
+				# Navigate to the object holding the last parameter
+				obj = target
+				params = change["params"]
+				indices = change["indices"]
+				for p, idx in zip(params[:-1], indices[:-1]):
+					obj = getattr(obj, p)
+					if idx is not None:
+						obj = obj.get_idx_val(idx)
+
+				# Apply the value
+				value = Serializable.deserialize(change["value"])
+				if indices[-1] is None:
+					setattr(obj, params[-1], value)
+				else:
+					getattr(obj, params[-1]).set_idx_val(indices[-1], value)
+			except Exception:
+				return False
+
+		return True
+
 	def add_param(self, name:str, unit:str="", is_data:bool=False, value=None ):
 		''' Adds a parameter in the __init__ function.
 		
@@ -433,6 +672,60 @@ class InstrumentState(Serializable):
 		# else:
 		# 	self.manifest.append(name)
 	
+	def get_state_dict(self) -> dict:
+		''' Overrides Serializable.get_state_dict() so parameters flagged is_data can be
+		left out of the serialized state (see state_serialization()).
+		'''
+
+		sd = super().get_state_dict()
+
+		if not getattr(_SERIALIZE_OPTS, "include_data", True):
+			for name in self.is_data:
+				sd.pop(name, None)
+
+		return sd
+
+	def __post_deserialize__(self):
+		''' Restores any parameter that was left out of the serialized state (ie. is_data
+		parameters of a settings-only state) as None, so the object is still complete.
+		'''
+
+		for name in getattr(self, "valid_params", []):
+			if not hasattr(self, name):
+				setattr(self, name, None)
+
+	def data_paths(self, _params:tuple=(), _indices:tuple=()) -> list:
+		''' Lists the location of every is_data parameter in the state tree, including
+		those inside IndexedLists, nested states and state fragments.
+
+		Returns:
+			list: Dicts with keys 'params', 'indices' and 'fragment', in the same format
+				accepted by set() and get().
+		'''
+
+		paths = []
+
+		for name in self.valid_params:
+
+			val = getattr(self, name, None)
+
+			if name in self.is_data:
+				paths.append({"params":list(_params+(name,)), "indices":list(_indices+(None,)), "fragment":None})
+			elif isinstance(val, IndexedList):
+				for idx, item in val.populated_items():
+					if isinstance(item, InstrumentState):
+						paths.extend(item.data_paths(_params+(name,), _indices+(idx,)))
+			elif isinstance(val, InstrumentState):
+				paths.extend(val.data_paths(_params+(name,), _indices+(None,)))
+
+		# Data held by state fragments
+		for frag_name, frag in self.state_fragments.items():
+			for path in frag.data_paths():
+				path["fragment"] = frag_name
+				paths.append(path)
+
+		return paths
+
 	def validate(self):
 		''' Checks that everything in __state_fields__ is in add_param and vis versa.'''
 		
@@ -677,6 +970,18 @@ class DataEntry:
 		# worth while. 
 		self.data_hash = None
 
+def _data_length(value):
+	''' Returns the number of points in a data value (the longest array-like member for
+	dicts), or None if it isn't array-like. '''
+
+	if isinstance(value, (list, tuple, np.ndarray)):
+		return len(value)
+	if isinstance(value, Mapping):
+		lengths = [len(v) for v in value.values() if isinstance(v, (list, tuple, np.ndarray))]
+		if len(lengths) > 0:
+			return max(lengths)
+	return None
+
 class FeatureUnavailable(RuntimeError):
 	''' Exception for when features are requested that are not supported on
 	the given driver.'''
@@ -729,6 +1034,8 @@ class Driver(ABC):
 		self.state_change_log_level = plf.DEBUG
 		self.data_state_change_log_level = plf.DEBUG
 		self._super_hint = None # Last measured value 
+		self.state_encoding = "dict" # Format of poll()/poll_delta() output: "dict" (stardust serialized dicts) or "binary" (state_codec, see state_to_bytes())
+		self.last_state_version = None # state_version of the most recent state_to_dict()/state_delta_dict() (or binary equivalent)
 		
 		# Setup ID
 		if remote_id is not None:
@@ -1111,6 +1418,91 @@ class Driver(ABC):
 			self.check_online()
 			return []
 
+	def query_binary_array(self, cmd:str, datatype:str='B') -> np.ndarray:
+		''' Like query_binary(), but returns the values as a NumPy array (see
+		CommandRelay.query_binary_array). Updates self.online with success/failure.
+
+		Args:
+			cmd (str): SCPI query command (e.g. ":WAV:DATA?").
+			datatype (str): struct format character for each data point (PyVISA convention).
+
+		Returns:
+			np.ndarray: Decoded values, or an empty array on failure/offline/dummy/unsupported
+				relay.
+		'''
+
+		empty = np.empty(0, dtype=np.dtype(datatype))
+
+		# Abort if not an SCPI instrument
+		if not self.is_scpi:
+			self.error(f"Cannot use default query_binary_array() function, instrument does recognize SCPI commands.")
+			return empty
+
+		# Abort if offline
+		if not self.online:
+			self.warning(f"Cannot query_binary_array when offline.")
+			return empty
+
+		# Spoof if dummy
+		if self.dummy:
+			self.lowdebug(f"Reading binary from dummy")
+			return empty
+
+		# Attempt to read
+		try:
+			self.online, rv = self.relay.query_binary_array(cmd, datatype=datatype)
+			if self.online:
+				self.lowdebug(f"Read binary block from instrument: >:a{len(rv)} values<")
+				return rv
+			else:
+				self.check_online()
+				return empty
+		except Exception as e:
+			self.error(f"Failed to query binary block from instrument {self.address}. ({e})")
+			self.check_online()
+			return empty
+
+	def query_block(self, cmd:str) -> bytes:
+		''' Queries a binary block and returns its payload as raw bytes (see
+		CommandRelay.query_block), for the caller to decode (eg. with np.frombuffer). Updates
+		self.online with success/failure.
+
+		Args:
+			cmd (str): SCPI query command (e.g. "TRAC:DATA? 1").
+
+		Returns:
+			bytes: Block payload, or empty bytes on failure/offline/dummy/unsupported relay.
+		'''
+
+		# Abort if not an SCPI instrument
+		if not self.is_scpi:
+			self.error(f"Cannot use default query_block() function, instrument does recognize SCPI commands.")
+			return b""
+
+		# Abort if offline
+		if not self.online:
+			self.warning(f"Cannot query_block when offline.")
+			return b""
+
+		# Spoof if dummy
+		if self.dummy:
+			self.lowdebug(f"Reading binary from dummy")
+			return b""
+
+		# Attempt to read
+		try:
+			self.online, rv = self.relay.query_block(cmd)
+			if self.online:
+				self.lowdebug(f"Read binary block from instrument: >:a{len(rv)} bytes<")
+				return rv
+			else:
+				self.check_online()
+				return b""
+		except Exception as e:
+			self.error(f"Failed to query binary block from instrument {self.address}. ({e})")
+			self.check_online()
+			return b""
+
 	def dummy_responder(self, func_name:str, *args, **kwargs):
 		''' Function expected to behave as the "real" equivalents. ie. write commands don't
 		need to return anything, reads commands or similar should. What is returned here
@@ -1204,22 +1596,18 @@ class Driver(ABC):
 			dict_summary(state_dict, verbose=1) #TODO: Make this a flag
 
 	
-	def state_to_dict(self, include_data:bool=False):
-		''' Saves the current instrument state to a dictionary. Note that it does NOT
-		refresh the state from the actual hardware. That must be done seperately
-		using `refresh_state()`.
+	def _state_metadata(self, state_version:int=None) -> dict:
+		''' Creates the metadata dict accompanying state_to_dict() and state_delta_dict().
+		'state_version' is the version watermark of the state at the time of the call (see
+		InstrumentState.state_delta()), unless specified.'''
 		
-		Args:
-			include_data (bool): Optional argument to include instrument data state
-				as well. Default = False.
+		if state_version is None:
+			state_version = current_state_version()
+		self.last_state_version = state_version
 		
-		Returns:
-			dict: Dictionary representing state
-		'''
-		
-		# Create metadata dict
 		meta_dict = {}
 		meta_dict["timestamp"] = datetime.datetime.now().strftime('%Y-%m-%d %H:%M:%S.%f')
+		meta_dict["state_version"] = state_version
 		meta_dict["instrument_id"] = self.id.to_dict()
 		meta_dict["dummy"] = self.dummy
 		meta_dict["is_scpi"] = self.is_scpi
@@ -1229,19 +1617,215 @@ class Driver(ABC):
 		meta_dict["max_channels"] = self.max_channels
 		meta_dict["max_traces"] = self.max_traces
 		
-		# CreaTe data dictionary if requested, package output dict
-		state_dict = to_serial_dict(self.state)
-		state_dict['metadata'] = meta_dict
+		return meta_dict
+	
+	def state_to_dict(self, include_data:bool=False):
+		''' Saves the current instrument state to a dictionary. Note that it does NOT
+		refresh the state from the actual hardware. That must be done seperately
+		using `refresh_state()`.
 		
+		Args:
+			include_data (bool): Optional argument to include instrument data state
+				as well. Default = False. When False, state parameters flagged is_data
+				(eg. waveforms, traces) are omitted and `self.data` is not included, so
+				the dict only describes the instrument settings. Use get_data_chunk() to
+				fetch data separately.
+
+		Returns:
+			dict: Dictionary representing state
+		'''
+
+		# Create metadata dict
+		meta_dict = self._state_metadata()
+		
+		# Package output dict
+		with state_serialization(include_data=include_data):
+			state_dict = to_serial_dict(self.state)
+		state_dict['metadata'] = meta_dict
+
+		# Create data dictionary if requested
+		if include_data:
+			data_dict = {}
+			for name, entry in self.data.items():
+				if isinstance(entry, DataEntry):
+					data_dict[name] = {"update_time":entry.update_time, "value":Serializable.serialize(entry.value)}
+				else:
+					data_dict[name] = Serializable.serialize(entry)
+			state_dict['data'] = data_dict
+
 		return state_dict
+
+	def state_to_bytes(self, include_data:bool=False, external_arrays:list=None, external_min_bytes:int=4096) -> bytes:
+		''' Binary equivalent of state_to_dict(), using constellation.state_codec. NumPy
+		arrays are stored as raw buffers and each state class's field names are written
+		once, so this is much faster and smaller than state_to_dict() for states holding
+		waveforms. Load with load_state_bytes().
+		
+		Args:
+			include_data (bool): Optional argument to include instrument data state
+				as well. Default = False.
+			external_arrays (list): Optional. Collects large NumPy arrays instead of
+				encoding them inline, see state_codec.encode_state(). Default = None.
+			external_min_bytes (int): Size threshold for external_arrays. Default = 4096.
+		
+		Returns:
+			bytes: Encoded state.
+		'''
+		
+		message = {"state":self.state, "metadata":self._state_metadata()}
+		
+		if include_data:
+			data_dict = {}
+			for name, entry in self.data.items():
+				if isinstance(entry, DataEntry):
+					data_dict[name] = {"update_time":entry.update_time, "value":entry.value}
+				else:
+					data_dict[name] = entry
+			message["data"] = data_dict
+		
+		with state_serialization(include_data=include_data):
+			return encode_state(message, external_arrays=external_arrays, external_min_bytes=external_min_bytes)
 	
-	def poll(self) -> dict:
+	def load_state_bytes(self, data:bytes) -> bool:
+		''' Loads a state created by state_to_bytes(). Like load_state_dict(), this only
+		updates the internal state.
+		
+		Args:
+			data (bytes): Encoded state.
+		
+		Returns:
+			bool: True if state is succesfully loaded.
+		'''
+		
+		self.state = decode_state(data, copy_arrays=True)["state"]
+		
+		return True
+	
+	def poll(self, encoding:str=None) -> dict:
 		''' Combination of refresh_state and state_to_dict() to meet the expectations
-		of the RelayAgent in labmesh.
+		of the RelayAgent in labmesh. Only the settings are returned, data parameters
+		are fetched on demand via get_data_manifest() and get_data_chunk().
+		
+		Args:
+			encoding (str): "dict" or "binary" (state_to_bytes(), wrapped by
+				state_codec.pack_state_bytes() for JSON transports). Default = None, uses
+				self.state_encoding.
+		'''
+
+		self.refresh_state()
+		
+		if (encoding or self.state_encoding) == "binary":
+			return pack_state_bytes(self.state_to_bytes(include_data=False))
+		return self.state_to_dict(include_data=False)
+
+	def state_delta_dict(self, since_version:int=0, include_data:bool=False) -> dict:
+		''' Like state_to_dict(), but only contains the state parameters that changed
+		after `since_version` (see InstrumentState.state_delta()). Apply it on the
+		receiving side with StateMirror.update() or InstrumentState.apply_delta().
+		
+		Args:
+			since_version (int): Version watermark of the receiver's copy of the state.
+			include_data (bool): Include is_data parameters. Default = False.
+		
+		Returns:
+			dict: Dict with keys '__state_delta__' (the delta) and 'metadata'.
+		'''
+		
+		delta = self.state.state_delta(since_version, include_data=include_data)
+		return {"__state_delta__":delta, "metadata":self._state_metadata(delta["version"])}
+	
+	def state_delta_bytes(self, since_version:int=0, include_data:bool=False) -> bytes:
+		''' Binary equivalent of state_delta_dict() (see state_to_bytes()). '''
+		
+		with state_serialization(include_data=include_data):
+			delta = self.state.state_delta(since_version, include_data=include_data, serialize=False)
+			return encode_state({"__state_delta__":delta, "metadata":self._state_metadata(delta["version"])})
+	
+	def poll_delta(self, since_version:int=0, encoding:str=None) -> dict:
+		''' Combination of refresh_state and state_delta_dict(). Returns only what changed
+		after `since_version`, so a poll where nothing changed is a few bytes long.
+		
+		Args:
+			since_version (int): Version watermark of the receiver's copy of the state.
+			encoding (str): "dict" or "binary", see poll().
 		'''
 		
 		self.refresh_state()
-		return self.state_to_dict()
+		
+		if (encoding or self.state_encoding) == "binary":
+			return pack_state_bytes(self.state_delta_bytes(since_version))
+		return self.state_delta_dict(since_version)
+	
+	def get_data_manifest(self) -> list:
+		''' Lists every data (is_data) parameter currently in the state, so a remote
+		client can decide which ones to fetch with get_data_chunk().
+
+		Returns:
+			list: Dicts with keys 'params', 'indices', 'fragment' and 'length'. Length
+				is the number of points in the data, or None if it isn't array-like.
+		'''
+
+		manifest = self.state.data_paths()
+		for entry in manifest:
+			entry["length"] = _data_length(self._get_data_value(entry["params"], entry["indices"], entry["fragment"]))
+
+		return manifest
+
+	def get_data_chunk(self, params:list, indices:list=None, fragment:str=None, offset:int=0, count:int=None) -> dict:
+		''' Returns a slice of a data (is_data) parameter from the state. This is the
+		data channel that complements the settings-only poll(): large waveforms or traces
+		can be fetched on demand, and in chunks, instead of riding along with every state
+		broadcast. Dict values (eg. {"time_s":[...], "volt_V":[...]}) have every array-like
+		member sliced identically.
+
+		Args:
+			params (list): Path to the parameter, as for InstrumentState.get().
+			indices (list): Indices for the path, as for InstrumentState.get().
+			fragment (str): State fragment holding the parameter, if any.
+			offset (int): First point to return. Default = 0.
+			count (int): Number of points to return. Default = None, returns
+				all points after offset.
+
+		Returns:
+			dict: Dict with keys 'params', 'indices', 'fragment', 'offset', 'count',
+				'length' and 'value' (serialized). None if the parameter isn't found.
+		'''
+
+		value = self._get_data_value(params, indices, fragment)
+		if value is None:
+			self.warning(f"Data parameter >{param_idx_to_str(params, indices=indices)}< not found or empty.")
+			return None
+
+		stop = None if count is None else offset+count
+
+		def _slice(x):
+			if isinstance(x, (list, tuple, np.ndarray)):
+				return x[offset:stop]
+			return x
+
+		if isinstance(value, Mapping):
+			chunk = {k: _slice(v) for k, v in value.items()}
+		else:
+			chunk = _slice(value)
+
+		length = _data_length(value)
+		if length is None:
+			count_out = None
+		else:
+			count_out = max(0, min(length, length if stop is None else stop) - offset)
+
+		return {"params":list(params), "indices":None if indices is None else list(indices), "fragment":fragment, "offset":offset, "count":count_out, "length":length, "value":Serializable.serialize(chunk)}
+
+	def _get_data_value(self, params:list, indices:list=None, fragment:str=None):
+		''' Reads a value from the state tree, optionally from a state fragment.'''
+
+		state = self.state
+		if fragment is not None:
+			if fragment not in self.state.state_fragments:
+				return None
+			state = self.state.state_fragments[fragment]
+
+		return state.get(params, indices=indices)
 	
 	def dump_state(self, filename:str, include_data:bool=False):
 		''' Saves the current instrument state to disk. Note that it does NOT
@@ -1249,7 +1833,9 @@ class Driver(ABC):
 		using `refresh_state()`.
 		
 		Args:
-			filename (str): File to save.
+			filename (str): File to save. The format is chosen by extension (see
+				constellation.state_io): .json, .cstb, .npz or HDF (.hdf, .h5, and
+				any other extension).
 			include_data (bool): Optional argument to include instrument data state
 				as well. Default = False.
 		
@@ -1257,13 +1843,14 @@ class Driver(ABC):
 			bool: True if successfully saved file.
 		'''
 		
-		#TODO: Also make JSON option
-		
-		# Generate dictionary
-		out_dict = self.state_to_dict(include_data=include_data)
+		fmt = state_format_for(filename)
+		try:
+			fmt.dump(self, filename, include_data=include_data)
+		except Exception as e:
+			self.error(f"Failed to save state to >{filename}< as >{fmt.name}<. ({e})")
+			return False
 		
-		# Save data
-		return dict_to_hdf(out_dict, filename)
+		return True
 	
 	def load_state_dict(self, state_dict:dict) -> bool:
 		''' Loads a state from a dictionary. Note that this only updates the 
@@ -1287,19 +1874,22 @@ class Driver(ABC):
 		the `apply_state()` function must be used.
 		
 		Args:
-			filename (str): State file to read. Should be HDF format.
+			filename (str): State file to read. The format is chosen by extension, as
+				in dump_state(). Large arrays in .npz files are memory-mapped rather
+				than read.
 		
 		Returns:
 			bool: True if state is succesfully loaded.
 		'''
 		
-		#TODO: Also accept JSON
-		
-		# Read file
-		in_dict = hdf_to_dict(filename)
+		fmt = state_format_for(filename)
+		try:
+			self.state = fmt.load(filename)
+		except Exception as e:
+			self.error(f"Failed to restore state from >{filename}< as >{fmt.name}<. ({e})")
+			return False
 		
-		# Apply to state
-		return self.load_state_dict(in_dict)
+		return True
 	
 	@abstractmethod
 	def refresh_state(self):
@@ -1344,6 +1934,59 @@ class Driver(ABC):
 		"""
 		pass
 	
+class StateMirror:
+	''' Receiving end of Driver state updates. Rebuilds an InstrumentState from full state
+	dicts (state_to_dict()/poll()) and keeps it up to date with deltas (state_delta_dict()/
+	poll_delta()). Accepts both the "dict" and "binary" state encodings.
+	
+	The InstrumentState in `self.state` is never modified after it is handed out: deltas
+	are applied to a copy, and when nothing changed the same object is kept. It is therefore
+	safe to pass to another thread.
+	'''
+	
+	def __init__(self):
+		self.state = None
+		self.version = None
+	
+	def update(self, message:dict) -> bool:
+		''' Applies a full state dict or a delta dict.
+		
+		Args:
+			message (dict): Output of state_to_dict() or state_delta_dict().
+		
+		Returns:
+			bool: True if self.state is up to date. False if the message was a delta that
+				doesn't follow on from the current version (or couldn't be applied), in
+				which case a full state dict is needed.
+		'''
+		
+		# Binary messages (see Driver.state_encoding) decode to the same layout, except
+		# that objects are already reconstructed.
+		message = unpack_state_message(message)
+		
+		# Full state
+		if "__state_delta__" not in message:
+			if isinstance(message["state"], InstrumentState):
+				self.state = message["state"]
+			else:
+				self.state = from_serial_dict(message)
+			self.version = message.get("metadata", {}).get("state_version", None)
+			return True
+		
+		delta = message["__state_delta__"]
+		if self.state is None or self.version is None or delta["base_version"] != self.version:
+			return False
+		
+		# Copy-on-write, so the previously emitted object stays untouched
+		if len(delta["changes"]) > 0:
+			new_state = copy.deepcopy(self.state)
+			if not new_state.apply_delta(delta):
+				return False
+			self.state = new_state
+		
+		self.version = delta["version"]
+		return True
+
 def bool_to_str01(val:bool):
 	''' Converts a boolean value to 0/1 as a string '''
 	
@@ -0,0 +1,251 @@
+""" Display decimation for large traces (eg. full-memory oscilloscope captures).
+
+A plot can't show more than one vertical line of pixels per horizontal pixel, so handing a
+multi-Mpt trace to matplotlib costs seconds per redraw without changing what's on screen. These
+functions reduce a trace to a few points per pixel column before plotting:
+
+	minmax   For each pixel column, the minimum and maximum sample (in the order they occur).
+	         Keeps every peak and glitch visible - what an oscilloscope display does. Default.
+	lttb     Largest-Triangle-Three-Buckets: one representative sample per column, chosen to
+	         preserve the visual shape. Smoother, but can hide single-sample spikes.
+
+The x axis can be given as an array, or as a (x_origin, x_increment) tuple for uniformly sampled
+data (eg. OscilloscopeWaveform.time_axis()), in which case no full-length time array is ever
+created.
+
+DecimationCache keeps the results for recently viewed x-ranges, so panning/zooming only decimates
+the visible range, and only when it isn't already covered by a cached view.
+"""
+
+import collections
+import numpy as np
+
+DECIMATION_MINMAX = "minmax"
+DECIMATION_LTTB = "lttb"
+
+# Traces with fewer points than this are plotted as-is
+DECIMATION_THRESHOLD = 20000
+
+def _is_uniform_axis(x) -> bool:
+	return isinstance(x, tuple) and len(x) == 2
+
+def _x_at(x, idx:np.ndarray) -> np.ndarray:
+	''' Returns the x values at the given indices, for an array or (x_origin, x_increment) axis. '''
+	if _is_uniform_axis(x):
+		return x[0] + np.asarray(idx, dtype=np.float64)*x[1]
+	return np.asarray(x)[idx]
+
+def index_range(x, npoints:int, x_range:tuple=None) -> tuple:
+	''' Returns the index range [i0, i1) of the points inside x_range (plus one point either
+	side, so lines run to the edge of the view). x must be increasing.
+
+	Args:
+		x: Array of x values, or (x_origin, x_increment) tuple.
+		npoints (int): Number of points in the trace.
+		x_range (tuple): (x_min, x_max). Default = None, the whole trace.
+
+	Returns:
+		tuple: (i0, i1)
+	'''
+
+	if x_range is None or npoints == 0:
+		return (0, npoints)
+
+	x_min, x_max = min(x_range), max(x_range)
+	if _is_uniform_axis(x):
+		if x[1] == 0:
+			return (0, npoints)
+		i0 = int(np.ceil((x_min - x[0])/x[1]))
+		i1 = int(np.floor((x_max - x[0])/x[1])) + 1
+	else:
+		xa = np.asarray(x)
+		i0 = int(np.searchsorted(xa, x_min, side="left"))
+		i1 = int(np.searchsorted(xa, x_max, side="right"))
+
+	i0 = max(0, i0 - 1)
+	i1 = min(npoints, i1 + 1)
+	return (i0, max(i0, i1))
+
+def minmax_envelope(x, y, n_bins:int, x_range:tuple=None) -> tuple:
+	''' Reduces a trace to the minimum and maximum of each of n_bins equal-width bins (by
+	index), returning 2 points per bin in the order they occur in the trace, plus the first
+	and last point of the range.
+
+	Args:
+		x: Array of x values, or (x_origin, x_increment) tuple.
+		y (np.ndarray): y values.
+		n_bins (int): Number of bins, usually the plot width in pixels.
+		x_range (tuple): Only decimate the points in (x_min, x_max). Default = None.
+
+	Returns:
+		tuple: (x, y) arrays of the decimated trace.
+	'''
+
+	y = np.asarray(y)
+	i0, i1 = index_range(x, len(y), x_range)
+	n = i1 - i0
+
+	if n <= 2*n_bins or n_bins < 1:
+		idx = np.arange(i0, i1)
+		return (_x_at(x, idx), y[i0:i1])
+
+	# Pad the tail with its last value so the trace reshapes into (n_bins, bin_size)
+	bin_size = -(-n // n_bins)
+	n_bins = -(-n // bin_size)
+	pad = n_bins*bin_size - n
+	seg = y[i0:i1]
+	if pad > 0:
+		seg = np.concatenate((seg, np.full(pad, seg[-1], dtype=seg.dtype)))
+	blocks = seg.reshape(n_bins, bin_size)
+
+	imin = np.argmin(blocks, axis=1)
+	imax = np.argmax(blocks, axis=1)
+
+	# Emit min and max in the order they occur, so the line traces the signal
+	first = np.minimum(imin, imax)
+	second = np.maximum(imin, imax)
+	offsets = np.arange(n_bins)*bin_size
+	idx = np.empty(2*n_bins + 2, dtype=np.int64)
+	idx[1:-1:2] = offsets + first
+	idx[2:-1:2] = offsets + second
+	idx[0] = 0 # Keep the end points, so the line spans the whole range
+	idx[-1] = n-1
+	idx = np.minimum(idx, n-1) + i0
+
+	return (_x_at(x, idx), y[idx])
+
+def lttb(x, y, n_out:int, x_range:tuple=None) -> tuple:
+	''' Largest-Triangle-Three-Buckets downsampling to n_out points. The first and last
+	points are always kept; every bucket in between contributes the point forming the largest
+	triangle with the previously selected point and the mean of the next bucket.
+
+	Args:
+		x: Array of x values, or (x_origin, x_increment) tuple.
+		y (np.ndarray): y values.
+		n_out (int): Number of output points.
+		x_range (tuple): Only decimate the points in (x_min, x_max). Default = None.
+
+	Returns:
+		tuple: (x, y) arrays of the decimated trace.
+	'''
+
+	y = np.asarray(y)
+	i0, i1 = index_range(x, len(y), x_range)
+	n = i1 - i0
+
+	if n <= n_out or n_out < 3:
+		idx = np.arange(i0, i1)
+		return (_x_at(x, idx), y[i0:i1])
+
+	xs = _x_at(x, np.arange(i0, i1))
+	ys = np.asarray(y[i0:i1], dtype=np.float64)
+
+	# Bucket edges for the n-2 interior points
+	edges = (np.linspace(1, n-1, n_out-1)).astype(np.int64)
+
+	# Mean of every bucket, for the "next bucket" vertex
+	counts = np.diff(edges)
+	x_mean = np.add.reduceat(xs[:n-1], edges[:-1]) / counts
+	y_mean = np.add.reduceat(ys[:n-1], edges[:-1]) / counts
+	x_mean = np.append(x_mean, xs[-1])
+	y_mean = np.append(y_mean, ys[-1])
+
+	selected = np.empty(n_out, dtype=np.int64)
+	selected[0] = 0
+	selected[-1] = n-1
+
+	a = 0
+	for b in range(n_out-2):
+		lo, hi = edges[b], edges[b+1]
+		# Twice the triangle area; the constant factor doesn't change the argmax
+		area = np.abs((xs[a] - x_mean[b+1])*(ys[lo:hi] - ys[a]) - (xs[a] - xs[lo:hi])*(y_mean[b+1] - ys[a]))
+		a = lo + int(np.argmax(area))
+		selected[b+1] = a
+
+	return (xs[selected], ys[selected].astype(y.dtype, copy=False))
+
+def decimate(x, y, n_pixels:int, method:str=DECIMATION_MINMAX, x_range:tuple=None) -> tuple:
+	''' Decimates a trace for display with the given method. See minmax_envelope() and
+	lttb().
+
+	Args:
+		x: Array of x values, or (x_origin, x_increment) tuple.
+		y (np.ndarray): y values.
+		n_pixels (int): Width of the plot in pixels.
+		method (str): DECIMATION_MINMAX (default) or DECIMATION_LTTB.
+		x_range (tuple): Only decimate the points in (x_min, x_max). Default = None.
+
+	Returns:
+		tuple: (x, y) arrays of the decimated trace.
+	'''
+
+	if method == DECIMATION_MINMAX:
+		return minmax_envelope(x, y, n_pixels, x_range=x_range)
+	elif method == DECIMATION_LTTB:
+		return lttb(x, y, 2*n_pixels, x_range=x_range)
+	raise ValueError(f"Unrecognized decimation method '{method}'.")
+
+class DecimationCache:
+	''' Decimated views of one trace, cached per (x-range, width). Each view is computed
+	for a range padded by 1/8 of its width on both sides (at proportionally more bins), so
+	small pans are served from the previous view. The `max_entries` most recently used views
+	are kept, so returning to a zoom level (or the full view) costs nothing.
+	'''
+
+	PAD_FRACTION = 0.125
+
+	def __init__(self, x, y, method:str=DECIMATION_MINMAX, max_entries:int=8):
+		'''
+		Args:
+			x: Array of x values, or (x_origin, x_increment) tuple.
+			y (np.ndarray): y values.
+			method (str): DECIMATION_MINMAX (default) or DECIMATION_LTTB.
+			max_entries (int): Number of views to keep.
+		'''
+		self.x = x
+		self.y = y
+		self.method = method
+		self.max_entries = max_entries
+		self._cache = collections.OrderedDict() # (n_pixels, x_lo, x_hi) -> (x, y)
+
+	def _lookup(self, n_pixels:int, x_range:tuple):
+		''' Returns the key of a cached view covering x_range at (about) the same
+		resolution, or None. '''
+
+		x_min, x_max = min(x_range), max(x_range)
+		span = x_max - x_min
+		for key in self._cache.keys():
+			px, lo, hi = key
+			if px != n_pixels or lo is None:
+				continue
+			if lo <= x_min and hi >= x_max and (hi - lo) <= span*(1 + 4*self.PAD_FRACTION):
+				return key
+		return None
+
+	def get(self, n_pixels:int, x_range:tuple=None) -> tuple:
+		''' Returns the decimated (x, y) for the given plot width and visible x-range
+		(default = None, the whole trace). '''
+
+		n_pixels = int(n_pixels)
+
+		if x_range is None:
+			key = (n_pixels, None, None)
+			if key not in self._cache:
+				self._cache[key] = decimate(self.x, self.y, n_pixels, method=self.method)
+		else:
+			key = self._lookup(n_pixels, x_range)
+			if key is None:
+				x_min, x_max = min(x_range), max(x_range)
+				pad = (x_max - x_min)*self.PAD_FRACTION
+				key = (n_pixels, x_min - pad, x_max + pad)
+				n_bins = int(np.ceil(n_pixels*(1 + 2*self.PAD_FRACTION)))
+				self._cache[key] = decimate(self.x, self.y, n_bins, method=self.method, x_range=key[1:])
+
+		self._cache.move_to_end(key)
+		while len(self._cache) > self.max_entries:
+			self._cache.popitem(last=False)
+
+		return self._cache[key]
+
+	def clear(self):
+		self._cache.clear()
@@ -0,0 +1,152 @@
+""" Background writer for append-only HDF5 files.
+
+StateJournal, WaveformArchive and SParameterArchive all append records to one extendable HDF5
+file while the measurement loop keeps running. BackgroundH5Writer holds what they share: the
+file and its lock, a queue of items written by a background thread in batches (so each dataset
+is resized once per batch), the in-memory row index, and the checks that stop callers from
+queueing to a read-only file or reading a file whose writer failed.
+"""
+
+import queue
+import threading
+import h5py
+import pylogfile.base as plf
+
+class BackgroundH5Writer:
+	''' Base of the append-only HDF5 files (StateJournal, WaveformArchive, SParameterArchive).
+	Opens the file and writes queued items from a background thread, taking everything already
+	waiting as one batch so each dataset is resized once per batch.
+
+	Subclasses create their datasets and in-memory index in __init__, then call
+	_start_writer(). They queue items with _queue.put() and implement _write_batch(batch),
+	which is called with the HDF5 lock held.
+	'''
+
+	_description = "HDF5 file" # For log and error messages, eg. "state journal"
+	_item_name = "item" # Name of one queued item, eg. "record"
+
+	def __init__(self, filename:str, mode:str="a", max_pending:int=0, log:plf.LogPile=None):
+		'''
+		Args:
+			filename (str): HDF5 file to use.
+			mode (str): "a" to create or append, "w" to overwrite, "r" to read only.
+			max_pending (int): Maximum number of items waiting to be written. Queueing
+				blocks when the writer falls this far behind. Default = 0, unlimited.
+			log (LogPile): Optional log.
+		'''
+
+		self.filename = filename
+		self.mode = mode
+		self.log = log if log is not None else plf.LogPile()
+
+		self.readonly = (mode == "r")
+
+		self._file = h5py.File(filename, mode)
+		self._h5_lock = threading.Lock()
+
+		# In-memory row index of the archives: key (eg. channel) -> {item number: row}
+		self._rows = {}
+
+		self._queue = queue.Queue(maxsize=max_pending)
+		self._writer_error = None
+		self._thread = None
+
+	def _start_writer(self):
+		''' Starts the background writer, unless the file is read-only. '''
+
+		if not self.readonly and self._thread is None:
+			self._thread = threading.Thread(target=self._writer, daemon=True)
+			self._thread.start()
+
+	def __enter__(self):
+		return self
+
+	def __exit__(self, exc_type, exc, tb):
+		self.close()
+
+	def _load_rows(self, group, column:str, key=str):
+		''' Fills the row index from the subgroups of `group`, each of which has an item
+		number column `column`. `key` converts the subgroup names to index keys. '''
+
+		for name, grp in group.items():
+			self._rows[key(name)] = {int(n):row for row, n in enumerate(grp[column][...])}
+
+	def _add_rows(self, seq:int, keys):
+		''' Adds a row for item `seq` to the index of each key. '''
+
+		for key in keys:
+			rows = self._rows.setdefault(key, {})
+			rows[seq] = len(rows)
+
+	def _check_writable(self):
+		''' Raises if nothing more can be queued: the file is read-only or the writer failed. '''
+
+		if self.readonly:
+			raise ValueError(f"Cannot write to a {self._description} opened read-only.")
+		if self._writer_error is not None:
+			raise RuntimeError(f"{self._description.capitalize()} writer failed: {self._writer_error}")
+
+	def _check_readable(self):
+		''' Raises if the writer failed. The in-memory index was advanced when items were
+		queued, so after a failed write it lists items the file doesn't contain. '''
+
+		if self._writer_error is not None:
+			raise RuntimeError(f"{self._description.capitalize()} writer failed, the file is incomplete: {self._writer_error}")
+
+	def _writer(self):
+		''' Background thread: writes queued items in batches. '''
+
+		while True:
+
+			item = self._queue.get()
+			if item is None:
+				self._queue.task_done()
+				return
+
+			# Grab everything else already waiting so it's written in one resize
+			batch = [item]
+			stop = False
+			while True:
+				try:
+					nxt = self._queue.get_nowait()
+				except queue.Empty:
+					break
+				if nxt is None:
+					stop = True
+					break
+				batch.append(nxt)
+
+			try:
+				with self._h5_lock:
+					self._write_batch(batch)
+					self._file.flush()
+			except Exception as e:
+				self._writer_error = e
+				self.log.error(f"Failed to write >{len(batch)}< {self._item_name}(s) to {self._description} >{self.filename}<. ({e})")
+
+			for _ in range(len(batch) + (1 if stop else 0)):
+				self._queue.task_done()
+
+			if stop:
+				return
+
+	def _write_batch(self, batch:list):
+		''' Writes a batch of queued items to the file. Called with the HDF5 lock held. '''
+		raise NotImplementedError()
+
+	def flush(self):
+		''' Blocks until every item queued so far has been written to disk. '''
+		if self._thread is not None:
+			self._queue.join()
+
+	def close(self):
+		''' Writes any pending items and closes the file. '''
+
+		if self._thread is not None:
+			self._queue.put(None)
+			self._thread.join()
+			self._thread = None
+
+		if self._file is not None:
+			self._file.close()
+			self._file = None
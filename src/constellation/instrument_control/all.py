@@ -1,4 +1,6 @@
 from constellation.instrument_control.oscilloscope.oscilloscope_ctg import *
+from constellation.instrument_control.oscilloscope.oscilloscope_acquisition import *
+from constellation.instrument_control.oscilloscope.oscilloscope_archive import *
 from constellation.instrument_control.oscilloscope.oscilloscope_gui import *
 from constellation.instrument_control.oscilloscope.drivers.Rigol_DS1000Z_dvr import *
 from constellation.instrument_control.oscilloscope.drivers.Rigol_DS1000E_dvr import *
@@ -7,6 +9,7 @@ from constellation.instrument_control.oscilloscope.drivers.Rigol_DS1000E_dvr imp
 from constellation.instrument_control.vector_network_analyzer.vector_network_analyzer_ctg import *
 # from constellation.instrument_control.vector_network_analyzer.vector_network_analyzer_gui import *
 from constellation.instrument_control.vector_network_analyzer.drivers.RohdeSchwarz_ZVA_dvr import *
+from constellation.instrument_control.vector_network_analyzer.vna_export import *
 
 from constellation.instrument_control.digital_multimeter.digital_multimeter_ctg import *
 from constellation.instrument_control.digital_multimeter.drivers.Siglent_SDM3000X_dvr import *
@@ -21,5 +24,6 @@ from constellation.instrument_control.power_supply.power_supply_gui import *
 from constellation.instrument_control.power_supply.drivers.Rigol_DP832_dvr import *
 
 from constellation.instrument_control.spectrum_analyzer.spectrum_analyzer_ctg import *
+from constellation.instrument_control.spectrum_analyzer.spectrum_acquisition import *
 from constellation.instrument_control.spectrum_analyzer.drivers.RohdeSchwarz_FSE_dvr import *
 from constellation.instrument_control.spectrum_analyzer.drivers.Siglent_SSA3000X_dvr import *
\ No newline at end of file
@@ -1,5 +1,29 @@
+import re
 from constellation.base import *
 
+# Leading number of each comma-separated field, ignoring unit suffixes (eg. '-4.87E-01VDC')
+_READING_FIELD_RE = re.compile(r"(?:^|,)\s*([+-]?(?:\d+\.?\d*|\.\d+)(?:[Ee][+-]?\d+)?)")
+
+def parse_readings(text:str, num_fields:int=1) -> np.ndarray:
+	''' Parses a comma-separated list of readings, as returned by FETCh? or TRACe:DATA?, into a
+	NumPy array in one pass. Unit suffixes on each field (eg. 'VDC', 'SECS', 'RDNG#') are
+	ignored.
+	
+	Args:
+		text (str): Reading string from the instrument.
+		num_fields (int): Number of fields per reading (eg. 2 for reading and timestamp).
+			Default = 1.
+	
+	Returns:
+		np.ndarray: Array of shape (N,) if num_fields is 1, else (N, num_fields).
+	'''
+	
+	values = np.array(_READING_FIELD_RE.findall(text), dtype=np.float64)
+	if num_fields == 1:
+		return values
+	
+	return values[:len(values)//num_fields*num_fields].reshape(-1, num_fields)
+
 class DigitalMultimeterState(InstrumentState):
 	
 	__state_fields__ = ("measurement_type", "trigger_type", "result_V", "result_I", "result_R")
@@ -33,6 +57,15 @@ class DigitalMultimeter(Driver):
 		_state = DigitalMultimeterState(log=log)
 		super().__init__(address, log, relay, _state, expected_idn=expected_idn, dummy=dummy, **kwargs)
 		
+		# Sample count and interval of the last configure_burst()
+		self._burst_config = (1, None)
+		self.max_burst_samples = None # Reading memory size, if limited
+		
+		# Dummy reading settings
+		self.dummy_reading = 1.0
+		self.dummy_noise = 1e-3 # RMS noise of dummy readings
+		self._dummy_rng = np.random.default_rng()
+		
 		if self.dummy:
 			self.init_dummy_state()
 		
@@ -54,7 +87,7 @@ class DigitalMultimeter(Driver):
 			elif self.state.measurement_type in (DigitalMultimeter.MEAS_VOLT_AC, DigitalMultimeter.MEAS_VOLT_DC):
 				return self.state.result_V
 			elif self.state.measurement_type in (DigitalMultimeter.MEAS_RESISTANCE_2WIRE, DigitalMultimeter.MEAS_RESISTANCE_4WIRE):
-				return self.state.result_B
+				return self.state.result_R
 		
 		# Put everything in a try-catch in case arguments are missing or similar
 		try:
@@ -75,6 +108,16 @@ class DigitalMultimeter(Driver):
 					rval = return_selected(self)
 				case "send_trigger_and_read":
 					rval = return_selected(self)
+				case "fetch_burst":
+					num_samples, interval_s = self._burst_config
+					values = self._dummy_rng.normal(self.dummy_reading, self.dummy_noise, num_samples)
+					rel_times = None if interval_s is None else np.arange(num_samples)*interval_s
+					rval = (values, rel_times)
+				case "fetch_scan":
+					num_scans = getattr(self, "_scan_num_scans", None)
+					rval = self._dummy_scan_readings(1 if num_scans is None else num_scans)
+				case "fetch_new_scan_readings":
+					rval = self._dummy_scan_readings(1)
 				case _:
 					found = False
 			
@@ -109,7 +152,7 @@ class DigitalMultimeter(Driver):
 	
 	@abstractmethod
 	def set_trigger_type(self, trig:str):
-		self.modify_state(self.get_measurement, ["trigger_type"], trig)
+		self.modify_state(self.get_trigger_type, ["trigger_type"], trig)
 	
 	@abstractmethod
 	@enabledummy
@@ -123,24 +166,231 @@ class DigitalMultimeter(Driver):
 	
 	@abstractmethod
 	def get_value(self, check_measurement:bool=True):
-		''' Queries the instrument and returns the last measured value.'''
+		''' Queries the instrument and returns the last measured value. The value is filed in
+		the state under the selected measurement function, which is cached in the state - it's
+		only queried if it isn't known yet. set_measurement() and refresh_state() update it.
+		
+		Args:
+			check_measurement (bool): Query the measurement function if it isn't cached.
+				Default = True.
+		
+		Returns:
+			float: Measured value, or None on error.
+		'''
 		
 		# Save super hint, it will be overridden by get_measurement()
 		local_super_hint = self._super_hint
+		if self.dummy:
+			local_super_hint = float(self._dummy_rng.normal(self.dummy_reading, self.dummy_noise))
 		
-		if check_measurement:
+		if check_measurement and not self.measurement_cached():
 			self.get_measurement()
 		
-		# Check if last value was a current
-		if self.state.measurement_type in (DigitalMultimeter.MEAS_CURR_AC, DigitalMultimeter.MEAS_CURR_DC):
-			return self.modify_state(None, ["result_I"], local_super_hint)
-		elif self.state.measurement_type in (DigitalMultimeter.MEAS_VOLT_AC, DigitalMultimeter.MEAS_VOLT_DC):
-			return self.modify_state(None, ["result_V"], local_super_hint)
-		elif self.state.measurement_type in (DigitalMultimeter.MEAS_RESISTANCE_2WIRE, DigitalMultimeter.MEAS_RESISTANCE_4WIRE):
-			return self.modify_state(None, ["result_R"], local_super_hint)
-		else:
+		param, _ = self.result_param()
+		if param is None:
 			self.error(f"Invalid measurement type >{self.state.measurement_type}<.")
 			return None
+		if local_super_hint is None:
+			return None
+		
+		return self.modify_state(None, [param], local_super_hint)
+	
+	def measurement_cached(self) -> bool:
+		''' Returns True if the measurement function in the state is a valid measurement
+		constant, ie. get_value() doesn't need to query it. '''
+		return self.result_param()[0] is not None
+	
+	def read_stream(self, num_readings:int=None, interval_s:float=0, validate_interval_s:float=10, check_period:float=0.005):
+		''' Generator that reads the meter repeatedly, yielding (timestamp, value, measurement)
+		tuples. Values are filed under the cached measurement function, which is re-validated
+		with get_measurement() only once every validate_interval_s. If the function was changed
+		on the instrument, a warning is logged and subsequent readings are filed under the new
+		function.
+		
+		With continuous triggering each reading costs one query. Otherwise every reading is
+		triggered (*CLS, INIT:IMM) and waited for with wait_ready(), which polls *ESR? until
+		the reading is done, so it takes at least two more round trips. The trigger type is
+		read from the instrument if it isn't cached.
+		
+		Example:
+			for t, v, meas in dmm.read_stream(num_readings=1000):
+				...
+		
+		Args:
+			num_readings (int): Number of readings. Default = None, reads until the generator
+				is closed.
+			interval_s (float): Minimum time between readings. Default = 0, reads as fast as
+				possible.
+			validate_interval_s (float): Time between checks of the measurement function. Set
+				to None to never re-check.
+			check_period (float): Period to poll the instrument for completion of triggered
+				readings.
+		
+		Yields:
+			tuple: (timestamp, value, measurement). value is None if the reading failed.
+		'''
+		
+		if not self.measurement_cached():
+			self.get_measurement()
+		t_validated = time.time()
+		if self.state.trigger_type is None:
+			self.get_trigger_type()
+		if self.state.trigger_type is None:
+			self.warning(f"Failed to read trigger type, triggering every reading.")
+		triggered = self.state.trigger_type != DigitalMultimeter.TRIG_CONT
+		
+		count = 0
+		t_next = time.perf_counter()
+		while num_readings is None or count < num_readings:
+			
+			# Low-rate check that the function hasn't been changed behind our back
+			if validate_interval_s is not None and time.time() - t_validated >= validate_interval_s:
+				cached = self.state.measurement_type
+				if self.get_measurement() != cached:
+					self.warning(f"Measurement function changed from >{cached}< to >{self.state.measurement_type}< while streaming.")
+				t_validated = time.time()
+			
+			if triggered and not self.dummy:
+				self.send_manual_trigger(send_cls=True)
+				self.wait_ready(check_period=check_period)
+			
+			t_sample = time.time()
+			value = self.get_value(check_measurement=False)
+			count += 1
+			yield (t_sample, value, self.state.measurement_type)
+			
+			if interval_s > 0:
+				t_next += interval_s
+				delay = t_next - time.perf_counter()
+				if delay > 0:
+					time.sleep(delay)
+				else:
+					t_next = time.perf_counter()
+	
+	def result_param(self, measurement:str=None) -> tuple:
+		''' Returns the state parameter and unit that readings of a measurement are stored
+		under, eg. ("result_V", "V"), or (None, None) if the measurement isn't recognized.
+		
+		Args:
+			measurement (str): Measurement constant. Default = None, uses the measurement in the state.
+		
+		Returns:
+			tuple: (parameter name, unit)
+		'''
+		
+		if measurement is None:
+			measurement = self.state.measurement_type
+		
+		if measurement in (DigitalMultimeter.MEAS_CURR_AC, DigitalMultimeter.MEAS_CURR_DC):
+			return ("result_I", "A")
+		elif measurement in (DigitalMultimeter.MEAS_VOLT_AC, DigitalMultimeter.MEAS_VOLT_DC):
+			return ("result_V", "V")
+		elif measurement in (DigitalMultimeter.MEAS_RESISTANCE_2WIRE, DigitalMultimeter.MEAS_RESISTANCE_4WIRE):
+			return ("result_R", "Ohm")
+		return (None, None)
+	
+	@abstractmethod
+	def configure_burst(self, num_samples:int, interval_s:float=None):
+		''' Programs the instrument to take num_samples readings of the selected measurement
+		into its reading memory on the next trigger (see acquire_burst()).
+		
+		Args:
+			num_samples (int): Number of readings.
+			interval_s (float): Time between readings. Default = None, reads as fast as the
+				instrument's integration time allows.
+		
+		Returns:
+			bool: True if the burst was configured, False if num_samples is out of range.
+		'''
+		
+		if not self.burst_size_ok(num_samples):
+			self.error(f"Burst of >{num_samples}< readings is out of range (1 to >{self.max_burst_samples}<).")
+			return False
+		
+		self._burst_config = (int(num_samples), interval_s)
+		return True
+	
+	def burst_size_ok(self, num_samples:int) -> bool:
+		''' Returns True if a burst of num_samples readings fits in the reading memory. '''
+		return int(num_samples) >= 1 and (self.max_burst_samples is None or int(num_samples) <= self.max_burst_samples)
+	
+	@abstractmethod
+	@enabledummy
+	def fetch_burst(self):
+		''' Reads every reading of the last burst from the instrument's memory in one transfer.
+		
+		Returns:
+			tuple: (values, rel_times) NumPy arrays. rel_times are the instrument's timestamps
+				in seconds, or None if the instrument doesn't timestamp readings. Returns None
+				on error.
+		'''
+		return self._super_hint
+	
+	def acquire_burst(self, num_samples:int, rate_Hz:float=None, timeout_s:float=None, check_period:float=0.02) -> dict:
+		''' Takes a burst of readings using the instrument's own trigger/sample counter and
+		reading memory, then fetches them all in one transfer. Much faster than calling
+		send_trigger_and_read() in a loop, which costs several round trips per reading.
+		
+		The burst leaves the instrument's trigger and sample counts programmed - call
+		set_trigger_type() (or apply_state()) afterwards to return to single readings.
+		
+		Args:
+			num_samples (int): Number of readings.
+			rate_Hz (float): Sample rate. Default = None, reads as fast as the instrument's
+				integration time allows.
+			timeout_s (float): Maximum time to wait for the burst to finish. Default = None,
+				waits indefinitely.
+			check_period (float): Period to poll the instrument for completion.
+		
+		Returns:
+			dict: Standard waveform dict with keys 'x' (timestamps, s since epoch), 'y'
+				(readings), 'x_units' and 'y_units'. Returns None on error. When the
+				instrument doesn't timestamp readings, timestamps are spread evenly over the
+				burst.
+		'''
+		
+		interval_s = None if rate_Hz is None else 1/rate_Hz
+		
+		# Measurement is needed to file the result - only ask if it's not already known
+		if self.state.measurement_type is None:
+			self.get_measurement()
+		param, unit = self.result_param()
+		if param is None:
+			self.error(f"Invalid measurement type >{self.state.measurement_type}<.")
+			return None
+		
+		if not self.configure_burst(num_samples, interval_s):
+			return None
+		
+		t_start = time.time()
+		if not self.dummy:
+			self.send_manual_trigger(send_cls=True)
+			if not self.wait_ready(check_period=check_period, timeout_s=timeout_s):
+				self.error(f"Timed out waiting for burst of >{num_samples}< readings.")
+				return None
+		t_end = time.time()
+		
+		result = self.fetch_burst()
+		if result is None:
+			return None
+		values, rel_times = result
+		if len(values) == 0:
+			self.error(f"Burst returned no readings.")
+			return None
+		if len(values) != num_samples:
+			self.warning(f"Burst returned >{len(values)}< readings, expected >{num_samples}<.")
+		
+		# Timestamps
+		if rel_times is not None and len(rel_times) == len(values):
+			times = t_start + (rel_times - rel_times[0])
+		elif interval_s is not None:
+			times = t_start + np.arange(len(values))*interval_s
+		else:
+			times = np.linspace(t_start, t_end, len(values))
+		
+		self.modify_state(None, [param], float(values[-1]))
+		
+		return {'x':times, 'y':values, 'x_units':'s', 'y_units':unit}
 	
 	def send_trigger_and_read(self):
 		''' Tells the instrument to read and returns teh measurement result. '''
@@ -159,4 +409,328 @@ class DigitalMultimeter(Driver):
 
 	
 	def refresh_data(self):
-		self.get_value()
\ No newline at end of file
+		self.get_value()
+
+# Layout of scan readings: value, instrument timestamp (s, relative to the first reading) and channel
+SCAN_DTYPE = np.dtype([("reading", np.float64), ("timestamp", np.float64), ("channel", np.int32)])
+
+def scan_array(fields:np.ndarray) -> np.ndarray:
+	''' Converts an (N, 3) array of (reading, timestamp, channel) fields, eg. from
+	parse_readings(text, num_fields=3), to a structured array with dtype SCAN_DTYPE.
+	'''
+	
+	out = np.empty(len(fields), dtype=SCAN_DTYPE)
+	out["reading"] = fields[:, 0]
+	out["timestamp"] = fields[:, 1]
+	out["channel"] = fields[:, 2]
+	return out
+
+class DigitalMultimeterScanState(InstrumentState):
+	
+	__state_fields__ = ("scan_channels", "scan_measurements", "scan_interval", "scan_data")
+	
+	def __init__(self, log:plf.LogPile=None):
+		super().__init__(log=log)
+		
+		self.add_param("scan_channels", unit="", value=[]) # Channel numbers in scan order, eg. 101
+		self.add_param("scan_measurements", unit="", value=[]) # Measurement constant for each channel
+		self.add_param("scan_interval", unit="s") # Time between scans, None = as fast as possible
+		
+		# Readings of the last scan, as columns of SCAN_DTYPE (a dict so it serializes)
+		self.add_param("scan_data", unit="", is_data=True, value={"reading":np.zeros(0), "timestamp":np.zeros(0), "channel":np.zeros(0, dtype=np.int32)})
+		
+		self.validate()
+
+class ScanMixin:
+	''' Scan-list acquisition for multimeters with a multiplexer card. The channels and their
+	measurement functions are configured once with configure_scan(), then the instrument scans
+	them on its own trigger model and the buffered (reading, timestamp, channel) triplets are
+	read back in one transfer.
+	
+	Example:
+		dmm.configure_scan([101, 102, 103, 104], DigitalMultimeter.MEAS_VOLT_DC, interval_s=1)
+		data = dmm.run_scan(num_scans=10)
+		ch2 = data[data["channel"] == 102]["reading"]
+		
+		dmm.start_continuous_scan()
+		...
+		dmm.stop_continuous_scan()
+		data = dmm.get_scan_data()
+	'''
+	
+	__state_key__ = "scan"
+	__state_fragment__ = DigitalMultimeterScanState
+	
+	def _scan_measurement_list(self, channels:list, measurements) -> list:
+		''' Expands `measurements` (None, one constant or one per channel) to one measurement
+		constant per channel. Returns None if the lengths don't match. '''
+		
+		if measurements is None:
+			if self.state.measurement_type is None:
+				self.get_measurement()
+			measurements = self.state.measurement_type
+			if measurements is None:
+				self.error(f"Scan needs a measurement, but none is selected.")
+				return None
+		if isinstance(measurements, str):
+			return [measurements]*len(channels)
+		if len(measurements) != len(channels):
+			self.error(f"Scan needs one measurement per channel (>{len(channels)}< channels, >{len(measurements)}< measurements).")
+			return None
+		return list(measurements)
+	
+	@abstractmethod
+	def configure_scan(self, channels:list, measurements=None, interval_s:float=None):
+		''' Sets the scan list and the measurement function of each channel.
+		
+		Args:
+			channels (list): Channel numbers in scan order (eg. 101 for card 1, channel 1).
+			measurements: Measurement constant for all channels, or a list with one per
+				channel. Default = None, uses the selected measurement.
+			interval_s (float): Time between the start of each scan. Default = None, scans
+				back-to-back.
+		
+		Returns:
+			None
+		'''
+		
+		measurements = self._scan_measurement_list(channels, measurements)
+		if measurements is None:
+			return
+		
+		self.modify_state(None, ["scan_channels"], [int(c) for c in channels], fragment=self.__state_key__)
+		self.modify_state(None, ["scan_measurements"], measurements, fragment=self.__state_key__)
+		self.modify_state(None, ["scan_interval"], interval_s, fragment=self.__state_key__)
+	
+	@abstractmethod
+	def arm_scan(self, num_scans:int=None):
+		''' Clears the reading buffer and sets up the trigger model for num_scans scans of the
+		scan list. The scan starts on the next trigger (send_manual_trigger()).
+		
+		Args:
+			num_scans (int): Number of scans. Default = None, scans continuously with the
+				buffer wrapping around.
+		
+		Returns:
+			None
+		'''
+		self._scan_num_scans = num_scans
+		self._dummy_scan_time = 0.0
+	
+	@abstractmethod
+	@enabledummy
+	def fetch_scan(self) -> np.ndarray:
+		''' Reads the whole reading buffer in one transfer.
+		
+		Returns:
+			np.ndarray: Structured array with dtype SCAN_DTYPE, or None on error.
+		'''
+		return self._super_hint
+	
+	@abstractmethod
+	@enabledummy
+	def fetch_new_scan_readings(self) -> np.ndarray:
+		''' Reads the readings buffered since the last call (or since arm_scan()) while a
+		continuous scan is running.
+		
+		Returns:
+			np.ndarray: Structured array with dtype SCAN_DTYPE, or None on error.
+		'''
+		return self._super_hint
+	
+	@abstractmethod
+	def abort_scan(self):
+		''' Stops a running scan. '''
+		pass
+	
+	def run_scan(self, num_scans:int=1, timeout_s:float=None, check_period:float=0.05) -> np.ndarray:
+		''' Runs num_scans hardware scans of the scan list and reads every reading back in one
+		transfer. The readings are also saved to the state (see get_scan_data()).
+		
+		Args:
+			num_scans (int): Number of scans.
+			timeout_s (float): Maximum time to wait for the scans. Default = None, waits
+				indefinitely.
+			check_period (float): Period to poll the instrument for completion.
+		
+		Returns:
+			np.ndarray: Structured array with dtype SCAN_DTYPE, or None on error.
+		'''
+		
+		frag = self.state.state_fragments[self.__state_key__]
+		if len(frag.scan_channels) == 0:
+			self.error(f"Cannot run scan, no scan list has been configured.")
+			return None
+		
+		self.arm_scan(num_scans)
+		if not self.dummy:
+			self.send_manual_trigger(send_cls=True)
+			if not self.wait_ready(check_period=check_period, timeout_s=timeout_s):
+				self.error(f"Timed out waiting for >{num_scans}< scans.")
+				return None
+		
+		data = self.fetch_scan()
+		if data is None:
+			return None
+		if len(data) != num_scans*len(frag.scan_channels):
+			self.warning(f"Scan returned >{len(data)}< readings, expected >{num_scans*len(frag.scan_channels)}<.")
+		
+		with self._scan_store_lock():
+			self._reset_scan_store()
+			self._store_scan_readings(data)
+		return data
+	
+	@property
+	def scan_running(self) -> bool:
+		thread = getattr(self, "_scan_thread", None)
+		return thread is not None and thread.is_alive()
+	
+	def start_continuous_scan(self, poll_s:float=0.5, max_readings:int=1000000):
+		''' Starts scanning continuously, with a background thread moving new readings from
+		the instrument's buffer into the state every poll_s. The instrument's buffer wraps, so
+		poll_s must be short enough that it doesn't fill between polls.
+		
+		While the scan runs it owns the driver - don't call the driver from other threads until
+		stop_continuous_scan() returns.
+		
+		Args:
+			poll_s (float): Time between buffer reads.
+			max_readings (int): Number of readings kept in the state. Older readings are
+				dropped.
+		
+		Returns:
+			None
+		'''
+		
+		if self.scan_running:
+			return
+		
+		frag = self.state.state_fragments[self.__state_key__]
+		if len(frag.scan_channels) == 0:
+			self.error(f"Cannot start scan, no scan list has been configured.")
+			return
+		
+		with self._scan_store_lock():
+			self._reset_scan_store()
+		self._scan_max_readings = max_readings
+		self.num_scan_errors = 0
+		
+		self.arm_scan(None)
+		if not self.dummy:
+			self.send_manual_trigger(send_cls=False)
+		
+		self._scan_stop_event = threading.Event()
+		self._scan_thread = threading.Thread(target=self._run_continuous_scan, args=(poll_s,), daemon=True)
+		self._scan_thread.start()
+	
+	def stop_continuous_scan(self, timeout:float=None):
+		''' Stops a continuous scan, after moving any remaining readings into the state. '''
+		
+		thread = getattr(self, "_scan_thread", None)
+		if thread is not None:
+			self._scan_stop_event.set()
+			thread.join(timeout)
+			self._scan_thread = None
+			self._poll_scan()
+		self.abort_scan()
+	
+	def get_scan_data(self, channel:int=None) -> np.ndarray:
+		''' Returns the readings of the last scan (or continuous scan) from the state.
+		
+		Args:
+			channel (int): Only return readings of this channel. Default = None, returns all.
+		
+		Returns:
+			np.ndarray: Structured array with dtype SCAN_DTYPE.
+		'''
+		
+		with self._scan_store_lock():
+			cols = self.state.state_fragments[self.__state_key__].scan_data
+			out = np.empty(len(cols["reading"]), dtype=SCAN_DTYPE)
+			for name in SCAN_DTYPE.names:
+				out[name] = cols[name]
+		
+		if channel is not None:
+			return out[out["channel"] == channel]
+		return out
+	
+	def _scan_store_lock(self) -> threading.Lock:
+		if getattr(self, "_scan_lock", None) is None:
+			self._scan_lock = threading.Lock()
+		return self._scan_lock
+	
+	def _reset_scan_store(self):
+		''' Empties the scan readings. Must be called with the scan lock held. '''
+		
+		self._scan_buffer = np.empty(1024, dtype=SCAN_DTYPE)
+		self._scan_count = 0
+		self._publish_scan_store()
+	
+	def _store_scan_readings(self, readings:np.ndarray):
+		''' Appends readings to the scan store, growing it geometrically, and drops the oldest
+		quarter whenever it exceeds the max_readings of a continuous scan. Must be called with
+		the scan lock held. '''
+		
+		n = self._scan_count
+		k = len(readings)
+		max_readings = getattr(self, "_scan_max_readings", None)
+		if max_readings is not None and n+k > max_readings:
+			keep = max(0, min(n, max_readings*3//4 - k))
+			self._scan_buffer[:keep] = self._scan_buffer[n-keep:n]
+			n = keep
+			readings = readings[-max_readings:]
+			k = len(readings)
+		
+		if n+k > len(self._scan_buffer):
+			grown = np.empty(max(2*len(self._scan_buffer), n+k), dtype=SCAN_DTYPE)
+			grown[:n] = self._scan_buffer[:n]
+			self._scan_buffer = grown
+		
+		self._scan_buffer[n:n+k] = readings
+		self._scan_count = n+k
+		self._publish_scan_store()
+	
+	def _publish_scan_store(self):
+		# State holds views of the filled part of the buffer, so appending doesn't copy it
+		n = self._scan_count
+		self.modify_state(None, ["scan_data"], {name:self._scan_buffer[name][:n] for name in SCAN_DTYPE.names}, fragment=self.__state_key__)
+	
+	def _poll_scan(self) -> bool:
+		
+		try:
+			readings = self.fetch_new_scan_readings()
+		except Exception as e:
+			readings = None
+			self.error(f"Failed to read scan buffer. ({e})")
+		
+		if readings is None:
+			self.num_scan_errors += 1
+			return False
+		
+		if len(readings) > 0:
+			with self._scan_store_lock():
+				self._store_scan_readings(readings)
+		return True
+	
+	def _run_continuous_scan(self, poll_s:float):
+		while not self._scan_stop_event.wait(poll_s):
+			self._poll_scan()
+	
+	def _dummy_scan_readings(self, num_scans:int) -> np.ndarray:
+		''' Spoofs num_scans scans of the scan list, continuing the timestamps of the previous
+		call. '''
+		
+		frag = self.state.state_fragments[self.__state_key__]
+		channels = np.asarray(frag.scan_channels, dtype=np.int32)
+		nch = len(channels)
+		
+		t0 = getattr(self, "_dummy_scan_time", 0.0)
+		period = frag.scan_interval if frag.scan_interval is not None else 0.01*nch
+		
+		out = np.empty(nch*num_scans, dtype=SCAN_DTYPE)
+		out["channel"] = np.tile(channels, num_scans)
+		out["timestamp"] = t0 + (np.repeat(np.arange(num_scans)*period, nch) + np.tile(np.arange(nch)*period/max(nch, 1), num_scans))
+		out["reading"] = self._dummy_rng.normal(self.dummy_reading, self.dummy_noise, len(out)) + 1e-3*(out["channel"] % 100)
+		
+		self._dummy_scan_time = t0 + num_scans*period
+		return out
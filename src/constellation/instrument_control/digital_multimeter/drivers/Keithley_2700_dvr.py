@@ -1,23 +1,33 @@
-''' Driver for Siglent SDM3000X series digital multimeters:
- - SDM3045X
- - SDM3055X
- - SDM3065X
-Only tested with SDM3045X.
-
-https://int.siglent.com/u_file/document/SDM%20Series%20Digital%20Multimeter_ProgrammingGuide_EN02A.pdf
+''' Driver for Keithley 2700 series multimeter / data acquisition systems. Supports scan lists
+with a multiplexer card (eg. 7700) via ScanMixin.
 '''
 
-import array
 from constellation.base import *
 from constellation.instrument_control.digital_multimeter.digital_multimeter_ctg import *
 
-class Keithley2700(DigitalMultimeter):
+# SENS:FUNC names of each measurement
+KEITHLEY_2700_FUNCTIONS = {DigitalMultimeter.MEAS_RESISTANCE_2WIRE:"RES", DigitalMultimeter.MEAS_RESISTANCE_4WIRE:"FRES", DigitalMultimeter.MEAS_CURR_AC:"CURR:AC", DigitalMultimeter.MEAS_CURR_DC:"CURR:DC", DigitalMultimeter.MEAS_VOLT_AC:"VOLT:AC", DigitalMultimeter.MEAS_VOLT_DC:"VOLT:DC"}
+
+def channel_list_str(channels:list) -> str:
+	''' Returns a SCPI channel list, eg. '(@101,102,105)'. '''
+	return "(@" + ",".join(str(int(c)) for c in channels) + ")"
+
+class Keithley2700(DigitalMultimeter, ScanMixin):
 	
-	def __init__(self, address:str, log:plf.LogPile, **kwargs):
-		super().__init__(address, log, relay=DirectSCPIRelay(), expected_idn="Siglent Technologies,SDM30", **kwargs) 
+	def __init__(self, address:str, log:plf.LogPile, relay:CommandRelay=None, **kwargs):
+		if relay is None:
+			relay = DirectSCPIRelay()
+		super().__init__(address, log, relay=relay, expected_idn="KEITHLEY INSTRUMENTS INC.,MODEL 2700", **kwargs)
 		
 		# Unit to make sure is matched by returned string
 		self.check_units = ""
+		
+		# Reading buffer size used by continuous scans, and the next buffer location to read
+		self.scan_buffer_size = 55000
+		self._scan_read_ptr = 0
+		
+		# Bursts are stored in the same buffer
+		self.max_burst_samples = 55000
 	
 	@superreturn
 	def set_measurement(self, measurement:str, range:float=None):
@@ -129,42 +139,55 @@ class Keithley2700(DigitalMultimeter):
 			self.write("*CLS")
 		self.write(f"INIT:IMM")
 	
+	@superreturn
+	def configure_burst(self, num_samples:int, interval_s:float=None):
+		if not self.burst_size_ok(num_samples):
+			return # DigitalMultimeter.configure_burst() logs the error and returns False
+		
+		self.write(f"ABORT") # Abort any previous wait for trigger events
+		self.write(f"INIT:CONT OFF")
+		self.write(f"ROUT:SCAN:LSEL NONE") # Measure the front panel (or closed) channel, not the scan list
+		
+		# Store every reading in the buffer, with a timestamp relative to the first one
+		self.write(f"TRAC:CLE")
+		self.write(f"TRAC:POIN {max(2, int(num_samples))}") # Buffer holds 2 to 55000 readings
+		self.write(f"TRAC:FEED SENS")
+		self.write(f"TRAC:TST:FORM ABS")
+		self.write(f"TRAC:FEED:CONT NEXT")
+		self.write(f"FORM:ELEM READ,TST,RNUM")
+		
+		if interval_s is None:
+			self.write(f"TRIG:SOUR IMM")
+			self.write(f"TRIG:COUN 1")
+			self.write(f"SAMP:COUN {int(num_samples)}")
+		else:
+			self.write(f"TRIG:SOUR TIM") # One reading per timer event
+			self.write(f"TRIG:TIM {interval_s}")
+			self.write(f"TRIG:COUN {int(num_samples)}")
+			self.write(f"SAMP:COUN 1")
+	
+	@superreturn
+	def fetch_burst(self):
+		# Triplets of reading, timestamp and reading number, eg.
+		# '-4.87665862E-01VDC,+0.000SECS,+1RDNG#,-4.87665901E-01VDC,+0.051SECS,+2RDNG#'
+		readings = parse_readings(self.query(f"TRAC:DATA?"), num_fields=3)
+		self._super_hint = (readings[:, 0], readings[:, 1])
+	
 	@superreturn
 	def get_value(self, check_measurement:bool=True) -> float:
 		''' Returns the last measured value. Will be in units self.check_units. Will return None on error '''
 		
+		self._super_hint = None # Nothing is filed in the state if the read fails
+		
 		str_val = self.query("READ?")
 		
-		# str_val will contain 3 values. Example: 
+		# The reading is the first field, followed by any other elements (see FORM:ELEM). Example:
 		# '-4.87665862E-01VDC,+1318.539SECS,+12129RDNG#\n'
-		#
-		# Parser function:
-		def parse_three_numbers(s: str):
-			"""
-			Extracts three leading float/scientific-notation numbers from a 
-			comma-separated Keithley-style reading string.
-			"""
-			fields = s.strip().split(",")
-
-			numbers = []
-			for f in fields:
-				# match leading number (scientific or normal float)
-				m = re.match(r'([+-]?\d+(?:\.\d+)?(?:[Ee][+-]?\d+)?)', f)
-				if not m:
-					raise ValueError(f"Could not parse number from field: {f}")
-				numbers.append(float(m.group(1)))
-			
-			if len(numbers) != 3:
-				raise ValueError(f"Expected 3 numbers, found {len(numbers)}")
-			
-			return tuple(numbers)
-		
-		# Parse return string
-		try:
-			(val, time_on, meas_count) = parse_three_numbers(str_val)
-		except Exception as e:
-			self.warning(f"Failed to parse returned string ({str_val}). {e}.")
+		values = parse_readings(str_val)
+		if len(values) == 0:
+			self.warning(f"Failed to parse returned string ({str_val}).")
 			return None
+		val = float(values[0])
 		
 		#TODO: Implement check units
 		# # Check units
@@ -182,4 +205,91 @@ class Keithley2700(DigitalMultimeter):
 		# 	self.log.error(f"Received wrong type of units. Aborting.", detail=f"Received '{unit_str}', expected '{self.check_units}' ({e}).")
 		# 	return None
 		
-		self._super_hint = val
\ No newline at end of file
+		self._super_hint = val
+	
+	@superreturn
+	def configure_scan(self, channels:list, measurements=None, interval_s:float=None):
+		measurements = self._scan_measurement_list(channels, measurements)
+		if measurements is None:
+			return
+		
+		self.write(f"ABORT")
+		
+		# One SENS:FUNC per function, applied to all of its channels
+		groups = {}
+		for ch, meas in zip(channels, measurements):
+			groups.setdefault(meas, []).append(ch)
+		for meas, chans in groups.items():
+			if meas not in KEITHLEY_2700_FUNCTIONS:
+				self.error(f"Measurement >{meas}< can't be scanned.")
+				continue
+			self.write(f"SENS:FUNC '{KEITHLEY_2700_FUNCTIONS[meas]}', {channel_list_str(chans)}")
+		
+		self.write(f"ROUT:SCAN {channel_list_str(channels)}")
+		self.write(f"ROUT:SCAN:TSO IMM") # Start scanning on the trigger model, not an external trigger
+		self._select_scan()
+	
+	def _select_scan(self):
+		''' Routes measurements through the scan list and reads channel numbers with each reading.
+		configure_burst() turns both off, so they're sent again whenever a scan is armed. '''
+		
+		self.write(f"ROUT:SCAN:LSEL INT")
+		self.write(f"FORM:ELEM READ,TST,CHAN")
+		self.write(f"TRAC:TST:FORM ABS") # Timestamps relative to the first reading in the buffer
+	
+	@superreturn
+	def arm_scan(self, num_scans:int=None):
+		frag = self.state.state_fragments[self.__state_key__]
+		
+		self.write(f"ABORT")
+		self.write(f"INIT:CONT OFF")
+		self._select_scan()
+		self.write(f"TRAC:CLE")
+		if num_scans is None:
+			self.write(f"TRAC:POIN {self.scan_buffer_size}")
+			self.write(f"TRAC:FEED:CONT ALW") # Wrap around, overwriting the oldest readings
+			self.write(f"TRIG:COUN INF")
+		else:
+			self.write(f"TRAC:POIN {max(2, len(frag.scan_channels)*int(num_scans))}")
+			self.write(f"TRAC:FEED:CONT NEXT")
+			self.write(f"TRIG:COUN {int(num_scans)}")
+		self.write(f"TRAC:FEED SENS")
+		
+		# One trigger per scan, with one sample per channel
+		self.write(f"SAMP:COUN {len(frag.scan_channels)}")
+		if frag.scan_interval is None:
+			self.write(f"TRIG:SOUR IMM")
+		else:
+			self.write(f"TRIG:SOUR TIM")
+			self.write(f"TRIG:TIM {frag.scan_interval}")
+		
+		self._scan_read_ptr = 0
+	
+	@superreturn
+	def fetch_scan(self):
+		# Triplets of reading, timestamp and channel, eg. '+1.23E+00VDC,+0.000SECS,+101INTCHAN,...'
+		self._super_hint = scan_array(parse_readings(self.query(f"TRAC:DATA?"), num_fields=3))
+	
+	@superreturn
+	def fetch_new_scan_readings(self):
+		
+		# Next buffer location to be written. The buffer wraps when it's full.
+		nxt = int(float(self.query(f"TRAC:NEXT?")))
+		ptr = self._scan_read_ptr
+		
+		if nxt == ptr:
+			self._super_hint = np.empty(0, dtype=SCAN_DTYPE)
+			return
+		
+		if nxt > ptr:
+			text = self.query(f"TRAC:DATA:SEL? {ptr},{nxt-ptr}")
+		else:
+			text = self.query(f"TRAC:DATA:SEL? {ptr},{self.scan_buffer_size-ptr}")
+			if nxt > 0:
+				text = text.strip() + "," + self.query(f"TRAC:DATA:SEL? 0,{nxt}")
+		
+		self._scan_read_ptr = nxt
+		self._super_hint = scan_array(parse_readings(text, num_fields=3))
+	
+	def abort_scan(self):
+		self.write(f"ABORT")
@@ -2,14 +2,15 @@
 
 '''
 
-import array
 from constellation.base import *
 from constellation.instrument_control.digital_multimeter.digital_multimeter_ctg import *
 
 class Keysight34400(DigitalMultimeter):
 	
-	def __init__(self, address:str, log:plf.LogPile, **kwargs):
-		super().__init__(address, log, relay=DirectSCPIRelay(), expected_idn="Keysight Technologies,344", **kwargs) 
+	def __init__(self, address:str, log:plf.LogPile, relay:CommandRelay=None, **kwargs):
+		if relay is None:
+			relay = DirectSCPIRelay()
+		super().__init__(address, log, relay=relay, expected_idn="Keysight Technologies,344", **kwargs)
 		
 		# Unit to make sure is matched by returned string
 		self.check_units = ""
@@ -131,10 +132,29 @@ class Keysight34400(DigitalMultimeter):
 			self.write("*CLS")
 		self.write(f"INIT:IMM")
 	
+	@superreturn
+	def configure_burst(self, num_samples:int, interval_s:float=None):
+		self.write(f"ABORT") # Abort any previous wait for trigger events
+		self.write(f"TRIG:SOUR IMM")
+		self.write(f"TRIG:COUN 1")
+		self.write(f"SAMP:COUN {int(num_samples)}")
+		if interval_s is None:
+			self.write(f"SAMP:SOUR IMM")
+		else:
+			self.write(f"SAMP:SOUR TIM") # Samples paced by the instrument's timer
+			self.write(f"SAMP:TIM {interval_s}")
+	
+	@superreturn
+	def fetch_burst(self):
+		# Readings have no units or timestamps, eg. '-4.87665862E-01,-4.87665901E-01'
+		self._super_hint = (parse_readings(self.query(f"FETC?")), None)
+	
 	@superreturn
 	def get_value(self, check_measurement:bool=True) -> float:
 		''' Returns the last measured value. Will be in units self.check_units. Will return None on error '''
 		
+		self._super_hint = None # Nothing is filed in the state if the read fails
+		
 		str_val = self.query("DATA:LAST?")
 		
 		# Remove line endings
@@ -7,14 +7,15 @@ Only tested with SDM3045X.
 https://int.siglent.com/u_file/document/SDM%20Series%20Digital%20Multimeter_ProgrammingGuide_EN02A.pdf
 '''
 
-import array
 from constellation.base import *
 from constellation.instrument_control.digital_multimeter.digital_multimeter_ctg import *
 
 class SiglentSDM3000X(DigitalMultimeter):
 	
-	def __init__(self, address:str, log:plf.LogPile, **kwargs):
-		super().__init__(address, log, relay=DirectSCPIRelay(), expected_idn="Siglent Technologies,SDM30", **kwargs) 
+	def __init__(self, address:str, log:plf.LogPile, relay:CommandRelay=None, **kwargs):
+		if relay is None:
+			relay = DirectSCPIRelay()
+		super().__init__(address, log, relay=relay, expected_idn="Siglent Technologies,SDM30", **kwargs)
 		
 		# Unit to make sure is matched by returned string
 		self.check_units = ""
@@ -129,10 +130,31 @@ class SiglentSDM3000X(DigitalMultimeter):
 			self.write("*CLS")
 		self.write(f"INIT:IMM")
 	
+	@superreturn
+	def configure_burst(self, num_samples:int, interval_s:float=None):
+		self.write(f"ABORT") # Abort any previous wait for trigger events
+		self.write(f"TRIG:SOUR IMM")
+		if interval_s is None:
+			self.write(f"TRIG:COUN 1")
+			self.write(f"SAMP:COUN {int(num_samples)}")
+		else:
+			# No sample timer - pace with one trigger per reading, delayed by the interval. The
+			# delay doesn't include the integration time, so the rate is approximate.
+			self.write(f"TRIG:COUN {int(num_samples)}")
+			self.write(f"SAMP:COUN 1")
+			self.write(f"TRIG:DEL {interval_s}")
+	
+	@superreturn
+	def fetch_burst(self):
+		# Readings have no units or timestamps, eg. '-4.87665862E-01,-4.87665901E-01'
+		self._super_hint = (parse_readings(self.query(f"FETC?")), None)
+	
 	@superreturn
 	def get_value(self, check_measurement:bool=True) -> float:
 		''' Returns the last measured value. Will be in units self.check_units. Will return None on error '''
 		
+		self._super_hint = None # Nothing is filed in the state if the read fails
+		
 		str_val = self.query("DATA:LAST?")
 		
 		# Remove line endings
@@ -5,6 +5,7 @@ https://beyondmeasure.rigoltech.com/acton/attachment/1579/f-0386/1/-/-/-/-/DS100
 
 from constellation.base import*
 from constellation.instrument_control.oscilloscope.oscilloscope_ctg import *
+from concurrent.futures import ThreadPoolExecutor
 
 # Maximum number of waveform points the DS1000Z will return per single :WAV:DATA? query, per the
 # programming guide's :WAVeform:DATA? section (WORD's 125000 isn't used - this driver only
@@ -15,6 +16,13 @@ from constellation.instrument_control.oscilloscope.oscilloscope_ctg import *
 # :ACQuire:MDEPth? rather than guessed, and every :WAV:STOP value sent must stay within it.
 _WAV_MAX_CHUNK_POINTS = {True: 250000, False: 15625}  # keyed by `binary`
 
+# Within that cap, get_waveform() sizes each chunk so its transfer takes about _WAV_TARGET_CHUNK_S
+# at the throughput measured on the previous chunk. On a fast (USB/LAN) link this is simply the
+# cap; on a slow link (eg. a remote relay) chunks shrink so no single query gets near the relay
+# timeout and the decode worker is kept busy.
+_WAV_TARGET_CHUNK_S = 0.5
+_WAV_MIN_CHUNK_POINTS = 1000
+
 def _parse_wav_preamble(preamble_str:str):
 	''' Parses a Rigol :WAVeform:PREamble? response into the fields get_waveform() needs.
 
@@ -31,6 +39,40 @@ def _parse_wav_preamble(preamble_str:str):
 	yreference = float(parts[9])
 	return points, xincrement, xorigin, yincrement, yorigin, yreference
 
+def _ascii_chunk_length(data:str) -> int:
+	''' Counts the values in an ASCII :WAV:DATA? reply without parsing them (the reply is
+	a 11 character #9NNNNNNNNN header, then comma-separated values, possibly with a trailing
+	comma before the newline). '''
+	body = data[11:].strip().rstrip(",")
+	if body.strip() == "":
+		return 0
+	return body.count(",") + 1
+
+def _decode_wav_chunk(raw, npoints:int, binary:bool, scale:tuple=None) -> np.ndarray:
+	''' Decodes the first `npoints` values of one :WAV:DATA? reply into a NumPy array. BYTE
+	replies are returned as the raw uint8 codes, or in volts if `scale` = (y_increment,
+	y_origin + y_reference) is given. ASCII replies are always in volts. Runs on the decode
+	worker thread of RigolDS1000Z._iter_wav_blocks(). '''
+
+	if binary:
+		codes = raw[:npoints]
+		if scale is None:
+			return codes
+		volt = np.subtract(codes, scale[1], dtype=np.float64)
+		volt *= scale[0]
+		return volt
+
+	# Filter out empty/whitespace-only tokens - a trailing comma before the
+	# terminating newline otherwise leaves a bare '\n' token float() can't parse.
+	values = [float(v) for v in raw[11:].split(",") if v.strip() != ""]
+	return np.asarray(values[:npoints], dtype=np.float64)
+
+def _next_chunk_points(npoints:int, elapsed_s:float, chunk_cap:int) -> int:
+	''' Returns the size of the next waveform chunk given the last one's throughput. '''
+	if elapsed_s <= 0:
+		return chunk_cap
+	return int(min(chunk_cap, max(_WAV_MIN_CHUNK_POINTS, npoints / elapsed_s * _WAV_TARGET_CHUNK_S)))
+
 class RigolDS1000Z(Oscilloscope, MeasurementsMixin):
 
 	def __init__(self, address:str, log:plf.LogPile, relay:CommandRelay=DirectSCPIRelay(), max_channels:int=4, **kwargs):
@@ -45,6 +87,16 @@ class RigolDS1000Z(Oscilloscope, MeasurementsMixin):
 		# Table to translate coupling constants to SCPI strings
 		self.coupling_table = {Oscilloscope.COUPLING_AC:"AC", Oscilloscope.COUPLING_DC:"DC", Oscilloscope.COUPLING_GND:"GND"}
 		
+		# Maximum number of :MEASure:STATistic:ITEM? queries joined into one compound query by
+		# get_all_measurements(). A call whose compound query isn't answered finishes with
+		# single queries. After meas_batch_max_failures failed calls in a row, compound queries
+		# are only retried every meas_batch_retry_s.
+		self.meas_batch_size = 20
+		self.meas_batch_max_failures = 3
+		self.meas_batch_retry_s = 60
+		self._meas_batch_failures = 0
+		self._meas_batch_t_fail = 0
+		
 	# def set_div_time(self, time_s:float):
 	# 	self.write(f":TIM:MAIN:SCAL {time_s}")
 	# 	super().set_div_time(time_s)
@@ -73,6 +125,7 @@ class RigolDS1000Z(Oscilloscope, MeasurementsMixin):
 		
 	
 	@superreturn
+	@invalidates_acquisition()
 	def set_div_time(self, time_s:float):
 		self.write(f":TIM:MAIN:SCAL {time_s}")
 		
@@ -81,6 +134,7 @@ class RigolDS1000Z(Oscilloscope, MeasurementsMixin):
 		self._super_hint = float(self.query(f":TIM:MAIN:SCAL?"))
 	
 	@superreturn
+	@invalidates_acquisition()
 	def set_offset_time(self, time_s:float):
 		self.write(f":TIM:MAIN:OFFS {time_s}")
 	
@@ -89,6 +143,7 @@ class RigolDS1000Z(Oscilloscope, MeasurementsMixin):
 		self._super_hint = float(self.query(f":TIM:MAIN:OFFS?"))
 	
 	@superreturn
+	@invalidates_acquisition()
 	def set_div_volt(self, channel:int, volt_V:float):
 		self.write(f":CHAN{channel}:SCAL {volt_V}")
 	
@@ -97,6 +152,7 @@ class RigolDS1000Z(Oscilloscope, MeasurementsMixin):
 		self._super_hint = float(self.query(f":CHAN{channel}:SCAL?"))
 	
 	@superreturn
+	@invalidates_acquisition()
 	def set_offset_volt(self, channel:int, volt_V:float):
 		self.write(f":CHAN{channel}:OFFS {volt_V}")
 	
@@ -105,6 +161,7 @@ class RigolDS1000Z(Oscilloscope, MeasurementsMixin):
 		self._super_hint = float(self.query(f":CHAN{channel}:OFFS?"))
 	
 	@superreturn
+	@invalidates_acquisition()
 	def set_chan_enable(self, channel:int, enable:bool):
 		self.write(f":CHAN{channel}:DISP {bool_to_str01(enable)}")
 	
@@ -113,6 +170,7 @@ class RigolDS1000Z(Oscilloscope, MeasurementsMixin):
 		self._super_hint = str_to_bool(self.query(f":CHAN{channel}:DISP?"))
 	
 	@superreturn
+	@invalidates_acquisition()
 	def set_probe_attenuation(self, channel:int, attenuation:float):
 		valid_probe_attenuations = {0.01, 0.02, 0.05, 0.1, 0.2, 0.5, 1, 2, 5, 10, 20, 50, 100, 200, 500, 1000}
 		if attenuation not in valid_probe_attenuations:
@@ -201,6 +259,7 @@ class RigolDS1000Z(Oscilloscope, MeasurementsMixin):
 			self._super_hint = src_str
 	
 	@superreturn
+	@invalidates_acquisition(settings=False)
 	def run_acquisition(self):
 		self.write(f":RUN")
 	
@@ -209,13 +268,138 @@ class RigolDS1000Z(Oscilloscope, MeasurementsMixin):
 		self.write(f":STOP")
 	
 	@superreturn
+	@invalidates_acquisition(settings=False)
 	def do_single_trigger(self):
 		self.write(f":SING")
 	
 	@superreturn
+	@invalidates_acquisition(settings=False)
 	def do_force_trigger(self):
 		self.write(f":TFORCE")
 	
+	def is_acquisition_complete(self) -> bool:
+		if self.dummy:
+			return super().is_acquisition_complete()
+		# :SING leaves the scope in STOP once the single acquisition has completed
+		return self._query_trigger_status() == "STOP"
+	
+	def _query_trigger_status(self) -> str:
+		''' Queries :TRIGger:STATus? and records a stopped/running acquisition in the
+		acquisition cache. '''
+		
+		status = self.query(":TRIGger:STATus?").strip().upper()
+		if status == "STOP":
+			self.acquisition_cache.set_stopped()
+		elif self.acquisition_cache.stopped:
+			self.acquisition_cache.set_running()
+		return status
+	
+	def _acquisition_running(self) -> bool:
+		''' Returns True unless the acquisition is stopped. Skips the status query if the
+		acquisition cache already knows it's stopped. '''
+		
+		if self.acquisition_cache.enabled and self.acquisition_cache.stopped:
+			return False
+		return self._query_trigger_status() != "STOP"
+	
+	# Segmented memory uses the DS1000Z's waveform record function: frames are recorded with
+	# :FUNCtion:WRECord and read back one at a time by selecting them with
+	# :FUNCtion:WREPlay:FCURrent and reading the screen waveform (:WAV:MODE NORM).
+	supports_segmented = True
+	
+	@superreturn
+	def set_segment_count(self, count:int):
+		self.write(f":FUNCtion:WRECord:FEND {int(count)}")
+	
+	@superreturn
+	def get_segment_count(self):
+		self._super_hint = int(self.query(":FUNCtion:WRECord:FEND?"))
+	
+	@superreturn
+	@invalidates_acquisition(settings=False)
+	def arm_segmented_acquisition(self):
+		self.write(":FUNCtion:WRECord:ENABle ON")
+		self.write(":FUNCtion:WRECord:OPERate RUN")
+	
+	def is_segmented_acquisition_complete(self) -> bool:
+		if self.dummy:
+			return super().is_segmented_acquisition_complete()
+		return self.query(":FUNCtion:WRECord:OPERate?").strip().upper() == "STOP"
+	
+	def get_segmented_waveforms(self, channel:int, binary:bool=True, frames:list=None, timeout_s:float=60.0) -> SegmentedWaveforms:
+		''' Waits for the segmented acquisition started by arm_segmented_acquisition() to
+		finish, then downloads the recorded frames of one channel into one preallocated
+		(num_frames, npoints) array.
+		
+		Each frame is read back from the playback screen (:WAV:MODE NORM), so only the ~1200
+		screen points of each frame are returned, not the full recorded frame memory. Use
+		normal (non-segmented) acquisition with get_waveform() for deep records.
+		
+		The DS1000Z doesn't report per-frame trigger time tags over SCPI, so frame_times are
+		nominal: frame index times the record interval (:FUNCtion:WRECord:FINTerval?).
+		
+		Args:
+			channel (int): Channel to read.
+			binary (bool): Read raw BYTE codes (default) instead of ASCII volts.
+			frames (list): Frame numbers to read (1-based). Default = None, all recorded frames.
+			timeout_s (float): How long to wait for the recording to finish.
+		
+		Returns:
+			SegmentedWaveforms: The frames, or None if an error occurs.
+		'''
+		
+		if self.dummy:
+			return super().get_segmented_waveforms(channel)
+		
+		try:
+			# Wait for the recording to finish, backing off like _wait_for_trigger_status()
+			t0 = time.time()
+			interval = 0.005
+			while not self.is_segmented_acquisition_complete():
+				if time.time() - t0 > timeout_s:
+					self.error("Timed out waiting for segmented acquisition to complete.")
+					return None
+				time.sleep(interval)
+				interval = min(interval*2, 0.2)
+			self.acquisition_cache.set_stopped()
+			
+			if frames is None:
+				frames = range(1, self.get_segment_count()+1)
+			frames = np.asarray(list(frames), dtype=np.int64)
+			frame_interval = float(self.query(":FUNCtion:WRECord:FINTerval?"))
+			
+			data = None
+			axis = {}
+			for i, frame in enumerate(frames):
+				self.write(f":FUNCtion:WREPlay:FCURrent {frame}")
+				frame_points = 0
+				for offset, chunk in self._iter_wav_blocks(channel, binary=binary, full_memory=False, raw=True, axis_out=axis, _skip_run_management=True):
+					if data is None:
+						data = np.full((len(frames), axis["npoints"]), 0 if chunk.dtype == np.uint8 else np.nan, dtype=chunk.dtype)
+					if offset+len(chunk) > data.shape[1]:
+						self.error(f"Frame >{frame}< on channel >{channel}< is longer than the first frame (>{data.shape[1]}< points).")
+						return None
+					data[i, offset:offset+len(chunk)] = chunk
+					frame_points = offset+len(chunk)
+				
+				# Every row must be filled - frames all share the first frame's length
+				if data is not None and frame_points != data.shape[1]:
+					self.error(f"Frame >{frame}< on channel >{channel}< returned >{frame_points}< points, expected >{data.shape[1]}<.")
+					return None
+			
+			if data is None:
+				self.error(f"No frames were read for channel {channel}.")
+				return None
+			
+			kwargs = {"frame_times":(frames - frames[0]) * frame_interval, "frame_numbers":frames, "x_increment":axis["x_increment"], "x_origin":axis["x_origin"], "channel":channel}
+			if binary:
+				return SegmentedWaveforms(codes=data, y_increment=axis["y_increment"], y_origin=axis["y_origin"], y_reference=axis["y_reference"], **kwargs)
+			return SegmentedWaveforms(volts=data, **kwargs)
+		
+		except Exception as e:
+			self.error(f"Failed to read segmented waveforms on channel {channel}. ({e})")
+			return None
+	
 	@superreturn
 	def get_waveform(self, channel:int, binary:bool=True, full_memory:bool=True, max_points:int=None, _skip_run_management:bool=False):
 		''' Reads the waveform on the specified channel.
@@ -246,17 +430,92 @@ class RigolDS1000Z(Oscilloscope, MeasurementsMixin):
 				leave this alone when calling get_waveform() directly.
 
 		Returns:
-			dict with keys 'time_s', 'volt_V', 'channel'.
+			OscilloscopeWaveform: dict-like, with keys 'time_s', 'volt_V', 'channel'.
+		'''
+
+		# A stopped acquisition that has already been read doesn't need to be transferred again
+		cache = self.acquisition_cache
+		cache_key = (channel, binary, full_memory, max_points)
+		if full_memory and cache.enabled and cache.stopped and cache_key in cache.waveforms:
+			self._super_hint = cache.waveforms[cache_key]
+			return
+
+		axis = {}
+		buffer = np.empty(0, dtype=np.uint8 if binary else np.float64)
+		npoints = 0
+
+		try:
+			for offset, chunk in self._iter_wav_blocks(channel, binary=binary, full_memory=full_memory, max_points=max_points, raw=True, axis_out=axis, _skip_run_management=_skip_run_management):
+
+				# Preallocate the whole record from the memory depth on the first chunk: BYTE
+				# transfers keep the raw uint8 codes (scaled to volts lazily by
+				# OscilloscopeWaveform), ASCII transfers are already in volts.
+				if offset == 0:
+					buffer = np.empty(axis["npoints"], dtype=chunk.dtype)
+
+				buffer[offset:offset+len(chunk)] = chunk
+				npoints = offset + len(chunk)
+
+		except Exception as e:
+			self.error(f"Failed to read waveform on channel {channel}. ({e})")
+			npoints = 0
+
+		xincr = axis.get("x_increment", 0.0)
+		xorigin = axis.get("x_origin", 0.0)
+		if binary:
+			wav = OscilloscopeWaveform(codes=buffer[:npoints], y_increment=axis.get("y_increment", 1.0), y_origin=axis.get("y_origin", 0.0), y_reference=axis.get("y_reference", 0.0), x_increment=xincr, x_origin=xorigin, channel=channel)
+		else:
+			wav = OscilloscopeWaveform(volts=buffer[:npoints], x_increment=xincr, x_origin=xorigin, channel=channel)
+
+		if full_memory and cache.enabled and cache.stopped and npoints > 0:
+			cache.waveforms[cache_key] = wav
+
+		self._super_hint = wav
+
+	def iter_waveform_chunks(self, channel:int, binary:bool=True, full_memory:bool=True, max_points:int=None, raw:bool=False, axis_out:dict=None, _skip_run_management:bool=False):
+		''' Streams the waveform on the specified channel, yielding each :WAV:DATA? block as
+		soon as it has been decoded (see Oscilloscope.iter_waveform_chunks()). Chunks are
+		decoded on a worker thread while the next block is transferred, as in get_waveform().
+
+		Acquisition is stopped/resumed as in get_waveform(). Closing the iterator early (eg.
+		breaking out of the loop) still resumes it.
+
+		Args:
+			channel: Channel to read.
+			binary, full_memory, max_points, _skip_run_management: As for get_waveform().
+			raw: If True, BYTE transfers yield the raw uint8 codes instead of volts (scale with
+				the y_* entries of axis_out). Default = False.
+			axis_out: Optional dict, filled in before the first chunk with 'x_origin',
+				'x_increment', 'npoints' (expected record length), 'channel', 'y_increment',
+				'y_origin' and 'y_reference'.
+
+		Yields:
+			tuple: (offset, chunk) - index of the chunk's first sample, NumPy array.
 		'''
 
+		if self.dummy:
+			yield from super().iter_waveform_chunks(channel, axis_out=axis_out)
+			return
+
+		try:
+			yield from self._iter_wav_blocks(channel, binary=binary, full_memory=full_memory, max_points=max_points, raw=raw, axis_out=axis_out, _skip_run_management=_skip_run_management)
+		except Exception as e:
+			self.error(f"Failed to stream waveform on channel {channel}. ({e})")
+
+	def _iter_wav_blocks(self, channel:int, binary:bool=True, full_memory:bool=True, max_points:int=None, raw:bool=False, axis_out:dict=None, _skip_run_management:bool=False):
+		''' Generator behind get_waveform() and iter_waveform_chunks(). Raises on failure. '''
+
+		if axis_out is None:
+			axis_out = {}
+
 		was_running = False
 		if full_memory and not _skip_run_management:
-			was_running = self.query(":TRIGger:STATus?").strip().upper() != "STOP"
+			was_running = self._acquisition_running()
 			if was_running:
 				self.stop_acquisition()
 				self._wait_for_trigger_status("STOP")
 
-		volts, xincr, xorigin = [], 0.0, 0.0
+		decode_pool = None
 
 		try:
 			self.write(f":WAV:SOUR CHAN{channel}")
@@ -267,7 +526,7 @@ class RigolDS1000Z(Oscilloscope, MeasurementsMixin):
 			# sending a value outside that range is rejected by the instrument, so the actual
 			# depth must be queried, never guessed. NORM mode's range is always documented as a
 			# fixed 1-1200 (the screen's point count).
-			total_points = self._get_memory_depth() if full_memory else 1200
+			total_points = max(self._get_memory_depth() if full_memory else 1200, 0)
 
 			if max_points is not None:
 				total_points = min(total_points, max_points)
@@ -276,48 +535,74 @@ class RigolDS1000Z(Oscilloscope, MeasurementsMixin):
 
 			# Query the waveform scaling factors once via the preamble, using a first chunk range
 			# that's guaranteed to be within [1, total_points] so it can't itself be rejected.
-			self.write(":WAV:STAR 1")
-			self.write(f":WAV:STOP {min(chunk_cap, total_points) if total_points > 0 else 1}")
-			_, xincr, xorigin, yincr, yorigin, yref = _parse_wav_preamble(self.query(":WAV:PRE?"))
+			# The preamble only changes with the settings, so it's cached.
+			cache = self.acquisition_cache
+			preamble_key = (channel, full_memory, binary)
+			if cache.enabled and preamble_key in cache.preambles:
+				preamble = cache.preambles[preamble_key]
+			else:
+				self.write(":WAV:STAR 1")
+				self.write(f":WAV:STOP {min(chunk_cap, total_points) if total_points > 0 else 1}")
+				preamble = _parse_wav_preamble(self.query(":WAV:PRE?"))
+				cache.preambles[preamble_key] = preamble
+			_, xincr, xorigin, yincr, yorigin, yref = preamble
+
+			axis_out.update({"x_origin":xorigin, "x_increment":xincr, "npoints":total_points, "channel":channel, "y_increment":yincr, "y_origin":yorigin, "y_reference":yref})
+			scale = None if raw else (yincr, yorigin + yref)
 
 			# The scope caps how many points it returns per single :WAV:DATA? query (see
 			# _WAV_MAX_CHUNK_POINTS) - read the full record (or max_points) in bounded batches,
 			# each explicitly sized to stay within that cap and within total_points.
+			#
+			# Each reply is handed to a worker thread for decoding while this thread requests the
+			# next chunk, so the link isn't idle while Python decodes. Only the number of points
+			# in the reply (cheap to get) is needed before the next request. A chunk is yielded
+			# once the following one has been requested, so at most two are held at a time.
+			decode_pool = ThreadPoolExecutor(max_workers=1)
+			pending = []
+			chunk_points = chunk_cap
+			npoints = 0
 			start = 1
 			while start <= total_points:
 
-				stop = min(start + chunk_cap - 1, total_points)
+				stop = min(start + chunk_points - 1, total_points)
 				self.write(f":WAV:STAR {start}")
 				self.write(f":WAV:STOP {stop}")
 
+				t0 = time.perf_counter()
 				if binary:
-					codes = self.query_binary(":WAV:DATA?", datatype='B')
-					chunk = [(code - yorigin - yref) * yincr for code in codes]
+					reply = self.query_binary_array(":WAV:DATA?", datatype='B')
+					count = len(reply)
 				else:
-					data = self.query("WAV:DATA?")
-					# Filter out empty/whitespace-only tokens - a trailing comma before the
-					# terminating newline otherwise leaves a bare '\n' token float() can't parse.
-					chunk = [float(v) for v in data[11:].split(",") if v.strip() != ""]
+					reply = self.query("WAV:DATA?")
+					count = _ascii_chunk_length(reply)
+				elapsed = time.perf_counter() - t0
 
-				if not chunk:
+				if count == 0:
 					break  # avoid an infinite loop if the instrument stops returning new data
 
-				volts.extend(chunk)
-				start += len(chunk)
+				n = min(count, total_points - npoints)
+				pending.append((npoints, decode_pool.submit(_decode_wav_chunk, reply, n, binary, scale)))
 
-		except Exception as e:
-			self.error(f"Failed to read waveform on channel {channel}. ({e})")
-			volts = []
+				npoints += n
+				start += count
+				chunk_points = _next_chunk_points(count, elapsed, chunk_cap)
+
+				if len(pending) >= 2:
+					offset, future = pending.pop(0)
+					yield offset, future.result()
+
+			for offset, future in pending:
+				yield offset, future.result()
 
 		finally:
+			if decode_pool is not None:
+				decode_pool.shutdown(wait=True, cancel_futures=True)
+
 			# Always resume acquisition if we're the one who stopped it, even on failure.
 			if was_running:
 				self.run_acquisition()
 
-		t = list(xorigin + np.linspace(0, xincr * (len(volts) - 1), len(volts))) if volts else []
-
-		self._super_hint = {"time_s":t, "volt_V":volts, "channel":channel}
-
 	def _get_memory_depth(self) -> int:
 		''' Returns the oscilloscope's current memory depth in points (the valid upper bound for
 		:WAV:STARt/:WAV:STOP in RAW mode). :ACQuire:MDEPth? returns either a concrete integer or
@@ -325,13 +610,20 @@ class RigolDS1000Z(Oscilloscope, MeasurementsMixin):
 		documented relationship Memory Depth = Sample Rate x Waveform Length (Waveform Length =
 		timebase-per-division x 12 divisions on a DS1000Z).
 		'''
+		cache = self.acquisition_cache
+		if cache.enabled and cache.memory_depth is not None:
+			return cache.memory_depth
+
 		mdepth_str = self.query(":ACQuire:MDEPth?").strip()
 		try:
-			return int(float(mdepth_str))
+			mdepth = int(float(mdepth_str))
 		except ValueError:
 			sample_rate = float(self.query(":ACQuire:SRATe?").strip())
 			timebase_per_div = float(self.query(":TIM:MAIN:SCAL?").strip())
-			return int(round(sample_rate * timebase_per_div * 12))
+			mdepth = int(round(sample_rate * timebase_per_div * 12))
+
+		cache.memory_depth = mdepth
+		return mdepth
 
 	def _begin_waveform_batch(self, full_memory:bool=True, **kwargs):
 		''' Stops acquisition once for the whole get_all_waveforms() batch (if full_memory is
@@ -341,7 +633,7 @@ class RigolDS1000Z(Oscilloscope, MeasurementsMixin):
 
 		if not full_memory:
 			return False
-		was_running = self.query(":TRIGger:STATus?").strip().upper() != "STOP"
+		was_running = self._acquisition_running()
 		if was_running:
 			self.stop_acquisition()
 			self._wait_for_trigger_status("STOP")
@@ -351,7 +643,7 @@ class RigolDS1000Z(Oscilloscope, MeasurementsMixin):
 		if batch_state:
 			self.run_acquisition()
 
-	def _wait_for_trigger_status(self, target:str, timeout_s:float=5.0, poll_interval_s:float=0.2):
+	def _wait_for_trigger_status(self, target:str, timeout_s:float=5.0, poll_interval_s:float=0.2, min_poll_interval_s:float=0.005):
 		''' Polls :TRIGger:STATus? until it reports `target`, or `timeout_s` elapses.
 
 		:STOP/:RUN do not take effect instantaneously - the oscilloscope needs a moment to
@@ -360,13 +652,18 @@ class RigolDS1000Z(Oscilloscope, MeasurementsMixin):
 		mid-transition was confirmed against real hardware to make the scope reject subsequent
 		commands ("Cannot operate now!" on the DS1000Z's screen) and hang the query that follows
 		until it times out.
+
+		The transition usually completes within a few ms, so polling starts at
+		`min_poll_interval_s` and backs off geometrically to `poll_interval_s`.
 		'''
 
 		t0 = time.time()
-		status = self.query(":TRIGger:STATus?").strip().upper()
+		interval = min_poll_interval_s
+		status = self._query_trigger_status()
 		while status != target and time.time() - t0 < timeout_s:
-			time.sleep(poll_interval_s)
-			status = self.query(":TRIGger:STATus?").strip().upper()
+			time.sleep(interval)
+			interval = min(interval*2, poll_interval_s)
+			status = self._query_trigger_status()
 
 		if status != target:
 			self.warning(f"Timed out waiting for :TRIGger:STATus? to report >{target}< (last saw >{status}<).")
@@ -414,6 +711,66 @@ class RigolDS1000Z(Oscilloscope, MeasurementsMixin):
 			
 		self._super_hint = float(self.query(f":MEASURE:STAT:ITEM? {stat_str},{item_str},{src_str}"))
 	
+	@superreturn
+	def get_all_measurements(self, stat_modes:list=None) -> dict:
+		
+		self._super_hint = None
+		
+		# Build one query per measurement and statistic
+		keys = self.measurement_keys(stat_modes)
+		cmds = []
+		for channel, measurement, stat_mode in keys:
+			if measurement not in self.meas_table:
+				self.log.error(f"Cannot read measurement >{measurement}<. Measurement not recognized.")
+				return
+			if stat_mode not in self.stat_table:
+				self.log.error(f"Cannot use stat-mode >{stat_mode}<. Statistic code not recognized.")
+				return
+			cmds.append(f":MEASURE:STAT:ITEM? {self.stat_table[stat_mode]},{self.meas_table[measurement]},CHAN{channel}")
+		
+		# Send them as compound queries, as few round trips as the scope allows
+		batch_size = self.meas_batch_size
+		if self._meas_batch_failures >= self.meas_batch_max_failures and time.time() - self._meas_batch_t_fail < self.meas_batch_retry_s:
+			batch_size = 1 # Compound queries keep failing, wait before trying again
+		
+		values = []
+		idx = 0
+		while idx < len(cmds):
+			batch = cmds[idx:idx+batch_size]
+			reply = self._query_compound(batch)
+			if reply is None:
+				if len(batch) == 1:
+					self.log.error(f"Failed to read measurement with query >{batch[0]}<.")
+					return
+				self._meas_batch_failures += 1
+				self._meas_batch_t_fail = time.time()
+				self.warning(f"Compound measurement query was not answered correctly (>{self._meas_batch_failures}< time(s) in a row). Falling back to one query per measurement.")
+				batch_size = 1
+				continue
+			if len(batch) > 1:
+				self._meas_batch_failures = 0
+			values.extend(reply)
+			idx += len(batch)
+		
+		self._super_hint = dict(zip(keys, values))
+	
+	def _query_compound(self, cmds:list) -> list:
+		''' Sends several queries as one semicolon-separated compound query. Returns the list of
+		float replies, or None if the reply doesn't contain one number per query. '''
+		
+		reply = self.query(";".join(cmds))
+		if reply is None:
+			return None
+		
+		try:
+			values = [float(x) for x in reply.strip().split(";")]
+		except ValueError:
+			return None
+		
+		if len(values) != len(cmds):
+			return None
+		return values
+	
 	@superreturn
 	def clear_measurements(self):
 		
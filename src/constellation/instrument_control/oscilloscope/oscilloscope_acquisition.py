@@ -0,0 +1,410 @@
+""" Continuous triggered acquisition for oscilloscopes.
+
+Calling do_single_trigger() then get_all_waveforms() in a loop re-checks which channels are
+enabled, polls the trigger status with fixed sleeps and manages run/stop state on every
+iteration. An AcquisitionEngine instead runs the arm -> wait -> read -> re-arm cycle in a tight
+loop on a background thread and delivers each capture (one waveform per channel) into a bounded
+queue.
+
+Example:
+	engine = AcquisitionEngine(osc, queue_size=32, overflow=AcquisitionEngine.DROP_OLDEST)
+	engine.start()
+	for _ in range(1000):
+		capture = engine.get(timeout=5)
+		...
+	engine.stop()
+	print(engine.stats())
+
+MeasurementSampler does the same for the scope's measurement table, reading every active
+measurement with one get_all_measurements() call per sample into a time-series ring buffer.
+
+While an engine or sampler is running it owns the Driver - don't call the driver from other
+threads until stop() returns.
+"""
+
+import time
+import queue
+import threading
+import collections
+import numpy as np
+
+from constellation.instrument_control.oscilloscope.oscilloscope_ctg import Oscilloscope
+
+class OscilloscopeCapture:
+	''' One triggered acquisition: a waveform per channel, plus its sequence number and the
+	time the trigger was detected.
+	'''
+
+	def __init__(self, seq:int, timestamp:float, waveforms:dict):
+		self.seq = seq
+		self.timestamp = timestamp
+		self.waveforms = waveforms # Channel number -> waveform
+
+	def __repr__(self):
+		return f"OscilloscopeCapture(seq={self.seq}, channels={list(self.waveforms.keys())})"
+
+class AcquisitionEngine:
+	''' Runs arm -> wait for trigger -> read channels -> re-arm on a background thread,
+	delivering OscilloscopeCapture objects into a bounded queue.
+	'''
+
+	DROP_OLDEST = "drop-oldest" # Full queue: discard the oldest queued capture
+	DROP_NEWEST = "drop-newest" # Full queue: discard the capture just acquired
+	BLOCK = "block" # Full queue: stop acquiring until the consumer catches up
+
+	def __init__(self, osc:Oscilloscope, channels:list=None, queue_size:int=16, overflow:str=DROP_OLDEST, trigger_timeout_s:float=10.0, force_trigger_on_timeout:bool=False, min_poll_s:float=0.001, max_poll_s:float=0.2, rate_window:int=50, max_consecutive_errors:int=5, **waveform_kwargs):
+		'''
+		Args:
+			osc (Oscilloscope): Connected oscilloscope driver.
+			channels (list): Channels to read on each trigger. Default = None, reads every
+				channel enabled when start() is called.
+			queue_size (int): Maximum number of captures waiting for the consumer.
+			overflow (str): What to do when the queue is full: DROP_OLDEST (default),
+				DROP_NEWEST or BLOCK.
+			trigger_timeout_s (float): How long to wait for a trigger before re-arming (or
+				forcing a trigger). Default = 10 s.
+			force_trigger_on_timeout (bool): Send do_force_trigger() when the trigger times
+				out, instead of re-arming. Default = False.
+			min_poll_s (float): Shortest interval between trigger status polls.
+			max_poll_s (float): Longest interval between trigger status polls.
+			rate_window (int): Number of recent captures used for the captures/s estimate.
+			max_consecutive_errors (int): The engine stops after this many failed cycles in
+				a row.
+			**waveform_kwargs: Forwarded to get_waveform() (eg. binary=, max_points=).
+		'''
+
+		if overflow not in (AcquisitionEngine.DROP_OLDEST, AcquisitionEngine.DROP_NEWEST, AcquisitionEngine.BLOCK):
+			raise ValueError(f"Unrecognized overflow policy '{overflow}'.")
+
+		self.osc = osc
+		self.channels = channels
+		self.overflow = overflow
+		self.trigger_timeout_s = trigger_timeout_s
+		self.force_trigger_on_timeout = force_trigger_on_timeout
+		self.min_poll_s = min_poll_s
+		self.max_poll_s = max_poll_s
+		self.max_consecutive_errors = max_consecutive_errors
+		self.waveform_kwargs = waveform_kwargs
+
+		self.queue = queue.Queue(maxsize=queue_size)
+
+		self._stop_event = threading.Event()
+		self._thread = None
+		self._stats_lock = threading.Lock()
+		self._capture_times = collections.deque(maxlen=rate_window)
+		self._last_trigger_wait_s = None
+		self._reset_stats()
+
+	def _reset_stats(self):
+		with self._stats_lock:
+			self.num_captures = 0
+			self.num_dropped = 0
+			self.num_timeouts = 0
+			self.num_errors = 0
+			self._capture_times.clear()
+			self._t_start = None
+			self._t_stop = None
+
+	@property
+	def running(self) -> bool:
+		return self._thread is not None and self._thread.is_alive()
+
+	def start(self):
+		''' Starts acquiring on a background thread. Resets the statistics. '''
+
+		if self.running:
+			return
+
+		if self.channels is None:
+			self.channels = [ch for ch in range(self.osc.state.first_channel, self.osc.state.first_channel+self.osc.state.num_channels) if self.osc.get_chan_enable(ch)]
+
+		self._reset_stats()
+		self._stop_event.clear()
+		self._t_start = time.perf_counter()
+		self._thread = threading.Thread(target=self._run, daemon=True)
+		self._thread.start()
+
+	def stop(self, timeout:float=None):
+		''' Stops acquiring and waits for the background thread to finish its current
+		capture. Captures already queued stay available to get(). '''
+
+		self._stop_event.set()
+		if self._thread is not None:
+			self._thread.join(timeout)
+			self._thread = None
+		if self._t_stop is None and self._t_start is not None:
+			self._t_stop = time.perf_counter()
+
+	def get(self, timeout:float=None) -> OscilloscopeCapture:
+		''' Returns the next capture, or None if none arrives within `timeout` seconds. '''
+		try:
+			return self.queue.get(timeout=timeout)
+		except queue.Empty:
+			return None
+
+	def __enter__(self):
+		self.start()
+		return self
+
+	def __exit__(self, exc_type, exc, tb):
+		self.stop()
+
+	def stats(self) -> dict:
+		''' Returns acquisition statistics:
+			captures: Captures acquired
+			dropped: Captures discarded by the overflow policy
+			timeouts: Trigger timeouts
+			errors: Failed cycles
+			captures_per_s: Average rate since start()
+			recent_captures_per_s: Rate over the last `rate_window` captures
+		'''
+
+		with self._stats_lock:
+			elapsed = None
+			if self._t_start is not None:
+				elapsed = (self._t_stop if self._t_stop is not None else time.perf_counter()) - self._t_start
+
+			recent = None
+			if len(self._capture_times) > 1:
+				span = self._capture_times[-1] - self._capture_times[0]
+				if span > 0:
+					recent = (len(self._capture_times)-1)/span
+
+			return {"captures":self.num_captures, "dropped":self.num_dropped, "timeouts":self.num_timeouts, "errors":self.num_errors, "captures_per_s":(self.num_captures/elapsed if elapsed else None), "recent_captures_per_s":recent}
+
+	def _wait_for_trigger(self) -> bool:
+		''' Polls is_acquisition_complete() until the armed acquisition completes. The first
+		poll is timed from the previous capture's trigger wait, then the interval backs off
+		geometrically from min_poll_s to max_poll_s. Returns False on timeout or stop(). '''
+
+		t0 = time.perf_counter()
+
+		# Most triggers arrive at a similar rate, so sleep through most of the expected wait
+		if self._last_trigger_wait_s is not None:
+			self._stop_event.wait(min(0.5*self._last_trigger_wait_s, self.max_poll_s))
+
+		interval = self.min_poll_s
+		while not self._stop_event.is_set():
+
+			if self.osc.is_acquisition_complete():
+				self._last_trigger_wait_s = time.perf_counter() - t0
+				return True
+
+			if time.perf_counter() - t0 > self.trigger_timeout_s:
+				return False
+
+			self._stop_event.wait(interval)
+			interval = min(interval*1.5, self.max_poll_s)
+
+		return False
+
+	def _deliver(self, capture:OscilloscopeCapture):
+		''' Puts a capture in the queue according to the overflow policy. '''
+
+		if self.overflow == AcquisitionEngine.BLOCK:
+			while not self._stop_event.is_set():
+				try:
+					self.queue.put(capture, timeout=0.1)
+					return
+				except queue.Full:
+					pass
+			return
+
+		if self.overflow == AcquisitionEngine.DROP_NEWEST:
+			try:
+				self.queue.put_nowait(capture)
+			except queue.Full:
+				with self._stats_lock:
+					self.num_dropped += 1
+			return
+
+		# DROP_OLDEST
+		while True:
+			try:
+				self.queue.put_nowait(capture)
+				return
+			except queue.Full:
+				try:
+					self.queue.get_nowait()
+					with self._stats_lock:
+						self.num_dropped += 1
+				except queue.Empty:
+					pass
+
+	def _run(self):
+
+		consecutive_errors = 0
+		seq = 0
+
+		while not self._stop_event.is_set():
+
+			try:
+				self.osc.do_single_trigger()
+
+				if not self._wait_for_trigger():
+					if self._stop_event.is_set():
+						break
+					with self._stats_lock:
+						self.num_timeouts += 1
+					if self.force_trigger_on_timeout:
+						self.osc.do_force_trigger()
+						if not self._wait_for_trigger():
+							continue
+					else:
+						continue
+
+				t_trig = time.time()
+
+				# The single acquisition has completed, so the scope is already stopped
+				waveforms = {ch:self.osc.get_waveform(ch, _skip_run_management=True, **self.waveform_kwargs) for ch in self.channels}
+
+				capture = OscilloscopeCapture(seq, t_trig, waveforms)
+				seq += 1
+
+				with self._stats_lock:
+					self.num_captures += 1
+					self._capture_times.append(time.perf_counter())
+
+				self._deliver(capture)
+				consecutive_errors = 0
+
+			except Exception as e:
+				consecutive_errors += 1
+				with self._stats_lock:
+					self.num_errors += 1
+				self.osc.error(f"Acquisition cycle failed. ({e})")
+				if consecutive_errors >= self.max_consecutive_errors:
+					self.osc.error(f"Stopping acquisition engine after >{consecutive_errors}< consecutive failures.")
+					break
+
+		self._t_stop = time.perf_counter()
+
+class MeasurementSampler:
+	''' Samples the oscilloscope's whole measurement table (get_all_measurements()) at a fixed
+	rate on a background thread, into a ring buffer of the most recent `buffer_size` samples.
+
+	Example:
+		with MeasurementSampler(osc, interval_s=0.1, stat_modes=[osc.STAT_CURR, osc.STAT_AVG]) as sampler:
+			time.sleep(10)
+			t, values = sampler.snapshot()
+			vpp = values[:, sampler.keys.index((1, osc.MEAS_VPP, osc.STAT_CURR))]
+	'''
+
+	def __init__(self, osc, interval_s:float=0.5, buffer_size:int=10000, stat_modes:list=None):
+		'''
+		Args:
+			osc: Connected oscilloscope driver with MeasurementsMixin.
+			interval_s (float): Time between samples.
+			buffer_size (int): Number of samples kept. Older samples are overwritten.
+			stat_modes (list): Statistics to read for each measurement. Default = None,
+				reads STAT_CURR only.
+		'''
+
+		self.osc = osc
+		self.interval_s = interval_s
+		self.buffer_size = buffer_size
+		self.stat_modes = stat_modes
+
+		self.keys = [] # Column order of the value buffer, (channel, measurement, stat_mode)
+		self._times = np.full(buffer_size, np.nan)
+		self._values = np.full((buffer_size, 0), np.nan)
+		self._count = 0 # Samples taken since start()
+		self.num_errors = 0
+		self.num_late = 0 # Samples that started late because the previous one overran
+
+		self._lock = threading.Lock()
+		self._stop_event = threading.Event()
+		self._thread = None
+
+	@property
+	def running(self) -> bool:
+		return self._thread is not None and self._thread.is_alive()
+
+	def start(self):
+		''' Clears the buffer and starts sampling. The measurement table is read from the
+		driver's state now - measurements added later aren't sampled until restart. '''
+
+		if self.running:
+			return
+
+		self.keys = self.osc.measurement_keys(self.stat_modes)
+		with self._lock:
+			self._times = np.full(self.buffer_size, np.nan)
+			self._values = np.full((self.buffer_size, len(self.keys)), np.nan)
+			self._count = 0
+			self.num_errors = 0
+			self.num_late = 0
+
+		self._stop_event.clear()
+		self._thread = threading.Thread(target=self._run, daemon=True)
+		self._thread.start()
+
+	def stop(self, timeout:float=None):
+		''' Stops sampling. The buffer stays available. '''
+
+		self._stop_event.set()
+		if self._thread is not None:
+			self._thread.join(timeout)
+			self._thread = None
+
+	def __enter__(self):
+		self.start()
+		return self
+
+	def __exit__(self, exc_type, exc, tb):
+		self.stop()
+
+	def __len__(self):
+		return min(self._count, self.buffer_size)
+
+	def snapshot(self) -> tuple:
+		''' Returns (times, values) for the buffered samples, oldest first. `times` has shape
+		(N,) and `values` has shape (N, len(keys)); missing values are NaN. '''
+
+		with self._lock:
+			n = min(self._count, self.buffer_size)
+			if self._count <= self.buffer_size:
+				return (self._times[:n].copy(), self._values[:n].copy())
+			order = np.roll(np.arange(self.buffer_size), -(self._count % self.buffer_size))
+			return (self._times[order], self._values[order])
+
+	def latest(self) -> dict:
+		''' Returns the most recent sample as a dict mapping each key to its value, or None
+		if nothing has been sampled yet. '''
+
+		with self._lock:
+			if self._count == 0:
+				return None
+			row = self._values[(self._count-1) % self.buffer_size]
+			return dict(zip(self.keys, row.tolist()))
+
+	def _run(self):
+
+		t_next = time.perf_counter()
+		while not self._stop_event.is_set():
+
+			t_sample = time.time()
+			try:
+				result = self.osc.get_all_measurements(self.stat_modes)
+			except Exception as e:
+				result = None
+				self.osc.error(f"Measurement sampling failed. ({e})")
+
+			if result is None:
+				self.num_errors += 1
+			else:
+				row = [result.get(k, np.nan) for k in self.keys]
+				with self._lock:
+					i = self._count % self.buffer_size
+					self._times[i] = t_sample
+					self._values[i, :] = row
+					self._count += 1
+
+			# Fixed rate: schedule from the previous deadline, not from when the read finished
+			t_next += self.interval_s
+			delay = t_next - time.perf_counter()
+			if delay < 0:
+				self.num_late += 1
+				t_next = time.perf_counter()
+				delay = 0
+			self._stop_event.wait(delay)
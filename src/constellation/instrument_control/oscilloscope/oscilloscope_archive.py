@@ -0,0 +1,348 @@
+""" Chunked, compressed HDF5 archive of oscilloscope captures.
+
+For long acquisition campaigns, saving each capture as its own JSON/HDF file is slow and wastes
+space. A WaveformArchive appends captures (one waveform per channel, as returned by
+get_all_waveforms(), an AcquisitionEngine or iter_waveform_chunks()) to one HDF5 file, storing
+the raw ADC codes in chunked, compressed, extendable datasets. Captures are queued by the caller
+and written by a background thread, and any capture can be read back by number.
+
+File layout:
+
+	/captures/time           float64  timestamp of each capture (seconds since epoch)
+	/captures/state          vlen uint8, the driver state (constellation.state_codec, settings
+	                         only) at the time of the capture, or empty
+	/channels/<ch>/capture   int64    capture number of each record on this channel
+	/channels/<ch>/offset    int64    first point of the record in codes/volts
+	/channels/<ch>/npoints   int64    number of points in the record
+	/channels/<ch>/kind      uint8    0 = record is in codes, 1 = record is in volts
+	/channels/<ch>/preamble  float64  (N, 5): y_increment, y_origin, y_reference, x_increment,
+	                                  x_origin
+	/channels/<ch>/codes     uint8    raw ADC codes of every record, concatenated
+	/channels/<ch>/volts     float32  records that were read as text (no codes), concatenated
+
+Example:
+	with WaveformArchive("campaign.h5") as archive:
+		for _ in range(10000):
+			osc.do_single_trigger()
+			archive.append(osc.get_all_waveforms(), driver=osc)
+
+	with WaveformArchive("campaign.h5", mode="r") as archive:
+		capture = archive.read(1234)
+"""
+
+import time
+import numpy as np
+import h5py
+import pylogfile.base as plf
+
+from constellation.base import Driver, state_serialization
+from constellation.state_codec import encode_state, decode_state
+from constellation.h5_writer import BackgroundH5Writer
+from constellation.instrument_control.oscilloscope.oscilloscope_ctg import OscilloscopeWaveform
+from constellation.instrument_control.oscilloscope.oscilloscope_acquisition import OscilloscopeCapture
+
+KIND_CODES = 0
+KIND_VOLTS = 1
+
+_ARCHIVE_FORMAT_VERSION = 1
+
+class WaveformArchive(BackgroundH5Writer):
+	''' Appends oscilloscope captures to a chunked, compressed HDF5 file from a background
+	writer thread, with random access to any capture by number.
+	'''
+
+	_description = "waveform archive"
+	_item_name = "capture"
+
+	def __init__(self, filename:str, mode:str="a", compression:str="gzip", compression_opts=1, chunk_points:int=1<<18, max_pending:int=64, log:plf.LogPile=None):
+		''' Opens (or creates) an archive.
+
+		Args:
+			filename (str): HDF5 file to use.
+			mode (str): "a" to create or append (default), "w" to overwrite, "r" to read
+				only.
+			compression (str): h5py compression filter for the waveform data ("gzip", "lzf"
+				or None). Default = "gzip".
+			compression_opts: Filter options (gzip level). Default = 1, fastest.
+			chunk_points (int): HDF5 chunk size of the waveform datasets, in points.
+			max_pending (int): Maximum number of captures waiting to be written. append()
+				blocks when the writer falls this far behind.
+			log (LogPile): Optional log.
+		'''
+
+		super().__init__(filename, mode, max_pending=max_pending, log=log)
+
+		self.compression = compression
+		self.compression_opts = compression_opts if compression == "gzip" else None
+		self.chunk_points = chunk_points
+
+		if "captures" not in self._file:
+			if self.readonly:
+				raise ValueError(f"File '{filename}' does not contain a waveform archive.")
+			grp = self._file.create_group("captures")
+			grp.attrs["format_version"] = _ARCHIVE_FORMAT_VERSION
+			grp.create_dataset("time", shape=(0,), maxshape=(None,), dtype=np.float64, chunks=(1024,))
+			grp.create_dataset("state", shape=(0,), maxshape=(None,), dtype=h5py.vlen_dtype(np.uint8), chunks=(64,))
+			self._file.create_group("channels")
+
+		# In-memory index, so lookups never touch the file
+		self._num_captures = self._file["captures/time"].shape[0]
+		self._load_rows(self._file["channels"], "capture", key=int) # Channel -> {capture number: row}
+
+		self._start_writer()
+
+	def __len__(self):
+		return self._num_captures
+
+	@property
+	def channels(self) -> list:
+		''' Channels with at least one record in the archive. '''
+		return sorted(self._rows.keys())
+
+	def append(self, waveforms, timestamp:float=None, driver:Driver=None) -> int:
+		''' Queues a capture to be written.
+
+		Args:
+			waveforms: Waveforms of the capture - a list (eg. from get_all_waveforms()), a dict
+				mapping channel to waveform, or an OscilloscopeCapture. Waveforms without
+				a 'channel' key in a list are numbered from 1.
+			timestamp (float): Time of the capture, seconds since epoch. Default = None, uses
+				the capture's timestamp or the current time.
+			driver (Driver): If given, its settings-only state is stored with the capture.
+
+		Returns:
+			int: Capture number.
+		'''
+
+		self._check_writable()
+
+		if isinstance(waveforms, OscilloscopeCapture):
+			if timestamp is None:
+				timestamp = waveforms.timestamp
+			waveforms = waveforms.waveforms
+
+		if not isinstance(waveforms, dict):
+			waveforms = {_channel_of(wav, i+1):wav for i, wav in enumerate(waveforms)}
+
+		if timestamp is None:
+			timestamp = time.time()
+
+		state = b""
+		if driver is not None:
+			with state_serialization(include_data=False):
+				state = encode_state(driver.state)
+
+		# Copy to new arrays now, so the caller is free to reuse/modify its waveforms while
+		# the capture waits in the queue
+		records = {ch:_record_of(wav) for ch, wav in waveforms.items() if wav is not None}
+
+		seq = self._num_captures
+		self._num_captures += 1
+		self._add_rows(seq, records.keys())
+
+		self._queue.put((seq, timestamp, np.frombuffer(state, dtype=np.uint8), records))
+
+		return seq
+
+	def append_stream(self, osc, channels:list=None, driver:Driver=None, **kwargs) -> int:
+		''' Reads each channel with iter_waveform_chunks() (raw codes where the driver supports
+		them) straight into one preallocated array per channel and queues the capture.
+
+		Args:
+			osc (Oscilloscope): Connected oscilloscope.
+			channels (list): Channels to read. Default = None, every enabled channel.
+			driver (Driver): If given, its settings-only state is stored with the capture.
+			**kwargs: Forwarded to iter_waveform_chunks().
+
+		Returns:
+			int: Capture number, or None if no channel could be read (nothing is queued).
+		'''
+
+		if channels is None:
+			channels = [ch for ch in range(osc.state.first_channel, osc.state.first_channel+osc.state.num_channels) if osc.get_chan_enable(ch)]
+
+		kwargs.setdefault("raw", True)
+
+		timestamp = time.time()
+		waveforms = {}
+		for ch in channels:
+			axis = {}
+			data = None
+			for offset, chunk in osc.iter_waveform_chunks(ch, axis_out=axis, **kwargs):
+				chunk = np.asarray(chunk)
+				if data is None:
+					data = np.empty(axis.get("npoints", offset+len(chunk)), dtype=chunk.dtype)
+				if offset+len(chunk) > len(data):
+					data = np.concatenate((data[:offset], chunk))
+				else:
+					data[offset:offset+len(chunk)] = chunk
+			if data is None:
+				continue
+
+			wav_kwargs = {"x_increment":axis.get("x_increment", 0.0), "x_origin":axis.get("x_origin", 0.0), "channel":ch}
+			if data.dtype == np.uint8 and "y_increment" in axis:
+				waveforms[ch] = OscilloscopeWaveform(codes=data, y_increment=axis["y_increment"], y_origin=axis["y_origin"], y_reference=axis["y_reference"], **wav_kwargs)
+			else:
+				waveforms[ch] = OscilloscopeWaveform(volts=data, **wav_kwargs)
+
+		if len(waveforms) == 0:
+			self.log.error(f"No channels could be read for waveform archive >{self.filename}<, capture not saved.")
+			return None
+
+		return self.append(waveforms, timestamp=timestamp, driver=driver)
+
+	def _channel_group(self, channel:int):
+
+		name = f"channels/{channel}"
+		if name in self._file:
+			return self._file[name]
+
+		grp = self._file.create_group(name)
+		for col, dtype in (("capture", np.int64), ("offset", np.int64), ("npoints", np.int64), ("kind", np.uint8)):
+			grp.create_dataset(col, shape=(0,), maxshape=(None,), dtype=dtype, chunks=(1024,))
+		grp.create_dataset("preamble", shape=(0, 5), maxshape=(None, 5), dtype=np.float64, chunks=(1024, 5))
+		for col, dtype in (("codes", np.uint8), ("volts", np.float32)):
+			grp.create_dataset(col, shape=(0,), maxshape=(None,), dtype=dtype, chunks=(self.chunk_points,), compression=self.compression, compression_opts=self.compression_opts, shuffle=(dtype != np.uint8 and self.compression is not None))
+		return grp
+
+	def _write_batch(self, batch:list):
+
+		# Capture table
+		n0 = self._file["captures/time"].shape[0]
+		n1 = n0 + len(batch)
+		ds = self._file["captures/time"]
+		ds.resize((n1,))
+		ds[n0:n1] = [item[1] for item in batch]
+		ds = self._file["captures/state"]
+		ds.resize((n1,))
+		for i, item in enumerate(batch):
+			ds[n0+i] = item[2]
+
+		# Group records by channel, so each dataset is resized once per batch
+		per_channel = {}
+		for seq, _, _, records in batch:
+			for ch, rec in records.items():
+				per_channel.setdefault(ch, []).append((seq, rec))
+
+		for ch, recs in per_channel.items():
+			grp = self._channel_group(ch)
+
+			r0 = grp["capture"].shape[0]
+			r1 = r0 + len(recs)
+			offsets = []
+			data_ends = {KIND_CODES:grp["codes"].shape[0], KIND_VOLTS:grp["volts"].shape[0]}
+			for _, (kind, data, _) in recs:
+				offsets.append(data_ends[kind])
+				data_ends[kind] += len(data)
+
+			for col, values in (("capture", [r[0] for r in recs]), ("offset", offsets), ("npoints", [len(r[1][1]) for r in recs]), ("kind", [r[1][0] for r in recs])):
+				grp[col].resize((r1,))
+				grp[col][r0:r1] = values
+			grp["preamble"].resize((r1, 5))
+			grp["preamble"][r0:r1, :] = [r[1][2] for r in recs]
+
+			for kind, col in ((KIND_CODES, "codes"), (KIND_VOLTS, "volts")):
+				parts = [r[1][1] for r in recs if r[1][0] == kind]
+				if len(parts) == 0:
+					continue
+				ds = grp[col]
+				d0 = ds.shape[0]
+				ds.resize((data_ends[kind],))
+				ds[d0:data_ends[kind]] = np.concatenate(parts)
+
+	def times(self) -> np.ndarray:
+		''' Returns the timestamp of every capture written so far. '''
+		self.flush()
+		with self._h5_lock:
+			return self._file["captures/time"][...]
+
+	def read_waveform(self, seq:int, channel:int) -> OscilloscopeWaveform:
+		''' Reads one channel of capture `seq`. Returns None if the capture has no record for
+		that channel. '''
+
+		if seq < 0:
+			seq += self._num_captures
+		row = self._rows.get(channel, {}).get(seq, None)
+		if row is None:
+			return None
+
+		self.flush()
+		self._check_readable()
+
+		with self._h5_lock:
+			grp = self._file[f"channels/{channel}"]
+			offset = int(grp["offset"][row])
+			npoints = int(grp["npoints"][row])
+			kind = int(grp["kind"][row])
+			y_increment, y_origin, y_reference, x_increment, x_origin = grp["preamble"][row, :]
+
+			if kind == KIND_CODES:
+				return OscilloscopeWaveform(codes=grp["codes"][offset:offset+npoints], y_increment=y_increment, y_origin=y_origin, y_reference=y_reference, x_increment=x_increment, x_origin=x_origin, channel=channel)
+			return OscilloscopeWaveform(volts=grp["volts"][offset:offset+npoints].astype(np.float64), x_increment=x_increment, x_origin=x_origin, channel=channel)
+
+	def read(self, seq:int) -> OscilloscopeCapture:
+		''' Reads capture `seq` (negative values count from the end).
+
+		Returns:
+			OscilloscopeCapture: The capture, with one OscilloscopeWaveform per channel.
+		'''
+
+		if seq < 0:
+			seq += self._num_captures
+		if seq < 0 or seq >= self._num_captures:
+			raise IndexError(f"Capture {seq} not in archive (length {self._num_captures}).")
+
+		self.flush()
+		self._check_readable()
+
+		with self._h5_lock:
+			timestamp = float(self._file["captures/time"][seq])
+
+		waveforms = {}
+		for ch in self.channels:
+			wav = self.read_waveform(seq, ch)
+			if wav is not None:
+				waveforms[ch] = wav
+
+		return OscilloscopeCapture(seq, timestamp, waveforms)
+
+	def read_state(self, seq:int):
+		''' Returns the driver state stored with capture `seq`, or None if none was stored. '''
+
+		if seq < 0:
+			seq += self._num_captures
+		if seq < 0 or seq >= self._num_captures:
+			raise IndexError(f"Capture {seq} not in archive (length {self._num_captures}).")
+
+		self.flush()
+		self._check_readable()
+
+		with self._h5_lock:
+			payload = self._file["captures/state"][seq]
+		if len(payload) == 0:
+			return None
+		return decode_state(payload, copy_arrays=True)
+
+def _channel_of(wav, default:int) -> int:
+	try:
+		ch = wav["channel"]
+	except (KeyError, TypeError):
+		return default
+	return default if ch is None else int(ch)
+
+def _record_of(wav) -> tuple:
+	''' Returns (kind, data, preamble) for a waveform (OscilloscopeWaveform or dict). `data`
+	is always a copy, never the waveform's own buffer. '''
+
+	if isinstance(wav, OscilloscopeWaveform):
+		x_origin, x_increment, _ = wav.time_axis()
+		if wav.codes is not None:
+			return (KIND_CODES, np.array(wav.codes, dtype=np.uint8, copy=True), (wav.y_increment, wav.y_origin, wav.y_reference, x_increment, x_origin))
+		return (KIND_VOLTS, np.array(wav.volts, dtype=np.float32, copy=True), (1.0, 0.0, 0.0, x_increment, x_origin))
+
+	# Plain dict, in volts with an explicit time axis
+	volts = np.array(wav["volt_V"], dtype=np.float32, copy=True)
+	t = np.asarray(wav.get("time_s", []), dtype=np.float64)
+	x_origin = float(t[0]) if len(t) > 0 else 0.0
+	x_increment = float(t[1]-t[0]) if len(t) > 1 else 0.0
+	return (KIND_VOLTS, volts, (1.0, 0.0, 0.0, x_increment, x_origin))
@@ -4,10 +4,306 @@ from abc import abstractmethod
 from constellation.base import InstrumentState, IndexedList, CommandRelay, Driver, enabledummy, protect_str
 # from constellation.networking.net_client import NetworkCommand, NetworkReply
 import numpy as np
+import functools
+from collections.abc import Mapping
+from stardust.serializer import Serializable
+from constellation.decimation import DecimationCache, DECIMATION_MINMAX, DECIMATION_THRESHOLD
 
 import matplotlib.pyplot as plt
 from matplotlib.gridspec import GridSpec
 
+DUMMY_SIGNAL_SHAPES = ("sine", "square", "triangle", "dc")
+
+_DUMMY_BLOCK_POINTS = 1<<20
+
+def _synthesize_dummy_codes(model:dict, npoints:int, x_origin:float, x_increment:float, v_min:float, y_increment:float, noise_V:float, rng:np.random.Generator) -> np.ndarray:
+	''' Generates a dummy waveform directly as uint8 ADC codes. Works in blocks so the
+	float64 temporaries stay small for multi-Mpt memory depths.
+	'''
+	
+	codes = np.empty(npoints, dtype=np.uint8)
+	shape = model["shape"]
+	
+	for i0 in range(0, npoints, _DUMMY_BLOCK_POINTS):
+		i1 = min(i0+_DUMMY_BLOCK_POINTS, npoints)
+		
+		if shape == "dc":
+			v = np.full(i1-i0, float(model["offset_V"]))
+		else:
+			phase = np.arange(i0, i1, dtype=np.float64)
+			phase *= x_increment
+			phase += x_origin
+			phase *= 2*np.pi*model["freq_Hz"]
+			phase += model["phase_rad"]
+			
+			if shape == "sine":
+				v = np.sin(phase, out=phase)
+			elif shape == "square":
+				v = np.sign(np.sin(phase, out=phase), out=phase)
+			else: # triangle
+				v = 2/np.pi*np.arcsin(np.sin(phase, out=phase), out=phase)
+			v *= model["ampl_V"]
+			v += model["offset_V"]
+		
+		if noise_V > 0:
+			v += rng.normal(0, noise_V, size=len(v))
+		
+		# Quantize to codes, clipping to the screen as a real scope would
+		v -= v_min
+		v /= y_increment
+		np.rint(v, out=v)
+		np.clip(v, 0, 255, out=v)
+		codes[i0:i1] = v
+	
+	return codes
+
+class OscilloscopeWaveform(Serializable, Mapping):
+	''' Compact oscilloscope waveform. Stores the raw ADC codes as returned by the
+	instrument (eg. uint8 for a BYTE transfer) plus the preamble scale and offset, instead of
+	one Python float per point. Voltages are computed in NumPy the first time they're
+	requested, and the time axis is implicit (x_origin + i*x_increment).
+
+	Behaves as a read-only Mapping with keys 'time_s', 'volt_V' and 'channel', so code that
+	indexes the old waveform dicts keeps working. Unlike the old dicts, 'time_s' and 'volt_V'
+	are NumPy arrays (so compare them with np.array_equal() or list(), not ==) and the
+	waveform isn't a dict, so json.dumps() can't take it directly - use to_dict().
+
+	Waveforms read as text (or otherwise already in volts) store them in `volts` instead of
+	`codes`.
+	'''
+
+	__state_fields__ = ("codes", "volts", "y_increment", "y_origin", "y_reference", "x_increment", "x_origin", "channel")
+
+	_KEYS = ("time_s", "volt_V", "channel")
+
+	def __init__(self, codes:np.ndarray=None, y_increment:float=1.0, y_origin:float=0.0, y_reference:float=0.0, x_increment:float=0.0, x_origin:float=0.0, channel:int=None, volts:np.ndarray=None):
+		self.codes = codes
+		self.volts = volts
+		self.y_increment = y_increment
+		self.y_origin = y_origin
+		self.y_reference = y_reference
+		self.x_increment = x_increment
+		self.x_origin = x_origin
+		self.channel = channel
+
+		self.__post_deserialize__()
+
+	def __post_deserialize__(self):
+		self._volt_cache = None
+		self._time_cache = None
+
+	@property
+	def npoints(self) -> int:
+		''' Number of points in the waveform. '''
+		if self.codes is not None:
+			return len(self.codes)
+		if self.volts is not None:
+			return len(self.volts)
+		return 0
+
+	@property
+	def volt_V(self) -> np.ndarray:
+		''' Waveform voltages, computed from the codes on first access. '''
+
+		if self.volts is not None:
+			return self.volts
+
+		if self._volt_cache is None:
+			if self.codes is None:
+				self._volt_cache = np.empty(0)
+			else:
+				volt = np.subtract(self.codes, self.y_origin + self.y_reference, dtype=np.float64)
+				volt *= self.y_increment
+				self._volt_cache = volt
+
+		return self._volt_cache
+
+	@property
+	def time_s(self) -> np.ndarray:
+		''' Time of each point, computed from the implicit axis on first access. '''
+
+		if self._time_cache is None or len(self._time_cache) != self.npoints:
+			self._time_cache = self.x_origin + np.arange(self.npoints) * self.x_increment
+		return self._time_cache
+
+	def time_axis(self) -> tuple:
+		''' Returns the implicit time axis as (x_origin, x_increment, npoints). '''
+		return (self.x_origin, self.x_increment, self.npoints)
+
+	def to_dict(self) -> dict:
+		''' Returns the waveform as a plain dict of lists, in the format of the old waveform
+		dicts, eg. for json.dumps(). '''
+
+		channel = None if self.channel is None else int(self.channel)
+		return {"time_s":self.time_s.tolist(), "volt_V":self.volt_V.tolist(), "channel":channel}
+
+	def __getitem__(self, key:str):
+		if key == "time_s":
+			return self.time_s
+		elif key == "volt_V":
+			return self.volt_V
+		elif key == "channel":
+			return self.channel
+		raise KeyError(key)
+
+	def __iter__(self):
+		return iter(self._KEYS)
+
+	def __len__(self):
+		return len(self._KEYS)
+
+	def __eq__(self, other):
+		if not isinstance(other, Mapping) or set(other.keys()) != set(self._KEYS):
+			return False
+		return self.channel == other["channel"] and np.array_equal(self.time_s, other["time_s"]) and np.array_equal(self.volt_V, other["volt_V"])
+
+	__hash__ = None
+
+	def __repr__(self):
+		return f"OscilloscopeWaveform(channel={self.channel}, npoints={self.npoints}, x_origin={self.x_origin}, x_increment={self.x_increment})"
+
+class SegmentedWaveforms(Serializable):
+	''' Frames of one channel captured in segmented memory (many triggers recorded at
+	hardware speed, downloaded afterwards). All frames share one preamble, so they're stored as
+	a single 2-D array of raw codes with shape (num_frames, npoints) - or of volts, for frames
+	read as text.
+
+	`frame_times` holds the time of each frame's trigger relative to the first frame, in seconds.
+	'''
+
+	__state_fields__ = ("codes", "volts", "frame_times", "frame_numbers", "y_increment", "y_origin", "y_reference", "x_increment", "x_origin", "channel")
+
+	def __init__(self, codes:np.ndarray=None, frame_times:np.ndarray=None, frame_numbers:np.ndarray=None, y_increment:float=1.0, y_origin:float=0.0, y_reference:float=0.0, x_increment:float=0.0, x_origin:float=0.0, channel:int=None, volts:np.ndarray=None):
+		self.codes = codes
+		self.volts = volts
+		self.frame_times = frame_times
+		self.frame_numbers = frame_numbers
+		self.y_increment = y_increment
+		self.y_origin = y_origin
+		self.y_reference = y_reference
+		self.x_increment = x_increment
+		self.x_origin = x_origin
+		self.channel = channel
+
+		self.__post_deserialize__()
+
+	def __post_deserialize__(self):
+		self._volt_cache = None
+
+	def _data(self) -> np.ndarray:
+		return self.codes if self.codes is not None else self.volts
+
+	@property
+	def num_frames(self) -> int:
+		data = self._data()
+		return 0 if data is None else data.shape[0]
+
+	@property
+	def npoints(self) -> int:
+		''' Number of points per frame. '''
+		data = self._data()
+		return 0 if data is None else data.shape[1]
+
+	def __len__(self):
+		return self.num_frames
+
+	@property
+	def volt_V(self) -> np.ndarray:
+		''' Voltages of every frame, shape (num_frames, npoints), computed on first access. '''
+
+		if self.volts is not None:
+			return self.volts
+
+		if self._volt_cache is None:
+			if self.codes is None:
+				self._volt_cache = np.empty((0, 0))
+			else:
+				volt = np.subtract(self.codes, self.y_origin + self.y_reference, dtype=np.float64)
+				volt *= self.y_increment
+				self._volt_cache = volt
+
+		return self._volt_cache
+
+	@property
+	def time_s(self) -> np.ndarray:
+		''' Time of each point within a frame, relative to that frame's trigger. '''
+		return self.x_origin + np.arange(self.npoints) * self.x_increment
+
+	def frame(self, index:int) -> OscilloscopeWaveform:
+		''' Returns one frame as an OscilloscopeWaveform (sharing this object's memory). '''
+
+		kwargs = {"x_increment":self.x_increment, "x_origin":self.x_origin, "channel":self.channel}
+		if self.codes is not None:
+			return OscilloscopeWaveform(codes=self.codes[index], y_increment=self.y_increment, y_origin=self.y_origin, y_reference=self.y_reference, **kwargs)
+		return OscilloscopeWaveform(volts=self.volts[index], **kwargs)
+
+	def __repr__(self):
+		return f"SegmentedWaveforms(channel={self.channel}, num_frames={self.num_frames}, npoints={self.npoints})"
+
+class AcquisitionCache:
+	''' Per-driver cache of acquisition metadata and data, so reading an unchanged
+	acquisition again doesn't re-query the instrument.
+
+	Settings (memory depth, waveform preambles) stay valid until a setter that affects them
+	calls invalidate_settings(). Waveform data is only kept while the acquisition is known to
+	be stopped, and is dropped by anything that starts a new acquisition (set_running()).
+
+	Changes made on the instrument's front panel can't be detected - call clear() (or set
+	`enabled` to False) if the instrument is shared.
+	'''
+
+	def __init__(self):
+		self.enabled = True
+		self.generation = 0 # Incremented by every invalidation
+		self.stopped = False # Acquisition known to be stopped
+		self.memory_depth = None
+		self.preambles = {}
+		self.waveforms = {}
+
+	def invalidate_data(self):
+		self.waveforms.clear()
+		self.generation += 1
+
+	def invalidate_settings(self):
+		self.memory_depth = None
+		self.preambles.clear()
+		self.invalidate_data()
+
+	def set_running(self):
+		''' Records that a new acquisition was started. '''
+		self.stopped = False
+		self.invalidate_data()
+
+	def set_stopped(self):
+		''' Records that the acquisition was observed to be stopped. '''
+		if not self.stopped:
+			self.invalidate_data() # Memory now holds a newer acquisition
+		self.stopped = True
+
+	def clear(self):
+		self.stopped = False
+		self.invalidate_settings()
+
+def invalidates_acquisition(settings:bool=True):
+	''' Decorator for driver functions that change the acquisition. With settings=True
+	(eg. timebase, channel scale) the cached memory depth, preambles and data are dropped,
+	with settings=False (eg. run, single trigger) only the data is. Place it below
+	@superreturn. '''
+
+	def decorator(func):
+
+		@functools.wraps(func)
+		def wrapper(self, *args, **kwargs):
+			rv = func(self, *args, **kwargs)
+			if settings:
+				self.acquisition_cache.invalidate_settings()
+			else:
+				self.acquisition_cache.set_running()
+			return rv
+
+		return wrapper
+	return decorator
+
 class OscilloscopeChannelState(InstrumentState):
 	
 	# __state_fields__ = (InstrumentState.__state_fields__+("div_volt", "offset_volt", "chan_en", "waveform"))
@@ -30,7 +326,7 @@ class OscilloscopeChannelState(InstrumentState):
 class OscilloscopeState(InstrumentState):
 	
 	# __state_fields__ = (InstrumentState.__state_fields__ + ("first_channel", "num_channels", "ndiv_horiz", "ndiv_vert", "div_time", "offset_time", "channels"))
-	__state_fields__ = ("first_channel", "num_channels", "ndiv_horiz", "ndiv_vert", "div_time", "offset_time", "channels", "channel_colors", "trigger_source", "trigger_mode", "trigger_level")
+	__state_fields__ = ("first_channel", "num_channels", "ndiv_horiz", "ndiv_vert", "div_time", "offset_time", "channels", "channel_colors", "trigger_source", "trigger_mode", "trigger_level", "segment_count")
 	
 	def __init__(self, first_channel:int, num_channels:int, ndiv_horiz, ndiv_vert, log:plf.LogPile=None):
 		super().__init__(log=log)
@@ -50,6 +346,8 @@ class OscilloscopeState(InstrumentState):
 		self.add_param("trigger_mode", unit="")
 		self.add_param("trigger_level", unit="")
 		
+		self.add_param("segment_count", unit="1", value=1) # Frames per segmented acquisition
+		
 		self.add_param("channels", unit="", value=IndexedList(self.first_channel, self.num_channels, validate_type=OscilloscopeChannelState, log=log))
 		
 		for ch_no in self.channels.get_range():
@@ -74,6 +372,17 @@ class Oscilloscope(Driver):
 		
 		self.max_channels = max_channels #TODO: Replace with state
 		
+		self.acquisition_cache = AcquisitionCache()
+		
+		# Dummy waveform generation (see remake_dummy_waves())
+		self.dummy_memory_depth = 1200 # Points per waveform
+		self.dummy_signal_models = {} # Channel -> signal model, see set_dummy_signal()
+		self.dummy_noise_V = 0.002 # RMS of added Gaussian noise
+		self.dummy_jitter_s = 0 # RMS of trigger jitter
+		self.dummy_fresh_captures = False # Re-generate (new noise/jitter) on every read instead of reusing the cached waveform
+		self._dummy_rng = np.random.default_rng()
+		self._dummy_wave_cache = {}
+		
 		if self.dummy:
 			self.init_dummy_state()
 		
@@ -88,11 +397,41 @@ class Oscilloscope(Driver):
 		
 		self.remake_dummy_waves()
 	
-	def remake_dummy_waves(self) ->  None:
-		''' Re-generates spoofed waveforms for each channel that is as realistic as
-		possible for the given instrument state. Saves the waveform to the internal
-		data tracker dict. Should be called each time a time or voltage parameter has
-		been changed and the waveform data is queried.
+	def set_dummy_signal(self, channel:int, shape:str="sine", freq_Hz:float=1e3, ampl_V:float=1.0, offset_V:float=0.0, phase_rad:float=0.0) -> None:
+		''' Sets the signal the dummy scope generates on a channel. Has no effect on real
+		instruments.
+		
+		Args:
+			channel (int): Channel number.
+			shape (str): One of DUMMY_SIGNAL_SHAPES ('sine', 'square', 'triangle', 'dc').
+			freq_Hz (float): Signal frequency.
+			ampl_V (float): Peak amplitude.
+			offset_V (float): DC offset.
+			phase_rad (float): Phase at t=0.
+		
+		Returns:
+			None
+		'''
+		
+		if shape not in DUMMY_SIGNAL_SHAPES:
+			self.error(f"Unrecognized dummy signal shape >{shape}<.")
+			return
+		
+		self.dummy_signal_models[channel] = {"shape":shape, "freq_Hz":freq_Hz, "ampl_V":ampl_V, "offset_V":offset_V, "phase_rad":phase_rad}
+	
+	def _dummy_signal_model(self, channel:int) -> dict:
+		if channel in self.dummy_signal_models:
+			return self.dummy_signal_models[channel]
+		return {"shape":"sine", "freq_Hz":40*(channel+1), "ampl_V":1.0, "offset_V":0.0, "phase_rad":0.0}
+	
+	def remake_dummy_waves(self, channels:list=None) ->  None:
+		''' Re-generates spoofed waveforms that are as realistic as possible for the given
+		instrument state, and saves them to the state. Waveforms are cached per channel and only
+		re-generated when a time or voltage setting, the signal model, the memory depth or the
+		noise settings have changed (or always, if dummy_fresh_captures is True).
+		
+		Args:
+			channels (list): Channels to generate. Default = None, generates all channels.
 		
 		Returns:
 			None
@@ -100,29 +439,42 @@ class Oscilloscope(Driver):
 		
 		#TODO: Consider coupliing AC vs DC
 		
-		# Loop over all channels
-		for channel in range(self.first_channel, self.first_channel+self.max_channels):
+		if channels is None:
+			channels = range(self.first_channel, self.first_channel+self.max_channels)
 		
-			ampl = 1 # V
-			freq = 40*(channel+1) # Hz
-			npoints = 101
+		for channel in channels:
+			
+			npoints = int(self.dummy_memory_depth)
+			model = self._dummy_signal_model(channel)
 			
-			# Create time series
+			# Time axis
 			t_span = self.state.get(["ndiv_horiz"]) * self.state.get(["div_time"])
 			t_start = -1*t_span/2+self.state.get(["offset_time"])
-			t_series = np.linspace(t_start, t_start + t_span, npoints)
+			x_increment = t_span/max(npoints-1, 1)
 			
-			# Create waveform
-			wave = ampl * np.sin(t_series*2*np.pi*freq)
-			
-			# Trim waveform to represent clipping on real scope
+			# Vertical window - values outside it clip, as on a real scope
 			v_span = self.state.get(["ndiv_vert"]) * self.state.get(["channels", "div_volt"], indices=[channel])
 			v_min = -1*v_span/2+self.state.get(["channels", "offset_volt"], indices=[channel])
-			v_max = v_min + v_span
-			wave_clipped = [np.max([np.min([element, v_max]), v_min]) for element in wave]
+			y_increment = v_span/255
+			
+			key = (npoints, t_start, x_increment, v_min, y_increment, tuple(sorted(model.items())), self.dummy_noise_V, self.dummy_jitter_s)
+			cached = self._dummy_wave_cache.get(channel, None)
+			if cached is not None and cached[0] == key and not self.dummy_fresh_captures:
+				self.state.channels[channel].waveform = cached[1]
+				continue
 			
-			# Return result
-			self.state.channels[channel].waveform = {"time_s":t_series, "volt_V":wave_clipped}
+			# Trigger jitter shifts the whole capture relative to the time axis
+			t_shift = 0
+			if self.dummy_jitter_s > 0:
+				t_shift = self._dummy_rng.normal(0, self.dummy_jitter_s)
+			
+			codes = _synthesize_dummy_codes(model, npoints, t_start+t_shift, x_increment, v_min, y_increment, self.dummy_noise_V, self._dummy_rng)
+			
+			# volt = (code - y_origin) * y_increment, with code 0 at v_min
+			wav = OscilloscopeWaveform(codes=codes, y_increment=y_increment, y_origin=-v_min/y_increment, x_increment=x_increment, x_origin=t_start, channel=channel)
+			
+			self._dummy_wave_cache[channel] = (key, wav)
+			self.state.channels[channel].waveform = wav
 	
 	def dummy_responder(self, func_name:str, *args, **kwargs):
 		''' Function expected to behave as the "real" equivalents. ie. write commands don't
@@ -162,8 +514,12 @@ class Oscilloscope(Driver):
 					rval = None
 				case "get_chan_enable":
 					rval = self.state.get(["channels", "chan_en"], indices=[args[0]])
+				case "get_segment_count":
+					rval = self.state.get(["segment_count"])
+				case "arm_segmented_acquisition":
+					rval = None
 				case "get_waveform":
-					self.remake_dummy_waves()
+					self.remake_dummy_waves([args[0]])
 					rval = self.state.channels[args[0]].waveform
 				case _:
 					found = False
@@ -337,6 +693,81 @@ class Oscilloscope(Driver):
 	def do_force_trigger(self):
 		pass
 	
+	def is_acquisition_complete(self) -> bool:
+		''' Returns True once an acquisition armed with do_single_trigger() has completed.
+		Used by AcquisitionEngine to poll for triggers. This default always returns True
+		(ie. read immediately), drivers that can report trigger status override it.
+		'''
+		return True
+	
+	# Segmented memory (optional): the scope records `segment_count` triggers into separate
+	# frames at hardware speed after arm_segmented_acquisition(), and get_segmented_waveforms()
+	# downloads them in bulk afterwards. Drivers that support it set supports_segmented = True
+	# and override these methods.
+	supports_segmented = False
+	
+	def _check_segmented(self) -> bool:
+		if not (self.supports_segmented or self.dummy):
+			self.error("Segmented acquisition is not supported by this driver.")
+			return False
+		return True
+	
+	def set_segment_count(self, count:int):
+		if not self._check_segmented():
+			return
+		self.modify_state(lambda: self.get_segment_count(), ["segment_count"], count)
+	
+	@enabledummy
+	def get_segment_count(self):
+		if not self._check_segmented():
+			return None
+		return self.modify_state(None, ["segment_count"], self._super_hint)
+	
+	@enabledummy
+	def arm_segmented_acquisition(self):
+		''' Starts recording segment_count frames. '''
+		self._check_segmented()
+	
+	def is_segmented_acquisition_complete(self) -> bool:
+		''' Returns True once every frame of a segmented acquisition has been recorded. '''
+		return True
+	
+	def get_segmented_waveforms(self, channel:int, **kwargs) -> SegmentedWaveforms:
+		''' Downloads every frame of the last segmented acquisition for one channel.
+		
+		In dummy mode, segment_count frames are generated, each with fresh noise and trigger
+		jitter, spaced by 10 horizontal spans.
+		
+		Args:
+			channel (int): Channel to read.
+			**kwargs: Driver-specific options.
+		
+		Returns:
+			SegmentedWaveforms: The frames, or None if an error occurs.
+		'''
+		
+		if not self._check_segmented():
+			return None
+		
+		if not self.dummy:
+			self.error("Driver does not implement get_segmented_waveforms().")
+			return None
+		
+		nframes = int(self.state.segment_count)
+		fresh = self.dummy_fresh_captures
+		self.dummy_fresh_captures = True
+		try:
+			frames = []
+			for _ in range(nframes):
+				self.remake_dummy_waves([channel])
+				frames.append(self.state.channels[channel].waveform)
+		finally:
+			self.dummy_fresh_captures = fresh
+		
+		wav = frames[0]
+		t_span = self.state.ndiv_horiz * self.state.div_time
+		return SegmentedWaveforms(codes=np.stack([f.codes for f in frames]), frame_times=np.arange(nframes)*10*t_span, frame_numbers=np.arange(1, nframes+1), y_increment=wav.y_increment, y_origin=wav.y_origin, y_reference=wav.y_reference, x_increment=wav.x_increment, x_origin=wav.x_origin, channel=channel)
+	
 	# @abstractmethod
 	# @enabledummy
 	# def set_bandwidth_limit(self, channel:int, enable:bool):
@@ -356,6 +787,48 @@ class Oscilloscope(Driver):
 		whatever args/kwargs the driver-level call received. '''
 		return self.modify_state(None, ["channels", "waveform"], self._super_hint, indices=[channel])
 	
+	def iter_waveform_chunks(self, channel:int, axis_out:dict=None, **kwargs):
+		''' Streams a channel's waveform as (offset, chunk) pairs, where `offset` is the index
+		of the chunk's first sample in the record and `chunk` is a NumPy array of voltages.
+		Drivers that transfer records in blocks override this to yield each block as it
+		arrives, so consumers (HDF writers, FFTs, GUIs) can handle a record larger than RAM
+		with bounded memory. Streamed chunks are not stored in the state.
+
+		This default reads the whole record with get_waveform() and yields it as one chunk,
+		always in volts - `raw` (codes instead of volts) is only supported by drivers that
+		override this, and is dropped here.
+
+		Args:
+			channel (int): Channel to read.
+			axis_out (dict): Optional. Filled in before the first chunk with 'x_origin',
+				'x_increment', 'npoints' and 'channel', describing the record's time axis.
+			**kwargs: Driver-specific capture options, as for get_waveform().
+
+		Yields:
+			tuple: (offset, chunk)
+		'''
+
+		kwargs.pop("raw", None)
+		wav = self.get_waveform(channel, **kwargs)
+		if wav is None:
+			return
+
+		if isinstance(wav, OscilloscopeWaveform):
+			x_origin, x_increment, npoints = wav.time_axis()
+		else:
+			# Plain dict. Drivers without a timebase (eg. DS1000E) give 'time_index' instead of
+			# 'time_s', so the record length comes from the voltages.
+			npoints = len(wav["volt_V"])
+			t = np.asarray(wav["time_s"] if "time_s" in wav else wav.get("time_index", []), dtype=np.float64)
+			x_origin = float(t[0]) if len(t) > 0 else 0.0
+			x_increment = float(t[1]-t[0]) if len(t) > 1 else 0.0
+
+		if axis_out is not None:
+			axis_out.update({"x_origin":x_origin, "x_increment":x_increment, "npoints":npoints, "channel":channel})
+
+		if npoints > 0:
+			yield 0, np.asarray(wav["volt_V"], dtype=np.float64)
+
 	def refresh_state(self):
 		self.get_div_time()
 		self.get_offset_time()
@@ -491,6 +964,44 @@ class MeasurementsMixin:
 		
 		return True
 	
+	def _measurement_index(self) -> dict:
+		''' Returns a dict mapping (measurement type, source) to each active measurement's
+		setting object. Rebuilt only when the list of active measurements changes.
+		'''
+		
+		am_list = self.state.state_fragments[self.__state_key__].active_measurements
+		key = (id(am_list), am_list.structure_version())
+		
+		cached = getattr(self, "_meas_index_cache", None)
+		if cached is None or cached[0] != key:
+			cached = (key, {(am.measurement_type, am.measurement_source):am for am in am_list})
+			self._meas_index_cache = cached
+		
+		return cached[1]
+	
+	def measurement_keys(self, stat_modes:list=None) -> list:
+		''' Returns the (channel, measurement, stat_mode) tuples read by
+		get_all_measurements(), in the order they are queried.
+		
+		Args:
+			stat_modes (list): Statistics to read for each measurement. Default = None,
+				reads STAT_CURR only.
+		
+		Returns:
+			list: List of (channel, measurement, stat_mode) tuples.
+		'''
+		
+		if stat_modes is None:
+			stat_modes = [MeasurementsMixin.STAT_CURR]
+		
+		keys = []
+		for (measurement, source) in self._measurement_index().keys():
+			channel = int(source[len("chan"):])
+			for stat_mode in stat_modes:
+				keys.append((channel, measurement, stat_mode))
+		
+		return keys
+	
 	@abstractmethod
 	@enabledummy
 	def get_measurement(self, channel:int, measurement:str, stat_mode:str=STAT_CURR) -> float:
@@ -502,23 +1013,51 @@ class MeasurementsMixin:
 		# Create source string
 		source = f"chan{channel}"
 		
-		# Check if measurement already exists
-		meas_idx = None
-		for idx, am in enumerate(self.state.state_fragments[self.__state_key__].active_measurements):
-			if am.measurement_type == measurement and am.measurement_source == source:
-				meas_idx = idx
-				break
-		
-		# Check if index was found
-		if meas_idx is None:
-			self.log.warning(f"Not adding measurement:>{measurement}< to source:>:a{source}<. Measurement already exists.")
+		# Check if measurement exists
+		am = self._measurement_index().get((measurement, source), None)
+		if am is None:
+			self.log.warning(f"Cannot update measurement:>{measurement}< for source:>:a{source}<. Measurement is not active.")
 			return None
 		
 		# Update last measured value
-		self.state.state_fragments[self.__state_key__].active_measurements[meas_idx].last_measured_value = self._super_hint
+		am.last_measured_value = self._super_hint
 		
 		return self._super_hint
+	
+	@abstractmethod
+	@enabledummy
+	def get_all_measurements(self, stat_modes:list=None) -> dict:
+		''' Reads every active measurement, for each requested statistic, in as few queries
+		as the instrument allows. Updates last_measured_value of each active measurement with
+		the value of the first statistic in stat_modes.
+		
+		Args:
+			stat_modes (list): Statistics to read for each measurement. Default = None,
+				reads STAT_CURR only.
 		
+		Returns:
+			dict: Dictionary mapping (channel, measurement, stat_mode) to the measured value.
+				None if an error occurs.
+		'''
+		
+		#TODO: Handle dummy!
+		
+		if self._super_hint is None:
+			return None
+		
+		if stat_modes is None:
+			stat_modes = [MeasurementsMixin.STAT_CURR]
+		
+		# Update last measured values in bulk
+		index = self._measurement_index()
+		for (channel, measurement, stat_mode), value in self._super_hint.items():
+			if stat_mode != stat_modes[0]:
+				continue
+			am = index.get((measurement, f"chan{channel}"), None)
+			if am is not None:
+				am.last_measured_value = value
+		
+		return self._super_hint
 	
 	@abstractmethod
 	@enabledummy
@@ -625,21 +1164,70 @@ def _waveform_style(wav, osc, kwargs):
 	return plot_kwargs
 
 def _waveform_xdata(wav):
-	''' Returns (x_data, x_unit) for a single waveform dict. '''
+	''' Returns (x_data, x_unit) for a single waveform dict. For OscilloscopeWaveforms x_data
+	is the implicit (x_origin, x_increment) axis, so the time array is never built. '''
 
-	if 'time_s' in wav:
+	if isinstance(wav, OscilloscopeWaveform):
+		return wav.time_axis()[:2], "s"
+	elif 'time_s' in wav:
 		return wav['time_s'], "s"
 	elif 'time_idx' in wav:
 		return wav['time_idx'], "idx"
 	return None, ""
 
-def plot_waveform(waveform, axis=None, fig=None, osc:Oscilloscope=None, label=None, separateaxes=False, **kwargs):
+def plot_decimated(axis, x, y, decimation:str=DECIMATION_MINMAX, decimation_threshold:int=DECIMATION_THRESHOLD, **kwargs):
+	''' Plots a trace, decimated to the axis width if it has more than decimation_threshold
+	points. The decimated line is recomputed for the visible x-range whenever the axis is
+	panned or zoomed (cached per zoom level, see DecimationCache).
+
+	Args:
+		axis: matplotlib Axes to plot on.
+		x: Array of x values, or (x_origin, x_increment) tuple for a uniform axis.
+		y: Array of y values.
+		decimation (str): Decimation method (see constellation.decimation), or None to always
+			plot every point. Default = min/max envelope.
+		decimation_threshold (int): Traces with fewer points are plotted as-is.
+		**kwargs: Forwarded to matplotlib plot().
+
+	Returns:
+		The matplotlib Line2D.
+	'''
+
+	y = np.asarray(y)
+
+	if decimation is None or len(y) < decimation_threshold:
+		if isinstance(x, tuple):
+			x = x[0] + np.arange(len(y))*x[1]
+		return axis.plot(x, y, **kwargs)[0]
+
+	def _width():
+		try:
+			return max(100, int(axis.get_window_extent().width))
+		except Exception:
+			return 1000
+
+	cache = DecimationCache(x, y, method=decimation)
+	line = axis.plot(*cache.get(_width()), **kwargs)[0]
+
+	def _on_xlim_changed(ax):
+		# Line was removed (eg. axis cleared for a redraw)
+		if line not in ax.lines:
+			ax.callbacks.disconnect(cid)
+			return
+		line.set_data(*cache.get(_width(), ax.get_xlim()))
+
+	cid = axis.callbacks.connect('xlim_changed', _on_xlim_changed)
+	line._decimation_cache = cache # Keep alive with the line
+
+	return line
+
+def plot_waveform(waveform, axis=None, fig=None, osc:Oscilloscope=None, label=None, separateaxes=False, decimation:str=DECIMATION_MINMAX, decimation_threshold:int=DECIMATION_THRESHOLD, **kwargs):
 	''' Plots a waveform dictionary. If multiple waveforms are provided (list
 	of dicts), each will by default be plotted on the same axes.
 
 	Args:
-		waveform:     dict with keys 'time_s', 'volt_V', and optionally 'channel',
-		              or a list of such dicts.
+		waveform:     dict (or OscilloscopeWaveform) with keys 'time_s', 'volt_V', and
+		              optionally 'channel', or a list of them.
 		axis:         matplotlib Axes to plot on. If None, one is created. Must not be given
 		              when separateaxes=True - there is no single axis to plot onto in that mode.
 		fig:          matplotlib Figure to use when axis is None. If None, a new figure is created.
@@ -650,6 +1238,10 @@ def plot_waveform(waveform, axis=None, fig=None, osc:Oscilloscope=None, label=No
 		              with a shared, synced X axis (panning/zooming one moves all of them)
 		              instead of being layered on one set of axes. Returns a list of Axes (one
 		              per waveform, same order as the input) instead of a single Axes.
+		decimation:   Decimation method for waveforms with at least decimation_threshold points
+		              (see constellation.decimation), or None to plot every point. Default is a
+		              min/max envelope at the axis' pixel width, recomputed on pan/zoom.
+		decimation_threshold: Waveforms with fewer points are plotted as-is.
 		**kwargs:     Forwarded to matplotlib plot() (color, marker, linestyle, alpha, etc.).
 		              Providing 'color' here overrides any channel color lookup.
 
@@ -659,7 +1251,7 @@ def plot_waveform(waveform, axis=None, fig=None, osc:Oscilloscope=None, label=No
 	'''
 
 	# Normalize input to list
-	if isinstance(waveform, dict):
+	if isinstance(waveform, Mapping):
 		waveforms = [waveform]
 	elif isinstance(waveform, list):
 		waveforms = waveform
@@ -689,7 +1281,7 @@ def plot_waveform(waveform, axis=None, fig=None, osc:Oscilloscope=None, label=No
 			plot_kwargs = _waveform_style(wav, osc, kwargs)
 			x, x_unit = _waveform_xdata(wav)
 
-			ax.plot(x, wav['volt_V'], label=plot_label, **plot_kwargs)
+			plot_decimated(ax, x, wav['volt_V'], decimation=decimation, decimation_threshold=decimation_threshold, label=plot_label, **plot_kwargs)
 			ax.set_title(plot_label)
 			ax.grid(True)
 			ax.set_ylabel("Voltage (V)")
@@ -716,7 +1308,7 @@ def plot_waveform(waveform, axis=None, fig=None, osc:Oscilloscope=None, label=No
 		plot_kwargs = _waveform_style(wav, osc, kwargs)
 		x, x_unit = _waveform_xdata(wav)
 
-		axis.plot(x, wav['volt_V'], label=plot_label, **plot_kwargs)
+		plot_decimated(axis, x, wav['volt_V'], decimation=decimation, decimation_threshold=decimation_threshold, label=plot_label, **plot_kwargs)
 
 	if len(waveforms) > 1:
 		axis.legend()
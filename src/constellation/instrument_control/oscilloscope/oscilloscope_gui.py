@@ -8,6 +8,7 @@ meant to be copied, not reinvented per category.
 
 from constellation.base import *
 from constellation.instrument_control.oscilloscope.oscilloscope_ctg import *
+from constellation.instrument_control.oscilloscope.oscilloscope_ctg import _waveform_xdata
 from constellation.ui import *
 
 from PyQt6.QtWidgets import QWidget, QGridLayout, QHBoxLayout, QLabel, QPushButton, QGroupBox
@@ -212,7 +213,7 @@ class OscilloscopeWidget(InstrumentWidget):
 			return
 
 		ch = args[0] if args else None
-		if ch is None or not isinstance(result, dict):
+		if ch is None or not isinstance(result, Mapping):
 			return
 
 		self._waveform_cache[ch] = result
@@ -224,7 +225,8 @@ class OscilloscopeWidget(InstrumentWidget):
 
 		for ch, wav in self._waveform_cache.items():
 			if "time_s" in wav and "volt_V" in wav:
-				self.plot_widget.ax1a.plot(wav["time_s"], wav["volt_V"], label=f"Ch{ch}")
+				x, _ = _waveform_xdata(wav)
+				plot_decimated(self.plot_widget.ax1a, x, wav["volt_V"], label=f"Ch{ch}")
 
 		self.plot_widget.ax1a.grid(True)
 		self.plot_widget.ax1a.set_xlabel("Time [s]")
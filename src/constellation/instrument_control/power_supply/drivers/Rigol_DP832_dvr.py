@@ -5,8 +5,15 @@ from constellation.instrument_control.power_supply.power_supply_ctg import *
 
 class RigolDP832(PowerSupply):
 
-	def __init__(self, address:str, log:plf.LogPile, **kwargs):
-		super().__init__(address, log, relay=DirectSCPIRelay(), expected_idn='RIGOL TECHNOLOGIES,DP832', max_channels=3, first_channel=1, **kwargs)
+	def __init__(self, address:str, log:plf.LogPile, relay:CommandRelay=None, **kwargs):
+		if relay is None:
+			relay = DirectSCPIRelay()
+		super().__init__(address, log, relay=relay, expected_idn='RIGOL TECHNOLOGIES,DP832', max_channels=3, first_channel=1, **kwargs)
+		
+		# Send the :MEAS:ALL? queries of all channels as one compound query in
+		# get_all_measured_outputs(). Saves two round trips, but needs firmware that accepts
+		# compound queries.
+		self.compound_measure_queries = False
 		
 	@superreturn
 	def set_voltage(self, channel:int, voltage:float):
@@ -32,9 +39,42 @@ class RigolDP832(PowerSupply):
 	def get_output_enable(self, channel:int):
 		self._super_hint = str_to_bool(self.query(f":OUTP? CH{channel}"))
 	
+	def _parse_meas_all(self, reply:str) -> tuple:
+		# :MEAS:ALL? returns voltage, current and power, eg. '12.000,0.1000,1.200'
+		fields = reply.strip().split(",")
+		return (float(fields[0]), float(fields[1]))
+	
 	@superreturn
 	def get_measured_output(self, channel:int):
-		v_meas = float(self.query(f":MEAS:VOLT? CH{channel}").strip())
-		i_meas = float(self.query(f":MEAS:CURR? CH{channel}").strip())
-		self._super_hint = (v_meas, i_meas)
+		self._super_hint = self._parse_meas_all(self.query(f":MEAS:ALL? CH{channel}"))
+	
+	@superreturn
+	def get_all_measured_outputs(self):
+		channels = list(self.state.channels.get_range())
+		
+		if self.compound_measure_queries:
+			meas = self._query_meas_all_compound(channels)
+			if meas is not None:
+				self._super_hint = meas
+				return
+			self.warning(f"Compound >:MEAS:ALL?< query returned an unexpected reply, measuring channels one at a time.")
+		
+		self._super_hint = {ch:self._parse_meas_all(self.query(f":MEAS:ALL? CH{ch}")) for ch in channels}
+	
+	def _query_meas_all_compound(self, channels:list) -> dict:
+		''' Measures all channels with one compound query. Returns None unless the reply has one
+		well-formed V,I,P segment per channel. '''
+		
+		reply = self.query(";".join(f":MEAS:ALL? CH{ch}" for ch in channels))
+		if reply is None:
+			return None
+		
+		segments = reply.strip().split(";")
+		if len(segments) != len(channels):
+			return None
+		
+		try:
+			return {ch:self._parse_meas_all(seg) for ch, seg in zip(channels, segments)}
+		except (ValueError, IndexError):
+			return None
 		
\ No newline at end of file
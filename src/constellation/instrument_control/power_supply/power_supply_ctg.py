@@ -89,6 +89,9 @@ class PowerSupply(Driver):
 				case "get_measured_output":
 					self.remake_dummy_measurements()
 					rval = (self.state.channels[args[0]].voltage_meas, self.state.channels[args[0]].current_meas)
+				case "get_all_measured_outputs":
+					self.remake_dummy_measurements()
+					rval = {ch:(self.state.channels[ch].voltage_meas, self.state.channels[ch].current_meas) for ch in self.state.channels.get_range()}
 				case _:
 					found = False
 				
@@ -124,7 +127,7 @@ class PowerSupply(Driver):
 		
 	@abstractmethod
 	def set_current(self, channel:int, current:float):
-		self.modify_state(lambda: self.get_voltage(channel), ["channels", "current_set"], current, indices=[channel])
+		self.modify_state(lambda: self.get_current(channel), ["channels", "current_set"], current, indices=[channel])
 	
 	@abstractmethod
 	@enabledummy
@@ -133,7 +136,7 @@ class PowerSupply(Driver):
 	
 	@abstractmethod
 	def set_output_enable(self, channel:int, enable:bool):
-		self.modify_state(lambda: self.get_voltage(channel), ["channels", "enable"], enable, indices=[channel])
+		self.modify_state(lambda: self.get_output_enable(channel), ["channels", "enable"], enable, indices=[channel])
 	
 	@abstractmethod
 	@enabledummy
@@ -156,22 +159,42 @@ class PowerSupply(Driver):
 		
 		return (v_meas, i_meas)
 	
+	@abstractmethod
+	@enabledummy
+	def get_all_measured_outputs(self) -> dict:
+		''' Measures the output voltage and current of every channel, using as few queries as
+		the instrument allows, and saves them all to the state once every channel has been read.
+		
+		Returns:
+			dict: Channel number -> (voltage, current) tuple. Returns None on error.
+		'''
+		
+		meas = self._super_hint
+		if not isinstance(meas, dict):
+			self.error(f"Failed to read measured outputs.")
+			return None
+		
+		for ch, (v_meas, i_meas) in meas.items():
+			self.modify_state(None, ["channels", "voltage_meas"], v_meas, indices=[ch])
+			self.modify_state(None, ["channels", "current_meas"], i_meas, indices=[ch])
+		
+		return meas
+	
 	def refresh_state(self):
 		for ch in range(self.first_channel, self.first_channel+self.max_channels):
 			self.get_voltage(ch)
 			self.get_current(ch)
 			self.get_output_enable(ch)
-			self.get_measured_output(ch)
+		self.get_all_measured_outputs()
 	
 	def apply_state(self):
 		for ch in range(self.first_channel, self.first_channel+self.max_channels):
 			try:
 				self.set_voltage(ch, self.state.channels[ch].voltage_set)
 				self.set_current(ch, self.state.channels[ch].current_set)
-				self.set_enable_output(ch, self.state.channels[ch].enable)
+				self.set_output_enable(ch, self.state.channels[ch].enable)
 			except Exception as e:
 				self.lowdebug(f"Skipping apply state for channels not yet populated. ({e})")
 	
 	def refresh_data(self):
-		for ch in range(self.first_channel, self.first_channel+self.max_channels):
-			self.get_output_measurement(ch)
\ No newline at end of file
+		self.get_all_measured_outputs()
\ No newline at end of file
@@ -18,8 +18,9 @@ class PowerSupplyWidget(InstrumentWidget):
 	The measured values are NOT TrackedValues - there's no setpoint for a measurement, only a
 	reported number, so the pending/mismatch machinery doesn't apply. They're just updated
 	straight from on_state_changed(). Unlike the oscilloscope's waveform capture, PowerSupply's
-	refresh_state() already folds get_measured_output() into every poll (it's one quick query,
-	not a multi-second transfer), so these labels update live with no capture button needed.
+	refresh_state() already folds get_all_measured_outputs() into every poll (one quick query
+	per channel, not a multi-second transfer), so these labels update live with no capture
+	button needed.
 	'''
 
 	def __init__(self, main_window, bridge:InstrumentBridge, log:plf.LogPile):
@@ -7,16 +7,20 @@ Manual: https://www.testworld.com/wp-content/uploads/user-guide-help-agilent-e83
 	    https://siglentna.com/wp-content/uploads/dlm_uploads/2017/10/SSA3000X_ProgrammingGuide_PG0703X_E04A.pdf
 '''
 
-import array
 from constellation.base import *
 from constellation.instrument_control.spectrum_analyzer.spectrum_analyzer_ctg import *
 
 class SiglentSSA3000X(SpectrumAnalyzer):
 	
-	def __init__(self, address:str, log:plf.LogPile, relay:CommandRelay=DirectSCPIRelay(), **kwargs):
+	def __init__(self, address:str, log:plf.LogPile, relay:CommandRelay=None, **kwargs):
+		if relay is None:
+			relay = DirectSCPIRelay()
 		super().__init__(address, log, relay=relay, expected_idn="Siglent Technologies,SSA30", **kwargs)
 		
 		self.trace_lookup = {}
+		
+		# Last trace data format sent (FORMAT:TRACE:DATA), so it's only sent when it changes
+		self._trace_format = None
 	
 	@superreturn
 	def set_freq_start(self, f_Hz:float):
@@ -31,7 +35,7 @@ class SiglentSSA3000X(SpectrumAnalyzer):
 		self.write(f"SENS:FREQ:STOP {f_Hz}")
 	
 	@superreturn
-	def get_freq_end(self, points:int):
+	def get_freq_end(self):
 		self._super_hint = float(self.query(f"SENS:FREQ:STOP?"))
 	
 	# @superreturn
@@ -88,13 +92,18 @@ class SiglentSSA3000X(SpectrumAnalyzer):
 	def send_manual_trigger(self):
 		self.write(f"INIT:IMM")
 	
+	def _set_trace_format(self, fmt:str):
+		if self._trace_format != fmt:
+			self.write(f"FORMAT:TRACE:DATA {fmt}")
+			self._trace_format = fmt
+	
 	@superreturn
 	def get_trace_data(self, trace:int, use_ascii_transfer:bool=False):
 		''' Returns the data of the trace in a standard waveform dict, which
 		
 		has keys:
-			* x: X data list (float)
-			* y: Y data list (float)
+			* x: X data array (float)
+			* y: Y data array (float)
 			* x_units: Units of x-axis
 			* y_units: UNits of y-axis
 		
@@ -106,41 +115,24 @@ class SiglentSSA3000X(SpectrumAnalyzer):
 			self.log.error(f"Did not apply command. Instrument limits values to integers 1-3 and this range was violated.")
 			return
 		
-		# Get Y-unit
+		y_data = None
 		
-		
-		# Run ASCII transfer if requested
-		if use_ascii_transfer:
+		# Binary transfer - one block read of 32-bit little-endian floats
+		if not use_ascii_transfer and self.binary_trace_supported:
 			
-			self.write(f"FORMAT:TRACE:DATA ASCII") # Set format to ASCII
+			self._set_trace_format("REAL")
+			block = self.query_block(f"TRACE:DATA? {trace}")
+			if len(block) >= 4:
+				y_data = np.frombuffer(block, dtype='<f4', count=len(block)//4).astype(np.float64)
+			self._record_binary_trace_read(y_data is not None)
+		
+		# ASCII transfer
+		if y_data is None:
+			self._set_trace_format("ASCII")
 			data_raw = self.query(f"TRACE:DATA? {trace}") # Get raw data
-			str_list = data_raw.split(",") # Split at each comma
-			del str_list[-1] # Remove last element (newline)
-			float_data = [float(x) for x in str_list] # Convert to float
-			
-		else:
-		
-			# Set data format - Real 64 binary data - in current Y unit
-			self.write(f"FORMAT:TRACE:DATA REAL")
-			
-			# Read data - ask for data
-			self.write(f"TRACE:DATA? {trace}")
-			data_raw = []
-			while True:
-				try:
-					byte = self.inst.read_bytes(1)
-					data_raw.append(byte)
-				except:
-					break
-			data_raw = data_raw[0]
-			
-			# Skip first 4 bytes (number of elements) and last byte (newline)
-			float_data = list(array.array('f', data_raw[4:-1]))
-		
-		# Generate time array
-		f_list = list(np.linspace(self.get_freq_start(), self.get_freq_end(), len(float_data)))
+			y_data = np.array([float(x) for x in data_raw.split(",") if x.strip() != ""])
 		
-		self._super_hint = {'x':f_list, 'y':float_data, 'x_units':'Hz', 'y_units':'dBm'}
+		self._super_hint = {'x':self.get_freq_axis(len(y_data)), 'y':y_data, 'x_units':'Hz', 'y_units':'dBm'}
 		
 		# Convert Y-unit to dBm
 		
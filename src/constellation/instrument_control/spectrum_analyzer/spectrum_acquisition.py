@@ -0,0 +1,296 @@
+""" Continuous trace capture for spectrum analyzers.
+
+Calling get_trace_data() in a loop allocates new arrays for every trace and leaves it to the
+caller to keep a history. A SpectrumStreamer instead triggers (or free-runs) the analyzer on a
+background thread and writes each trace into a preallocated 2-D ring buffer (time x frequency),
+the spectrogram/waterfall of the most recent `buffer_size` traces. Max-hold, min-hold and
+average traces are updated incrementally as each trace arrives, so they cover every trace since
+start() (or reset_holds()), not just the ones still in the buffer.
+
+Example:
+	with SpectrumStreamer(sa, buffer_size=2000) as streamer:
+		time.sleep(60)
+		times, freqs, waterfall = streamer.snapshot()
+		peak = streamer.max_hold()
+	print(streamer.stats())
+
+While a streamer is running it owns the Driver - don't call the driver from other threads
+until stop() returns.
+"""
+
+import time
+import threading
+import numpy as np
+
+class SpectrumStreamer:
+	''' Repeatedly captures one trace of a spectrum analyzer into a ring buffer of the most
+	recent `buffer_size` traces, keeping incremental max-hold, min-hold and average traces.
+
+	In triggered mode (continuous=False) each capture sends a manual trigger, waits for the
+	sweep to finish with *OPC? and reads the trace, so every trace is a new sweep. In
+	continuous mode the analyzer free-runs and the trace on screen is read as fast as possible,
+	which is quicker but may read the same sweep twice or a partially updated one.
+
+	The buffer is allocated on the first trace. If the number of points or the frequency axis
+	changes while streaming, the buffer and holds are cleared and restart with the new axis.
+	'''
+
+	def __init__(self, sa, trace:int=1, buffer_size:int=1000, continuous:bool=False, interval_s:float=0, use_ascii_transfer:bool=False):
+		'''
+		Args:
+			sa: Connected spectrum analyzer driver (SpectrumAnalyzer).
+			trace (int): Trace number to capture.
+			buffer_size (int): Number of traces kept. Older traces are overwritten.
+			continuous (bool): Free-run the analyzer instead of triggering each sweep.
+			interval_s (float): Minimum time between captures. Default = 0, captures as fast
+				as the analyzer allows.
+			use_ascii_transfer (bool): Passed to get_trace_data().
+		'''
+
+		self.sa = sa
+		self.trace = trace
+		self.buffer_size = buffer_size
+		self.continuous = continuous
+		self.interval_s = interval_s
+		self.use_ascii_transfer = use_ascii_transfer
+
+		self.freqs = None # Frequency axis (Hz) of the buffered traces
+		self.y_units = None
+		self._times = np.full(buffer_size, np.nan)
+		self._data = np.full((buffer_size, 0), np.nan)
+		self._count = 0 # Traces in the buffer since it was (re)allocated
+		self.num_traces = 0 # Traces captured since start()
+		self.num_errors = 0
+		self.num_late = 0 # Captures that started late because the previous one overran
+
+		# Incremental reductions since reset_holds()
+		self._max = None
+		self._min = None
+		self._sum_dB = None # Sum of traces in dB, for the log average
+		self._sum_lin = None # Sum of traces in linear power, for the power average
+		self._scratch = None
+		self._num_held = 0
+
+		self._t_start = None
+		self._t_stop = None
+
+		self._lock = threading.Lock()
+		self._stop_event = threading.Event()
+		self._thread = None
+
+	@property
+	def running(self) -> bool:
+		return self._thread is not None and self._thread.is_alive()
+
+	def start(self):
+		''' Clears the buffer, sets the analyzer's trigger mode and starts capturing. '''
+
+		if self.running:
+			return
+
+		self.sa.set_continuous_trigger(self.continuous)
+		with self._lock:
+			self.freqs = None
+			self._allocate(0)
+			self.num_traces = 0
+			self.num_errors = 0
+			self.num_late = 0
+		self._t_start = time.perf_counter()
+		self._t_stop = None
+
+		self._stop_event.clear()
+		self._thread = threading.Thread(target=self._run, daemon=True)
+		self._thread.start()
+
+	def stop(self, timeout:float=None):
+		''' Stops capturing. The buffer and holds stay available. '''
+
+		self._stop_event.set()
+		if self._thread is not None:
+			self._thread.join(timeout)
+			self._thread = None
+			self._t_stop = time.perf_counter()
+
+	def __enter__(self):
+		self.start()
+		return self
+
+	def __exit__(self, exc_type, exc, tb):
+		self.stop()
+
+	def __len__(self):
+		return min(self._count, self.buffer_size)
+
+	def _allocate(self, npoints:int):
+		''' (Re)allocates the ring buffer and holds for traces of npoints points. Must be
+		called with the lock held. '''
+
+		if self._max is None or self._data.shape[1] != npoints:
+			self._data = np.full((self.buffer_size, npoints), np.nan)
+			self._max = np.empty(npoints)
+			self._min = np.empty(npoints)
+			self._sum_dB = np.empty(npoints)
+			self._sum_lin = np.empty(npoints)
+			self._scratch = np.empty(npoints)
+		self._times.fill(np.nan)
+		self._count = 0
+		self._reset_holds()
+
+	def _reset_holds(self):
+		self._max.fill(-np.inf)
+		self._min.fill(np.inf)
+		self._sum_dB.fill(0)
+		self._sum_lin.fill(0)
+		self._num_held = 0
+
+	def reset_holds(self):
+		''' Restarts the max-hold, min-hold and average traces. The buffer is kept. '''
+
+		with self._lock:
+			if self._max is not None:
+				self._reset_holds()
+
+	def capture(self) -> bool:
+		''' Captures one trace into the buffer on the calling thread. Used by the background
+		thread, and can be called directly for synchronous capture when not running.
+
+		Returns:
+			bool: True if a trace was captured.
+		'''
+
+		t_sample = time.time()
+		try:
+			if not self.continuous:
+				self.sa.send_manual_trigger()
+				self.sa.wait_sweep_complete()
+			result = self.sa.get_trace_data(self.trace, use_ascii_transfer=self.use_ascii_transfer)
+		except Exception as e:
+			result = None
+			self.sa.error(f"Spectrum capture failed. ({e})")
+
+		if result is None or len(result['y']) == 0:
+			self.num_errors += 1
+			return False
+
+		y = np.asarray(result['y'], dtype=np.float64)
+		x = result['x']
+		with self._lock:
+
+			# Restart the buffer if the frequency axis changed. The driver reuses the same
+			# axis array until a setting changes, so the identity check is usually enough.
+			if x is not self.freqs and (self.freqs is None or len(x) != len(self.freqs) or not np.array_equal(x, self.freqs)):
+				if self._count > 0:
+					self.sa.warning(f"Frequency axis changed while streaming, clearing spectrum buffer.")
+				self._allocate(len(y))
+			self.freqs = x
+			self.y_units = result.get('y_units', None)
+
+			i = self._count % self.buffer_size
+			self._times[i] = t_sample
+			self._data[i, :] = y
+			self._count += 1
+			self.num_traces += 1
+
+			# Incremental reductions, in place
+			np.maximum(self._max, y, out=self._max)
+			np.minimum(self._min, y, out=self._min)
+			self._sum_dB += y
+			np.multiply(y, np.log(10)/10, out=self._scratch) # dBm -> mW, as exp(y*ln(10)/10)
+			np.exp(self._scratch, out=self._scratch)
+			self._sum_lin += self._scratch
+			self._num_held += 1
+
+		return True
+
+	def snapshot(self) -> tuple:
+		''' Returns (times, freqs, data) for the buffered traces, oldest first. `data` has
+		shape (N, len(freqs)) - one row per trace, ie. a spectrogram. '''
+
+		with self._lock:
+			n = min(self._count, self.buffer_size)
+			if self._count <= self.buffer_size:
+				return (self._times[:n].copy(), self.freqs, self._data[:n].copy())
+			order = np.roll(np.arange(self.buffer_size), -(self._count % self.buffer_size))
+			return (self._times[order], self.freqs, self._data[order])
+
+	def latest(self) -> dict:
+		''' Returns the most recent trace as a standard waveform dict, or None if nothing has
+		been captured yet. '''
+
+		with self._lock:
+			if self._count == 0:
+				return None
+			y = self._data[(self._count-1) % self.buffer_size].copy()
+			return {'x':self.freqs, 'y':y, 'x_units':'Hz', 'y_units':self.y_units}
+
+	def max_hold(self) -> np.ndarray:
+		''' Returns the max-hold trace, or None if nothing has been captured yet. '''
+
+		with self._lock:
+			if self._num_held == 0:
+				return None
+			return self._max.copy()
+
+	def min_hold(self) -> np.ndarray:
+		''' Returns the min-hold trace, or None if nothing has been captured yet. '''
+
+		with self._lock:
+			if self._num_held == 0:
+				return None
+			return self._min.copy()
+
+	def average(self, power:bool=True) -> np.ndarray:
+		''' Returns the average trace, or None if nothing has been captured yet.
+
+		Args:
+			power (bool): Average in linear power and return the result in dB, as a spectrum
+				analyzer's power (RMS) average does. If False, averages the dB values
+				directly (log/video average), which reads low on noise.
+
+		Returns:
+			np.ndarray: Average trace.
+		'''
+
+		with self._lock:
+			if self._num_held == 0:
+				return None
+			if power:
+				return 10*np.log10(self._sum_lin/self._num_held)
+			return self._sum_dB/self._num_held
+
+	def num_averaged(self) -> int:
+		''' Returns the number of traces in the holds and average. '''
+		return self._num_held
+
+	def stats(self) -> dict:
+		''' Returns capture statistics: traces captured, errors, late captures, elapsed time
+		and the mean trace rate. '''
+
+		elapsed = None
+		rate = None
+		if self._t_start is not None:
+			t_end = self._t_stop if self._t_stop is not None else time.perf_counter()
+			elapsed = t_end - self._t_start
+			if elapsed > 0:
+				rate = self.num_traces/elapsed
+
+		return {"traces":self.num_traces, "errors":self.num_errors, "late":self.num_late, "elapsed_s":elapsed, "traces_per_s":rate}
+
+	def _run(self):
+
+		t_next = time.perf_counter()
+		while not self._stop_event.is_set():
+
+			self.capture()
+
+			if self.interval_s <= 0:
+				continue
+
+			# Fixed rate: schedule from the previous deadline, not from when the read finished
+			t_next += self.interval_s
+			delay = t_next - time.perf_counter()
+			if delay < 0:
+				self.num_late += 1
+				t_next = time.perf_counter()
+				delay = 0
+			self._stop_event.wait(delay)
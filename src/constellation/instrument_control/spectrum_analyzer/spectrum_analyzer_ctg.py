@@ -41,24 +41,142 @@ class SpectrumAnalyzerState(InstrumentState):
 class SpectrumAnalyzer(Driver):
 	
 	def __init__(self, address:str, log:plf.LogPile, expected_idn:str="", dummy:bool=False, relay:CommandRelay=None, num_traces:int=1, first_trace:int=1, ndiv_horiz:int=8, ndiv_vert:int=8, **kwargs):
-		super().__init__(address, log, expected_idn=expected_idn, dummy=dummy, relay=relay, **kwargs)
+		_state = SpectrumAnalyzerState(first_trace=first_trace, num_traces=num_traces, ndiv_horiz=ndiv_horiz, ndiv_vert=ndiv_vert, log=log)
+		super().__init__(address, log, expected_idn=expected_idn, dummy=dummy, relay=relay, state=_state, **kwargs)
 		
-		self.state = SpectrumAnalyzerState(first_trace=first_trace, num_traces=num_traces, ndiv_horiz=ndiv_horiz, ndiv_vert=ndiv_vert, log=log)
+		# Frequency axis, keyed on (start, stop, points). Cleared by the frequency setters.
+		self._freq_axis_cache = None
+		
+		# Binary trace transfer, for drivers that support it. A failed binary read falls back
+		# to ASCII for that trace only - binary is turned off after binary_trace_max_failures
+		# failures in a row.
+		self.binary_trace_supported = True
+		self.binary_trace_max_failures = 3
+		self._binary_trace_failures = 0
+		
+		# Dummy trace generator settings
+		self.dummy_num_points = 751
+		self.dummy_noise_floor_dBm = -90 # Displayed average noise level
+		self.dummy_noise_dB = 1.5 # RMS of the trace noise, in dB
+		self.dummy_signals = [(100e6, -30), (250e6, -55)] # (frequency Hz, power dBm) of each spoofed tone
+		self._dummy_rng = np.random.default_rng()
 		
 		if self.dummy:
 			self.init_dummy_state()
 	
+	def _record_binary_trace_read(self, ok:bool):
+		''' Called by drivers after each binary trace read attempt. Counts failures in a row and
+		turns binary transfer off once there are binary_trace_max_failures of them. '''
+		
+		if ok:
+			self._binary_trace_failures = 0
+			return
+		
+		self._binary_trace_failures += 1
+		if self._binary_trace_failures >= self.binary_trace_max_failures:
+			self.binary_trace_supported = False
+			self.warning(f"Binary trace read failed >{self._binary_trace_failures}< times in a row, using ASCII transfer from now on.")
+		else:
+			self.warning(f"Binary trace read failed, falling back to ASCII transfer for this trace.")
+	
 	def init_dummy_state(self) -> None:
-		pass
+		self.set_freq_start(1e6)
+		self.set_freq_end(500e6)
+		self.set_res_bandwidth(1e6)
+		self.set_continuous_trigger(True)
+		self.set_ref_level(0)
+		self.set_y_div(10)
+		
+		self.remake_dummy_trace()
 	
-	def remake_dummy_trace(self) -> None:
-		pass
+	def remake_dummy_trace(self, traces:list=None) -> None:
+		''' Re-generates spoofed traces for the current frequency span and resolution bandwidth,
+		and saves them to the state. Each tone in dummy_signals is drawn with the (Gaussian)
+		shape of the RBW filter on top of the noise floor, and fresh noise is added on every
+		call so successive traces differ as they would on a real instrument.
+		
+		Args:
+			traces (list): Traces to generate. Default = None, generates all populated traces.
+		
+		Returns:
+			None
+		'''
+		
+		if traces is None:
+			traces = self.state.traces.get_populated()
+		
+		npoints = int(self.dummy_num_points)
+		freqs = self.get_freq_axis(npoints)
+		rbw = self.state.res_bw
+		if rbw is None or rbw <= 0:
+			rbw = (freqs[-1]-freqs[0])/max(npoints-1, 1)
+		sigma = rbw/2.3548 # RBW is the filter's FWHM
+		
+		# Sum the tones in linear power (mW), then convert back to dBm
+		p_mW = np.full(npoints, 10**(self.dummy_noise_floor_dBm/10))
+		for f_Hz, power_dBm in self.dummy_signals:
+			p_mW += 10**(power_dBm/10) * np.exp(-0.5*((freqs-f_Hz)/sigma)**2)
+		y_base = 10*np.log10(p_mW)
+		
+		for trace in traces:
+			y = y_base + self._dummy_rng.normal(0, self.dummy_noise_dB, npoints)
+			self.state.traces[trace].waveform = {'x':freqs, 'y':y, 'x_units':'Hz', 'y_units':'dBm'}
 	
-	def dummy_responder(self, func_name, *args, **kwargs):
-		pass
+	def dummy_responder(self, func_name:str, *args, **kwargs):
+		''' Function expected to behave as the "real" equivalents. ie. write commands don't
+		need to return anything, reads commands or similar should. What is returned here
+		should mimic what would be returned by the "real" function if it were connected to
+		hardware.
+		'''
+		
+		# Put everything in a try-catch in case arguments are missing or similar
+		try:
+		
+			# Check for known functions
+			found = True
+			adjective = ""
+			match func_name:
+				case "get_freq_start":
+					rval = self.state.get(["freq_start"])
+				case "get_freq_end":
+					rval = self.state.get(["freq_end"])
+				case "get_res_bandwidth":
+					rval = self.state.get(["res_bw"])
+				case "get_continuous_trigger":
+					rval = self.state.get(["continuous_trig_en"])
+				case "get_ref_level":
+					rval = self.state.get(["ref_level"])
+				case "get_y_div":
+					rval = self.state.get(["y_div_scale"])
+				case "get_trace_data":
+					self.remake_dummy_trace([args[0]])
+					rval = self.state.traces[args[0]].waveform
+				case _:
+					found = False
+			
+			# If function was found, label as recognized, else check match for general getter or setter
+			if found:
+				adjective = "recognized"
+			else:
+				if "set_" == func_name[:4]:
+					rval = -1
+					adjective = "set_"
+				elif "get_" == func_name[:4]:
+					rval = None
+					adjective = "get_"
+				else:
+					rval = None
+					adjective = "unrecognized"
+			
+			self.debug(f"Dummy responder sending >{protect_str(rval)}< to {adjective} function (>{func_name}<).")
+			return rval
+		except Exception as e:
+			self.error(f"Failed to respond to dummy instruction. ({e})")
+			return None
 	
 	@abstractmethod
 	def set_freq_start(self, f_Hz:float):
+		self._freq_axis_cache = None
 		self.modify_state(self.get_freq_start, ["freq_start"], f_Hz)
 	
 	@abstractmethod
@@ -68,6 +186,7 @@ class SpectrumAnalyzer(Driver):
 	
 	@abstractmethod
 	def set_freq_end(self, f_Hz:float):
+		self._freq_axis_cache = None
 		self.modify_state(self.get_freq_end, ["freq_end"], f_Hz)
 	
 	@abstractmethod
@@ -106,9 +225,36 @@ class SpectrumAnalyzer(Driver):
 	# 	#TODO: Update trace state tracking model
 	# 	pass
 	
-	# @abstractmethod
-	# def get_trace_data(self, trace:int):
-	# 	pass
+	@abstractmethod
+	@enabledummy
+	def get_trace_data(self, trace:int, use_ascii_transfer:bool=False):
+		''' Returns the data of the trace in a standard waveform dict, which has keys:
+			* x: Frequency array (Hz)
+			* y: Trace value array (current Y unit)
+			* x_units: Units of x-axis
+			* y_units: Units of y-axis
+		
+		Returns None if an error occurs.
+		'''
+		return self.modify_state(None, ["traces", "waveform"], self._super_hint, indices=[trace])
+	
+	def get_freq_axis(self, npoints:int) -> np.ndarray:
+		''' Returns the frequency axis (Hz) of a trace with npoints points. Uses the start
+		and stop frequencies in the state, only querying the instrument for ones that aren't
+		known yet, and reuses the array until they (or npoints) change.
+		'''
+		
+		f0 = self.state.freq_start
+		fe = self.state.freq_end
+		if f0 is None:
+			f0 = self.get_freq_start()
+		if fe is None:
+			fe = self.get_freq_end()
+		
+		key = (f0, fe, npoints)
+		if self._freq_axis_cache is None or self._freq_axis_cache[0] != key:
+			self._freq_axis_cache = (key, np.linspace(f0, fe, npoints))
+		return self._freq_axis_cache[1]
 	
 	@abstractmethod
 	def set_continuous_trigger(self, enable:bool):
@@ -123,6 +269,19 @@ class SpectrumAnalyzer(Driver):
 	def send_manual_trigger(self, send_cls:bool=True):
 		pass
 	
+	def wait_sweep_complete(self) -> bool:
+		''' Blocks until the triggered sweep finishes, using *OPC?. The wait is limited by the
+		relay's timeout, which must be longer than the sweep time.
+		
+		Returns:
+			bool: True if the sweep completed.
+		'''
+		
+		if self.dummy:
+			return True
+		
+		return self.query(f"*OPC?").strip() == "1"
+	
 	@abstractmethod
 	def set_ref_level(self, ref_dBm:float):
 		self.modify_state(self.get_ref_level, ["ref_level"], ref_dBm)
@@ -144,7 +303,6 @@ class SpectrumAnalyzer(Driver):
 	def refresh_state(self):
 		self.get_freq_start()
 		self.get_freq_end()
-		self.get_num_points()
 		self.get_res_bandwidth()
 		self.get_continuous_trigger()
 		self.get_ref_level()
@@ -152,17 +310,16 @@ class SpectrumAnalyzer(Driver):
 		
 		# iterate over all traces and get data
 		for t_idx in self.state.traces.get_populated():
-			self.get_trace_data(self, t_idx)
+			self.get_trace_data(t_idx)
 	
 	def refresh_data(self):
 		# iterate over all traces and get data
 		for t_idx in self.state.traces.get_populated():
-			self.get_trace_data(self, t_idx)
+			self.get_trace_data(t_idx)
 	
 	def apply_state(self):
 		self.set_freq_start(self.state.freq_start)
 		self.set_freq_end(self.state.freq_end)
-		self.set_num_points(self.state.num_points)
 		self.set_res_bandwidth(self.state.res_bw)
 		self.set_continuous_trigger(self.state.continuous_trig_en)
 		self.set_ref_level(self.state.ref_level)
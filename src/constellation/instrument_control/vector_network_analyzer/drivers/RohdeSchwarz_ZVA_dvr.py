@@ -5,12 +5,16 @@ Manual (Requires login and R&S approval): https://scdn.rohde-schwarz.com/ur/pws/
 
 from constellation.base import *
 from constellation.instrument_control.vector_network_analyzer.vector_network_analyzer_ctg import *
-import array
 
 class RohdeSchwarzZVA(BasicVectorNetworkAnalyzerCtg):
 	
-	def __init__(self, address:str, log:plf.LogPile):
-		super().__init__(address, log, relay=DirectSCPIRelay(), expected_idn="Rohde&Schwarz,ZVA")
+	def __init__(self, address:str, log:plf.LogPile, relay:CommandRelay=None, **kwargs):
+		if relay is None:
+			relay = DirectSCPIRelay()
+		super().__init__(address, log, relay=relay, expected_idn="Rohde&Schwarz,ZVA", **kwargs)
+		
+		# S-parameters returned by CALC<ch>:DATA:CALL?, in order, per channel
+		self._call_catalog = {}
 		
 		# This translates the string measurement codes defined the the BasicVectorNetworkAnalyzerCtg class
 		# to strings that are understood by the specific instrument model (the ZVA).
@@ -36,11 +40,10 @@ class RohdeSchwarzZVA(BasicVectorNetworkAnalyzerCtg):
 		''' Returns the index for the requested trace. Returns NOne if not found.
 		'''
 		
-		for idx, tr in self.state.traces.populated_items():
-			if tr.id_str == trace_name:
-				return idx
-
-		return None
+		entry = self._lookup_trace(trace_name)
+		if entry is None:
+			return None
+		return entry[0]
 	
 	def valid_trace_name(self, name:str) -> bool:
 		''' Ensures a trace has a valid name. Trace name rules, as taken from the ZVA manual:
@@ -164,27 +167,26 @@ class RohdeSchwarzZVA(BasicVectorNetworkAnalyzerCtg):
 		# Wipe channel and trace data - start over
 		self.state.channels.clear()
 		self.state.traces.clear()
+		self._call_catalog.clear()
 		trc_idx = self.first_trace
 		
-		# Scan over all channels - determine which are enabled
+		# Get the enabled channels with one catalog query (<num>,<name>,<num>,<name>,...)
+		chan_cat = self.query(f"CONF:CHAN:CAT?").strip().strip("'\"")
+		cat_tokens = [tok.strip() for tok in chan_cat.split(",") if tok.strip() != ""]
 		c_list = []
-		for i in range(self.first_channel, self.first_channel+self.max_channels):
-			
-			#TODO: Store this info somewhere
-			_enabled = False
-			if str_to_bool(self.query(f"CONF:CHAN{i}:STAT?")):
-				_enabled = True
-				c_list.append(i)
-				
-				# Update channel state enabled tracker
-				self.state.channels[i] = VNAChannelState()
-				self.state.channels[i].enabled = True
+		for tok in cat_tokens[0::2]:
+			try:
+				ch = int(tok)
+			except ValueError:
+				self.error(f"Failed to parse channel catalog >{chan_cat}<.")
+				break
 			
-			self.lowdebug(f"Read channel #{i} enabled:{_enabled}")
-			
-
-			# self.modify_state(None, ["channels", "enabled"], _enabled, indices=[i])
-			#TODO: better to use modify_state or directly access state?
+			# Update channel state enabled tracker
+			c_list.append(ch)
+			self.state.channels[ch] = VNAChannelState()
+			self.state.channels[ch].enabled = True
+		
+		self.lowdebug(f"Enabled channels: >{c_list}<")
 		
 		# Read all channel settings and traces for all enabled channels
 		for ch in c_list:
@@ -193,19 +195,20 @@ class RohdeSchwarzZVA(BasicVectorNetworkAnalyzerCtg):
 			trace_state_str = self.query(f"CALC{ch}:PAR:CAT?")
 			
 			# Format trance string into something less arcane
-			trace_state_str = trace_state_str[1:-2] # Trim quotes
-			t_state_list = trace_state_str.strip().split(',') # Split at commas
+			trace_state_str = trace_state_str.strip().strip("'\"") # Trim whitespace and quotes
+			t_state_list = [tok.strip() for tok in trace_state_str.split(',')] # Split at commas
 			trace_data = {t_state_list[i]: t_state_list[i+1] for i in range(0, len(t_state_list)-1, 2)} # Break into dict of <trace-names>:<trace-measurements>
 			
 			# Loop over all traces for this channel...
 			for trc_name, trc_meas in trace_data.items():
 				
 				# Create new trace
-				self.state.traces[trc_idx] = VNATraceState()
-				self.state.traces[trc_idx].enabled = True
-				self.state.traces[trc_idx].channel = ch
-				self.state.traces[trc_idx].id_str = trc_name
-				self.state.traces[trc_idx].measurement = self._from_meas_code(trc_meas)
+				trace = VNATraceState()
+				trace.enabled = True
+				trace.channel = ch
+				trace.id_str = trc_name
+				trace.measurement = self._from_meas_code(trc_meas)
+				self.state.traces[trc_idx] = trace
 				
 				# Select the specified measurement/trace
 				self.write(f"CALC{ch}:PAR:SEL {trc_name}")
@@ -304,102 +307,168 @@ class RohdeSchwarzZVA(BasicVectorNetworkAnalyzerCtg):
 	def get_rf_power(self):
 		self._super_hint = str_to_bool(self.query(f"OUTP:STAT?"))
 	
+	@superreturn
 	def clear_traces(self):
 		self.write(f"CALC:PAR:DEL:ALL")
-		
-		#TODO: Update state
+		self._call_catalog.clear()
 	
+	@superreturn
 	def add_trace(self, channel:int, trace_name:str, measurement:str) -> bool:
 		
+		self._super_hint = False
+		
 		# Get measurement code
 		try:
 			meas_code = self.measurement_codes[measurement]
 		except:
-			self.log.error(f"Unrecognized measurement!")
-			return False
+			self.error(f"Unrecognized measurement!")
+			return
 		
 		# Check that trace doesn't already exist
-		exist_trace_names = [tr.id_str for tr in self.state.traces]
-		if trace_name in exist_trace_names:
+		if self._lookup_trace(trace_name) is not None:
 			self.error(f"Trace name >'{trace_name}'< already exists. Aborting add_trace.")
-			return False
+			return
 		
 		if not self.valid_trace_name(trace_name):
 			self.error(f"Trace name >'{trace_name}'< invalid. Aborting add_trace.")
-			return False
+			return
 		
 		# Create measurement - will not display yet
 		self.write(f"CALC{channel}:PAR:SDEF '{trace_name}', '{meas_code}'")
 		
 		# Create a trace and assoc. with measurement
 		self.write(f"DISP:TRAC:EFE '{trace_name}'")
+		self._call_catalog.pop(channel, None)
 		
-		#TODO: Update state
-		
-		return True
+		self._super_hint = True
 	
 	def send_update_display(self):
 		self.write(f"SYSTEM:DISPLAY:UPDATE ONCE")
 	
-	def get_trace_data(self, trace_name:str):
-		'''
-		
-		Channel Data:
-			* x: X data list, frequency (Hz) (float)
-			* y: Y data list,  (float)
-			* x_units: Units of x-axis
-			* y_units: UNits of y-axis
-		'''
-		
-		# Check that trace exists
-		exist_trace_names = [tr.id_str for tr in self.state.traces]
-		if trace_name not in exist_trace_names:
-			self.log.error(f"Trace >'{trace_name}'< does not exist!")
-			return
+	def _query_sdata(self, cmd:str) -> np.ndarray:
+		''' Queries a REAL,64 block of interleaved real/imaginary values and returns it as a
+		complex array (no copy). Returns None on failure. '''
 		
-		# Get channel number for specified trace
-		tr_idx = self._get_trace_idx(trace_name)
-		channel = self.state.traces[tr_idx].channel
+		data = self.query_binary_array(cmd, datatype='d')
+		if len(data) == 0 or len(data) % 2 != 0:
+			return None
+		return np.ascontiguousarray(data, dtype=np.float64).view(np.complex128)
+	
+	def _channel_call_catalog(self, channel:int) -> list:
+		''' Returns the S-parameters returned by CALC<ch>:DATA:CALL?, in order (cached). '''
 		
-		# Select the specified measurement/trace
-		self.write(f"CALC{channel}:PAR:SEL {trace_name}")
+		if channel not in self._call_catalog:
+			cat = self.query(f"CALC{channel}:DATA:CALL:CAT?").strip().strip("'\"")
+			self._call_catalog[channel] = [c.strip() for c in cat.split(",") if c.strip() != ""]
+		return self._call_catalog[channel]
+	
+	@superreturn
+	def get_traces_data(self, trace_names:list):
+		
+		self._super_hint = None
+		
+		# Check that the traces exist, and group them by channel
+		channels = {}
+		for name in trace_names:
+			channel = self.get_trace_channel(name)
+			if channel is None:
+				self.error(f"Trace >'{name}'< does not exist!")
+				return
+			channels.setdefault(channel, []).append(name)
+		
+		# All traces must share one frequency axis
+		freqs_Hz = self.get_freq_axis(list(channels.keys())[0])
+		for channel in channels.keys():
+			if not np.array_equal(self.get_freq_axis(channel), freqs_Hz):
+				self.error(f"Traces >{trace_names}< are on channels with different frequency axes.")
+				return
 		
 		# Set data format - 64-bit real numbers
 		self.write(f"FORM:DATA REAL,64")
 		
-		# Request the trace data
-		self.write(f"CALC{channel}:DATA? SDATA")
+		y_data = np.empty((len(trace_names), len(freqs_Hz)), dtype=np.complex128)
+		rows = {name:i for i, name in enumerate(trace_names)}
 		
-		# Read the packet header first (size prefix)
-		header = self.relay.inst.read_bytes(2)
-		digits_in_size_num = int(header[1:2])
-		
-		# Read the size of the data packet
-		size_bytes = self.relay.inst.read_bytes(digits_in_size_num)
-		packet_size = int(size_bytes.decode())
-		
-		# Read the actual packet data
-		data_raw = self.relay.inst.read_bytes(packet_size)
+		for channel, names in channels.items():
+			
+			# Read every S-parameter of the channel in one block
+			catalog = self._channel_call_catalog(channel)
+			block = self._query_sdata(f"CALC{channel}:DATA:CALL? SDATA") if len(catalog) > 0 else None
+			if block is not None and len(block) == len(catalog)*len(freqs_Hz):
+				block = block.reshape(len(catalog), len(freqs_Hz))
+			else:
+				block = None
+			
+			for name in names:
+				meas_code = self._to_meas_code(self.state.traces[self._get_trace_idx(name)].measurement)
+				if block is not None and meas_code in catalog:
+					y_data[rows[name], :] = block[catalog.index(meas_code)]
+					continue
+				
+				# Not in the channel block - read the trace on its own
+				self.write(f"CALC{channel}:PAR:SEL {name}")
+				trace = self._query_sdata(f"CALC{channel}:DATA? SDATA")
+				if trace is None or len(trace) != len(freqs_Hz):
+					self.error(f"Failed to read data for trace >'{name}'<.")
+					return
+				y_data[rows[name], :] = trace
 		
-		# Convert the raw binary data to an array of floats
-		float_data = list(array.array('d', data_raw))  # 'd' ensures double precision floats
+		#TODO: Determine what type of trace is being measured and correct units
+		#TODO: Handle non-s-parameter data correctly
+		self._super_hint = {'x': freqs_Hz, 'y': y_data, 'traces': list(trace_names), 'x_units': 'Hz', 'y_units': 'Reflection, complex, unitless'}
+	
+	def get_trace_data(self, trace_name:str):
+		'''
 		
-		# Get frequency range
-		f0 = self.get_freq_start()
-		fe = self.get_freq_end()
-		fnum = self.get_num_points()
-		freqs_Hz = list(np.linspace(f0, fe, fnum))
+		Channel Data:
+			* x: X data array, frequency (Hz) (float)
+			* y: Y data array,  (complex)
+			* x_units: Units of x-axis
+			* y_units: UNits of y-axis
+		'''
 		
-		real_vals = float_data[0::2]  # Extract real components
-		imag_vals = float_data[1::2]  # Extract imaginary components
-		complex_trace = np.array(real_vals) + 1j * np.array(imag_vals)
+		data = self.get_traces_data([trace_name])
+		if data is None:
+			return None
 		
-		#TODO: Determine what type of trace is being measured and correct units
-		#TODO: Handle non-s-parameter data correctly
-		y_data = complex_trace
-		y_unit = 'Reflection, complex, unitless'
+		return {'x': data['x'], 'y': data['y'][0], 'x_units': data['x_units'], 'y_units': data['y_units']}
+	
+	@superreturn
+	def set_continuous_trigger(self, enable:bool, channel:int=1):
+		self.write(f"INIT{channel}:CONT {bool_to_ONOFF(enable)}")
+	
+	@superreturn
+	def get_continuous_trigger(self, channel:int=1):
+		self._super_hint = str_to_bool(self.query(f"INIT{channel}:CONT?"))
+	
+	@superreturn
+	def set_averaging_enable(self, enable:bool, channel:int=1):
+		self.write(f"SENS{channel}:AVER {bool_to_ONOFF(enable)}")
+	
+	@superreturn
+	def get_averaging_enable(self, channel:int=1):
+		self._super_hint = str_to_bool(self.query(f"SENS{channel}:AVER?"))
+	
+	@superreturn
+	def set_averaging_count(self, count:int, channel:int=1):
+		count = int(max(1, min(count, 65536)))
+		self.write(f"SENS{channel}:AVER:COUN {count}")
 		
-		return {'x': freqs_Hz, 'y': y_data, 'x_units': 'Hz', 'y_units': y_unit}
+		# A single sweep trigger runs SWE:COUN sweeps - match the averaging count so one
+		# trigger produces one fully averaged result
+		self.write(f"SENS{channel}:SWE:COUN {count}")
+	
+	@superreturn
+	def get_averaging_count(self, channel:int=1):
+		self._super_hint = int(self.query(f"SENS{channel}:AVER:COUN?"))
+	
+	@superreturn
+	def send_clear_averaging(self, channel:int=1):
+		self.write(f"SENS{channel}:AVER:CLE")
+	
+	@superreturn
+	def send_sweep_trigger(self, channel:int=1):
+		self.write(f"INIT{channel}:IMM")
 	
 	def refresh_data(self):
 		pass
@@ -448,30 +517,5 @@ class RohdeSchwarzZVA(BasicVectorNetworkAnalyzerCtg):
 		# # Query data
 		# return self.query(f"CALC{channel}:DATA? SDATA")
 		
-	# def set_continuous_trigger(self, enable:bool):
-	# 	self.write(f"INIT:CONT {bool_to_ONOFF(enable)}")
-	# def get_continuous_trigger(self):
-	# 	return str_to_bool(self.query(f"INIT:CONT?"))
-	
-	# def send_manual_trigger(self):
-	# 	self.write(f"INIT:IMM")
-		
-	# def set_averaging_enable(self, enable:bool, channel:int=1):
-	# 	self.write(f"SENS{channel}:AVER {bool_to_ONOFF(enable)}")
-	# def get_averaging_enable(self, channel:int=1):
-	# 	return str_to_bool(self.write(f"SENS{channel}:AVER?"))
-	
-	# def set_averaging_count(self, count:int, channel:int=1):
-	# 	count = int(max(1, min(count, 65536)))
-	# 	if count != count:
-	# 		self.log.error(f"Did not apply command. Instrument limits values to integers 1-65536 and this range was violated.")
-	# 		return
-	# 	self.write(f"SENS{channel}:AVER:COUN {count}")
-	# def get_averaging_count(self, channel:int=1):
-	# 	return int(self.query(f"SENS{channel}:AVER:COUN?"))
-	
-	# def send_clear_averaging(self, channel:int=1):
-	# 	self.write(f"SENS{channel}:AVER:CLE")
-	
 	# def send_preset(self):
 	# 	self.write("SYST:PRES")
\ No newline at end of file
@@ -1,56 +1,110 @@
 """
 Saves S-parameters from a VNA to disk.
-"""
 
+Reads the S11, S21, S12 and S22 traces (which must already be set up on the VNA) for one or more
+single sweeps, and appends them to an HDF5 S-parameter archive (see vna_export.SParameterArchive)
+and/or writes one Touchstone .s2p file per sweep.
+
+Examples:
+	python save_sparam.py -o dut1.h5 --cal-notes "SOLT, 2024-05-01"
+	python save_sparam.py -o overnight.h5 --sweeps 5000 --averaging 4
+	python save_sparam.py -o dut1.s2p --format touchstone --plot
+"""
 
-from constellation.all import *
-import matplotlib.pyplot as plt
-from stardust.io import hdf_to_dict, dict_to_hdf
-from constellation.instrument_control.vector_network_analyzer.drivers.RohdeSchwarz_ZVA_dvr import *
+import os
+import re
 import sys
+import argparse
+import pylogfile.base as plf
+from constellation.instrument_control.vector_network_analyzer.vector_network_analyzer_ctg import BasicVectorNetworkAnalyzerCtg, plot_vna_mag
+from constellation.instrument_control.vector_network_analyzer.drivers.RohdeSchwarz_ZVA_dvr import RohdeSchwarzZVA
+from constellation.instrument_control.vector_network_analyzer.vna_export import SParameterArchive, write_touchstone, TOUCHSTONE_RI, TOUCHSTONE_MA, TOUCHSTONE_DB
+
+SPARAMS = {"S11":BasicVectorNetworkAnalyzerCtg.MEAS_S11, "S21":BasicVectorNetworkAnalyzerCtg.MEAS_S21, "S12":BasicVectorNetworkAnalyzerCtg.MEAS_S12, "S22":BasicVectorNetworkAnalyzerCtg.MEAS_S22}
+
+def touchstone_name(filename:str, idx:int, num_sweeps:int) -> str:
+	''' Returns the Touchstone filename for sweep idx - numbered only if there is more than one. '''
+
+	base, ext = os.path.splitext(filename)
+	if not re.fullmatch(r"\.s\d+p", ext.lower()):
+		ext = ".s2p"
+	if num_sweeps == 1:
+		return base + ext
+	return f"{base}_{idx:0{len(str(num_sweeps-1))}d}{ext}"
+
+def main(argv:list=None) -> int:
+
+	parser = argparse.ArgumentParser(description="Saves S-parameters from a VNA to disk.")
+	parser.add_argument("-o", "--output", required=True, help="Output file. HDF5 archives are appended to if they exist.")
+	parser.add_argument("--address", default="TCPIP0::169.254.131.24::INSTR", help="VISA address of the VNA.")
+	parser.add_argument("--format", choices=["hdf", "touchstone", "both"], default="hdf", help="Output format. 'both' writes the Touchstone files next to the HDF5 file.")
+	parser.add_argument("--sweeps", type=int, default=1, help="Number of single sweeps to save.")
+	parser.add_argument("--averaging", type=int, default=None, help="Number of sweeps averaged into each result.")
+	parser.add_argument("--live", action="store_true", help="Read the traces on screen instead of triggering fresh sweeps.")
+	parser.add_argument("--touchstone-format", choices=[TOUCHSTONE_RI, TOUCHSTONE_MA, TOUCHSTONE_DB], default=TOUCHSTONE_RI, help="Number format of Touchstone files.")
+	parser.add_argument("--cal-notes", default="", help="Calibration notes.")
+	parser.add_argument("--notes", default="", help="Other notes.")
+	parser.add_argument("--plot", action="store_true", help="Plot the last sweep.")
+	args = parser.parse_args(argv)
+
+	log = plf.LogPile()
+
+	zva = RohdeSchwarzZVA(args.address, log)
+	zva.refresh_channels_and_traces()
 
-FILENAME = input("Filename:")
-cal_notes = input("Calibration notes:")
-other_notes = input("Other notes?:")
+	# Find trace names for each measurement
+	trace_names = {sp:zva.find_trace(meas) for sp, meas in SPARAMS.items()}
 
-log = plf.LogPile()
+	# Check if any required traces were not found
+	missing = [sp for sp, trc in trace_names.items() if trc is None]
+	if len(missing) > 0:
+		print(f"Failed to find traces for {missing}. Aborting.")
+		return 1
 
-zva = RohdeSchwarzZVA("TCPIP0::169.254.131.24::INSTR", log)
+	traces = list(trace_names.values())
+	sp_names = list(trace_names.keys())
 
-zva.refresh_channels_and_traces()
+	archive = None
+	if args.format in ("hdf", "both"):
+		hdf_name = args.output if args.format == "hdf" else os.path.splitext(args.output)[0] + ".h5"
+		archive = SParameterArchive(hdf_name, log=log)
+		archive.set_info(cal_notes=args.cal_notes, gen_notes=args.notes)
 
-# Find trace names for each measurement
-trc_s11 = zva.find_trace(BasicVectorNetworkAnalyzerCtg.MEAS_S11)
-trc_s12 = zva.find_trace(BasicVectorNetworkAnalyzerCtg.MEAS_S12)
-trc_s21 = zva.find_trace(BasicVectorNetworkAnalyzerCtg.MEAS_S21)
-trc_s22 = zva.find_trace(BasicVectorNetworkAnalyzerCtg.MEAS_S22)
+	last = {}
+	comments = [f"Calibration notes: {args.cal_notes}", f"Notes: {args.notes}"]
 
-# Check if any required traces were not found
-if None in [trc_s11, trc_s12, trc_s21, trc_s22]:
-	print(f"Failed to find one or more required traces. Aborting.")
-	sys.exit()
-	
-# Read trace data
-td_s11 = zva.get_trace_data(trc_s11)
-td_s22 = zva.get_trace_data(trc_s22)
-td_s12 = zva.get_trace_data(trc_s12)
-td_s21 = zva.get_trace_data(trc_s21)
+	def save_sweep(idx:int, data:dict):
+		if data is None:
+			print(f"Sweep {idx} failed.")
+			return
 
-# Format data into dictionary
-state_data = zva.state_to_dict()
-sp_data = {"S11": td_s11, "S22":td_s22, "S12":td_s12, "S21":td_s21}
-file_info = {"cal_notes":cal_notes, "gen_notes":other_notes, "timestamp":datetime.datetime.now().strftime('%Y-%m-%d %H:%M:%S.%f'), "instrument_state":state_data}
-data_out = {"data":sp_data, "info":file_info}
+		if archive is not None:
+			archive.append(data, driver=zva, names=sp_names)
+		if args.format in ("touchstone", "both"):
+			write_touchstone(touchstone_name(args.output, idx, args.sweeps), data['x'], dict(zip(sp_names, data['y'])), data_format=args.touchstone_format, comments=comments)
+		last['data'] = data
 
-# Save to disk
-dict_to_hdf(data_out, FILENAME)
+	try:
+		if args.live:
+			for idx in range(args.sweeps):
+				save_sweep(idx, zva.get_traces_data(traces))
+		else:
+			zva.run_sweeps(traces, num_sweeps=args.sweeps, averaging=args.averaging, callback=save_sweep)
+			stats = zva.sweep_stats()
+			print(f"Saved {stats['sweeps']} sweep(s), {stats['errors']} failed, {stats['sweeps_per_s']} sweeps/s.")
+	finally:
+		if archive is not None:
+			archive.close()
 
-# Create S-parameter plot
-plot_vna_mag(sp_data['S11'], label="S11")
-plot_vna_mag(sp_data['S22'], label="S22")
-plot_vna_mag(sp_data['S21'], label="S21")
-plot_vna_mag(sp_data['S12'], label="S12")
+	# Create S-parameter plot
+	if args.plot and 'data' in last:
+		import matplotlib.pyplot as plt
+		for row, sp in enumerate(sp_names):
+			plot_vna_mag({'x':last['data']['x'], 'y':last['data']['y'][row]}, label=sp)
+		plt.legend()
+		plt.show()
 
+	return 0
 
-plt.legend()
-plt.show()
+if __name__ == "__main__":
+	sys.exit(main())
@@ -37,7 +37,7 @@ class VNATraceState(InstrumentState):
 	""" Class used to represent a trace that is active on the VNA.
 	"""
 	
-	__state_fields__ = ("enabled", "id_str", "measurement", "format", "data")
+	__state_fields__ = ("enabled", "id_str", "channel", "measurement", "format", "data")
 	
 	def __init__(self, log:plf.LogPile=None):
 		super().__init__(log)
@@ -45,6 +45,7 @@ class VNATraceState(InstrumentState):
 		self.add_param("enabled", unit="bool", value=False)
 		
 		self.add_param("id_str") # Trace name, per the instrument. This is used in many instruments' SCPI commands to determine which trace is being referred to.
+		self.add_param("channel", unit="1") # Channel the trace belongs to
 		self.add_param("measurement") # For example: BasicVectorNetworkAnalyzerState.MEAS_S11
 		self.add_param("format") # For example: BasicVectorNetworkAnalyzerState.FORM_LOG_MAG
 		
@@ -56,7 +57,7 @@ class VNAChannelState(InstrumentState):
 	""" Describes the state of one VNA channel.
 	"""
 	
-	__state_fields__ = ("enabled", "freq_start", "freq_end", "res_bw", "cal_enabled", "num_points", "power")
+	__state_fields__ = ("enabled", "freq_start", "freq_end", "res_bw", "cal_enabled", "num_points", "power", "continuous_trigger", "averaging_enable", "averaging_count")
 	
 	def __init__(self, log:plf.LogPile=None):
 		super().__init__(log)
@@ -71,6 +72,10 @@ class VNAChannelState(InstrumentState):
 		self.add_param("num_points", unit="")
 		self.add_param("power", unit="dBm")
 		
+		self.add_param("continuous_trigger", unit="bool")
+		self.add_param("averaging_enable", unit="bool")
+		self.add_param("averaging_count", unit="")
+		
 		self.validate()
 
 
@@ -143,6 +148,14 @@ class BasicVectorNetworkAnalyzerCtg(Driver):
 		self.max_channels = max_channels
 		self.max_traces = max_traces # This is per-channel
 		
+		# Frequency axis per channel, keyed on (start, stop, points). Cleared by the setters.
+		self._freq_axis_cache = {}
+		
+		# Sweep statistics for run_sweeps()
+		self._sweep_t0 = None
+		self._sweep_t_last = None
+		self.num_sweeps = 0
+		self.num_sweep_errors = 0
 		
 	
 	def find_trace(self, meas:str, format:str=FORM_LOG_MAG) -> str:
@@ -156,17 +169,78 @@ class BasicVectorNetworkAnalyzerCtg(Driver):
 		
 		return None
 	
+	def _trace_index(self) -> dict:
+		''' Returns a dict mapping each trace name to its (trace index, channel). Rebuilt only
+		when traces are added, replaced or cleared.
+		'''
+		
+		traces = self.state.traces
+		key = (id(traces), traces.structure_version())
+		
+		cached = getattr(self, "_trace_index_cache", None)
+		if cached is None or cached[0] != key:
+			cached = (key, {tr.id_str:(idx, tr.channel) for idx, tr in traces.populated_items()})
+			self._trace_index_cache = cached
+		
+		return cached[1]
+	
+	def _lookup_trace(self, trace_name:str) -> tuple:
+		''' Returns the (trace index, channel) of a trace, or None if not found. '''
+		
+		entry = self._trace_index().get(trace_name, None)
+		
+		# Traces renamed in place don't change the list structure - rebuild if stale
+		if entry is None or self.state.traces[entry[0]] is None or self.state.traces[entry[0]].id_str != trace_name:
+			self._trace_index_cache = None
+			entry = self._trace_index().get(trace_name, None)
+		
+		return entry
+	
+	def get_trace_channel(self, trace_name:str) -> int:
+		''' Returns the channel of a trace, or None if the trace doesn't exist. '''
+		
+		entry = self._lookup_trace(trace_name)
+		if entry is None:
+			return None
+		return entry[1] if entry[1] is not None else self.first_channel
+	
 	@abstractmethod
 	def _get_trace_idx(self, trace_name:str) -> int:
 		pass
 	
+	def get_freq_axis(self, channel:int=1) -> np.ndarray:
+		''' Returns the frequency axis of a channel (Hz). Uses the sweep settings in the state,
+		only querying the instrument for settings that aren't known yet, and reuses the array
+		until the settings change.
+		'''
+		
+		ch_state = self.state.channels[channel] if self.state.channels.idx_is_populated(channel) else None
+		f0 = ch_state.freq_start if ch_state is not None else None
+		fe = ch_state.freq_end if ch_state is not None else None
+		fnum = ch_state.num_points if ch_state is not None else None
+		
+		if f0 is None:
+			f0 = self.get_freq_start(channel)
+		if fe is None:
+			fe = self.get_freq_end(channel)
+		if fnum is None:
+			fnum = self.get_num_points(channel)
+		
+		key = (f0, fe, fnum)
+		cached = self._freq_axis_cache.get(channel, None)
+		if cached is None or cached[0] != key:
+			cached = (key, np.linspace(f0, fe, int(fnum)))
+			self._freq_axis_cache[channel] = cached
+		return cached[1]
+	
 	@abstractmethod
 	def valid_trace_name(self, name:str):
 		pass
 	
 	@abstractmethod
 	def set_freq_start(self, f_Hz:float, channel:int=1):
-		self.modify_state(self.get_freq_start, ["channels", "freq_start"], f_Hz, indices=[channel])
+		self._freq_axis_cache.pop(channel, None)
+		self.modify_state(lambda: self.get_freq_start(channel), ["channels", "freq_start"], f_Hz, indices=[channel])
 	
 	@abstractmethod
 	@enabledummy
@@ -175,7 +249,8 @@ class BasicVectorNetworkAnalyzerCtg(Driver):
 	
 	@abstractmethod
 	def set_freq_end(self, f_Hz:float, channel:int=1):
-		self.modify_state(self.get_freq_start, ["channels", "freq_end"], f_Hz, indices=[channel])
+		self._freq_axis_cache.pop(channel, None)
+		self.modify_state(lambda: self.get_freq_end(channel), ["channels", "freq_end"], f_Hz, indices=[channel])
 	
 	@abstractmethod
 	@enabledummy
@@ -193,7 +268,8 @@ class BasicVectorNetworkAnalyzerCtg(Driver):
 	
 	@abstractmethod
 	def set_num_points(self, points:int, channel:int=1):
-		self.modify_state(self.get_num_points, ["channels", "num_points"], points, indices=[channel])
+		self._freq_axis_cache.pop(channel, None)
+		self.modify_state(lambda: self.get_num_points(channel), ["channels", "num_points"], points, indices=[channel])
 	
 	@abstractmethod
 	@enabledummy 
@@ -224,15 +300,54 @@ class BasicVectorNetworkAnalyzerCtg(Driver):
 	
 	@abstractmethod
 	def add_trace(self, channel:int, trace_name:str, measurement:str) -> bool:
-		''' Returns trace number '''
-		pass
-		#TODO: Add to state tracking somehow
+		''' Creates a trace on the channel. Returns True if successful. '''
+		
+		# Driver reports failure (eg. invalid name) via _super_hint
+		if not self.dummy and not self._super_hint:
+			return False
+		
+		trace = VNATraceState()
+		trace.enabled = True
+		trace.id_str = trace_name
+		trace.channel = channel
+		trace.measurement = measurement
+		if not self.state.traces.append(trace):
+			self.error(f"No free trace slots for trace >'{trace_name}'<.")
+			return False
+		
+		return True
 	
 	@abstractmethod
 	@enabledummy
 	def get_trace_data(self, trace_name:str):
 		return self.modify_state(None, ["traces", "data"], self._super_hint, indices=[self._get_trace_idx(trace_name)])
 	
+	@abstractmethod
+	@enabledummy
+	def get_traces_data(self, trace_names:list) -> dict:
+		''' Reads several traces in as few transfers as the instrument allows. All traces
+		must share one frequency axis.
+		
+		Args:
+			trace_names (list): Names of the traces to read.
+		
+		Returns:
+			dict: Dictionary with keys 'x' (frequency array, Hz), 'y' (complex array with shape
+				(len(trace_names), npoints), rows in the order of trace_names), 'traces'
+				(trace_names), 'x_units' and 'y_units'. None if an error occurs.
+		'''
+		
+		if self._super_hint is None:
+			return None
+		
+		# Update each trace's data, as get_trace_data() would
+		for row, name in enumerate(self._super_hint['traces']):
+			idx = self._get_trace_idx(name)
+			if idx is not None:
+				self.modify_state(None, ["traces", "data"], {'x':self._super_hint['x'], 'y':self._super_hint['y'][row], 'x_units':self._super_hint['x_units'], 'y_units':self._super_hint['y_units']}, indices=[idx])
+		
+		return self._super_hint
+	
 	@abstractmethod
 	def set_rf_enable(self, enable:bool):
 		self.modify_state(self.get_rf_enable, ["rf_enable"], enable)
@@ -251,6 +366,204 @@ class BasicVectorNetworkAnalyzerCtg(Driver):
 	def get_rf_power(self, channel:int=1):
 		return self.modify_state(None, ["channels", "power"], self._super_hint, indices=[channel])
 	
+	@abstractmethod
+	def set_continuous_trigger(self, enable:bool, channel:int=1):
+		self.modify_state(lambda: self.get_continuous_trigger(channel), ["channels", "continuous_trigger"], enable, indices=[channel])
+	
+	@abstractmethod
+	@enabledummy
+	def get_continuous_trigger(self, channel:int=1):
+		return self.modify_state(None, ["channels", "continuous_trigger"], self._super_hint, indices=[channel])
+	
+	@abstractmethod
+	def set_averaging_enable(self, enable:bool, channel:int=1):
+		self.modify_state(lambda: self.get_averaging_enable(channel), ["channels", "averaging_enable"], enable, indices=[channel])
+	
+	@abstractmethod
+	@enabledummy
+	def get_averaging_enable(self, channel:int=1):
+		return self.modify_state(None, ["channels", "averaging_enable"], self._super_hint, indices=[channel])
+	
+	@abstractmethod
+	def set_averaging_count(self, count:int, channel:int=1):
+		self.modify_state(lambda: self.get_averaging_count(channel), ["channels", "averaging_count"], count, indices=[channel])
+	
+	@abstractmethod
+	@enabledummy
+	def get_averaging_count(self, channel:int=1):
+		return self.modify_state(None, ["channels", "averaging_count"], self._super_hint, indices=[channel])
+	
+	@abstractmethod
+	@enabledummy
+	def send_clear_averaging(self, channel:int=1):
+		pass
+	
+	@abstractmethod
+	@enabledummy
+	def send_sweep_trigger(self, channel:int=1):
+		''' Starts one single sweep (or, with averaging enabled, one group of averaged sweeps)
+		on the channel. Returns immediately - see wait_sweep_complete(). '''
+		pass
+	
+	def wait_sweep_complete(self) -> bool:
+		''' Blocks until the triggered sweep(s) finish, using *OPC?. The wait is limited by the
+		relay's timeout, which must be longer than the sweep (times the averaging count).
+		
+		Returns:
+			bool: True if the sweep completed.
+		'''
+		
+		if self.dummy:
+			return True
+		
+		return self.query(f"*OPC?").strip() == "1"
+	
+	def configure_averaging(self, count:int, channel:int=1):
+		''' Sets the number of sweeps averaged by each send_sweep_trigger(). A count of 1
+		or less turns averaging off. Only sends commands for settings that changed.
+		'''
+		
+		enable = (count is not None) and (count > 1)
+		
+		ch_state = self.state.channels[channel] if self.state.channels.idx_is_populated(channel) else None
+		if ch_state is None or ch_state.averaging_enable != enable:
+			self.set_averaging_enable(enable, channel=channel)
+		if enable and (ch_state is None or ch_state.averaging_count != count):
+			self.set_averaging_count(int(count), channel=channel)
+	
+	def acquire_sweep(self, trace_names:list, channel:int=1, averaging:int=None) -> dict:
+		''' Triggers a fresh single sweep, waits for it to finish and reads the traces back,
+		so the data always belongs to one complete sweep (unlike get_traces_data(), which reads
+		whatever is on screen).
+		
+		Args:
+			trace_names (list): Names of the traces to read. All must be on `channel`.
+			channel (int): Channel to sweep. Default = 1.
+			averaging (int): Number of sweeps to average. Default = None, leaves the
+				averaging settings unchanged.
+		
+		Returns:
+			dict: Trace data, as returned by get_traces_data(). None if an error occurs.
+		'''
+		
+		self._prepare_single_sweep(channel, averaging)
+		
+		self.send_sweep_trigger(channel=channel)
+		if not self.wait_sweep_complete():
+			self.error(f"Sweep on channel >{channel}< did not complete.")
+			return None
+		
+		return self.get_traces_data(trace_names)
+	
+	def _prepare_single_sweep(self, channel:int, averaging:int):
+		
+		ch_state = self.state.channels[channel] if self.state.channels.idx_is_populated(channel) else None
+		if ch_state is None or ch_state.continuous_trigger is not False:
+			self.set_continuous_trigger(False, channel=channel)
+		
+		if averaging is not None:
+			self.configure_averaging(averaging, channel=channel)
+		
+		ch_state = self.state.channels[channel] if self.state.channels.idx_is_populated(channel) else None
+		if ch_state is not None and ch_state.averaging_enable:
+			self.send_clear_averaging(channel=channel)
+	
+	def _apply_sweep_settings(self, settings:dict, channel:int):
+		''' Calls set_<name>(value, channel=channel) for every item in settings. '''
+		
+		for name, value in settings.items():
+			setter = getattr(self, f"set_{name}", None)
+			if setter is None:
+				self.error(f"Unrecognized sweep setting >{name}<.")
+				continue
+			setter(value, channel=channel)
+	
+	def run_sweeps(self, trace_names:list, num_sweeps:int=None, channel:int=1, averaging:int=None, settings:list=None, callback:callable=None) -> list:
+		''' Runs repeated single sweeps (see acquire_sweep()). The next sweep is configured
+		and triggered as soon as the current sweep's data has been read, so the instrument
+		sweeps while the host processes the previous result (callback, storage).
+		
+		Args:
+			trace_names (list): Names of the traces to read each sweep.
+			num_sweeps (int): Number of sweeps. Default = None, one per entry in `settings`.
+			channel (int): Channel to sweep. Default = 1.
+			averaging (int): Number of sweeps to average per result. Default = None, leaves
+				the averaging settings unchanged.
+			settings (list): Optional list of dicts, one per sweep, mapping setting names to
+				values, eg. {"freq_start":1e9, "power":-10} calls set_freq_start() and
+				set_power() before that sweep.
+			callback (callable): Optional function called as callback(index, data) for each
+				sweep while the next one runs. If None, the results are returned instead.
+		
+		Returns:
+			list: Trace data for each sweep (None for failed sweeps), or an empty list if
+				callback is given.
+		'''
+		
+		if num_sweeps is None:
+			num_sweeps = len(settings) if settings is not None else 1
+		if settings is not None and (len(settings) == 0 or len(settings) < num_sweeps):
+			self.error(f"Sweep settings list has >{len(settings)}< entries, but >{num_sweeps}< sweeps were requested.")
+			return []
+		
+		results = []
+		self._sweep_t0 = time.time()
+		self._sweep_t_last = None
+		self.num_sweeps = 0
+		self.num_sweep_errors = 0
+		
+		# Start the first sweep
+		self._prepare_single_sweep(channel, averaging)
+		if settings is not None:
+			self._apply_sweep_settings(settings[0], channel)
+		self.send_sweep_trigger(channel=channel)
+		
+		for i in range(num_sweeps):
+			
+			data = None
+			if self.wait_sweep_complete():
+				data = self.get_traces_data(trace_names)
+			else:
+				self.error(f"Sweep >{i}< on channel >{channel}< did not complete.")
+			
+			# Set up and start the next sweep before handling this one
+			if i+1 < num_sweeps:
+				if settings is not None:
+					self._apply_sweep_settings(settings[i+1], channel)
+				if self.state.channels.idx_is_populated(channel) and self.state.channels[channel].averaging_enable:
+					self.send_clear_averaging(channel=channel)
+				self.send_sweep_trigger(channel=channel)
+			
+			self._sweep_t_last = time.time()
+			if data is None:
+				self.num_sweep_errors += 1
+			else:
+				self.num_sweeps += 1
+			
+			if callback is not None:
+				callback(i, data)
+			else:
+				results.append(data)
+		
+		return results
+	
+	def sweep_stats(self) -> dict:
+		''' Statistics for the last run_sweeps() call.
+		
+		Returns:
+			dict: Dictionary with keys:
+			sweeps: Number of sweeps read
+			errors: Number of failed sweeps
+			elapsed_s: Time from the first trigger to the last sweep read
+			sweeps_per_s: Average sweep rate
+		'''
+		
+		if self._sweep_t0 is None or self._sweep_t_last is None:
+			return {"sweeps":self.num_sweeps, "errors":self.num_sweep_errors, "elapsed_s":None, "sweeps_per_s":None}
+		
+		elapsed = self._sweep_t_last - self._sweep_t0
+		return {"sweeps":self.num_sweeps, "errors":self.num_sweep_errors, "elapsed_s":elapsed, "sweeps_per_s":(self.num_sweeps/elapsed if elapsed > 0 else None)}
+	
 	@abstractmethod
 	def refresh_channels_and_traces(self):
 		pass
@@ -0,0 +1,378 @@
+""" Export of VNA sweeps to Touchstone files and chunked HDF5 archives.
+
+write_touchstone() writes one sweep (complex S-parameter arrays, as returned by
+get_traces_data()/acquire_sweep()) to a Touchstone v1 .sNp file.
+
+For long campaigns, SParameterArchive appends sweeps to one HDF5 file, storing each trace as a
+row of a chunked, compressed, extendable complex128 dataset. Sweeps are queued by the caller and
+written by a background thread, so the file is never rewritten and the sweep loop doesn't wait
+on the disk.
+
+File layout:
+
+	/sweeps/time             float64  timestamp of each sweep (seconds since epoch)
+	/sweeps/axis             int64    frequency axis of each sweep (index into /axes)
+	/sweeps/state            vlen uint8, the driver state (constellation.state_codec, settings
+	                         only) at the time of the sweep, or empty
+	/axes/<k>                float64  frequency axis <k> (Hz). A new axis is stored only when
+	                                  the sweep settings change.
+	/traces/<name>/sweep     int64    sweep number of each row of data
+	/traces/<name>/data      complex128 (N, npoints) trace data
+
+Example:
+	with SParameterArchive("overnight.h5") as archive:
+		vna.run_sweeps([trc_s11, trc_s21, trc_s12, trc_s22], num_sweeps=10000, callback=lambda i, data: archive.append(data, driver=vna, names=["S11", "S21", "S12", "S22"]))
+
+	with SParameterArchive("overnight.h5", mode="r") as archive:
+		sweep = archive.read(1234)
+		write_touchstone("sweep1234.s2p", sweep['x'], dict(zip(sweep['traces'], sweep['y'])))
+
+See tools/save_sparam.py for a command-line front end.
+"""
+
+import time
+import numpy as np
+import h5py
+import pylogfile.base as plf
+
+from constellation.base import Driver, state_serialization
+from constellation.state_codec import encode_state, decode_state
+from constellation.h5_writer import BackgroundH5Writer
+
+_ARCHIVE_FORMAT_VERSION = 1
+
+TOUCHSTONE_RI = "RI" # Real, imaginary
+TOUCHSTONE_MA = "MA" # Linear magnitude, angle (degrees)
+TOUCHSTONE_DB = "DB" # Magnitude (dB), angle (degrees)
+
+_FREQ_UNITS = {"HZ":1.0, "KHZ":1e3, "MHZ":1e6, "GHZ":1e9}
+
+def sparam_matrix(sparams:dict, num_ports:int=None) -> np.ndarray:
+	''' Arranges S-parameter traces into an (npoints, nports, nports) array.
+
+	Args:
+		sparams (dict): Maps names such as "S21" to complex arrays. Missing parameters
+			are filled with NaN.
+		num_ports (int): Number of ports. Default = None, the highest port number in
+			sparams.
+
+	Returns:
+		np.ndarray: Complex array, element [f, i-1, j-1] is Sij at frequency point f.
+	'''
+
+	ports = {name:(int(name[1]), int(name[2])) for name in sparams.keys()}
+	if num_ports is None:
+		num_ports = max(max(p) for p in ports.values())
+
+	npoints = len(next(iter(sparams.values())))
+	matrix = np.full((npoints, num_ports, num_ports), np.nan, dtype=np.complex128)
+	for name, (i, j) in ports.items():
+		matrix[:, i-1, j-1] = sparams[name]
+
+	return matrix
+
+def write_touchstone(filename:str, freqs_Hz:np.ndarray, sparams:np.ndarray, z0:float=50.0, data_format:str=TOUCHSTONE_RI, freq_unit:str="HZ", comments:list=None):
+	''' Writes one sweep to a Touchstone v1 file. The extension (.s2p etc.) isn't checked.
+
+	Args:
+		filename (str): File to write.
+		freqs_Hz (np.ndarray): Frequency axis (Hz).
+		sparams (np.ndarray): (npoints, nports, nports) complex array, see sparam_matrix(),
+			or a dict of traces which is passed through sparam_matrix().
+		z0 (float): Reference impedance (ohms). Default = 50.
+		data_format (str): TOUCHSTONE_RI (default), TOUCHSTONE_MA or TOUCHSTONE_DB.
+		freq_unit (str): Frequency unit of the file: "HZ" (default), "KHZ", "MHZ" or "GHZ".
+		comments (list): Optional comment lines for the header.
+
+	Returns:
+		None
+	'''
+
+	if isinstance(sparams, dict):
+		sparams = sparam_matrix(sparams)
+	sparams = np.asarray(sparams, dtype=np.complex128)
+	npoints, nports, _ = sparams.shape
+
+	freq_unit = freq_unit.upper()
+	if freq_unit not in _FREQ_UNITS:
+		raise ValueError(f"Unrecognized frequency unit '{freq_unit}'.")
+
+	# Two columns per parameter
+	if data_format == TOUCHSTONE_RI:
+		a, b = sparams.real, sparams.imag
+	elif data_format == TOUCHSTONE_MA:
+		a, b = np.abs(sparams), np.angle(sparams, deg=True)
+	elif data_format == TOUCHSTONE_DB:
+		with np.errstate(divide="ignore"):
+			a, b = 20*np.log10(np.abs(sparams)), np.angle(sparams, deg=True)
+	else:
+		raise ValueError(f"Unrecognized Touchstone data format '{data_format}'.")
+
+	# 2-port files list the parameters column-major (S11 S21 S12 S22), all others row-major
+	if nports == 2:
+		a = a.transpose(0, 2, 1)
+		b = b.transpose(0, 2, 1)
+	pairs = np.empty((npoints, nports*nports*2))
+	pairs[:, 0::2] = a.reshape(npoints, -1)
+	pairs[:, 1::2] = b.reshape(npoints, -1)
+
+	freqs = np.asarray(freqs_Hz, dtype=np.float64)/_FREQ_UNITS[freq_unit]
+
+	with open(filename, "w") as fh:
+		for line in (comments if comments is not None else []):
+			fh.write(f"! {line}\n")
+		fh.write(f"# {freq_unit} S {data_format} R {z0:g}\n")
+
+		if nports <= 2:
+			np.savetxt(fh, np.column_stack((freqs, pairs)), fmt="%.12g", delimiter=" ")
+			return
+
+		# 3+ ports: one matrix row per line, at most 4 pairs per line
+		for k in range(npoints):
+			for row in range(nports):
+				vals = pairs[k, row*2*nports:(row+1)*2*nports]
+				for start in range(0, len(vals), 8):
+					prefix = f"{freqs[k]:.12g} " if (row == 0 and start == 0) else "  "
+					fh.write(prefix + " ".join(f"{v:.12g}" for v in vals[start:start+8]) + "\n")
+
+class SParameterArchive(BackgroundH5Writer):
+	''' Appends VNA sweeps to a chunked, compressed HDF5 file from a background writer
+	thread, with random access to any sweep by number.
+	'''
+
+	_description = "S-parameter archive"
+	_item_name = "sweep"
+
+	def __init__(self, filename:str, mode:str="a", compression:str="gzip", compression_opts=1, chunk_sweeps:int=64, max_pending:int=256, log:plf.LogPile=None):
+		''' Opens (or creates) an archive.
+
+		Args:
+			filename (str): HDF5 file to use.
+			mode (str): "a" to create or append (default), "w" to overwrite, "r" to read
+				only.
+			compression (str): h5py compression filter for the trace data ("gzip", "lzf" or
+				None). Default = "gzip".
+			compression_opts: Filter options (gzip level). Default = 1, fastest.
+			chunk_sweeps (int): Number of sweeps per HDF5 chunk of trace data.
+			max_pending (int): Maximum number of sweeps waiting to be written. append()
+				blocks when the writer falls this far behind.
+			log (LogPile): Optional log.
+		'''
+
+		super().__init__(filename, mode, max_pending=max_pending, log=log)
+
+		self.compression = compression
+		self.compression_opts = compression_opts if compression == "gzip" else None
+		self.chunk_sweeps = chunk_sweeps
+
+		if "sweeps" not in self._file:
+			if self.readonly:
+				raise ValueError(f"File '{filename}' does not contain an S-parameter archive.")
+			grp = self._file.create_group("sweeps")
+			grp.attrs["format_version"] = _ARCHIVE_FORMAT_VERSION
+			grp.create_dataset("time", shape=(0,), maxshape=(None,), dtype=np.float64, chunks=(1024,))
+			grp.create_dataset("axis", shape=(0,), maxshape=(None,), dtype=np.int64, chunks=(1024,))
+			grp.create_dataset("state", shape=(0,), maxshape=(None,), dtype=h5py.vlen_dtype(np.uint8), chunks=(64,))
+			self._file.create_group("axes")
+			self._file.create_group("traces")
+
+		# In-memory index, so lookups never touch the file
+		self._num_sweeps = self._file["sweeps/time"].shape[0]
+		self._axes = [self._file[f"axes/{k}"][...] for k in range(len(self._file["axes"]))]
+		self._npoints = {name:grp["data"].shape[1] for name, grp in self._file["traces"].items()}
+		self._load_rows(self._file["traces"], "sweep") # Trace name -> {sweep number: row}
+
+		self._start_writer()
+
+	def __len__(self):
+		return self._num_sweeps
+
+	@property
+	def traces(self) -> list:
+		''' Names of the traces with at least one sweep in the archive. '''
+		return sorted(self._rows.keys())
+
+	def set_info(self, **info):
+		''' Stores notes (eg. cal_notes="...") as attributes of the file. '''
+
+		with self._h5_lock:
+			for key, value in info.items():
+				self._file.attrs[key] = value
+
+	def info(self) -> dict:
+		''' Returns the attributes stored with set_info(). '''
+
+		with self._h5_lock:
+			return dict(self._file.attrs)
+
+	def _axis_index(self, freqs_Hz:np.ndarray) -> int:
+		''' Returns the index of the frequency axis, registering it if it's new. '''
+
+		# Sweeps normally repeat the last axis - check it first
+		for k in range(len(self._axes)-1, -1, -1):
+			if len(self._axes[k]) == len(freqs_Hz) and np.array_equal(self._axes[k], freqs_Hz):
+				return k
+
+		self._axes.append(np.array(freqs_Hz, dtype=np.float64))
+		return len(self._axes)-1
+
+	def append(self, data:dict, timestamp:float=None, driver:Driver=None, names:list=None) -> int:
+		''' Queues a sweep to be written.
+
+		Args:
+			data (dict): Sweep data, as returned by get_traces_data() or acquire_sweep().
+			timestamp (float): Time of the sweep, seconds since epoch. Default = None, uses
+				the current time.
+			driver (Driver): If given, its settings-only state is stored with the sweep.
+			names (list): Names to store the traces under, in the order of data['y'], one
+				per trace (ValueError otherwise). Default = None, uses data['traces'].
+
+		Returns:
+			int: Sweep number, or None if data is None (eg. a failed sweep).
+		'''
+
+		self._check_writable()
+		if data is None:
+			return None
+
+		if timestamp is None:
+			timestamp = time.time()
+		if names is None:
+			names = data['traces']
+
+		y_data = np.atleast_2d(np.asarray(data['y'], dtype=np.complex128))
+		if len(names) != y_data.shape[0]:
+			raise ValueError(f"Got {len(names)} trace names for {y_data.shape[0]} traces.")
+		npoints = y_data.shape[1]
+		for name in names:
+			if self._npoints.setdefault(name, npoints) != npoints:
+				raise ValueError(f"Trace '{name}' has {npoints} points, but is stored in the archive with {self._npoints[name]}.")
+
+		state = b""
+		if driver is not None:
+			with state_serialization(include_data=False):
+				state = encode_state(driver.state)
+
+		seq = self._num_sweeps
+		self._num_sweeps += 1
+		self._add_rows(seq, names)
+
+		# Copy, so the caller is free to reuse its arrays
+		self._queue.put((seq, timestamp, self._axis_index(data['x']), np.frombuffer(state, dtype=np.uint8), list(names), y_data.copy()))
+
+		return seq
+
+	def _trace_group(self, name:str, npoints:int):
+
+		path = f"traces/{name}"
+		if path in self._file:
+			return self._file[path]
+
+		grp = self._file.create_group(path)
+		grp.create_dataset("sweep", shape=(0,), maxshape=(None,), dtype=np.int64, chunks=(1024,))
+		grp.create_dataset("data", shape=(0, npoints), maxshape=(None, npoints), dtype=np.complex128, chunks=(self.chunk_sweeps, npoints), compression=self.compression, compression_opts=self.compression_opts, shuffle=(self.compression is not None))
+		return grp
+
+	def _write_batch(self, batch:list):
+
+		# New frequency axes
+		for k in range(len(self._file["axes"]), max(item[2] for item in batch)+1):
+			self._file["axes"].create_dataset(str(k), data=self._axes[k])
+
+		# Sweep table
+		n0 = self._file["sweeps/time"].shape[0]
+		n1 = n0 + len(batch)
+		for col, values in (("time", [item[1] for item in batch]), ("axis", [item[2] for item in batch])):
+			ds = self._file[f"sweeps/{col}"]
+			ds.resize((n1,))
+			ds[n0:n1] = values
+		ds = self._file["sweeps/state"]
+		ds.resize((n1,))
+		for i, item in enumerate(batch):
+			ds[n0+i] = item[3]
+
+		# Group rows by trace, so each dataset is resized once per batch
+		per_trace = {}
+		for seq, _, _, _, names, y_data in batch:
+			for row, name in enumerate(names):
+				per_trace.setdefault(name, []).append((seq, y_data[row]))
+
+		for name, rows in per_trace.items():
+			grp = self._trace_group(name, len(rows[0][1]))
+			r0 = grp["sweep"].shape[0]
+			r1 = r0 + len(rows)
+			grp["sweep"].resize((r1,))
+			grp["sweep"][r0:r1] = [r[0] for r in rows]
+			grp["data"].resize((r1, grp["data"].shape[1]))
+			grp["data"][r0:r1, :] = np.stack([r[1] for r in rows])
+
+	def times(self) -> np.ndarray:
+		''' Returns the timestamp of every sweep written so far. '''
+		self.flush()
+		with self._h5_lock:
+			return self._file["sweeps/time"][...]
+
+	def read_trace(self, name:str, sweeps=None) -> np.ndarray:
+		''' Reads a trace from several sweeps.
+
+		Args:
+			name (str): Trace name.
+			sweeps: Sweep numbers to read (list or slice). Default = None, every sweep
+				containing the trace.
+
+		Returns:
+			np.ndarray: Complex array (nsweeps, npoints).
+		'''
+
+		self.flush()
+		self._check_readable()
+
+		with self._h5_lock:
+			ds = self._file[f"traces/{name}/data"]
+			if sweeps is None:
+				return ds[...]
+			if isinstance(sweeps, slice):
+				sweeps = range(*sweeps.indices(self._num_sweeps))
+			rows = [self._rows[name][s] for s in sweeps]
+			return ds[np.sort(rows), :][np.argsort(np.argsort(rows))]
+
+	def read(self, seq:int) -> dict:
+		''' Reads sweep `seq` (negative values count from the end).
+
+		Returns:
+			dict: Sweep data in the format of get_traces_data().
+		'''
+
+		if seq < 0:
+			seq += self._num_sweeps
+		if seq < 0 or seq >= self._num_sweeps:
+			raise IndexError(f"Sweep {seq} not in archive (length {self._num_sweeps}).")
+
+		self.flush()
+		self._check_readable()
+
+		names = [name for name in self.traces if seq in self._rows[name]]
+		with self._h5_lock:
+			axis = self._axes[int(self._file["sweeps/axis"][seq])]
+			y_data = np.empty((len(names), len(axis)), dtype=np.complex128)
+			for i, name in enumerate(names):
+				y_data[i, :] = self._file[f"traces/{name}/data"][self._rows[name][seq], :]
+
+		return {'x': axis, 'y': y_data, 'traces': names, 'x_units': 'Hz', 'y_units': 'Reflection, complex, unitless'}
+
+	def read_state(self, seq:int):
+		''' Returns the driver state stored with sweep `seq`, or None if none was stored. '''
+
+		if seq < 0:
+			seq += self._num_sweeps
+		if seq < 0 or seq >= self._num_sweeps:
+			raise IndexError(f"Sweep {seq} not in archive (length {self._num_sweeps}).")
+
+		self.flush()
+		self._check_readable()
+
+		with self._h5_lock:
+			payload = self._file["sweeps/state"][seq]
+		if len(payload) == 0:
+			return None
+		return decode_state(payload, copy_arrays=True)
@@ -11,6 +11,49 @@ import threading
 from labmesh import RelayAgent
 from constellation.base import Driver
 
+class _DeltaStatePublisher:
+	''' Stands in for a Driver inside labmesh.RelayAgent. poll() publishes a full state dict
+	(keyframe) every `keyframe_interval` polls, so observers that join late or miss a message
+	can resynchronize, and only the changed parameters (Driver.poll_delta()) in between.
+	Everything else is forwarded to the Driver, so RPC calls are unaffected.
+	'''
+
+	def __init__(self, driver:Driver, keyframe_interval:int=10, encoding:str=None):
+		self.driver = driver
+		self.keyframe_interval = keyframe_interval
+		self.encoding = encoding
+
+		self._last_version = None
+		self._polls_since_keyframe = 0
+
+	def __getattr__(self, name:str):
+		return getattr(self.driver, name)
+
+	def poll(self) -> dict:
+
+		if self._last_version is None or self._polls_since_keyframe >= self.keyframe_interval:
+			state = self.driver.poll(encoding=self.encoding)
+			self._polls_since_keyframe = 0
+		else:
+			state = self.driver.poll_delta(self._last_version, encoding=self.encoding)
+			self._polls_since_keyframe += 1
+
+		self._last_version = self.driver.last_state_version
+		return state
+
+class _FullStatePublisher:
+	''' Like _DeltaStatePublisher, but always publishes the full state. '''
+
+	def __init__(self, driver:Driver, encoding:str=None):
+		self.driver = driver
+		self.encoding = encoding
+
+	def __getattr__(self, name:str):
+		return getattr(self.driver, name)
+
+	def poll(self) -> dict:
+		return self.driver.poll(encoding=self.encoding)
+
 class DriverStateBroadcaster:
 	''' Runs a labmesh.RelayAgent wrapping an already-connected Driver instance in a background
 	thread, so other ("observer") clients can subscribe to its state via
@@ -23,18 +66,35 @@ class DriverStateBroadcaster:
 	restricting observers to read-only state, is a policy decision, not a technical one -
 	concurrent writers are allowed for now (see docs/labmesh_migration_plan.md's open questions).
 
+	The published state is settings-only (Driver.poll() leaves out is_data parameters such as
+	waveforms and traces). Observers fetch data on demand over RPC with get_data_manifest() and
+	get_data_chunk(), in as many chunks as they like.
+
+	With send_deltas=True (default) only the parameters that changed since the previous
+	broadcast are published, with a full state every `keyframe_interval` broadcasts.
+	ObserverBridge handles both.
+
+	encoding selects the format of each broadcast: "dict" (stardust serialized dicts) or "binary"
+	(constellation.state_codec, base64 wrapped since labmesh publishes JSON). Default = None, uses
+	the Driver's state_encoding.
+
 	Because RelayAgent._serve_rpc calls the wrapped object's methods synchronously and
 	Driver.write/read/query never `await`, an in-flight Driver.poll() and an incoming RPC call
 	can't actually interleave mid-call - asyncio's single-threaded event loop only switches
 	coroutines at `await` points, and neither poll() nor a Driver set_*/get_* method contains one.
 	'''
 
-	def __init__(self, relay_id:str, driver:Driver, broker_rpc:str, rpc_bind:str, state_pub:str, local_address:str="127.0.0.1", broker_address:str="127.0.0.1", state_interval:float=1.0):
+	def __init__(self, relay_id:str, driver:Driver, broker_rpc:str, rpc_bind:str, state_pub:str, local_address:str="127.0.0.1", broker_address:str="127.0.0.1", state_interval:float=1.0, send_deltas:bool=True, keyframe_interval:int=10, encoding:str=None):
 
 		self.relay_id = relay_id
 		self.driver = driver
 
-		self.agent = RelayAgent(relay_id, driver, broker_rpc=broker_rpc, rpc_bind=rpc_bind, state_pub=state_pub, local_address=local_address, broker_address=broker_address, state_interval=state_interval)
+		if send_deltas:
+			published = _DeltaStatePublisher(driver, keyframe_interval=keyframe_interval, encoding=encoding)
+		else:
+			published = _FullStatePublisher(driver, encoding=encoding)
+
+		self.agent = RelayAgent(relay_id, published, broker_rpc=broker_rpc, rpc_bind=rpc_bind, state_pub=state_pub, local_address=local_address, broker_address=broker_address, state_interval=state_interval)
 
 		self._thread = None
 
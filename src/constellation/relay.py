@@ -4,6 +4,7 @@ from pyvicp import Client
 import pyvisa as pv
 import asyncio
 import threading
+import numpy as np
 from labmesh import DirectorClientAgent
 from labmesh.util import prompt_network_password
 
@@ -73,6 +74,38 @@ class CommandRelay:
 		'''
 		raise NotImplementedError(f"{type(self).__name__} does not support query_binary().")
 
+	def query_binary_array(self, cmd:str, datatype:str='B'):
+		''' Like query_binary(), but returns the values as a NumPy array instead of a list, so
+		large blocks (eg. multi-megapoint waveforms) don't have to pass through a Python list.
+		The default implementation converts query_binary()'s result - relays that can decode
+		straight into an array should override this.
+
+		Args:
+			cmd (str): SCPI query command (e.g. ":WAV:DATA?").
+			datatype (str): struct format character for each data point (PyVISA convention).
+
+		Returns:
+			tuple: Element 0 = success status, element 1 = NumPy array of decoded values.
+		'''
+		success, rv = self.query_binary(cmd, datatype=datatype)
+		return success, np.asarray(rv, dtype=np.dtype(datatype))
+
+	def query_block(self, cmd:str) -> tuple:
+		''' Queries a binary block (IEEE 488.2 #<n><count><bytes> format) and returns its
+		payload as raw bytes, with the header and terminator removed. Use this when the
+		caller decodes the data itself (eg. np.frombuffer with an explicit byte order). The
+		default implementation converts query_binary()'s result - relays that can return the
+		bytes directly should override this.
+
+		Args:
+			cmd (str): SCPI query command (e.g. "TRAC:DATA? 1").
+
+		Returns:
+			tuple: Element 0 = success status, element 1 = payload bytes.
+		'''
+		success, rv = self.query_binary(cmd, datatype='B')
+		return success, bytes(bytearray(rv))
+
 class VICPDirectSCPIRelay(CommandRelay):
 	''' A relay that directly connects to instruments via VICP and relays
 	SCPI commands from a driver. This is only for LeCroy oscilloscopes because
@@ -279,6 +312,48 @@ class DirectSCPIRelay(CommandRelay):
 
 		return True, rv
 
+	def query_binary_array(self, cmd:str, datatype:str='B') -> tuple:
+		''' Queries a binary block directly into a NumPy array (PyVISA decodes it with
+		np.frombuffer rather than building a list).
+
+		Args:
+			cmd (str): SCPI query command (e.g. ":WAV:DATA?").
+			datatype (str): struct format character for each data point (PyVISA convention).
+
+		Returns:
+			tuple: Element 0 = success status, element 1 = NumPy array of decoded values.
+		'''
+
+		try:
+			rv = self.inst.query_binary_values(cmd, datatype=datatype, container=np.array)
+			self.log.lowdebug(f"DirectSCPIRelay queried binary block from instrument: >:a{len(rv)} values<.")
+		except Exception as e:
+			self.log.error(f"DirectSCPIRelay failed to query binary block from instrument {self.address}. ({e})")
+			return False, np.empty(0, dtype=np.dtype(datatype))
+
+		return True, rv
+
+	def query_block(self, cmd:str) -> tuple:
+		''' Queries a binary block and returns its payload as bytes. PyVISA parses the
+		IEEE 488.2 header and reads exactly the announced number of bytes, so payloads
+		containing the termination character are read whole, in one transfer.
+
+		Args:
+			cmd (str): SCPI query command (e.g. "TRAC:DATA? 1").
+
+		Returns:
+			tuple: Element 0 = success status, element 1 = payload bytes.
+		'''
+
+		try:
+			rv = self.inst.query_binary_values(cmd, datatype='s', container=bytes)
+			self.log.lowdebug(f"DirectSCPIRelay queried binary block from instrument: >:a{len(rv)} bytes<.")
+		except Exception as e:
+			self.log.error(f"DirectSCPIRelay failed to query binary block from instrument {self.address}. ({e})")
+			return False, b""
+
+		return True, rv
+
 class RemoteTextCommandRelayClient(CommandRelay):
 	''' A CommandRelay that tunnels write/read/query calls over labmesh to a remote
 	instrument-adjacent process (a RemoteTextCommandRelayListener wrapped in a
@@ -0,0 +1,465 @@
+""" Compact binary codec for InstrumentState/IndexedList trees (and anything else built from
+stardust Serializable objects, dicts, lists and scalars).
+
+stardust's to_serial_dict() turns every object into a nested dict that repeats each field name
+and converts NumPy arrays to Python lists. That's fine for small settings-only states, but it's
+slow and large for states holding waveforms. This codec instead produces a self-describing
+byte string:
+
+	magic "CSTB" | u8 format version | u32 schema count | schemas | root value
+
+Each Serializable class is described once per byte string by a schema (class name, class
+schema version, field names), after which every object of that class is just a schema number
+followed by its field values in order. NumPy arrays are written as raw typed buffers (8-byte
+aligned, so decoding is a zero-copy np.frombuffer()), and lists of floats are packed the same
+way. The field lists of each class are cached, so repeated encodes don't re-inspect classes.
+
+Only classes in stardust's SERIALIZABLE_CLASS_REGISTRY can be decoded, same as
+stardust.serializer.from_serial_dict().
+
+Example:
+	data = encode_state(driver.state)
+	state = decode_state(data)
+"""
+
+import struct
+import base64
+import datetime
+import numpy as np
+from stardust.serializer import SERIALIZABLE_CLASS_REGISTRY
+
+STATE_CODEC_MAGIC = b"CSTB"
+STATE_CODEC_VERSION = 1
+
+# File extension used by Driver.dump_state()/restore_state() for this format
+STATE_CODEC_EXTENSION = ".cstb"
+
+# Value tags
+_T_NONE = b"N"
+_T_TRUE = b"T"
+_T_FALSE = b"F"
+_T_INT = b"i"
+_T_BIGINT = b"I"
+_T_FLOAT = b"d"
+_T_COMPLEX = b"c"
+_T_STR = b"s"
+_T_BYTES = b"b"
+_T_LIST = b"l"
+_T_TUPLE = b"t"
+_T_SET = b"S"
+_T_DICT = b"D"
+_T_NDARRAY = b"a"
+_T_EXTARRAY = b"A"
+_T_FLOATLIST = b"f"
+_T_NPSCALAR = b"g"
+_T_DATETIME = b"z"
+_T_OBJECT = b"o"
+_T_ABSENT = b"x"
+
+_U8 = struct.Struct("<B")
+_U16 = struct.Struct("<H")
+_U32 = struct.Struct("<I")
+_U64 = struct.Struct("<Q")
+_I64 = struct.Struct("<q")
+_F64 = struct.Struct("<d")
+_C128 = struct.Struct("<dd")
+
+_INT64_MIN = -(2**63)
+_INT64_MAX = 2**63-1
+
+# Shortest list of floats packed as a raw buffer rather than item by item
+_FLOATLIST_MIN_LEN = 8
+
+# Cache of class -> (name, schema version, field names)
+_SCHEMA_CACHE = {}
+
+class StateCodecError(ValueError):
+	''' Raised when a byte string can't be decoded. '''
+	pass
+
+def _class_schema(cls) -> tuple:
+	''' Returns (name, schema version, field names) for a registered class, cached per class.'''
+
+	schema = _SCHEMA_CACHE.get(cls, None)
+	if schema is None:
+		info = SERIALIZABLE_CLASS_REGISTRY[cls.__name__]
+		schema = (cls.__name__, info.version, tuple(cls.__state_fields__))
+		_SCHEMA_CACHE[cls] = schema
+	return schema
+
+class _Encoder:
+
+	def __init__(self, external_arrays:list=None, external_min_bytes:int=0):
+		self.parts = []
+		self.size = 0
+		self.schema_ids = {}
+		self.schemas = []
+		self.external_arrays = external_arrays
+		self.external_min_bytes = external_min_bytes
+
+	def put(self, b:bytes):
+		self.parts.append(b)
+		self.size += len(b)
+
+	def put_str(self, s:str):
+		b = s.encode("utf-8")
+		self.put(_U32.pack(len(b)))
+		self.put(b)
+
+	def put_aligned_buffer(self, buf):
+		''' Writes a u8 padding length, padding so the buffer starts on an 8-byte boundary
+		of the body, then the buffer. '''
+		pad = (-(self.size+1)) % 8
+		self.put(_U8.pack(pad) + b"\0"*pad)
+		self.put(buf)
+
+	def encode(self, obj):
+
+		t = type(obj)
+
+		# Fast paths for the most common types
+		if obj is None:
+			self.put(_T_NONE)
+		elif t is bool:
+			self.put(_T_TRUE if obj else _T_FALSE)
+		elif t is int:
+			if _INT64_MIN <= obj <= _INT64_MAX:
+				self.put(_T_INT + _I64.pack(obj))
+			else:
+				self.put(_T_BIGINT)
+				self.put_str(str(obj))
+		elif t is float:
+			self.put(_T_FLOAT + _F64.pack(obj))
+		elif t is str:
+			self.put(_T_STR)
+			self.put_str(obj)
+		elif t is dict:
+			self.put(_T_DICT + _U32.pack(len(obj)))
+			for k, v in obj.items():
+				self.encode(k)
+				self.encode(v)
+		elif t is list:
+			if len(obj) >= _FLOATLIST_MIN_LEN and all(type(x) is float for x in obj):
+				self.put(_T_FLOATLIST + _U32.pack(len(obj)))
+				self.put_aligned_buffer(np.asarray(obj, dtype="<f8").tobytes())
+			else:
+				self.put(_T_LIST + _U32.pack(len(obj)))
+				for v in obj:
+					self.encode(v)
+		elif isinstance(obj, np.ndarray):
+			self.encode_ndarray(obj)
+		elif t.__name__ in SERIALIZABLE_CLASS_REGISTRY and SERIALIZABLE_CLASS_REGISTRY[t.__name__].cls is t:
+			self.encode_object(obj)
+		elif isinstance(obj, np.generic):
+			dt = obj.dtype.newbyteorder("<") if obj.dtype.byteorder == ">" else obj.dtype
+			self.put(_T_NPSCALAR)
+			self.put_str(dt.str)
+			self.put_str_bytes(np.asarray(obj, dtype=dt).tobytes())
+		elif isinstance(obj, bool):
+			self.put(_T_TRUE if obj else _T_FALSE)
+		elif isinstance(obj, int):
+			self.encode(int(obj))
+		elif isinstance(obj, float):
+			self.encode(float(obj))
+		elif isinstance(obj, complex):
+			self.put(_T_COMPLEX + _C128.pack(obj.real, obj.imag))
+		elif isinstance(obj, str):
+			self.encode(str(obj))
+		elif isinstance(obj, (bytes, bytearray, memoryview)):
+			self.put(_T_BYTES)
+			self.put_str_bytes(bytes(obj))
+		elif isinstance(obj, tuple):
+			self.put(_T_TUPLE + _U32.pack(len(obj)))
+			for v in obj:
+				self.encode(v)
+		elif isinstance(obj, list):
+			self.encode(list(obj))
+		elif isinstance(obj, dict):
+			self.encode(dict(obj))
+		elif isinstance(obj, (set, frozenset)):
+			self.put(_T_SET + _U32.pack(len(obj)))
+			for v in obj:
+				self.encode(v)
+		elif isinstance(obj, datetime.datetime):
+			self.put(_T_DATETIME)
+			self.put_str(obj.isoformat())
+		else:
+			raise TypeError(f"Cannot encode object of type {t} in state codec.")
+
+	def put_str_bytes(self, b:bytes):
+		self.put(_U32.pack(len(b)))
+		self.put(b)
+
+	def encode_ndarray(self, arr:np.ndarray):
+
+		# Object arrays can't be written as a raw buffer
+		if arr.dtype.hasobject:
+			self.put(_T_LIST + _U32.pack(len(arr)))
+			for v in arr:
+				self.encode(v)
+			return
+
+		# Large arrays may be stored outside the byte string (see encode_state())
+		if self.external_arrays is not None and arr.nbytes >= self.external_min_bytes:
+			self.put(_T_EXTARRAY + _U32.pack(len(self.external_arrays)))
+			self.external_arrays.append(arr)
+			return
+
+		if arr.dtype.byteorder == ">":
+			arr = arr.astype(arr.dtype.newbyteorder("<"))
+		if not arr.flags.c_contiguous:
+			arr = arr.copy(order="C")
+
+		self.put(_T_NDARRAY)
+		self.put_str(arr.dtype.str)
+		self.put(_U8.pack(arr.ndim) + b"".join(_U64.pack(d) for d in arr.shape) + _U64.pack(arr.nbytes))
+		self.put_aligned_buffer(arr.data.cast("B") if arr.nbytes > 0 else b"")
+
+	def encode_object(self, obj):
+
+		cls = type(obj)
+		schema = _class_schema(cls)
+
+		# Register schema on first use in this byte string
+		sid = self.schema_ids.get(cls, None)
+		if sid is None:
+			sid = len(self.schemas)
+			self.schema_ids[cls] = sid
+			self.schemas.append(schema)
+
+		state_dict = SERIALIZABLE_CLASS_REGISTRY[schema[0]].to(obj)
+
+		self.put(_T_OBJECT + _U16.pack(sid))
+		for field in schema[2]:
+			if field in state_dict:
+				self.encode(state_dict[field])
+			else:
+				self.put(_T_ABSENT)
+
+	def header(self) -> bytes:
+
+		out = [STATE_CODEC_MAGIC, _U8.pack(STATE_CODEC_VERSION), _U32.pack(len(self.schemas))]
+		for name, version, fields in self.schemas:
+			b = name.encode("utf-8")
+			out.append(_U32.pack(len(b)) + b)
+			out.append(_U16.pack(version) + _U16.pack(len(fields)))
+			for f in fields:
+				b = f.encode("utf-8")
+				out.append(_U32.pack(len(b)) + b)
+
+		# Pad header to a multiple of 8, so buffers aligned within the body stay aligned
+		# relative to the start of the byte string.
+		hdr = b"".join(out)
+		pad = (-(len(hdr)+4)) % 8
+		return hdr + _U32.pack(pad) + b"\0"*pad
+
+class _Decoder:
+
+	def __init__(self, data, copy_arrays:bool=False, array_loader=None):
+		self.buf = memoryview(data).cast("B")
+		self.pos = 0
+		self.copy_arrays = copy_arrays
+		self.array_loader = array_loader
+		self.schemas = []
+
+	def u8(self):
+		v = self.buf[self.pos]
+		self.pos += 1
+		return v
+
+	def unpack(self, st:struct.Struct):
+		v = st.unpack_from(self.buf, self.pos)
+		self.pos += st.size
+		return v
+
+	def get_str(self) -> str:
+		(n,) = self.unpack(_U32)
+		s = bytes(self.buf[self.pos:self.pos+n]).decode("utf-8")
+		self.pos += n
+		return s
+
+	def get_bytes(self) -> bytes:
+		(n,) = self.unpack(_U32)
+		b = bytes(self.buf[self.pos:self.pos+n])
+		self.pos += n
+		return b
+
+	def skip_padding(self):
+		pad = self.u8()
+		self.pos += pad
+
+	def read_header(self):
+
+		if bytes(self.buf[0:4]) != STATE_CODEC_MAGIC:
+			raise StateCodecError("Not a state codec byte string (bad magic).")
+		self.pos = 4
+		version = self.u8()
+		if version > STATE_CODEC_VERSION:
+			raise StateCodecError(f"Unsupported state codec version {version}.")
+
+		(nschema,) = self.unpack(_U32)
+		for _ in range(nschema):
+			name = self.get_str()
+			cls_version, nfields = self.unpack(struct.Struct("<HH"))
+			fields = tuple(self.get_str() for _ in range(nfields))
+			if name not in SERIALIZABLE_CLASS_REGISTRY:
+				raise StateCodecError(f"Class >{name}< is not a registered Serializable class.")
+			self.schemas.append((SERIALIZABLE_CLASS_REGISTRY[name], cls_version, fields))
+
+		(pad,) = self.unpack(_U32)
+		self.pos += pad
+
+	def decode(self):
+		tag = self.buf[self.pos]
+		self.pos += 1
+		try:
+			handler = _DECODERS[tag]
+		except KeyError:
+			raise StateCodecError(f"Unknown tag {bytes([tag])!r} at byte {self.pos-1}.")
+		return handler(self)
+
+	def decode_dict(self):
+		(n,) = self.unpack(_U32)
+		out = {}
+		for _ in range(n):
+			k = self.decode()
+			out[k] = self.decode()
+		return out
+
+	def decode_list(self):
+		(n,) = self.unpack(_U32)
+		return [self.decode() for _ in range(n)]
+
+	def decode_floatlist(self):
+		(n,) = self.unpack(_U32)
+		self.skip_padding()
+		arr = np.frombuffer(self.buf, dtype="<f8", count=n, offset=self.pos)
+		self.pos += 8*n
+		return arr.tolist()
+
+	def decode_extarray(self):
+		(idx,) = self.unpack(_U32)
+		if self.array_loader is None:
+			raise StateCodecError("Byte string references an external array but no array_loader was provided.")
+		return self.array_loader(idx)
+
+	def decode_npscalar(self):
+		dt = np.dtype(self.get_str())
+		return np.frombuffer(self.get_bytes(), dtype=dt)[0]
+
+	def decode_ndarray(self):
+
+		dt = np.dtype(self.get_str())
+		ndim = self.u8()
+		shape = tuple(self.unpack(_U64)[0] for _ in range(ndim))
+		(nbytes,) = self.unpack(_U64)
+		self.skip_padding()
+
+		count = nbytes // dt.itemsize if dt.itemsize > 0 else 0
+		arr = np.frombuffer(self.buf, dtype=dt, count=count, offset=self.pos).reshape(shape)
+		self.pos += nbytes
+
+		if self.copy_arrays:
+			arr = arr.copy()
+		return arr
+
+	def decode_object(self):
+
+		(sid,) = self.unpack(_U16)
+		info, cls_version, fields = self.schemas[sid]
+
+		data = {}
+		for field in fields:
+			v = self.decode()
+			if v is not _ABSENT:
+				data[field] = v
+
+		if cls_version != info.version and info.upgrade:
+			data = info.upgrade(data, cls_version, info.version)
+
+		return info.from_(data)
+
+_ABSENT = object()
+
+# Tag byte -> decoder function
+_DECODERS = {
+	_T_NONE[0]: lambda d: None,
+	_T_TRUE[0]: lambda d: True,
+	_T_FALSE[0]: lambda d: False,
+	_T_INT[0]: lambda d: d.unpack(_I64)[0],
+	_T_BIGINT[0]: lambda d: int(d.get_str()),
+	_T_FLOAT[0]: lambda d: d.unpack(_F64)[0],
+	_T_COMPLEX[0]: lambda d: complex(*d.unpack(_C128)),
+	_T_STR[0]: _Decoder.get_str,
+	_T_BYTES[0]: _Decoder.get_bytes,
+	_T_LIST[0]: _Decoder.decode_list,
+	_T_TUPLE[0]: lambda d: tuple(d.decode_list()),
+	_T_SET[0]: lambda d: set(d.decode_list()),
+	_T_DICT[0]: _Decoder.decode_dict,
+	_T_NDARRAY[0]: _Decoder.decode_ndarray,
+	_T_EXTARRAY[0]: _Decoder.decode_extarray,
+	_T_FLOATLIST[0]: _Decoder.decode_floatlist,
+	_T_NPSCALAR[0]: _Decoder.decode_npscalar,
+	_T_DATETIME[0]: lambda d: datetime.datetime.fromisoformat(d.get_str()),
+	_T_OBJECT[0]: _Decoder.decode_object,
+	_T_ABSENT[0]: lambda d: _ABSENT,
+}
+
+def encode_state(obj, external_arrays:list=None, external_min_bytes:int=4096) -> bytes:
+	''' Encodes a state tree (or any dict/list/scalar structure containing Serializable
+	objects and NumPy arrays) to a self-describing byte string.
+
+	Note that InstrumentStates are encoded via their get_state_dict(), so is_data
+	parameters are skipped when called inside base.state_serialization(include_data=False).
+
+	Args:
+		obj: Object to encode.
+		external_arrays (list): Optional. If provided, NumPy arrays of at least
+			`external_min_bytes` are appended to this list instead of being written into
+			the byte string, and referenced by their position in it. Used by file formats
+			that store bulk arrays separately (eg. for memory mapping).
+		external_min_bytes (int): Size threshold for external_arrays. Default = 4096.
+
+	Returns:
+		bytes: Encoded byte string.
+	'''
+
+	enc = _Encoder(external_arrays=external_arrays, external_min_bytes=external_min_bytes)
+	enc.encode(obj)
+
+	return enc.header() + b"".join(enc.parts)
+
+def decode_state(data, copy_arrays:bool=False, array_loader:callable=None):
+	''' Decodes a byte string created by encode_state().
+
+	Args:
+		data (bytes-like): Encoded byte string.
+		copy_arrays (bool): Copy NumPy arrays out of `data`. Default = False, arrays are
+			read-only views into `data` (no copy is made).
+		array_loader (callable): Function returning external array N, required if
+			encode_state() was called with external_arrays.
+
+	Returns:
+		Decoded object.
+	'''
+
+	dec = _Decoder(data, copy_arrays=copy_arrays, array_loader=array_loader)
+	dec.read_header()
+	return dec.decode()
+
+def is_encoded_state(data) -> bool:
+	''' Checks if a bytes-like object starts with the state codec magic bytes. '''
+	return isinstance(data, (bytes, bytearray, memoryview)) and bytes(data[:4]) == STATE_CODEC_MAGIC
+
+def pack_state_bytes(data:bytes) -> dict:
+	''' Wraps an encoded state in a JSON-compatible dict (base64), for transports such as
+	labmesh's state broadcasts that only carry JSON. See unpack_state_message(). '''
+	return {"__state_bytes__": base64.b64encode(data).decode("ascii")}
+
+def unpack_state_message(message:dict) -> dict:
+	''' Decodes a message created with pack_state_bytes(). Any other dict is returned
+	unchanged. '''
+
+	if isinstance(message, dict) and "__state_bytes__" in message:
+		return decode_state(base64.b64decode(message["__state_bytes__"]))
+	return message
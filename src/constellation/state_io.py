@@ -0,0 +1,197 @@
+""" State file formats for Driver.dump_state() and Driver.restore_state().
+
+The format is chosen by file extension:
+
+	.hdf, .h5, .hdf5   stardust serialized dict in HDF (default for unknown extensions)
+	.json              stardust serialized dict as compact JSON. Best for small,
+	                   settings-only states (eg. include_data=False).
+	.cstb              constellation.state_codec byte string
+	.npz               constellation.state_codec byte string plus one uncompressed .npy
+	                   member per large NumPy array. Arrays are memory-mapped on load, so
+	                   opening a multi-GB capture only reads the instrument settings; waveform
+	                   data is paged in from disk when it's accessed.
+
+Additional formats can be added with register_state_format().
+"""
+
+import os
+import json
+import struct
+import zipfile
+import numpy as np
+from abc import ABC, abstractmethod
+from stardust.serializer import from_serial_dict
+from stardust.io import hdf_to_dict, dict_to_hdf
+from constellation.state_codec import decode_state, STATE_CODEC_EXTENSION
+
+class StateFormat(ABC):
+	''' A file format for instrument states. dump() receives the Driver, so formats can use
+	whichever of its state_to_dict()/state_to_bytes() representations suits them. '''
+
+	name = ""
+
+	@abstractmethod
+	def dump(self, driver, filename:str, include_data:bool=False):
+		''' Writes the driver's state to `filename`. Raises on failure. '''
+		pass
+
+	@abstractmethod
+	def load(self, filename:str):
+		''' Reads a state file and returns the InstrumentState. Raises on failure. '''
+		pass
+
+class HDFStateFormat(StateFormat):
+
+	name = "hdf"
+
+	def dump(self, driver, filename:str, include_data:bool=False):
+		if not dict_to_hdf(driver.state_to_dict(include_data=include_data), filename):
+			raise IOError(f"Failed to write HDF file '{filename}'.")
+
+	def load(self, filename:str):
+		return from_serial_dict(hdf_to_dict(filename))
+
+class JSONStateFormat(StateFormat):
+
+	name = "json"
+
+	def dump(self, driver, filename:str, include_data:bool=False):
+		with open(filename, "w") as f:
+			json.dump(driver.state_to_dict(include_data=include_data), f, separators=(",", ":"), default=_json_default)
+
+	def load(self, filename:str):
+		with open(filename, "r") as f:
+			return from_serial_dict(json.load(f))
+
+def _json_default(obj):
+	''' Converts NumPy values that json can't handle on its own. '''
+
+	if isinstance(obj, np.ndarray):
+		return obj.tolist()
+	if isinstance(obj, np.generic):
+		return obj.item()
+	raise TypeError(f"Object of type {type(obj).__name__} is not JSON serializable")
+
+class BinaryStateFormat(StateFormat):
+
+	name = "cstb"
+
+	def dump(self, driver, filename:str, include_data:bool=False):
+		with open(filename, "wb") as f:
+			f.write(driver.state_to_bytes(include_data=include_data))
+
+	def load(self, filename:str):
+		with open(filename, "rb") as f:
+			return decode_state(f.read(), copy_arrays=True)["state"]
+
+class NPZStateFormat(StateFormat):
+	''' state_codec byte string in member "state", with every NumPy array of at least
+	`external_min_bytes` moved to its own member "array_N". Members are stored
+	uncompressed so they can be memory-mapped.
+	'''
+
+	name = "npz"
+
+	def __init__(self, external_min_bytes:int=65536):
+		self.external_min_bytes = external_min_bytes
+
+	def dump(self, driver, filename:str, include_data:bool=False):
+
+		arrays = []
+		data = driver.state_to_bytes(include_data=include_data, external_arrays=arrays, external_min_bytes=self.external_min_bytes)
+
+		members = {"state":np.frombuffer(data, dtype=np.uint8)}
+		for i, arr in enumerate(arrays):
+			members[f"array_{i}"] = arr
+
+		with open(filename, "wb") as f:
+			np.savez(f, **members)
+
+	def load(self, filename:str):
+
+		offsets = npz_member_offsets(filename)
+
+		def loader(idx:int):
+			return _map_member(filename, offsets, f"array_{idx}")
+
+		return decode_state(_map_member(filename, offsets, "state"), copy_arrays=True, array_loader=loader)["state"]
+
+_ZIP_LOCAL_HEADER = struct.Struct("<4s5H3L2H")
+
+def npz_member_offsets(filename:str) -> dict:
+	''' Returns a dictionary mapping each uncompressed member of an .npz file (without the
+	.npy suffix) to the byte offset of its contents in the file. '''
+
+	offsets = {}
+	with zipfile.ZipFile(filename, "r") as zf, open(filename, "rb") as f:
+		for info in zf.infolist():
+			if info.compress_type != zipfile.ZIP_STORED:
+				continue
+
+			# The local header's extra field can differ from the central directory's
+			f.seek(info.header_offset)
+			fields = _ZIP_LOCAL_HEADER.unpack(f.read(_ZIP_LOCAL_HEADER.size))
+			if fields[0] != b"PK\x03\x04":
+				raise ValueError(f"Corrupt zip local header for member '{info.filename}' in '{filename}'.")
+			name_len, extra_len = fields[-2], fields[-1]
+
+			name = info.filename[:-4] if info.filename.endswith(".npy") else info.filename
+			offsets[name] = info.header_offset + _ZIP_LOCAL_HEADER.size + name_len + extra_len
+
+	return offsets
+
+def _map_member(filename:str, offsets:dict, name:str) -> np.ndarray:
+	''' Memory-maps one .npy member of an .npz file (copy-on-write, the file is never
+	modified). Members that can't be mapped (compressed, object dtype) are read normally. '''
+
+	header = None
+	if name in offsets:
+		with open(filename, "rb") as f:
+			f.seek(offsets[name])
+			version = np.lib.format.read_magic(f)
+			if version == (1, 0):
+				header = np.lib.format.read_array_header_1_0(f)
+			elif version == (2, 0):
+				header = np.lib.format.read_array_header_2_0(f)
+			data_offset = f.tell()
+
+	if header is not None:
+		shape, fortran_order, dtype = header
+		if not dtype.hasobject:
+			if int(np.prod(shape)) == 0: # mmap can't map zero bytes
+				return np.empty(shape, dtype=dtype, order="F" if fortran_order else "C")
+			return np.memmap(filename, dtype=dtype, mode="c", offset=data_offset, shape=shape, order="F" if fortran_order else "C")
+
+	with np.load(filename, allow_pickle=False) as npz:
+		return npz[name]
+
+_HDF_FORMAT = HDFStateFormat()
+
+STATE_FORMATS = {
+	".hdf":_HDF_FORMAT,
+	".h5":_HDF_FORMAT,
+	".hdf5":_HDF_FORMAT,
+	".json":JSONStateFormat(),
+	STATE_CODEC_EXTENSION:BinaryStateFormat(),
+	".npz":NPZStateFormat(),
+}
+
+def register_state_format(fmt:StateFormat, extensions:list):
+	''' Registers a StateFormat for one or more file extensions (eg. [".xyz"]). '''
+
+	for ext in extensions:
+		STATE_FORMATS[ext.lower()] = fmt
+
+def state_format_for(filename:str) -> StateFormat:
+	''' Returns the StateFormat for a filename, based on its extension. Unknown extensions
+	use HDF. '''
+
+	ext = os.path.splitext(filename)[1].lower()
+	return STATE_FORMATS.get(ext, _HDF_FORMAT)
+
+def load_state_file(filename:str):
+	''' Reads a state file in any registered format and returns the InstrumentState,
+	without needing a Driver. For .npz files, large arrays are memory-mapped rather than
+	read. '''
+
+	return state_format_for(filename).load(filename)
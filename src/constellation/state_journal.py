@@ -0,0 +1,236 @@
+""" Append-only journal of instrument states in a single HDF5 file.
+
+Driver.dump_state() writes one complete file per snapshot, which for experiments that save the
+instrument state at every sweep point means thousands of small files. A StateJournal instead
+appends timestamped records to one extendable file: a full state (keyframe) every
+`keyframe_interval` records and only the changed parameters (InstrumentState.state_delta())
+in between. Records are encoded with constellation.state_codec on the calling thread (so they
+capture the state at the time of the call) and written to disk by a background thread.
+
+The background writer is constellation.h5_writer.BackgroundH5Writer, shared with the other
+append-only HDF5 files (WaveformArchive and SParameterArchive).
+
+File layout (all datasets extendable along axis 0, one row per record):
+
+	/journal/seq            int64    sequence number (row index)
+	/journal/time           float64  timestamp (seconds since epoch)
+	/journal/kind           uint8    0 = keyframe, 1 = delta
+	/journal/keyframe       int64    sequence number of the keyframe a record builds on
+	/journal/state_version  int64    state version watermark of the record
+	/journal/payload        vlen uint8, the encoded record
+
+Example:
+	with StateJournal("sweep_states.h5") as journal:
+		for f in freqs:
+			sg.set_freq(f)
+			journal.record(sg)
+
+		state = journal.state_at(t)
+"""
+
+import copy
+import time
+import numpy as np
+import h5py
+import pylogfile.base as plf
+
+from constellation.base import Driver, InstrumentState, state_serialization, current_state_version
+from constellation.state_codec import encode_state, decode_state
+from constellation.h5_writer import BackgroundH5Writer
+
+KIND_KEYFRAME = 0
+KIND_DELTA = 1
+
+_JOURNAL_FORMAT_VERSION = 1
+
+class StateJournal(BackgroundH5Writer):
+	''' Appends timestamped InstrumentState snapshots/deltas to a single HDF5 file from a
+	background writer thread, with indexed random access by sequence number or time.
+	'''
+
+	_description = "state journal"
+	_item_name = "record"
+
+	def __init__(self, filename:str, mode:str="a", keyframe_interval:int=50, include_data:bool=False, log:plf.LogPile=None):
+		''' Opens (or creates) a journal.
+
+		Args:
+			filename (str): HDF5 file to use.
+			mode (str): "a" to create or append (default), "w" to overwrite, "r" to read
+				only.
+			keyframe_interval (int): Maximum number of delta records between keyframes.
+				Larger values make the file smaller but reconstruction slower. Default = 50.
+			include_data (bool): Also journal is_data parameters (eg. waveforms).
+				Default = False.
+			log (LogPile): Optional log.
+		'''
+
+		super().__init__(filename, mode, log=log)
+
+		self.keyframe_interval = keyframe_interval
+		self.include_data = include_data
+
+		if "journal" not in self._file:
+			if self.readonly:
+				raise ValueError(f"File '{filename}' does not contain a state journal.")
+			self._create_datasets()
+		self._grp = self._file["journal"]
+
+		# In-memory copy of the index columns, so lookups never touch the file
+		self._times = list(self._grp["time"][...])
+		self._kinds = list(self._grp["kind"][...])
+		self._keyframes = list(self._grp["keyframe"][...])
+
+		# Delta tracking for record()
+		self._last_version = None
+		self._last_state_id = None
+		self._last_keyframe = None
+		self._deltas_since_keyframe = 0
+
+		# Cache of the last reconstructed state, for sequential reads
+		self._cache_seq = None
+		self._cache_state = None
+
+		self._start_writer()
+
+	def _create_datasets(self):
+
+		grp = self._file.create_group("journal")
+		grp.attrs["format_version"] = _JOURNAL_FORMAT_VERSION
+
+		for name, dtype in (("seq", np.int64), ("time", np.float64), ("kind", np.uint8), ("keyframe", np.int64), ("state_version", np.int64)):
+			grp.create_dataset(name, shape=(0,), maxshape=(None,), dtype=dtype, chunks=(1024,))
+		grp.create_dataset("payload", shape=(0,), maxshape=(None,), dtype=h5py.vlen_dtype(np.uint8), chunks=(64,))
+
+	def __len__(self):
+		return len(self._times)
+
+	def record(self, source, timestamp:float=None) -> int:
+		''' Appends the current state of a Driver (or an InstrumentState) to the journal.
+		The state is encoded before returning, the file write happens in the background.
+
+		Args:
+			source (Driver or InstrumentState): State to record.
+			timestamp (float): Time of the record, seconds since epoch. Default = None,
+				uses the current time.
+
+		Returns:
+			int: Sequence number of the record.
+		'''
+
+		self._check_writable()
+
+		state = source.state if isinstance(source, Driver) else source
+		if timestamp is None:
+			timestamp = time.time()
+
+		seq = len(self._times)
+
+		# Keyframe for the first record, when the state object was replaced (eg. by
+		# restore_state()), or when the interval is reached.
+		keyframe = (self._last_version is None) or (id(state) != self._last_state_id) or (self._deltas_since_keyframe >= self.keyframe_interval)
+
+		with state_serialization(include_data=self.include_data):
+			if keyframe:
+				version = current_state_version()
+				payload = encode_state(state)
+				kind = KIND_KEYFRAME
+				self._last_keyframe = seq
+				self._deltas_since_keyframe = 0
+			else:
+				delta = state.state_delta(self._last_version, include_data=self.include_data, serialize=False)
+				version = delta["version"]
+				payload = encode_state(delta)
+				kind = KIND_DELTA
+				self._deltas_since_keyframe += 1
+
+		self._last_version = version
+		self._last_state_id = id(state)
+
+		self._times.append(timestamp)
+		self._kinds.append(kind)
+		self._keyframes.append(self._last_keyframe)
+
+		self._queue.put((seq, timestamp, kind, self._last_keyframe, version, np.frombuffer(payload, dtype=np.uint8)))
+
+		return seq
+
+	def _write_batch(self, batch:list):
+
+		n0 = self._grp["seq"].shape[0]
+		n1 = n0 + len(batch)
+
+		columns = list(zip(*batch))
+		for name, col in zip(("seq", "time", "kind", "keyframe", "state_version"), columns[:5]):
+			ds = self._grp[name]
+			ds.resize((n1,))
+			ds[n0:n1] = np.asarray(col, dtype=ds.dtype)
+
+		ds = self._grp["payload"]
+		ds.resize((n1,))
+		for i, payload in enumerate(columns[5]):
+			ds[n0+i] = payload
+
+	def times(self) -> np.ndarray:
+		''' Returns the timestamp of every record. '''
+		return np.asarray(self._times, dtype=np.float64)
+
+	def index_at(self, t:float) -> int:
+		''' Returns the sequence number of the last record at or before time `t`, or None
+		if `t` is before the first record. '''
+
+		idx = int(np.searchsorted(self.times(), t, side="right")) - 1
+		if idx < 0:
+			return None
+		return idx
+
+	def _read_payload(self, seq:int):
+		with self._h5_lock:
+			return decode_state(self._grp["payload"][seq], copy_arrays=True)
+
+	def read(self, seq:int) -> tuple:
+		''' Reconstructs the state recorded as record `seq`: decodes its keyframe and
+		applies the deltas up to `seq`.
+
+		Args:
+			seq (int): Sequence number. Negative values count from the end.
+
+		Returns:
+			tuple: (timestamp, InstrumentState). The state is a new object each call.
+		'''
+
+		if seq < 0:
+			seq += len(self._times)
+		if seq < 0 or seq >= len(self._times):
+			raise IndexError(f"Record {seq} not in journal (length {len(self._times)}).")
+
+		self.flush()
+		self._check_readable()
+
+		kf = self._keyframes[seq]
+
+		# Continue from the cached state if it's on the way to `seq`
+		if self._cache_seq is not None and self._keyframes[self._cache_seq] == kf and self._cache_seq <= seq:
+			state = copy.deepcopy(self._cache_state)
+			start = self._cache_seq + 1
+		else:
+			state = self._read_payload(kf)
+			start = kf + 1
+
+		for i in range(start, seq+1):
+			if not state.apply_delta(self._read_payload(i)):
+				self.log.warning(f"State journal >{self.filename}<: record >{i}< could not be fully applied.")
+
+		self._cache_seq = seq
+		self._cache_state = copy.deepcopy(state)
+
+		return (self._times[seq], state)
+
+	def state_at(self, t:float) -> InstrumentState:
+		''' Returns the state as it was at time `t` (ie. the last record at or before `t`),
+		or None if `t` is before the first record. '''
+
+		seq = self.index_at(t)
+		if seq is None:
+			return None
+		return self.read(seq)[1]
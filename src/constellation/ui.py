@@ -13,7 +13,6 @@ from PyQt6.QtGui import QAction
 import matplotlib.pyplot as plt
 from matplotlib.backends.backend_qtagg import FigureCanvasQTAgg as FigureCanvas, NavigationToolbar2QT
 
-from jarnsaxa import from_serial_dict
 from labmesh import DirectorClientAgent
 
 # ============================================================================
@@ -84,6 +83,10 @@ class OwningBridge(InstrumentBridge):
 	poll() only refreshes settings/state, not measurement data (get_waveform() and friends can
 	legitimately take many seconds - see the RigolDS1000Z waveform-capture work - so those must be
 	requested explicitly via request(), never folded into the automatic poll cycle).
+
+	After the first poll only the changed parameters are serialized (Driver.poll_delta()) and
+	applied to a StateMirror, so a poll where nothing changed re-emits the previous state object
+	instead of rebuilding it.
 	'''
 
 	def __init__(self, driver:Driver, poll_interval_s:float=2.0):
@@ -95,6 +98,7 @@ class OwningBridge(InstrumentBridge):
 		self._queue = queue.Queue()
 		self._thread = None
 		self._stop_event = threading.Event()
+		self._mirror = StateMirror()
 
 	def start(self):
 		if self._thread is not None:
@@ -143,14 +147,23 @@ class OwningBridge(InstrumentBridge):
 	def _poll_and_emit(self):
 
 		try:
-			state_dict = self.driver.poll()
+			if self._mirror.state is None:
+				message = self.driver.poll()
+			else:
+				message = self.driver.poll_delta(self._mirror.version)
+
+			# A delta that can't be applied falls back to a full state
+			if not self._mirror.update(message):
+				self._mirror.update(self.driver.state_to_dict())
+
 			self.connection_changed.emit(self.driver.online)
-			# Reconstruct a fresh, independent InstrumentState object rather than emitting
+			# Emit the mirror's independent InstrumentState object rather than
 			# self.driver.state directly - Qt signals pass Python object references across
 			# threads, and self.driver.state keeps getting mutated in place by this same worker
 			# thread on every subsequent poll, which would otherwise be a data race against
-			# whatever the GUI thread is doing with the object it received last time.
-			self.state_changed.emit(from_serial_dict(state_dict))
+			# whatever the GUI thread is doing with the object it received last time. The
+			# mirror never mutates an object it has handed out (see StateMirror).
+			self.state_changed.emit(self._mirror.state)
 		except Exception as e:
 			self.connection_changed.emit(False)
 
@@ -176,6 +189,7 @@ class ObserverBridge(InstrumentBridge):
 		self._thread = None
 		self._loop = None
 		self._relay_client = None
+		self._mirror = StateMirror()
 
 	def start(self):
 		if self._thread is not None:
@@ -229,7 +243,12 @@ class ObserverBridge(InstrumentBridge):
 			if rid != self.relay_id:
 				return
 			self.connection_changed.emit(True)
-			self.state_changed.emit(from_serial_dict(state))
+
+			# Full states and deltas both arrive here (see DriverStateBroadcaster). A delta
+			# that doesn't follow on from the last state received is skipped until the next
+			# full state (keyframe) arrives.
+			if self._mirror.update(state):
+				self.state_changed.emit(self._mirror.state)
 
 		client.on_state(_on_state)
 
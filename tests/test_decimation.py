@@ -0,0 +1,76 @@
+""" Tests for display decimation (constellation.decimation) and its use in plot_waveform(). """
+
+import matplotlib
+matplotlib.use("Agg")  # headless - no display needed to run these tests
+
+import numpy as np
+
+from constellation.decimation import minmax_envelope, lttb, index_range, DecimationCache
+from constellation.instrument_control.oscilloscope.oscilloscope_ctg import plot_waveform, OscilloscopeWaveform
+
+def test_minmax_envelope_keeps_extremes_in_order():
+	y = np.zeros(100_000)
+	y[12_345] = 5.0 # single-sample glitch
+	y[70_000] = -3.0
+	x = np.arange(len(y)) * 1e-6
+
+	xd, yd = minmax_envelope(x, y, 500)
+
+	assert len(yd) <= 2*500 + 2
+	assert yd.max() == 5.0 and yd.min() == -3.0
+	assert np.all(np.diff(xd) >= 0)
+	assert xd[np.argmax(yd)] == x[12_345]
+
+def test_minmax_envelope_uniform_axis_matches_array_axis():
+	y = np.sin(np.linspace(0, 50, 33_333))
+	x = 1.5 + np.arange(len(y)) * 0.25
+
+	xa, ya = minmax_envelope(x, y, 300, x_range=(100, 2000))
+	xu, yu = minmax_envelope((1.5, 0.25), y, 300, x_range=(100, 2000))
+
+	assert np.allclose(xa, xu)
+	assert np.array_equal(ya, yu)
+	assert xa[0] <= 100 and xa[-1] >= 2000
+
+def test_index_range_includes_edge_points():
+	assert index_range((0.0, 1.0), 100, (10.5, 20.5)) == (10, 22)
+	assert index_range(np.arange(100.0), 100, (10.5, 20.5)) == (10, 22)
+	assert index_range((0.0, 1.0), 100, None) == (0, 100)
+
+def test_lttb_output_size_and_endpoints():
+	x = np.arange(10_000, dtype=float)
+	y = np.sin(x / 100)
+
+	xd, yd = lttb(x, y, 200)
+
+	assert len(xd) == 200
+	assert xd[0] == x[0] and xd[-1] == x[-1]
+	assert np.all(np.diff(xd) > 0)
+
+def test_decimation_cache_reuses_views():
+	y = np.random.default_rng(0).normal(size=200_000)
+	cache = DecimationCache((0.0, 1.0), y)
+
+	full = cache.get(800)
+	assert cache.get(800) is full
+
+	zoom = cache.get(800, (1000.0, 5000.0))
+	assert cache.get(800, (1100.0, 5100.0)) is zoom # small pan reuses the padded view
+	assert cache.get(800, (9000.0, 13000.0)) is not zoom
+	assert zoom[0][0] <= 1000 and zoom[0][-1] >= 5000
+
+def test_plot_waveform_decimates_large_waveforms_and_follows_zoom():
+	codes = np.random.default_rng(1).integers(0, 256, size=1_000_000, dtype=np.uint8)
+	wf = OscilloscopeWaveform(codes=codes, y_increment=0.01, y_origin=128, x_increment=1e-6, x_origin=0.0, channel=1)
+
+	ax = plot_waveform(wf)
+	line = ax.get_lines()[0]
+	assert len(line.get_xdata()) < 10_000
+
+	ax.set_xlim(0.1, 0.2)
+	xd = line.get_xdata()
+	assert xd[0] <= 0.1 and xd[-1] >= 0.2 and xd[-1] < 0.3
+
+	# Opt out
+	ax2 = plot_waveform(wf, decimation=None)
+	assert len(ax2.get_lines()[0].get_xdata()) == 1_000_000
@@ -0,0 +1,116 @@
+""" Tests for buffered DMM bursts (acquire_burst()) and reading-list parsing. """
+
+import numpy as np
+import pylogfile.base as plf
+
+from constellation.relay import CommandRelay, DirectSCPIRelay
+from constellation.instrument_control.digital_multimeter.digital_multimeter_ctg import DigitalMultimeter, parse_readings
+from constellation.instrument_control.digital_multimeter.drivers.Keysight_34400_dvr import Keysight34400
+from constellation.instrument_control.digital_multimeter.drivers.Keithley_2700_dvr import Keithley2700
+
+def make_log():
+	log = plf.LogPile()
+	log.terminal_level = plf.CRITICAL
+	return log
+
+class _FakeDMMRelay(CommandRelay):
+	""" Answers *IDN?, :FUNC? and *ESR? and returns a canned reading list for FETC?/TRAC:DATA?. """
+
+	def __init__(self, idn, readings):
+		super().__init__()
+		self.idn = idn
+		self.readings = readings
+		self.queries = []
+		self.writes = []
+
+	def connect(self):
+		return True
+
+	def close(self):
+		pass
+
+	def write(self, cmd):
+		self.writes.append(cmd)
+		return True
+
+	def read(self):
+		return True, ""
+
+	def query(self, cmd):
+		self.queries.append(cmd)
+		if cmd == "*IDN?":
+			return True, self.idn
+		if cmd == ":FUNC?":
+			return True, '"VOLT"'
+		if cmd == "*ESR?":
+			return True, "1"
+		if cmd in ("FETC?", "TRAC:DATA?"):
+			return True, self.readings
+		return True, "0"
+
+def test_parse_readings_ignores_units():
+	text = "-4.87665862E-01VDC,+1318.539SECS,+12129RDNG#,+1.5E+00VDC,+1318.6SECS,+12130RDNG#\n"
+	values = parse_readings(text, num_fields=3)
+	assert values.shape == (2, 3)
+	assert np.allclose(values[:, 0], [-0.487665862, 1.5])
+	assert np.allclose(values[:, 1], [1318.539, 1318.6])
+	assert np.allclose(parse_readings("+1.0E-03,-2.5,.5"), [1e-3, -2.5, 0.5])
+
+def test_keysight_burst_is_one_fetch():
+	values = np.linspace(-1, 1, 500)
+	relay = _FakeDMMRelay("Keysight Technologies,34461A,FAKE,1.0", ",".join(f"{v:+.8E}" for v in values))
+	dmm = Keysight34400("fake-addr", log=make_log(), relay=relay)
+
+	data = dmm.acquire_burst(500, rate_Hz=100)
+
+	assert np.allclose(data['y'], values)
+	assert data['y_units'] == "V"
+	assert np.allclose(np.diff(data['x']), 0.01, atol=1e-5)
+	assert "SAMP:COUN 500" in relay.writes and "SAMP:TIM 0.01" in relay.writes
+	assert relay.queries.count("FETC?") == 1
+	assert relay.queries.count(":FUNC?") == 1
+	assert dmm.state.result_V == values[-1]
+
+	# Measurement is known now, so isn't asked again
+	relay.queries.clear()
+	dmm.acquire_burst(500)
+	assert ":FUNC?" not in relay.queries
+
+def test_keithley_burst_uses_instrument_timestamps():
+	n = 50
+	rel_t = 10 + 0.0503*np.arange(n)
+	readings = ",".join(f"{0.1*i:+.8E}VDC,{t:+.3f}SECS,{i+1:+d}RDNG#" for i, t in enumerate(rel_t))
+	relay = _FakeDMMRelay("KEITHLEY INSTRUMENTS INC.,MODEL 2700,FAKE,1.0", readings)
+	dmm = Keithley2700("fake-addr", log=make_log(), relay=relay)
+
+	data = dmm.acquire_burst(n, rate_Hz=20)
+
+	assert np.allclose(data['y'], 0.1*np.arange(n))
+	assert np.allclose(data['x'] - data['x'][0], rel_t - rel_t[0], atol=1e-3)
+	assert "TRIG:SOUR TIM" in relay.writes and f"TRIG:COUN {n}" in relay.writes
+	assert relay.queries.count("TRAC:DATA?") == 1
+
+def test_dummy_burst():
+	dmm = Keysight34400("TCPIP0::10.0.0.8::INSTR", log=make_log(), relay=DirectSCPIRelay(), dummy=True)
+	dmm.dummy_reading = 2.5
+
+	data = dmm.acquire_burst(1000, rate_Hz=1000)
+
+	assert len(data['y']) == 1000
+	assert abs(np.mean(data['y']) - 2.5) < 1e-3
+	assert np.isclose(data['x'][-1] - data['x'][0], 0.999)
+	assert dmm.state.measurement_type == DigitalMultimeter.MEAS_VOLT_DC
+
+def test_keithley_burst_fits_buffer():
+	relay = _FakeDMMRelay("KEITHLEY INSTRUMENTS INC.,MODEL 2700,FAKE,1.0", "+1.5E+00VDC,+10.000SECS,+1RDNG#")
+	dmm = Keithley2700("fake-addr", log=make_log(), relay=relay)
+
+	# Buffer needs at least 2 points, even for one reading
+	data = dmm.acquire_burst(1)
+	assert np.allclose(data['y'], [1.5])
+	assert "TRAC:POIN 2" in relay.writes
+
+	# Too big for the buffer - nothing is sent
+	relay.writes.clear()
+	assert dmm.acquire_burst(60000) is None
+	assert relay.writes == []
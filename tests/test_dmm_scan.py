@@ -0,0 +1,138 @@
+""" Tests for Keithley 2700 scan-list acquisition (ScanMixin). """
+
+import time
+import numpy as np
+import pylogfile.base as plf
+
+from constellation.relay import CommandRelay, DirectSCPIRelay
+from constellation.instrument_control.digital_multimeter.digital_multimeter_ctg import DigitalMultimeter, SCAN_DTYPE
+from constellation.instrument_control.digital_multimeter.drivers.Keithley_2700_dvr import Keithley2700
+
+CHANNELS = [101, 102, 103, 104, 105]
+
+def make_log():
+	log = plf.LogPile()
+	log.terminal_level = plf.CRITICAL
+	return log
+
+def reading_str(i:int) -> str:
+	''' Reading i of the buffer, for channel CHANNELS[i % 5]. '''
+	ch = CHANNELS[i % len(CHANNELS)]
+	return f"{ch + 0.001*i:+.8E}VDC,{0.01*i:+.3f}SECS,+{ch}INTCHAN"
+
+class _Fake2700Relay(CommandRelay):
+	""" Emulates the 2700's reading buffer. Each TRAC:NEXT? query advances the write pointer by
+	one scan, wrapping at buffer_size. """
+
+	def __init__(self, buffer_size=55000):
+		super().__init__()
+		self.buffer_size = buffer_size
+		self.num_readings = 0 # Readings taken since the buffer was cleared
+		self.queries = []
+		self.writes = []
+
+	def connect(self):
+		return True
+
+	def close(self):
+		pass
+
+	def write(self, cmd):
+		self.writes.append(cmd)
+		if cmd == "TRAC:CLE":
+			self.num_readings = 0
+		elif cmd.startswith("TRIG:COUN ") and cmd != "TRIG:COUN INF":
+			self.num_readings = int(cmd.split(" ")[1])*len(CHANNELS)
+		return True
+
+	def read(self):
+		return True, ""
+
+	def query(self, cmd):
+		self.queries.append(cmd)
+		if cmd == "*IDN?":
+			return True, "KEITHLEY INSTRUMENTS INC.,MODEL 2700,FAKE,1.0"
+		if cmd == "*ESR?":
+			return True, "1"
+		if cmd == "TRAC:DATA?":
+			return True, ",".join(reading_str(i) for i in range(self.num_readings))
+		if cmd == "TRAC:NEXT?":
+			self.num_readings += len(CHANNELS)
+			return True, f"{self.num_readings % self.buffer_size}"
+		if cmd.startswith("TRAC:DATA:SEL? "):
+			start, count = [int(x) for x in cmd.split(" ")[1].split(",")]
+			# Location -> reading number of the most recent pass over the buffer
+			base = (self.num_readings-1)//self.buffer_size*self.buffer_size
+			idx = [base + loc if base + loc < self.num_readings else base - self.buffer_size + loc for loc in range(start, start+count)]
+			return True, ",".join(reading_str(i) for i in idx)
+		return True, "0"
+
+def test_run_scan_reads_triplets_in_one_transfer():
+	relay = _Fake2700Relay()
+	dmm = Keithley2700("fake-addr", log=make_log(), relay=relay)
+
+	dmm.configure_scan(CHANNELS, [DigitalMultimeter.MEAS_VOLT_DC]*4 + [DigitalMultimeter.MEAS_RESISTANCE_4WIRE], interval_s=0.5)
+	data = dmm.run_scan(num_scans=20)
+
+	assert data.dtype == SCAN_DTYPE and len(data) == 100
+	assert np.array_equal(data["channel"], np.tile(CHANNELS, 20))
+	assert np.allclose(data["reading"], data["channel"] + 0.001*np.arange(100))
+	assert np.allclose(data["timestamp"], 0.01*np.arange(100))
+	assert relay.queries.count("TRAC:DATA?") == 1
+
+	assert "SENS:FUNC 'VOLT:DC', (@101,102,103,104)" in relay.writes
+	assert "SENS:FUNC 'FRES', (@105)" in relay.writes
+	assert "ROUT:SCAN (@101,102,103,104,105)" in relay.writes
+	assert "TRIG:TIM 0.5" in relay.writes and "SAMP:COUN 5" in relay.writes
+
+	# Saved to the state too
+	ch3 = dmm.get_scan_data(channel=103)
+	assert len(ch3) == 20 and np.all(ch3["channel"] == 103)
+	assert dmm.state.state_fragments["scan"].scan_measurements[-1] == DigitalMultimeter.MEAS_RESISTANCE_4WIRE
+
+def test_continuous_scan_follows_wrapping_buffer():
+	relay = _Fake2700Relay(buffer_size=12)
+	dmm = Keithley2700("fake-addr", log=make_log(), relay=relay)
+	dmm.scan_buffer_size = 12
+	dmm.configure_scan(CHANNELS)
+
+	dmm.arm_scan(None)
+	got = [dmm.fetch_new_scan_readings() for _ in range(7)]
+	data = np.concatenate(got)
+
+	# Every reading arrives exactly once, in order, across several wraps of the buffer
+	assert len(data) == 35
+	assert np.allclose(data["reading"], data["channel"] + 0.001*np.arange(35))
+	assert "TRAC:FEED:CONT ALW" in relay.writes and "TRIG:COUN INF" in relay.writes
+
+def test_dummy_continuous_scan_streams_into_state():
+	dmm = Keithley2700("TCPIP0::10.0.0.9::INSTR", log=make_log(), relay=DirectSCPIRelay(), dummy=True)
+	dmm.configure_scan(CHANNELS, interval_s=1)
+
+	dmm.start_continuous_scan(poll_s=0.005, max_readings=400)
+	deadline = time.time() + 5
+	while len(dmm.get_scan_data()) < 300 and time.time() < deadline:
+		time.sleep(0.01)
+	dmm.stop_continuous_scan()
+	assert not dmm.scan_running
+
+	data = dmm.get_scan_data()
+	assert 300 <= len(data) <= 400
+	assert np.all(np.diff(data["timestamp"]) > 0)
+	assert np.array_equal(data["channel"][:5], np.roll(CHANNELS, -list(CHANNELS).index(data["channel"][0]))[:5])
+
+def test_scan_after_burst_restores_scan_routing():
+	relay = _Fake2700Relay()
+	dmm = Keithley2700("fake-addr", log=make_log(), relay=relay)
+	dmm.configure_scan(CHANNELS, DigitalMultimeter.MEAS_VOLT_DC)
+
+	dmm.configure_burst(10)
+	assert relay.writes[-1] == "SAMP:COUN 10" and "ROUT:SCAN:LSEL NONE" in relay.writes
+
+	relay.writes.clear()
+	data = dmm.run_scan(num_scans=2)
+
+	# Burst switched the scan list and channel readout off - arming turns them back on
+	assert relay.writes.index("ROUT:SCAN:LSEL INT") < relay.writes.index("TRAC:CLE")
+	assert "FORM:ELEM READ,TST,CHAN" in relay.writes
+	assert np.array_equal(data["channel"], np.tile(CHANNELS, 2))
@@ -0,0 +1,102 @@
+""" Tests for the cached DMM measurement function (get_value()) and read_stream(). """
+
+import pylogfile.base as plf
+
+from constellation.relay import CommandRelay
+from constellation.instrument_control.digital_multimeter.digital_multimeter_ctg import DigitalMultimeter
+from constellation.instrument_control.digital_multimeter.drivers.Keysight_34400_dvr import Keysight34400
+
+def make_log():
+	log = plf.LogPile()
+	log.terminal_level = plf.CRITICAL
+	return log
+
+class _FakeMeterRelay(CommandRelay):
+	""" Continuously triggered meter whose function can be changed 'from the front panel'. """
+
+	def __init__(self):
+		super().__init__()
+		self.function = '"VOLT"'
+		self.num_reads = 0
+		self.queries = []
+
+	def connect(self):
+		return True
+
+	def close(self):
+		pass
+
+	def write(self, cmd):
+		if cmd.startswith("CONFigure:"):
+			self.function = '"' + cmd[len("CONFigure:"):].split(" ")[0] + '"'
+		return True
+
+	def read(self):
+		return True, ""
+
+	def query(self, cmd):
+		self.queries.append(cmd)
+		if cmd == "*IDN?":
+			return True, "Keysight Technologies,34461A,FAKE,1.0"
+		if cmd == ":FUNC?":
+			return True, self.function
+		if cmd == "TRIG:SOUR?":
+			return True, "IMM"
+		if cmd == "TRIG:COUN?":
+			return True, "+9.9E+37"
+		if cmd == "DATA:LAST?":
+			self.num_reads += 1
+			return True, f"{self.num_reads:+.6E} VDC"
+		return True, "0"
+
+def make_meter():
+	relay = _FakeMeterRelay()
+	dmm = Keysight34400("fake-addr", log=make_log(), relay=relay)
+	dmm.set_trigger_type(DigitalMultimeter.TRIG_CONT)
+	return dmm, relay
+
+def test_get_value_queries_function_only_until_cached():
+	dmm, relay = make_meter()
+
+	values = [dmm.get_value() for _ in range(5)]
+	assert values == [1, 2, 3, 4, 5]
+	assert relay.queries.count(":FUNC?") == 1
+	assert dmm.state.result_V == 5
+
+	# set_measurement() updates the cache from the instrument's readback
+	dmm.set_measurement(DigitalMultimeter.MEAS_CURR_DC)
+	assert dmm.state.measurement_type == DigitalMultimeter.MEAS_CURR_DC
+	n_func = relay.queries.count(":FUNC?")
+	dmm.get_value()
+	assert relay.queries.count(":FUNC?") == n_func
+	assert dmm.state.result_I == 6
+
+def test_read_stream_revalidates_at_low_rate():
+	dmm, relay = make_meter()
+	dmm.get_measurement()
+	relay.queries.clear()
+
+	readings = list(dmm.read_stream(num_readings=200, validate_interval_s=None))
+	assert [r[1] for r in readings] == list(range(1, 201))
+	assert relay.queries == ["DATA:LAST?"]*200 # One round trip per reading
+
+	# Function changed on the instrument - noticed at the next validation
+	relay.function = '"CURR"'
+	stream = dmm.read_stream(validate_interval_s=0)
+	t, value, meas = next(stream)
+	stream.close()
+	assert meas == DigitalMultimeter.MEAS_CURR_DC
+	assert dmm.state.result_I == value
+
+def test_read_stream_reads_unknown_trigger_type():
+	relay = _FakeMeterRelay()
+	dmm = Keysight34400("fake-addr", log=make_log(), relay=relay)
+	dmm.get_measurement()
+	assert dmm.state.trigger_type is None
+	relay.queries.clear()
+
+	readings = list(dmm.read_stream(num_readings=5, validate_interval_s=None))
+	assert [r[1] for r in readings] == list(range(1, 6))
+	assert dmm.state.trigger_type == DigitalMultimeter.TRIG_CONT
+	# Continuously triggered, so no trigger or *ESR? polling per reading
+	assert relay.queries == ["TRIG:SOUR?", "TRIG:COUN?"] + ["DATA:LAST?"]*5
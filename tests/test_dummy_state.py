@@ -10,9 +10,11 @@ docs/dummy_and_state_review.md for the full writeup of each bug.
 import os
 import tempfile
 import pytest
+import numpy as np
 import pylogfile.base as plf
 
 from constellation.base import InstrumentState, IndexedList, Driver, CheckOnline
+from stardust.serializer import Serializable
 from constellation.relay import DirectSCPIRelay
 from constellation.instrument_control.oscilloscope.oscilloscope_ctg import Oscilloscope
 from constellation.instrument_control.oscilloscope.drivers.Rigol_DS1000Z_dvr import RigolDS1000Z
@@ -186,6 +188,33 @@ def test_dummy_waveform_reflects_channel_settings():
 	v_min, v_max = -v_span / 2, v_span / 2
 	assert all(v_min - 1e-9 <= v <= v_max + 1e-9 for v in wf["volt_V"])
 
+def test_dummy_waveform_memory_depth_and_quantization():
+	osc = make_dummy_osc()
+	osc.dummy_memory_depth = 250_000
+	osc.dummy_noise_V = 0
+	osc.set_dummy_signal(1, shape="square", freq_Hz=100, ampl_V=1.0)
+	osc.set_div_volt(1, 0.1) # +/-0.4 V window, the 1 V square wave clips on both rails
+
+	wf = osc.get_waveform(1)
+	assert wf.npoints == 250_000
+	assert wf.codes.dtype == np.uint8
+	assert set(np.unique(wf.codes)) <= {0, 255}
+	assert np.isclose(wf["volt_V"].max(), 0.4) and np.isclose(wf["volt_V"].min(), -0.4)
+	assert np.isclose(wf["time_s"][-1] - wf["time_s"][0], osc.state.ndiv_horiz * osc.state.div_time)
+
+def test_dummy_waveform_cached_until_settings_change():
+	osc = make_dummy_osc()
+
+	wf1 = osc.get_waveform(1)
+	assert osc.get_waveform(1) is wf1
+
+	osc.set_div_time(1e-3)
+	wf2 = osc.get_waveform(1)
+	assert wf2 is not wf1
+
+	osc.dummy_fresh_captures = True
+	assert osc.get_waveform(1) is not wf2
+
 # ---------------------------------------------------------------------------
 # Mutable default argument bug
 # ---------------------------------------------------------------------------
@@ -295,12 +324,6 @@ def test_dump_state_preserves_channel_colors(tmp_path):
 	assert osc2.state.channel_colors == osc.state.channel_colors
 	assert len(osc2.state.channel_colors) == 4
 
-@pytest.mark.xfail(strict=True, reason=(
-	"BUG: Driver.state_to_dict()'s `include_data` parameter is accepted but never referenced in "
-	"the function body - self.data (DataEntry values) is never included in the output regardless "
-	"of the flag, contradicting the docstring ('Optional argument to include instrument data "
-	"state as well')."
-))
 def test_state_to_dict_include_data_flag_has_effect():
 	osc = make_dummy_osc()
 	osc.data["some_measurement"] = "placeholder-value"
@@ -310,3 +333,122 @@ def test_state_to_dict_include_data_flag_has_effect():
 
 	assert "data" not in without_data
 	assert with_data.get("data") == {"some_measurement": "placeholder-value"}
+
+def _channel_state_data(state_dict, channel):
+	return state_dict["state"]["state_data"]["channels"]["state_data"]["index_data"][f"idx-{channel}"]["state_data"]
+
+def test_poll_state_excludes_is_data_params():
+	osc = make_dummy_osc()
+	osc.get_waveform(1)
+
+	settings_only = osc.state_to_dict()
+	full = osc.state_to_dict(include_data=True)
+
+	assert "waveform" not in _channel_state_data(settings_only, 1)
+	assert "div_volt" in _channel_state_data(settings_only, 1)
+	assert "waveform" in _channel_state_data(full, 1)
+
+	# Live state is untouched by a settings-only serialization
+	assert len(osc.state.channels[1].waveform["volt_V"]) > 0
+
+def test_settings_only_state_deserializes_with_data_params_as_none():
+	osc = make_dummy_osc()
+	osc.get_waveform(1)
+
+	osc2 = make_dummy_osc()
+	osc2.load_state_dict(osc.state_to_dict())
+
+	assert osc2.state.channels[1].waveform is None
+	assert osc2.state.channels[1].div_volt == osc.state.channels[1].div_volt
+
+def test_data_manifest_and_chunks():
+	osc = make_dummy_osc()
+	osc.get_waveform(2)
+
+	manifest = osc.get_data_manifest()
+	wf_entry = [m for m in manifest if m["params"] == ["channels", "waveform"] and m["indices"][0] == 2][0]
+	npoints = len(osc.state.channels[2].waveform["volt_V"])
+	assert wf_entry["length"] == npoints
+
+	chunk = osc.get_data_chunk(["channels", "waveform"], indices=[2, None], offset=10, count=20)
+	assert chunk["count"] == 20
+	assert chunk["length"] == npoints
+	value = Serializable.deserialize(chunk["value"])
+	assert len(value["volt_V"]) == 20
+	assert value["volt_V"][0] == osc.state.channels[2].waveform["volt_V"][10]
+
+# ---------------------------------------------------------------------------
+# Versioned state / deltas
+# ---------------------------------------------------------------------------
+
+def test_state_delta_reports_only_changed_params():
+	from constellation.base import current_state_version
+	osc = make_dummy_osc()
+
+	v0 = current_state_version()
+	assert osc.state.state_delta(v0)["changes"] == []
+
+	osc.set_div_volt(2, 0.5)
+	osc.set_div_volt(2, 0.5) # Same value, no new version
+	delta = osc.state.state_delta(v0)
+
+	assert len(delta["changes"]) == 1
+	change = delta["changes"][0]
+	assert change["params"] == ["channels", "div_volt"]
+	assert change["indices"] == [2, None]
+	assert change["value"] == 0.5
+	assert delta["version"] >= osc.state.latest_version()
+
+def test_state_delta_skips_data_unless_requested():
+	from constellation.base import current_state_version
+	osc = make_dummy_osc()
+
+	v0 = current_state_version()
+	osc.get_waveform(1)
+
+	assert osc.state.state_delta(v0)["changes"] == []
+	with_data = osc.state.state_delta(v0, include_data=True)["changes"]
+	assert len(with_data) > 0
+	assert all(c["params"] == ["channels", "waveform"] for c in with_data)
+
+def test_state_mirror_applies_deltas_copy_on_write():
+	from constellation.base import StateMirror
+	osc = make_dummy_osc()
+
+	mirror = StateMirror()
+	assert mirror.update(osc.state_to_dict())
+	first = mirror.state
+
+	# Nothing changed - same object is kept
+	assert mirror.update(osc.state_delta_dict(mirror.version))
+	assert mirror.state is first
+
+	osc.set_div_time(1e-3)
+	osc.set_offset_volt(3, 0.25)
+	assert mirror.update(osc.state_delta_dict(mirror.version))
+
+	assert mirror.state is not first
+	assert mirror.state.div_time == 1e-3
+	assert mirror.state.channels[3].offset_volt == 0.25
+	assert first.div_time != 1e-3
+
+	# A delta that doesn't follow on from the mirror's version is refused
+	stale = osc.state_delta_dict(0)
+	stale["__state_delta__"]["base_version"] = -1
+	assert not mirror.update(stale)
+
+def test_apply_delta_replaces_indexed_list_items():
+	from constellation.base import current_state_version
+	osc = make_dummy_osc()
+
+	v0 = current_state_version()
+	replacement = type(osc.state.channels[1])(log=make_log())
+	replacement.div_volt = 7.0
+	osc.state.channels.set_idx_val(1, replacement)
+
+	osc2 = make_dummy_osc()
+	osc2.load_state_dict(osc.state_to_dict())
+	osc2.state.channels[1].div_volt = 1.0
+
+	assert osc2.state.apply_delta(osc.state.state_delta(v0))
+	assert osc2.state.channels[1].div_volt == 7.0
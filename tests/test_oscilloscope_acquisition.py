@@ -0,0 +1,71 @@
+""" Tests for the continuous triggered-acquisition AcquisitionEngine. """
+
+import time
+import pytest
+import pylogfile.base as plf
+
+from constellation.relay import DirectSCPIRelay
+from constellation.instrument_control.oscilloscope.drivers.Rigol_DS1000Z_dvr import RigolDS1000Z
+from constellation.instrument_control.oscilloscope.oscilloscope_acquisition import AcquisitionEngine
+
+def make_dummy_osc():
+	log = plf.LogPile()
+	log.terminal_level = plf.CRITICAL
+	return RigolDS1000Z("TCPIP0::10.0.0.9::INSTR", log=log, relay=DirectSCPIRelay(), dummy=True)
+
+def wait_for(condition, timeout_s:float=5.0):
+	t0 = time.time()
+	while not condition() and time.time() - t0 < timeout_s:
+		time.sleep(0.01)
+	return condition()
+
+def test_engine_delivers_captures_in_order():
+	osc = make_dummy_osc()
+
+	with AcquisitionEngine(osc, channels=[1, 2], queue_size=64, overflow=AcquisitionEngine.BLOCK) as engine:
+		captures = [engine.get(timeout=5) for _ in range(5)]
+
+	assert [c.seq for c in captures] == [0, 1, 2, 3, 4]
+	assert set(captures[0].waveforms.keys()) == {1, 2}
+	assert len(captures[0].waveforms[1]["volt_V"]) > 0
+
+	stats = engine.stats()
+	assert stats["captures"] >= 5
+	assert stats["dropped"] == 0
+	assert stats["captures_per_s"] > 0
+
+def test_drop_newest_keeps_first_captures():
+	osc = make_dummy_osc()
+	engine = AcquisitionEngine(osc, channels=[1], queue_size=2, overflow=AcquisitionEngine.DROP_NEWEST)
+	engine.start()
+	assert wait_for(lambda: engine.stats()["dropped"] > 0)
+	engine.stop()
+
+	assert [engine.get(timeout=1).seq, engine.get(timeout=1).seq] == [0, 1]
+
+def test_drop_oldest_keeps_latest_captures():
+	osc = make_dummy_osc()
+	engine = AcquisitionEngine(osc, channels=[1], queue_size=2, overflow=AcquisitionEngine.DROP_OLDEST)
+	engine.start()
+	assert wait_for(lambda: engine.stats()["dropped"] > 2)
+	engine.stop()
+
+	first = engine.get(timeout=1)
+	second = engine.get(timeout=1)
+	assert second.seq == first.seq + 1
+	assert second.seq == engine.stats()["captures"] - 1
+
+def test_trigger_timeout_rearms(monkeypatch):
+	osc = make_dummy_osc()
+	monkeypatch.setattr(osc, "is_acquisition_complete", lambda: False)
+
+	engine = AcquisitionEngine(osc, channels=[1], trigger_timeout_s=0.02, max_poll_s=0.005)
+	engine.start()
+	assert wait_for(lambda: engine.stats()["timeouts"] >= 2)
+	engine.stop()
+
+	assert engine.stats()["captures"] == 0
+
+def test_invalid_overflow_policy():
+	with pytest.raises(ValueError):
+		AcquisitionEngine(make_dummy_osc(), overflow="nope")
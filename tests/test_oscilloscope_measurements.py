@@ -0,0 +1,142 @@
+""" Tests for batched measurement-table reads (get_all_measurements() and MeasurementSampler). """
+
+import time
+import numpy as np
+import pylogfile.base as plf
+
+from constellation.relay import CommandRelay
+from constellation.instrument_control.oscilloscope.oscilloscope_ctg import MeasurementsMixin
+from constellation.instrument_control.oscilloscope.drivers.Rigol_DS1000Z_dvr import RigolDS1000Z
+from constellation.instrument_control.oscilloscope.oscilloscope_acquisition import MeasurementSampler
+
+def make_log():
+	log = plf.LogPile()
+	log.terminal_level = plf.CRITICAL
+	return log
+
+class _FakeMeasRelay(CommandRelay):
+	""" Answers :MEASURE:STAT:ITEM? queries with a value derived from the statistic, item and
+	source, optionally refusing compound (semicolon-joined) queries. """
+
+	STAT_VALUES = {"CURR":1, "AVER":2, "MAX":3, "MIN":4, "DEV":5}
+	ITEM_VALUES = {"VMAX":10, "VMIN":20, "VAVG":30, "VPP":40, "FREQ":50}
+
+	def __init__(self, allow_compound=True):
+		super().__init__()
+		self.allow_compound = allow_compound
+		self.queries = []
+
+	def connect(self):
+		return True
+
+	def close(self):
+		pass
+
+	def write(self, cmd):
+		return True
+
+	def read(self):
+		return True, ""
+
+	@classmethod
+	def value_for(cls, stat, item, channel):
+		return channel*100 + cls.ITEM_VALUES[item] + cls.STAT_VALUES[stat]
+
+	def query(self, cmd):
+		self.queries.append(cmd)
+		if cmd.strip() == "*IDN?":
+			return True, "RIGOL TECHNOLOGIES,DS1054Z,FAKE,1.0"
+
+		parts = cmd.split(";")
+		if len(parts) > 1 and not self.allow_compound:
+			return True, "" # Like a scope that doesn't support compound queries
+
+		replies = []
+		for part in parts:
+			stat, item, src = part.split("? ")[1].split(",")
+			replies.append(str(self.value_for(stat, item, int(src[4:]))))
+		return True, ";".join(replies)
+
+def make_osc(relay):
+	osc = RigolDS1000Z("fake-addr", log=make_log(), relay=relay)
+	osc.add_measurement(1, MeasurementsMixin.MEAS_VPP)
+	osc.add_measurement(1, MeasurementsMixin.MEAS_FREQ)
+	osc.add_measurement(2, MeasurementsMixin.MEAS_VMAX)
+	return osc
+
+def test_get_all_measurements_uses_one_compound_query():
+	relay = _FakeMeasRelay()
+	osc = make_osc(relay)
+	relay.queries.clear()
+
+	result = osc.get_all_measurements([MeasurementsMixin.STAT_CURR, MeasurementsMixin.STAT_AVG])
+
+	assert len(relay.queries) == 1
+	assert len(result) == 6
+	assert result[(1, MeasurementsMixin.MEAS_VPP, MeasurementsMixin.STAT_AVG)] == _FakeMeasRelay.value_for("AVER", "VPP", 1)
+	assert result[(2, MeasurementsMixin.MEAS_VMAX, MeasurementsMixin.STAT_CURR)] == _FakeMeasRelay.value_for("CURR", "VMAX", 2)
+
+	# last_measured_value is updated from the first statistic
+	values = {(am.measurement_source, am.measurement_type):am.last_measured_value for am in osc.state.state_fragments["measurements"].active_measurements}
+	assert values[("chan1", MeasurementsMixin.MEAS_FREQ)] == _FakeMeasRelay.value_for("CURR", "FREQ", 1)
+
+def test_get_all_measurements_falls_back_to_single_queries():
+	relay = _FakeMeasRelay(allow_compound=False)
+	osc = make_osc(relay)
+	relay.queries.clear()
+
+	result = osc.get_all_measurements()
+
+	assert len(relay.queries) == 4 # Failed compound query, then one per measurement
+	assert len(result) == 3
+	assert result[(1, MeasurementsMixin.MEAS_VPP, MeasurementsMixin.STAT_CURR)] == _FakeMeasRelay.value_for("CURR", "VPP", 1)
+
+	# A single failure only affects that call - the next one tries batching again
+	relay.queries.clear()
+	osc.get_all_measurements()
+	assert len(relay.queries) == 4
+	assert osc.meas_batch_size == 20
+
+	# After repeated failures, reads go straight to single queries until the retry time
+	osc.get_all_measurements()
+	relay.queries.clear()
+	osc.get_all_measurements()
+	assert len(relay.queries) == 3
+
+	osc._meas_batch_t_fail -= osc.meas_batch_retry_s
+	relay.allow_compound = True
+	relay.queries.clear()
+	assert len(osc.get_all_measurements()) == 3
+	assert len(relay.queries) == 1
+	assert osc._meas_batch_failures == 0
+
+def test_get_measurement_uses_index_after_changes():
+	relay = _FakeMeasRelay()
+	osc = make_osc(relay)
+
+	assert osc.get_measurement(1, MeasurementsMixin.MEAS_VPP) == _FakeMeasRelay.value_for("CURR", "VPP", 1)
+
+	osc.clear_measurements()
+	assert osc.get_measurement(1, MeasurementsMixin.MEAS_VPP) is None
+
+	osc.add_measurement(3, MeasurementsMixin.MEAS_VMIN)
+	assert osc.get_measurement(3, MeasurementsMixin.MEAS_VMIN) == _FakeMeasRelay.value_for("CURR", "VMIN", 3)
+
+def test_measurement_sampler_fills_ring_buffer():
+	relay = _FakeMeasRelay()
+	osc = make_osc(relay)
+
+	sampler = MeasurementSampler(osc, interval_s=0.001, buffer_size=5)
+	with sampler:
+		t0 = time.time()
+		while len(relay.queries) < 20 and time.time() - t0 < 5:
+			time.sleep(0.005)
+
+	times, values = sampler.snapshot()
+	assert len(sampler) == 5
+	assert values.shape == (5, 3)
+	assert np.all(np.diff(times) >= 0)
+
+	col = sampler.keys.index((2, MeasurementsMixin.MEAS_VMAX, MeasurementsMixin.STAT_CURR))
+	assert np.all(values[:, col] == _FakeMeasRelay.value_for("CURR", "VMAX", 2))
+	assert sampler.latest()[sampler.keys[col]] == _FakeMeasRelay.value_for("CURR", "VMAX", 2)
@@ -0,0 +1,93 @@
+""" Tests for bulk power supply output measurement (get_all_measured_outputs()). """
+
+import pylogfile.base as plf
+
+from constellation.relay import CommandRelay, DirectSCPIRelay
+from constellation.instrument_control.power_supply.drivers.Rigol_DP832_dvr import RigolDP832
+
+def make_log():
+	log = plf.LogPile()
+	log.terminal_level = plf.CRITICAL
+	return log
+
+class _FakeDP832Relay(CommandRelay):
+	""" Answers :MEAS:ALL? per channel (and as a compound query) with canned V,I,P values. """
+
+	def __init__(self):
+		super().__init__()
+		self.outputs = {1:(5.0, 0.1), 2:(12.0, 0.25), 3:(3.3, 0.05)}
+		self.queries = []
+
+	def connect(self):
+		return True
+
+	def close(self):
+		pass
+
+	def write(self, cmd):
+		return True
+
+	def read(self):
+		return True, ""
+
+	def _meas_all(self, cmd):
+		v, i = self.outputs[int(cmd.split("CH")[1])]
+		return f"{v:.3f},{i:.4f},{v*i:.3f}"
+
+	def query(self, cmd):
+		self.queries.append(cmd)
+		if cmd == "*IDN?":
+			return True, "RIGOL TECHNOLOGIES,DP832,FAKE,1.0"
+		if cmd.startswith(":MEAS:ALL?"):
+			return True, ";".join(self._meas_all(c) for c in cmd.split(";"))
+		return True, "0"
+
+def test_refresh_data_is_one_query_per_channel():
+	relay = _FakeDP832Relay()
+	ps = RigolDP832("fake-addr", log=make_log(), relay=relay)
+	relay.queries.clear()
+
+	ps.refresh_data()
+
+	assert relay.queries == [":MEAS:ALL? CH1", ":MEAS:ALL? CH2", ":MEAS:ALL? CH3"]
+	for ch, (v, i) in relay.outputs.items():
+		assert ps.state.channels[ch].voltage_meas == v
+		assert ps.state.channels[ch].current_meas == i
+
+	assert ps.get_measured_output(2) == (12.0, 0.25)
+
+def test_compound_measure_query():
+	relay = _FakeDP832Relay()
+	ps = RigolDP832("fake-addr", log=make_log(), relay=relay)
+	ps.compound_measure_queries = True
+	relay.queries.clear()
+
+	meas = ps.get_all_measured_outputs()
+
+	assert meas == relay.outputs
+	assert len(relay.queries) == 1
+	assert ps.state.channels[3].voltage_meas == 3.3
+
+def test_dummy_measures_every_channel():
+	ps = RigolDP832("TCPIP0::10.0.0.10::INSTR", log=make_log(), relay=DirectSCPIRelay(), dummy=True)
+
+	meas = ps.get_all_measured_outputs()
+
+	assert sorted(meas.keys()) == [1, 2, 3]
+	for ch, (v, i) in meas.items():
+		assert ps.state.channels[ch].voltage_meas == v
+
+def test_compound_measure_falls_back_on_short_reply():
+	relay = _FakeDP832Relay()
+	ps = RigolDP832("fake-addr", log=make_log(), relay=relay)
+	ps.compound_measure_queries = True
+
+	# Firmware answers only the first query of the compound
+	orig = relay.query
+	relay.query = lambda cmd: orig(cmd.split(";")[0])
+	relay.queries.clear()
+
+	meas = ps.get_all_measured_outputs()
+
+	assert meas == relay.outputs
+	assert relay.queries == [":MEAS:ALL? CH1", ":MEAS:ALL? CH1", ":MEAS:ALL? CH2", ":MEAS:ALL? CH3"]
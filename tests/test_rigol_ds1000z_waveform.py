@@ -14,10 +14,13 @@ Covers two things:
     opt-out (full_memory=False) for compatibility/quick-live-look use cases.
 """
 
+import numpy as np
 import pylogfile.base as plf
 
 from constellation.relay import CommandRelay
 from constellation.instrument_control.oscilloscope.drivers.Rigol_DS1000Z_dvr import RigolDS1000Z
+import constellation.instrument_control.oscilloscope.drivers.Rigol_DS1000Z_dvr as rigol_mod
+from constellation.instrument_control.oscilloscope.oscilloscope_ctg import OscilloscopeWaveform
 
 def make_log():
 	log = plf.LogPile()
@@ -152,7 +155,8 @@ def test_legacy_ascii_handles_trailing_comma_before_newline():
 
 	wf = osc.get_waveform(1, binary=False, full_memory=False)
 
-	assert wf["volt_V"] == [1.0, 2.0, 3.0]
+	# OscilloscopeWaveform holds NumPy arrays - to_dict() gives the old list format
+	assert wf.to_dict()["volt_V"] == [1.0, 2.0, 3.0]
 
 def test_legacy_ascii_handles_clean_reply_without_trailing_comma():
 	relay = _FakeRelay(total_points=3, chunk_size=10)
@@ -161,7 +165,8 @@ def test_legacy_ascii_handles_clean_reply_without_trailing_comma():
 
 	wf = osc.get_waveform(1, binary=False, full_memory=False)
 
-	assert wf["volt_V"] == [1.0, 2.0, 3.0]
+	# OscilloscopeWaveform holds NumPy arrays - to_dict() gives the old list format
+	assert wf.to_dict()["volt_V"] == [1.0, 2.0, 3.0]
 
 def test_legacy_mode_does_not_touch_run_stop_state():
 	osc = make_osc(total_points=3, chunk_size=10, trig_status="RUN")
@@ -230,7 +235,7 @@ def test_full_memory_resumes_acquisition_even_if_read_fails():
 
 	wf = osc.get_waveform(1)
 
-	assert wf["volt_V"] == []
+	assert wf.to_dict()["volt_V"] == []
 	assert ":RUN" in osc.relay.write_log
 	assert osc.relay.trig_status == "RUN"
 
@@ -272,6 +277,220 @@ def test_never_requests_a_stop_point_beyond_total_points():
 		if cmd.startswith(":WAV:STOP "):
 			assert int(cmd.split(" ")[1]) <= 10
 
+def test_binary_waveform_keeps_raw_codes_and_scales_lazily():
+	""" BYTE transfers are stored as uint8 codes plus the preamble scale - volts and time are
+	computed vectorized on access, not one Python float per point. """
+	osc = make_osc(total_points=10, chunk_size=4)
+
+	wf = osc.get_waveform(1)
+
+	assert isinstance(wf, OscilloscopeWaveform)
+	assert wf.codes.dtype == np.uint8
+	assert wf.npoints == 10
+	# Preamble: yincrement 0.04, yorigin 127, xincrement 1us, xorigin 0
+	assert np.allclose(wf["volt_V"], [((127 + i % 5) - 127) * 0.04 for i in range(10)])
+	assert np.allclose(wf["time_s"], np.arange(10) * 1e-6)
+	assert wf.time_axis() == (0.0, 1e-6, 10)
+	assert wf["channel"] == 1
+	assert set(wf.keys()) == {"time_s", "volt_V", "channel"}
+
+def test_waveform_to_dict_is_json_friendly():
+	import json
+
+	osc = make_osc(total_points=10, chunk_size=4)
+	wf = osc.get_waveform(1)
+
+	out = json.loads(json.dumps({"waveform": wf.to_dict()}))["waveform"]
+	assert out["channel"] == 1
+	assert np.allclose(out["volt_V"], wf["volt_V"])
+	assert np.allclose(out["time_s"], wf["time_s"])
+
+def test_waveform_roundtrips_through_state_codec_and_data_chunks():
+	from constellation.state_codec import encode_state, decode_state
+	from stardust.serializer import Serializable
+
+	osc = make_osc(total_points=10, chunk_size=4)
+	wf = osc.get_waveform(2)
+
+	out = decode_state(encode_state(wf))
+	assert out == wf
+	assert out.codes.dtype == np.uint8
+
+	chunk = osc.get_data_chunk(["channels", "waveform"], indices=[2], offset=2, count=3)
+	assert chunk["length"] == 10
+	assert np.allclose(Serializable.deserialize(chunk["value"])["volt_V"], wf["volt_V"][2:5])
+
+def test_chunk_size_adapts_to_link_throughput():
+	""" Chunks are sized to take ~_WAV_TARGET_CHUNK_S at the measured throughput, never beyond
+	_WAV_MAX_CHUNK_POINTS or below _WAV_MIN_CHUNK_POINTS. """
+	cap = rigol_mod._WAV_MAX_CHUNK_POINTS[True]
+
+	assert rigol_mod._next_chunk_points(cap, 0.01, cap) == cap  # fast link: stay at the cap
+	assert rigol_mod._next_chunk_points(100000, 1.0, cap) == int(100000 * rigol_mod._WAV_TARGET_CHUNK_S)
+	assert rigol_mod._next_chunk_points(10, 10.0, cap) == rigol_mod._WAV_MIN_CHUNK_POINTS
+
+def test_slow_link_requests_smaller_chunks(monkeypatch):
+	""" With every query taking 1 s, the second :WAV:STOP must request a smaller range than the
+	first (full cap) one. """
+	clock = {"t": 0.0}
+	def _perf_counter():
+		clock["t"] += 1.0
+		return clock["t"]
+	monkeypatch.setattr(rigol_mod.time, "perf_counter", _perf_counter)
+
+	osc = make_osc(total_points=600000, chunk_size=300000, trig_status="STOP")
+	wf = osc.get_waveform(1)
+
+	ranges = []
+	for cmd in osc.relay.write_log:
+		if cmd.startswith(":WAV:STAR "):
+			start = int(cmd.split(" ")[1])
+		elif cmd.startswith(":WAV:STOP "):
+			ranges.append(int(cmd.split(" ")[1]) - start + 1)
+	data_ranges = ranges[1:]  # first STAR/STOP pair is the preamble range
+	assert data_ranges[0] == rigol_mod._WAV_MAX_CHUNK_POINTS[True]
+	assert data_ranges[1] < data_ranges[0]
+	assert wf.npoints == 600000
+
+def test_ascii_chunk_length_counts_values_without_parsing():
+	assert rigol_mod._ascii_chunk_length("#900000010" + "0" + "1.0,2.0,3.0,\n") == 3
+	assert rigol_mod._ascii_chunk_length("#900000010" + "0" + "1.0,2.0,3.0\n") == 3
+	assert rigol_mod._ascii_chunk_length("#900000000" + "\n") == 0
+
+# ---------------------------------------------------------------------------
+# Acquisition cache: skip re-reading an unchanged (stopped) acquisition
+# ---------------------------------------------------------------------------
+
+class _QueryCountingRelay(_FakeRelay):
+
+	def __init__(self, **kwargs):
+		super().__init__(**kwargs)
+		self.queries = []
+
+	def query(self, cmd):
+		self.queries.append(cmd.strip())
+		return super().query(cmd)
+
+	def query_binary(self, cmd, datatype='B'):
+		self.queries.append(cmd.strip())
+		return super().query_binary(cmd, datatype)
+
+def test_stopped_acquisition_is_not_transferred_twice():
+	relay = _QueryCountingRelay(total_points=10, chunk_size=4, trig_status="STOP")
+	osc = RigolDS1000Z("fake-addr", log=make_log(), relay=relay)
+
+	first = osc.get_waveform(1)
+	n_queries = len(relay.queries)
+	second = osc.get_waveform(1)
+
+	assert second is first
+	assert len(relay.queries) == n_queries  # no status, depth, preamble or data queries
+
+def test_new_acquisition_invalidates_cached_data_but_not_preamble():
+	relay = _QueryCountingRelay(total_points=10, chunk_size=4, trig_status="STOP")
+	osc = RigolDS1000Z("fake-addr", log=make_log(), relay=relay)
+
+	osc.get_waveform(1)
+	osc.do_single_trigger()
+	relay.queries.clear()
+	osc.get_waveform(1)
+
+	assert ":WAV:DATA?" in relay.queries
+	assert ":WAV:PRE?" not in relay.queries
+	assert ":ACQuire:MDEPth?" not in relay.queries
+
+def test_settings_change_invalidates_memory_depth_and_preamble():
+	relay = _QueryCountingRelay(total_points=10, chunk_size=4, trig_status="STOP")
+	osc = RigolDS1000Z("fake-addr", log=make_log(), relay=relay)
+
+	osc.get_waveform(1)
+	osc.set_div_time(1e-3)
+	relay.queries.clear()
+	osc.get_waveform(1)
+
+	assert ":WAV:PRE?" in relay.queries
+	assert ":ACQuire:MDEPth?" in relay.queries
+	assert ":WAV:DATA?" in relay.queries
+
+def test_running_acquisition_is_never_served_from_cache():
+	osc = make_osc(total_points=10, chunk_size=4, trig_status="RUN")
+
+	first = osc.get_waveform(1)
+	second = osc.get_waveform(1)
+
+	assert second is not first
+	assert osc.relay.write_log.count(":STOP") == 2
+
+def test_disabled_acquisition_cache_always_rereads():
+	relay = _QueryCountingRelay(total_points=10, chunk_size=4, trig_status="STOP")
+	osc = RigolDS1000Z("fake-addr", log=make_log(), relay=relay)
+	osc.acquisition_cache.enabled = False
+
+	osc.get_waveform(1)
+	relay.queries.clear()
+	osc.get_waveform(1)
+
+	assert ":TRIGger:STATus?" in relay.queries
+	assert ":WAV:PRE?" in relay.queries
+
+# ---------------------------------------------------------------------------
+# iter_waveform_chunks(): streaming, one decoded block at a time
+# ---------------------------------------------------------------------------
+
+def test_iter_waveform_chunks_yields_each_block_with_its_offset():
+	osc = make_osc(total_points=10, chunk_size=4, trig_status="STOP")
+
+	axis = {}
+	chunks = list(osc.iter_waveform_chunks(1, axis_out=axis))
+
+	assert [offset for offset, _ in chunks] == [0, 4, 8]
+	assert [len(c) for _, c in chunks] == [4, 4, 2]
+	assert axis["npoints"] == 10 and axis["x_increment"] == 1e-6
+
+	volts = np.concatenate([c for _, c in chunks])
+	assert np.allclose(volts, osc.get_waveform(1)["volt_V"])
+
+def test_iter_waveform_chunks_raw_codes():
+	osc = make_osc(total_points=10, chunk_size=4, trig_status="STOP")
+
+	chunks = list(osc.iter_waveform_chunks(1, raw=True))
+
+	assert all(c.dtype == np.uint8 for _, c in chunks)
+
+def test_closing_iterator_early_still_resumes_acquisition():
+	osc = make_osc(total_points=10, chunk_size=4, trig_status="RUN")
+
+	it = osc.iter_waveform_chunks(1)
+	next(it)
+	assert osc.relay.trig_status == "STOP"
+	it.close()
+
+	assert osc.relay.trig_status == "RUN"
+
+def test_iter_waveform_chunks_dummy_falls_back_to_get_waveform():
+	from constellation.relay import DirectSCPIRelay
+	osc = RigolDS1000Z("fake-addr", log=make_log(), relay=DirectSCPIRelay(), dummy=True)
+
+	axis = {}
+	chunks = list(osc.iter_waveform_chunks(1, axis_out=axis))
+
+	assert len(chunks) == 1 and chunks[0][0] == 0
+	assert axis["npoints"] == len(chunks[0][1])
+
+def test_default_iter_waveform_chunks_handles_index_based_dicts():
+	""" Drivers without a timebase (eg. DS1000E) return 'time_index' instead of 'time_s' - the
+	default streaming path must still yield the record. """
+	from constellation.instrument_control.oscilloscope.oscilloscope_ctg import Oscilloscope
+	osc = make_osc(total_points=10, chunk_size=4)
+	osc.get_waveform = lambda channel, **kwargs: {"time_index":np.arange(600.0), "volt_V":[0.5]*600, "channel":channel}
+
+	axis = {}
+	chunks = list(Oscilloscope.iter_waveform_chunks(osc, 1, axis_out=axis))
+
+	assert len(chunks) == 1 and chunks[0][0] == 0
+	assert np.allclose(chunks[0][1], 0.5) and len(chunks[0][1]) == 600
+	assert axis["npoints"] == 600 and axis["x_increment"] == 1.0
+
 # ---------------------------------------------------------------------------
 # get_all_waveforms() batching (stop/resume once, not once per channel)
 # ---------------------------------------------------------------------------
@@ -317,3 +536,105 @@ def test_direct_scpi_relay_sets_an_explicit_timeout(monkeypatch):
 
 	assert relay.connect() is True
 	assert fake_inst.timeout == 4242
+
+# ---------------------------------------------------------------------------
+# Segmented memory (waveform record/playback)
+# ---------------------------------------------------------------------------
+
+class _SegmentedRelay(_FakeRelay):
+	""" Adds the :FUNCtion:WRECord/:WREPlay subsystem. Each recorded frame's codes are offset
+	by its frame number, so frames can be told apart. Recording finishes after `record_polls`
+	status queries. """
+
+	def __init__(self, num_frames=5, record_polls=2, **kwargs):
+		super().__init__(**kwargs)
+		self.num_frames = num_frames
+		self.record_polls = record_polls
+		self.recording = False
+		self.current_frame = 1
+
+	def write(self, cmd):
+		if cmd.startswith(":FUNCtion:WRECord:FEND "):
+			self.num_frames = int(cmd.split(" ")[1])
+		elif cmd == ":FUNCtion:WRECord:OPERate RUN":
+			self.recording = True
+			self._polls_remaining = self.record_polls
+		elif cmd.startswith(":FUNCtion:WREPlay:FCURrent "):
+			self.current_frame = int(cmd.split(" ")[1])
+		return super().write(cmd)
+
+	def query(self, cmd):
+		c = cmd.strip()
+		if c == ":FUNCtion:WRECord:FEND?":
+			return True, str(self.num_frames)
+		if c == ":FUNCtion:WRECord:FINTerval?":
+			return True, "1e-3"
+		if c == ":FUNCtion:WRECord:OPERate?":
+			if self.recording:
+				self._polls_remaining -= 1
+				if self._polls_remaining <= 0:
+					self.recording = False
+			return True, "RUN" if self.recording else "STOP"
+		return super().query(cmd)
+
+	def query_binary(self, cmd, datatype='B'):
+		ok, codes = super().query_binary(cmd, datatype)
+		if ok:
+			codes = [c + 10*self.current_frame for c in codes]
+		return ok, codes
+
+def test_segmented_acquisition_downloads_all_frames():
+	relay = _SegmentedRelay(total_points=1200, chunk_size=250_000)
+	osc = RigolDS1000Z("fake-addr", log=make_log(), relay=relay)
+
+	osc.set_segment_count(4)
+	assert osc.state.segment_count == 4
+	osc.arm_segmented_acquisition()
+	assert relay.recording
+
+	seg = osc.get_segmented_waveforms(1)
+
+	assert seg.codes.shape == (4, 1200)
+	assert seg.codes.dtype == np.uint8
+	assert list(seg.frame_numbers) == [1, 2, 3, 4]
+	assert np.allclose(seg.frame_times, [0, 1e-3, 2e-3, 3e-3])
+	# Frame i's codes are offset by 10*i
+	assert np.array_equal(seg.codes[2] - seg.codes[0], np.full(1200, 20))
+
+	frame = seg.frame(1)
+	assert isinstance(frame, OscilloscopeWaveform)
+	assert np.allclose(frame["volt_V"], seg.volt_V[1])
+
+	assert ":FUNCtion:WRECord:ENABle ON" in relay.write_log
+
+def test_segmented_acquisition_rejects_short_frame():
+	relay = _SegmentedRelay(total_points=1200, chunk_size=250_000)
+	orig = relay.query_binary
+	frame3_reads = []
+	def _query_binary(cmd, datatype='B'):
+		ok, codes = orig(cmd, datatype)
+		if relay.current_frame != 3:
+			return ok, codes
+		frame3_reads.append(cmd)
+		return ok, (codes[:1000] if len(frame3_reads) == 1 else []) # Frame 3 ends early
+	relay.query_binary = _query_binary
+	osc = RigolDS1000Z("fake-addr", log=make_log(), relay=relay)
+
+	osc.set_segment_count(4)
+	osc.arm_segmented_acquisition()
+
+	# No row is left partly filled
+	assert osc.get_segmented_waveforms(1) is None
+
+def test_segmented_acquisition_dummy_generates_frames():
+	from constellation.relay import DirectSCPIRelay
+	osc = RigolDS1000Z("fake-addr", log=make_log(), relay=DirectSCPIRelay(), dummy=True)
+	osc.dummy_jitter_s = 1e-4
+
+	osc.set_segment_count(3)
+	osc.arm_segmented_acquisition()
+	seg = osc.get_segmented_waveforms(2)
+
+	assert seg.num_frames == 3
+	assert seg.npoints == osc.dummy_memory_depth
+	assert not np.array_equal(seg.codes[0], seg.codes[1]) # fresh jitter/noise per frame
@@ -0,0 +1,115 @@
+""" Tests for spectrum analyzer trace reads (SiglentSSA3000X block transfer and frequency axis). """
+
+import numpy as np
+import pylogfile.base as plf
+
+from constellation.relay import CommandRelay
+from constellation.instrument_control.spectrum_analyzer.drivers.Siglent_SSA3000X_dvr import SiglentSSA3000X
+
+NPOINTS = 751
+
+def make_log():
+	log = plf.LogPile()
+	log.terminal_level = plf.CRITICAL
+	return log
+
+def trace_values(trace):
+	return -90.0 + 0.125*np.arange(NPOINTS) + trace
+
+class _FakeSSARelay(CommandRelay):
+	""" Answers SSA3000X frequency and trace queries, as a binary block or ASCII depending on
+	the last FORMAT:TRACE:DATA command. """
+
+	def __init__(self, binary=True):
+		super().__init__()
+		self.binary = binary
+		self.format = "ASCII"
+		self.settings = {"SENS:FREQ:STAR":"1000000", "SENS:FREQ:STOP":"751000000"}
+		self.queries = []
+		self.writes = []
+
+	def connect(self):
+		return True
+
+	def close(self):
+		pass
+
+	def write(self, cmd):
+		self.writes.append(cmd)
+		name, _, value = cmd.partition(" ")
+		if name == "FORMAT:TRACE:DATA":
+			self.format = value
+		elif name in self.settings:
+			self.settings[name] = value.split(" ")[0]
+		return True
+
+	def read(self):
+		return True, ""
+
+	def query(self, cmd):
+		self.queries.append(cmd)
+		if cmd == "*IDN?":
+			return True, "Siglent Technologies,SSA3021X,FAKE,1.0"
+		if cmd[:-1] in self.settings:
+			return True, self.settings[cmd[:-1]]
+		if cmd.startswith("TRACE:DATA? "):
+			return True, ",".join(f"{v:.6f}" for v in trace_values(int(cmd.split(" ")[1]))) + ","
+		return True, "0"
+
+	def query_block(self, cmd):
+		self.queries.append(cmd)
+		if not self.binary or self.format != "REAL":
+			return False, b""
+		return True, trace_values(int(cmd.split(" ")[1])).astype('<f4').tobytes()
+
+def test_binary_trace_read_is_one_block():
+	relay = _FakeSSARelay()
+	sa = SiglentSSA3000X("fake-addr", log=make_log(), relay=relay)
+
+	data = sa.get_trace_data(1)
+
+	assert np.allclose(data['y'], trace_values(1))
+	assert len(data['x']) == NPOINTS and data['x'][0] == 1e6 and data['x'][-1] == 751e6
+	assert relay.queries.count("TRACE:DATA? 1") == 1
+	assert np.array_equal(sa.state.traces[1].waveform['y'], data['y'])
+
+	# Format isn't re-sent and the frequency axis is reused
+	relay.queries.clear()
+	relay.writes.clear()
+	data2 = sa.get_trace_data(1)
+	assert relay.queries == ["TRACE:DATA? 1"] and relay.writes == []
+	assert data2['x'] is data['x']
+
+def test_freq_axis_invalidated_by_setter():
+	relay = _FakeSSARelay()
+	sa = SiglentSSA3000X("fake-addr", log=make_log(), relay=relay)
+
+	axis = sa.get_trace_data(1)['x']
+	sa.set_freq_end(376e6)
+	axis2 = sa.get_trace_data(1)['x']
+	assert axis2 is not axis
+	assert axis2[-1] == 376e6
+
+def test_ascii_fallback_when_block_read_fails():
+	relay = _FakeSSARelay(binary=False)
+	sa = SiglentSSA3000X("fake-addr", log=make_log(), relay=relay)
+
+	data = sa.get_trace_data(1)
+	assert np.allclose(data['y'], trace_values(1), atol=1e-6)
+
+	# One failure only affects that trace - binary is tried again next time
+	assert sa.binary_trace_supported is True
+	relay.binary = True
+	relay.queries.clear()
+	sa.get_trace_data(1)
+	assert relay.queries == ["TRACE:DATA? 1"]
+
+	# Repeated failures in a row turn binary off
+	relay.binary = False
+	for _ in range(sa.binary_trace_max_failures):
+		data = sa.get_trace_data(1)
+	assert sa.binary_trace_supported is False
+	assert np.allclose(data['y'], trace_values(1), atol=1e-6)
+	relay.queries.clear()
+	sa.get_trace_data(1)
+	assert relay.queries == ["TRACE:DATA? 1"] and relay.format == "ASCII" # No block read attempted
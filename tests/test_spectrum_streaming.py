@@ -0,0 +1,165 @@
+""" Tests for spectrum streaming (SpectrumStreamer), the dummy trace generator and the FSE trace read. """
+
+import time
+import numpy as np
+import pylogfile.base as plf
+
+from constellation.relay import CommandRelay, DirectSCPIRelay
+from constellation.instrument_control.spectrum_analyzer.spectrum_acquisition import SpectrumStreamer
+from constellation.instrument_control.spectrum_analyzer.drivers.Siglent_SSA3000X_dvr import SiglentSSA3000X
+from constellation.instrument_control.spectrum_analyzer.drivers.RohdeSchwarz_FSE_dvr import RohdeSchwarzFSE
+
+NPOINTS = 625
+
+def make_log():
+	log = plf.LogPile()
+	log.terminal_level = plf.CRITICAL
+	return log
+
+def make_dummy(**kwargs):
+	return SiglentSSA3000X("TCPIP0::10.0.0.7::INSTR", log=make_log(), relay=DirectSCPIRelay(), dummy=True, **kwargs)
+
+class _FakeFSERelay(CommandRelay):
+	""" Answers FSE frequency, *OPC? and trace queries. Each trace is a new ramp offset by the
+	number of triggers sent so far. """
+
+	def __init__(self):
+		super().__init__()
+		self.settings = {"SENS:FREQ:STAR":"1000000", "SENS:FREQ:STOP":"625000000", "INIT:CONT":"1"}
+		self.num_triggers = 0
+		self.block_failures = 0 # Number of trace block reads to fail
+		self.queries = []
+		self.writes = []
+
+	def connect(self):
+		return True
+
+	def close(self):
+		pass
+
+	def write(self, cmd):
+		self.writes.append(cmd)
+		if cmd == "INIT:IMM":
+			self.num_triggers += 1
+		name, _, value = cmd.partition(" ")
+		if name in self.settings:
+			self.settings[name] = {"ON":"1", "OFF":"0"}.get(value, value.split(" ")[0])
+		return True
+
+	def read(self):
+		return True, ""
+
+	def query(self, cmd):
+		self.queries.append(cmd)
+		if cmd == "*IDN?":
+			return True, "Rohde&Schwarz,FSE-3,FAKE,1.0"
+		if cmd == "*OPC?":
+			return True, "1"
+		if cmd[:-1] in self.settings:
+			return True, self.settings[cmd[:-1]]
+		return True, "0"
+
+	def query_block(self, cmd):
+		self.queries.append(cmd)
+		assert "FORMAT:DATA REAL,32" in self.writes
+		if self.block_failures > 0:
+			self.block_failures -= 1
+			return False, b""
+		y = -80.0 + 0.01*np.arange(NPOINTS) + self.num_triggers
+		return True, y.astype('<f4').tobytes()
+
+def test_dummy_trace_has_tones_over_noise_floor():
+	sa = make_dummy()
+	sa.dummy_noise_dB = 0
+
+	data = sa.get_trace_data(1)
+
+	assert len(data['y']) == sa.dummy_num_points
+	assert data['x'][0] == 1e6 and data['x'][-1] == 500e6
+	assert np.isclose(data['y'][np.argmin(np.abs(data['x']-100e6))], -30, atol=1)
+	assert np.isclose(np.median(data['y']), sa.dummy_noise_floor_dBm, atol=0.1)
+	assert np.array_equal(sa.state.traces[1].waveform['y'], data['y'])
+
+def test_streamer_holds_match_buffer_reductions():
+	sa = make_dummy()
+	streamer = SpectrumStreamer(sa, buffer_size=16)
+
+	for _ in range(40):
+		assert streamer.capture()
+
+	times, freqs, data = streamer.snapshot()
+	assert data.shape == (16, sa.dummy_num_points)
+	assert np.all(np.diff(times) >= 0)
+	assert np.array_equal(data[-1], streamer.latest()['y'])
+	assert freqs is sa.get_freq_axis(sa.dummy_num_points)
+
+	# Holds cover all 40 traces, so they bound the 16 still in the buffer
+	assert np.all(streamer.max_hold() >= data.max(axis=0))
+	assert np.all(streamer.min_hold() <= data.min(axis=0))
+	assert streamer.num_averaged() == 40
+
+	# Power average reads higher than the log average on noise
+	floor = np.abs(freqs-400e6) < 50e6
+	assert np.mean(streamer.average()[floor] - streamer.average(power=False)[floor]) > 0
+
+	streamer.reset_holds()
+	streamer.capture()
+	assert np.array_equal(streamer.max_hold(), streamer.latest()['y'])
+	assert np.array_equal(streamer.average(power=False), streamer.latest()['y'])
+
+def test_streamer_restarts_buffer_when_span_changes():
+	sa = make_dummy()
+	streamer = SpectrumStreamer(sa, buffer_size=8)
+	for _ in range(5):
+		streamer.capture()
+
+	sa.set_freq_end(250e6)
+	streamer.capture()
+
+	assert len(streamer) == 1
+	assert streamer.num_averaged() == 1
+	assert streamer.freqs[-1] == 250e6
+
+def test_streamer_triggers_each_sweep_on_fse():
+	relay = _FakeFSERelay()
+	sa = RohdeSchwarzFSE("fake-addr", log=make_log(), relay=relay)
+
+	with SpectrumStreamer(sa, buffer_size=4) as streamer:
+		deadline = time.time() + 5
+		while streamer.num_traces < 6 and time.time() < deadline:
+			time.sleep(0.01)
+	assert not streamer.running
+	assert "INIT:CONT OFF" in relay.writes
+
+	times, freqs, data = streamer.snapshot()
+	n = streamer.num_traces
+	assert data.shape == (4, NPOINTS) and len(freqs) == NPOINTS
+	# Every trace is a new sweep, oldest first
+	assert np.allclose(data[:, 0], -80.0 + np.arange(n-3, n+1))
+	assert np.allclose(streamer.max_hold()[0], -80.0 + n)
+	assert np.allclose(streamer.min_hold()[0], -79.0)
+	assert relay.writes.count("FORMAT:DATA REAL,32") == 1
+
+	stats = streamer.stats()
+	assert stats["traces"] == n and stats["errors"] == 0
+	assert stats["traces_per_s"] > 0
+
+def test_fse_retries_binary_after_a_failed_block_read():
+	relay = _FakeFSERelay()
+	sa = RohdeSchwarzFSE("fake-addr", log=make_log(), relay=relay)
+
+	# One failed read falls back to ASCII for that trace only
+	relay.block_failures = 1
+	assert len(sa.get_trace_data(1)['y']) == 1
+	assert sa.binary_trace_supported
+	assert len(sa.get_trace_data(1)['y']) == NPOINTS
+
+	# Repeated failures turn binary transfer off
+	relay.block_failures = sa.binary_trace_max_failures
+	for _ in range(sa.binary_trace_max_failures):
+		sa.get_trace_data(1)
+	assert not sa.binary_trace_supported
+	relay.queries.clear()
+	sa.get_trace_data(1)
+	assert relay.queries == ["TRACE:DATA? TRACE1"]
+	assert relay.writes[-1] == "FORMAT:DATA ASCII"
@@ -0,0 +1,84 @@
+""" Tests for constellation.state_codec and the Driver binary state encoding. """
+
+import numpy as np
+import pytest
+import pylogfile.base as plf
+
+from constellation.base import StateMirror, IndexedList
+from constellation.state_codec import encode_state, decode_state, pack_state_bytes, unpack_state_message, StateCodecError
+from constellation.relay import DirectSCPIRelay
+from constellation.instrument_control.oscilloscope.drivers.Rigol_DS1000Z_dvr import RigolDS1000Z
+
+def make_dummy_osc():
+	log = plf.LogPile()
+	log.terminal_level = plf.CRITICAL
+	return RigolDS1000Z("TCPIP0::10.0.0.9::INSTR", log=log, relay=DirectSCPIRelay(), dummy=True)
+
+def test_roundtrip_plain_values():
+	value = {"a":[1, 2.5, "x", None, True], 3:(1, 2), "c":complex(1, -2), "big":2**70, "floats":[0.25]*20, "np_scalar":np.float32(1.5)}
+	out = decode_state(encode_state(value))
+
+	assert out == value
+	assert type(out["np_scalar"]) is np.float32
+
+def test_ndarrays_are_raw_buffers():
+	arr = np.arange(1000, dtype=np.int16).reshape(10, 100)
+	data = encode_state({"arr":arr})
+
+	# Raw int16 buffer plus a small header - not a text/list encoding
+	assert len(data) < arr.nbytes + 128
+
+	out = decode_state(data)["arr"]
+	assert out.dtype == np.int16
+	assert out.shape == (10, 100)
+	assert np.array_equal(out, arr)
+	assert not out.flags.writeable # Zero-copy view
+
+	assert decode_state(data, copy_arrays=True)["arr"].flags.writeable
+
+def test_roundtrip_instrument_state():
+	osc = make_dummy_osc()
+	osc.set_div_volt(2, 0.2)
+	osc.get_waveform(1)
+
+	state = decode_state(encode_state(osc.state))
+
+	assert type(state) is type(osc.state)
+	assert state.channels[2].div_volt == 0.2
+	assert isinstance(state.channels, IndexedList)
+	assert np.allclose(state.channels[1].waveform["volt_V"], osc.state.channels[1].waveform["volt_V"])
+
+def test_bad_magic_raises():
+	with pytest.raises(StateCodecError):
+		decode_state(b"JUNKJUNKJUNK")
+
+def test_binary_poll_and_delta_feed_state_mirror():
+	osc = make_dummy_osc()
+	osc.state_encoding = "binary"
+
+	mirror = StateMirror()
+	assert mirror.update(osc.poll())
+	assert mirror.state.channels[1].waveform is None # Settings only
+
+	osc.set_div_time(2e-3)
+	message = osc.poll_delta(mirror.version)
+	assert "__state_bytes__" in message
+	assert mirror.update(message)
+	assert mirror.state.div_time == 2e-3
+
+def test_pack_unpack_message_passthrough():
+	assert unpack_state_message({"x":1}) == {"x":1}
+	assert unpack_state_message(pack_state_bytes(encode_state({"x":1}))) == {"x":1}
+
+def test_dump_restore_binary_state_file(tmp_path):
+	osc = make_dummy_osc()
+	osc.set_offset_volt(3, 0.75)
+	osc.get_waveform(3)
+
+	fn = str(tmp_path / "state.cstb")
+	assert osc.dump_state(fn, include_data=True)
+
+	osc2 = make_dummy_osc()
+	assert osc2.restore_state(fn)
+	assert osc2.state.channels[3].offset_volt == 0.75
+	assert np.allclose(osc2.state.channels[3].waveform["volt_V"], osc.state.channels[3].waveform["volt_V"])
@@ -0,0 +1,71 @@
+""" Tests for constellation.state_io and the dump_state()/restore_state() file formats. """
+
+import json
+import numpy as np
+import pytest
+import pylogfile.base as plf
+
+from constellation.state_io import load_state_file, state_format_for, npz_member_offsets, JSONStateFormat, HDFStateFormat
+from constellation.relay import DirectSCPIRelay
+from constellation.instrument_control.oscilloscope.drivers.Rigol_DS1000Z_dvr import RigolDS1000Z
+
+def make_dummy_osc():
+	log = plf.LogPile()
+	log.terminal_level = plf.CRITICAL
+	return RigolDS1000Z("TCPIP0::10.0.0.9::INSTR", log=log, relay=DirectSCPIRelay(), dummy=True)
+
+def test_format_chosen_by_extension():
+	assert isinstance(state_format_for("a/b.JSON"), JSONStateFormat)
+	assert isinstance(state_format_for("state.h5"), HDFStateFormat)
+	assert isinstance(state_format_for("state.unknown"), HDFStateFormat)
+
+# HDF round trips are covered (as known failures) in test_dummy_state.py
+@pytest.mark.parametrize("ext", [".json", ".cstb", ".npz"])
+def test_dump_restore_roundtrip(tmp_path, ext):
+	osc = make_dummy_osc()
+	osc.set_div_volt(2, 0.2)
+	osc.get_waveform(2)
+
+	fn = str(tmp_path / f"state{ext}")
+	assert osc.dump_state(fn, include_data=True)
+
+	osc2 = make_dummy_osc()
+	assert osc2.restore_state(fn)
+	assert type(osc2.state) is type(osc.state)
+	assert osc2.state.channels[2].div_volt == 0.2
+	assert np.allclose(osc2.state.channels[2].waveform["volt_V"], osc.state.channels[2].waveform["volt_V"])
+
+def test_json_is_compact_settings_only(tmp_path):
+	osc = make_dummy_osc()
+	osc.get_waveform(1)
+
+	fn = str(tmp_path / "state.json")
+	assert osc.dump_state(fn)
+
+	with open(fn) as f:
+		text = f.read()
+	assert ", " not in text and ": " not in text
+	assert "volt_V" not in text
+	assert "metadata" in json.loads(text)
+
+def test_npz_arrays_are_memory_mapped(tmp_path):
+	osc = make_dummy_osc()
+	n = 200000
+	osc.state.channels[1].waveform = {"time_s":np.linspace(0, 1, n), "volt_V":np.arange(n, dtype=np.float32), "channel":1}
+
+	fn = str(tmp_path / "state.npz")
+	assert osc.dump_state(fn, include_data=True)
+	assert {"state", "array_0", "array_1"} <= set(npz_member_offsets(fn))
+
+	state = load_state_file(fn)
+	volt = state.channels[1].waveform["volt_V"]
+	assert isinstance(volt, np.memmap)
+	assert volt.dtype == np.float32
+	assert np.array_equal(volt, np.arange(n, dtype=np.float32))
+
+	# Copy-on-write: editing the loaded state never touches the file
+	volt[0] = -1
+	assert load_state_file(fn).channels[1].waveform["volt_V"][0] == 0
+
+def test_restore_missing_file_returns_false(tmp_path):
+	assert not make_dummy_osc().restore_state(str(tmp_path / "missing.npz"))
@@ -0,0 +1,61 @@
+""" Tests for constellation.state_journal.StateJournal. """
+
+import numpy as np
+import pylogfile.base as plf
+
+from constellation.state_journal import StateJournal, KIND_KEYFRAME, KIND_DELTA
+from constellation.relay import DirectSCPIRelay
+from constellation.instrument_control.oscilloscope.drivers.Rigol_DS1000Z_dvr import RigolDS1000Z
+
+def make_dummy_osc():
+	log = plf.LogPile()
+	log.terminal_level = plf.CRITICAL
+	return RigolDS1000Z("TCPIP0::10.0.0.9::INSTR", log=log, relay=DirectSCPIRelay(), dummy=True)
+
+def test_journal_records_keyframes_and_deltas(tmp_path):
+	osc = make_dummy_osc()
+	fn = str(tmp_path / "journal.h5")
+
+	with StateJournal(fn, keyframe_interval=3) as journal:
+		for i in range(8):
+			osc.set_div_volt(1, 0.1*(i+1))
+			journal.record(osc, timestamp=100.0+i)
+		assert len(journal) == 8
+		assert journal._kinds == [KIND_KEYFRAME, KIND_DELTA, KIND_DELTA, KIND_DELTA, KIND_KEYFRAME, KIND_DELTA, KIND_DELTA, KIND_DELTA]
+
+	# Reopen read-only: every record reconstructs the value it was taken with
+	journal = StateJournal(fn, mode="r")
+	assert len(journal) == 8
+	for i in (7, 2, 0, 5, 6):
+		t, state = journal.read(i)
+		assert t == 100.0+i
+		assert np.isclose(state.channels[1].div_volt, 0.1*(i+1))
+	journal.close()
+
+def test_state_at_time(tmp_path):
+	osc = make_dummy_osc()
+
+	with StateJournal(str(tmp_path / "journal.h5")) as journal:
+		for i, tdiv in enumerate((1e-3, 2e-3, 5e-3)):
+			osc.set_div_time(tdiv)
+			journal.record(osc, timestamp=10.0*i)
+
+		assert journal.state_at(-1) is None
+		assert journal.state_at(0).div_time == 1e-3
+		assert journal.state_at(15).div_time == 2e-3
+		assert journal.state_at(1e9).div_time == 5e-3
+		assert journal.index_at(20) == 2
+
+def test_append_to_existing_journal(tmp_path):
+	osc = make_dummy_osc()
+	fn = str(tmp_path / "journal.h5")
+
+	with StateJournal(fn) as journal:
+		osc.set_offset_volt(2, 0.5)
+		journal.record(osc, timestamp=1.0)
+
+	with StateJournal(fn) as journal:
+		osc.set_offset_volt(2, -0.5)
+		assert journal.record(osc, timestamp=2.0) == 1
+		assert journal.read(0)[1].channels[2].offset_volt == 0.5
+		assert journal.read(1)[1].channels[2].offset_volt == -0.5
@@ -0,0 +1,115 @@
+""" Tests for VNA sweep export (Touchstone writer and SParameterArchive). """
+
+import os
+import tempfile
+import numpy as np
+import pytest
+import pylogfile.base as plf
+
+from constellation.instrument_control.vector_network_analyzer.vna_export import SParameterArchive, write_touchstone, sparam_matrix, TOUCHSTONE_DB
+
+def make_sweep(seed, npoints=401, f0=1e9, fe=3e9):
+	rng = np.random.default_rng(seed)
+	y = rng.normal(size=(4, npoints)) + 1j*rng.normal(size=(4, npoints))
+	return {'x': np.linspace(f0, fe, npoints), 'y': y, 'traces': ["S11", "S21", "S12", "S22"], 'x_units': 'Hz', 'y_units': 'Reflection, complex, unitless'}
+
+def test_touchstone_2port_column_order():
+	sweep = make_sweep(0, npoints=11)
+	with tempfile.TemporaryDirectory() as tmp:
+		fn = os.path.join(tmp, "dut.s2p")
+		write_touchstone(fn, sweep['x'], dict(zip(sweep['traces'], sweep['y'])), freq_unit="GHz", comments=["test"])
+
+		with open(fn) as fh:
+			lines = fh.read().splitlines()
+		assert lines[0] == "! test"
+		assert lines[1] == "# GHZ S RI R 50"
+
+		table = np.loadtxt(fn, comments=["!", "#"])
+		assert table.shape == (11, 9)
+		assert np.allclose(table[:, 0], sweep['x']/1e9)
+		# 2-port order is S11 S21 S12 S22
+		for col, row in enumerate([0, 1, 2, 3]):
+			assert np.allclose(table[:, 1+2*col] + 1j*table[:, 2+2*col], sweep['y'][row])
+
+def test_touchstone_db_and_sparam_matrix():
+	sweep = make_sweep(1, npoints=5)
+	matrix = sparam_matrix(dict(zip(sweep['traces'], sweep['y'])))
+	assert matrix.shape == (5, 2, 2)
+	assert np.array_equal(matrix[:, 1, 0], sweep['y'][1]) # S21
+
+	with tempfile.TemporaryDirectory() as tmp:
+		fn = os.path.join(tmp, "dut.s2p")
+		write_touchstone(fn, sweep['x'], matrix, data_format=TOUCHSTONE_DB)
+		table = np.loadtxt(fn, comments=["!", "#"])
+		assert np.allclose(table[:, 1], 20*np.log10(np.abs(sweep['y'][0])))
+		assert np.allclose(table[:, 2], np.angle(sweep['y'][0], deg=True))
+
+def test_archive_appends_and_reads_back():
+	with tempfile.TemporaryDirectory() as tmp:
+		fn = os.path.join(tmp, "sweeps.h5")
+
+		sweeps = [make_sweep(i) for i in range(30)]
+		sweeps[20] = make_sweep(20, f0=2e9) # Settings change part way through
+
+		with SParameterArchive(fn, chunk_sweeps=8) as archive:
+			archive.set_info(cal_notes="SOLT")
+			for sweep in sweeps[:25]:
+				archive.append(sweep)
+
+		# Reopen and keep appending - nothing is rewritten
+		with SParameterArchive(fn) as archive:
+			for sweep in sweeps[25:]:
+				archive.append(sweep)
+			assert len(archive) == 30
+
+		with SParameterArchive(fn, mode="r") as archive:
+			assert archive.info()["cal_notes"] == "SOLT"
+			assert archive.traces == ["S11", "S12", "S21", "S22"]
+
+			back = archive.read(20)
+			assert np.array_equal(back['x'], sweeps[20]['x'])
+			assert np.array_equal(back['y'][back['traces'].index("S21")], sweeps[20]['y'][1])
+			assert np.array_equal(archive.read(-1)['x'], sweeps[29]['x'])
+
+			s22 = archive.read_trace("S22")
+			assert s22.shape == (30, 401) and s22.dtype == np.complex128
+			assert np.array_equal(s22[7], sweeps[7]['y'][3])
+			assert np.array_equal(archive.read_trace("S11", sweeps=[9, 2])[0], sweeps[9]['y'][0])
+			assert len(archive.times()) == 30
+
+def test_archive_reads_refuse_bad_sweeps():
+	log = plf.LogPile()
+	log.terminal_level = plf.CRITICAL
+
+	with tempfile.TemporaryDirectory() as tmp:
+		fn = os.path.join(tmp, "sweeps.h5")
+
+		with SParameterArchive(fn, log=log) as archive:
+			archive.append(make_sweep(0))
+			assert archive.read_state(0) is None
+			with pytest.raises(IndexError):
+				archive.read_state(5)
+
+			# Failed write: the index has sweep 1, the file doesn't
+			def fail(batch):
+				raise OSError("disk full")
+			archive._write_batch = fail
+			archive.append(make_sweep(1))
+			with pytest.raises(RuntimeError):
+				archive.read(1)
+			with pytest.raises(RuntimeError):
+				archive.read_state(0)
+
+def test_archive_rejects_name_count_mismatch():
+	with tempfile.TemporaryDirectory() as tmp:
+		fn = os.path.join(tmp, "sweeps.h5")
+
+		with SParameterArchive(fn) as archive:
+			with pytest.raises(ValueError):
+				archive.append(make_sweep(0), names=["S11", "S21"])
+			assert len(archive) == 0
+
+			# Nothing was queued, so the writer is still usable
+			assert archive.append(make_sweep(1)) == 0
+			archive.flush()
+			assert np.array_equal(archive.read(0)['y'][0], make_sweep(1)['y'][0])
@@ -0,0 +1,219 @@
+""" Tests for the Rohde & Schwarz ZVA driver's bulk S-parameter reads (get_traces_data()). """
+
+import pytest
+import numpy as np
+import pylogfile.base as plf
+
+pytest.importorskip("hallett.core") # Required by vector_network_analyzer_ctg
+
+from constellation.relay import CommandRelay
+from constellation.instrument_control.vector_network_analyzer.vector_network_analyzer_ctg import BasicVectorNetworkAnalyzerCtg, VNATraceState, VNAChannelState
+from constellation.instrument_control.vector_network_analyzer.drivers.RohdeSchwarz_ZVA_dvr import RohdeSchwarzZVA
+
+NPOINTS = 201
+
+def make_log():
+	log = plf.LogPile()
+	log.terminal_level = plf.CRITICAL
+	return log
+
+def sparam(name:str) -> np.ndarray:
+	''' Distinct, recognizable complex data for each S-parameter. '''
+	k = int(name[1:])
+	return (k + np.arange(NPOINTS)) + 1j*(k - np.arange(NPOINTS))
+
+class _FakeZVARelay(CommandRelay):
+	""" Answers the sweep-setting, catalog and SDATA queries of a 2-port ZVA with one channel,
+	optionally refusing CALC:DATA:CALL? (like older firmware). """
+
+	def __init__(self, allow_call=True):
+		super().__init__()
+		self.allow_call = allow_call
+		self.catalog = ["S11", "S21", "S12", "S22"]
+		self.selected = None
+		self.settings = {"INIT1:CONT":"1", "SENS1:AVER":"0", "SENS1:AVER:COUN":"1", "SOUR1:POW1:LEV:IMM:AMPL":"0", "SENS1:FREQ:STAR":"1e9", "SENS1:FREQ:STOP":"3e9", "SENS1:SWEEP:POIN":str(NPOINTS)}
+		self.queries = []
+		self.writes = []
+
+	def connect(self):
+		return True
+
+	def close(self):
+		pass
+
+	def write(self, cmd):
+		self.writes.append(cmd)
+		if ":PAR:SEL " in cmd:
+			self.selected = cmd.split(" ")[-1]
+		name, _, value = cmd.partition(" ")
+		if name in self.settings:
+			self.settings[name] = {"ON":"1", "OFF":"0"}.get(value, value)
+		return True
+
+	def read(self):
+		return True, ""
+
+	def query(self, cmd):
+		self.queries.append(cmd)
+		if cmd == "*IDN?":
+			return True, "Rohde&Schwarz,ZVA24-4Port,FAKE,1.0"
+		if cmd == "CONF:CHAN:CAT?":
+			return True, "'1,Ch1'"
+		if cmd == "CALC1:PAR:CAT?":
+			return True, "'Trc1,S11,Trc2,S21,Trc3,S12,Trc4,S22'"
+		if cmd == "CALC1:FORM?":
+			return True, "MLOG"
+		if cmd == "CALC1:DATA:CALL:CAT?":
+			return True, "'" + ",".join(self.catalog) + "'"
+		if cmd == "*OPC?":
+			return True, "1"
+		if cmd[:-1] in self.settings:
+			return True, self.settings[cmd[:-1]]
+		return True, "0"
+
+	def query_binary_array(self, cmd, datatype='B'):
+		self.queries.append(cmd)
+		if cmd == "CALC1:DATA:CALL? SDATA":
+			if not self.allow_call:
+				return True, np.empty(0, dtype=np.float64)
+			data = np.concatenate([sparam(s) for s in self.catalog])
+		elif cmd == "CALC1:DATA? SDATA":
+			data = sparam({"Trc1":"S11", "Trc2":"S21", "Trc3":"S12", "Trc4":"S22"}[self.selected])
+		else:
+			return False, np.empty(0, dtype=np.float64)
+		return True, data.view(np.float64).copy()
+
+def make_vna(relay):
+	vna = RohdeSchwarzZVA("fake-addr", log=make_log(), relay=relay)
+	vna.state.channels[1] = VNAChannelState()
+	for i, meas in enumerate([BasicVectorNetworkAnalyzerCtg.MEAS_S11, BasicVectorNetworkAnalyzerCtg.MEAS_S21, BasicVectorNetworkAnalyzerCtg.MEAS_S12, BasicVectorNetworkAnalyzerCtg.MEAS_S22]):
+		vna.state.traces[i+1] = VNATraceState()
+		vna.state.traces[i+1].id_str = f"Trc{i+1}"
+		vna.state.traces[i+1].measurement = meas
+		vna.state.traces[i+1].channel = 1
+	return vna
+
+def test_get_traces_data_reads_all_sparameters_in_one_block():
+	relay = _FakeZVARelay()
+	vna = make_vna(relay)
+
+	data = vna.get_traces_data(["Trc2", "Trc1", "Trc4"])
+
+	assert data['y'].shape == (3, NPOINTS)
+	assert np.array_equal(data['y'][0], sparam("S21"))
+	assert np.array_equal(data['y'][1], sparam("S11"))
+	assert np.array_equal(data['y'][2], sparam("S22"))
+	assert np.allclose(data['x'], np.linspace(1e9, 3e9, NPOINTS))
+	assert relay.queries.count("CALC1:DATA:CALL? SDATA") == 1
+	assert "CALC1:DATA? SDATA" not in relay.queries
+
+	# Per-trace data is stored in the state too
+	assert np.array_equal(vna.state.traces[4].data['y'], sparam("S22"))
+
+	# Second read reuses the catalog and frequency axis - only the data block is queried
+	relay.queries.clear()
+	data2 = vna.get_traces_data(["Trc1"])
+	assert relay.queries == ["CALC1:DATA:CALL? SDATA"]
+	assert data2['x'] is data['x']
+
+def test_get_traces_data_falls_back_to_single_traces():
+	relay = _FakeZVARelay(allow_call=False)
+	vna = make_vna(relay)
+
+	data = vna.get_traces_data(["Trc3", "Trc1"])
+
+	assert np.array_equal(data['y'][0], sparam("S12"))
+	assert np.array_equal(data['y'][1], sparam("S11"))
+	assert relay.queries.count("CALC1:DATA? SDATA") == 2
+
+	single = vna.get_trace_data("Trc3")
+	assert np.array_equal(single['y'], sparam("S12"))
+
+def test_get_traces_data_rejects_unknown_trace():
+	vna = make_vna(_FakeZVARelay())
+	assert vna.get_traces_data(["Trc1", "NoSuchTrace"]) is None
+
+def test_acquire_sweep_triggers_and_waits_before_reading():
+	relay = _FakeZVARelay()
+	vna = make_vna(relay)
+
+	data = vna.acquire_sweep(["Trc1", "Trc2"], averaging=4)
+
+	assert np.array_equal(data['y'][1], sparam("S21"))
+	assert "INIT1:CONT OFF" in relay.writes
+	assert "SENS1:AVER ON" in relay.writes
+	assert "SENS1:SWE:COUN 4" in relay.writes
+
+	# Averages are cleared, then the sweep is triggered and waited on before the data is read
+	assert relay.writes.index("SENS1:AVER:CLE") < relay.writes.index("INIT1:IMM")
+	assert relay.queries.index("*OPC?") < relay.queries.index("CALC1:DATA:CALL? SDATA")
+
+def test_run_sweeps_pipelines_next_sweep_settings():
+	relay = _FakeZVARelay()
+	vna = make_vna(relay)
+
+	events = []
+	relay.write = (lambda orig: (lambda cmd: events.append(cmd) or orig(cmd)))(relay.write)
+	def callback(i, data):
+		events.append(("data", i))
+
+	settings = [{"power":-10}, {"power":-5}, {"power":0}]
+	assert vna.run_sweeps(["Trc1", "Trc4"], settings=settings, callback=callback) == []
+
+	# Sweep i+1 is configured and triggered before sweep i is handed to the callback
+	assert events.index("SOUR1:POW1:LEV:IMM:AMPL -5") < events.index(("data", 0))
+	assert events.count("INIT1:IMM") == 3
+	assert events.index(("data", 2)) > events.index("SOUR1:POW1:LEV:IMM:AMPL 0")
+
+	stats = vna.sweep_stats()
+	assert stats["sweeps"] == 3 and stats["errors"] == 0
+	assert stats["sweeps_per_s"] is not None and stats["sweeps_per_s"] > 0
+
+def test_refresh_reads_enabled_channels_from_one_catalog_query():
+	relay = _FakeZVARelay()
+	vna = RohdeSchwarzZVA("fake-addr", log=make_log(), relay=relay)
+	relay.queries.clear()
+
+	vna.refresh_channels_and_traces()
+
+	assert not any(q.startswith("CONF:CHAN") and q != "CONF:CHAN:CAT?" for q in relay.queries)
+	assert vna.state.channels.get_populated() == [1]
+	assert vna.get_trace_channel("Trc3") == 1
+	assert vna.state.traces[vna._get_trace_idx("Trc4")].measurement == BasicVectorNetworkAnalyzerCtg.MEAS_S22
+
+def test_trace_index_follows_add_and_clear():
+	vna = make_vna(_FakeZVARelay())
+
+	assert vna._get_trace_idx("Trc2") == 2
+	assert vna.add_trace(1, "Extra", BasicVectorNetworkAnalyzerCtg.MEAS_S21)
+	assert vna._get_trace_idx("Extra") == 5
+	assert vna.get_trace_channel("Extra") == 1
+	assert not vna.add_trace(1, "Extra", BasicVectorNetworkAnalyzerCtg.MEAS_S21) # Duplicate name
+
+	vna.clear_traces()
+	assert vna._get_trace_idx("Trc2") is None
+	assert vna.get_trace_channel("Extra") is None
+
+def test_freq_axis_cached_until_setter_changes_sweep():
+	relay = _FakeZVARelay()
+	vna = make_vna(relay)
+
+	axis = vna.get_freq_axis(1)
+	relay.queries.clear()
+	assert vna.get_freq_axis(1) is axis
+	assert relay.queries == []
+
+	vna.set_num_points(101, channel=1)
+	new_axis = vna.get_freq_axis(1)
+	assert len(new_axis) == 101
+	assert new_axis[0] == 1e9 and new_axis[-1] == 3e9
+
+def test_run_sweeps_rejects_short_settings_list():
+	relay = _FakeZVARelay()
+	vna = make_vna(relay)
+
+	events = []
+	relay.write = (lambda orig: (lambda cmd: events.append(cmd) or orig(cmd)))(relay.write)
+
+	assert vna.run_sweeps(["Trc1"], num_sweeps=3, settings=[{"power":-10}, {"power":-5}]) == []
+	assert "INIT1:IMM" not in events
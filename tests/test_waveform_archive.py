@@ -0,0 +1,123 @@
+""" Tests for the HDF5 WaveformArchive. """
+
+import os
+import tempfile
+import numpy as np
+import pylogfile.base as plf
+
+from constellation.relay import DirectSCPIRelay
+from constellation.instrument_control.oscilloscope.oscilloscope_ctg import OscilloscopeWaveform
+from constellation.instrument_control.oscilloscope.oscilloscope_acquisition import OscilloscopeCapture
+from constellation.instrument_control.oscilloscope.oscilloscope_archive import WaveformArchive
+from constellation.instrument_control.oscilloscope.drivers.Rigol_DS1000Z_dvr import RigolDS1000Z
+
+def make_dummy_osc():
+	log = plf.LogPile()
+	log.terminal_level = plf.CRITICAL
+	return RigolDS1000Z("TCPIP0::10.0.0.9::INSTR", log=log, relay=DirectSCPIRelay(), dummy=True)
+
+def make_waveform(seed, channel, npoints=5000):
+	codes = np.random.default_rng(seed).integers(0, 256, size=npoints, dtype=np.uint8)
+	return OscilloscopeWaveform(codes=codes, y_increment=0.04, y_origin=127, y_reference=0, x_increment=1e-6, x_origin=-2.5e-3, channel=channel)
+
+def test_archive_round_trip_and_random_access():
+	with tempfile.TemporaryDirectory() as tmp:
+		fn = os.path.join(tmp, "captures.h5")
+
+		originals = []
+		with WaveformArchive(fn) as archive:
+			for i in range(20):
+				wavs = [make_waveform(i, 1), make_waveform(100+i, 2, npoints=3000+i)]
+				originals.append(wavs)
+				assert archive.append(wavs, timestamp=1000.0+i) == i
+
+		with WaveformArchive(fn, mode="r") as archive:
+			assert len(archive) == 20
+			assert archive.channels == [1, 2]
+			assert np.array_equal(archive.times(), 1000.0 + np.arange(20))
+
+			cap = archive.read(13)
+			assert isinstance(cap, OscilloscopeCapture)
+			assert cap.seq == 13 and cap.timestamp == 1013.0
+			assert cap.waveforms[1] == originals[13][0]
+			assert cap.waveforms[2] == originals[13][1]
+			assert cap.waveforms[2].codes.dtype == np.uint8
+
+			assert archive.read(-1).waveforms[2].npoints == 3019
+
+def test_archive_appends_to_existing_file_and_mixed_records():
+	with tempfile.TemporaryDirectory() as tmp:
+		fn = os.path.join(tmp, "captures.h5")
+
+		with WaveformArchive(fn, compression="lzf") as archive:
+			archive.append({1:make_waveform(0, 1)})
+
+		volts_wav = {"time_s":[0.0, 0.5, 1.0], "volt_V":[0.1, 0.2, 0.3], "channel":3}
+		with WaveformArchive(fn) as archive:
+			assert len(archive) == 1
+			archive.append(OscilloscopeCapture(7, 55.0, {1:make_waveform(1, 1), 3:volts_wav}))
+
+			cap = archive.read(1)
+			assert cap.timestamp == 55.0
+			assert cap.waveforms[1] == make_waveform(1, 1)
+			assert np.allclose(cap.waveforms[3]["volt_V"], [0.1, 0.2, 0.3])
+			assert np.allclose(cap.waveforms[3]["time_s"], [0.0, 0.5, 1.0])
+			assert archive.read_waveform(0, 3) is None
+
+def test_archive_stores_driver_state_and_streamed_captures():
+	osc = make_dummy_osc()
+	osc.set_div_volt(1, 0.25)
+
+	with tempfile.TemporaryDirectory() as tmp:
+		fn = os.path.join(tmp, "captures.h5")
+		with WaveformArchive(fn) as archive:
+			seq = archive.append_stream(osc, channels=[1], driver=osc)
+			cap = archive.read(seq)
+			state = archive.read_state(seq)
+
+		# The dummy scope streams volts, which are archived as float32
+		assert np.allclose(cap.waveforms[1]["volt_V"], osc.get_waveform(1)["volt_V"], atol=1e-6)
+		assert np.allclose(cap.waveforms[1]["time_s"], osc.get_waveform(1)["time_s"])
+		assert state.channels[1].div_volt == 0.25
+		assert state.channels[1].waveform is None # settings only
+
+def test_append_copies_caller_buffers():
+	with tempfile.TemporaryDirectory() as tmp:
+		fn = os.path.join(tmp, "captures.h5")
+
+		wav = make_waveform(7, 1)
+		original = wav.codes.copy()
+		volts = np.linspace(-1, 1, 1000, dtype=np.float32)
+		with WaveformArchive(fn) as archive:
+			archive.append({1:wav, 2:OscilloscopeWaveform(volts=volts, x_increment=1e-6, x_origin=0, channel=2)})
+			# Caller reuses its buffers before the writer gets to them
+			wav.codes[:] = 0
+			volts[:] = 0
+
+		with WaveformArchive(fn, mode="r") as archive:
+			cap = archive.read(0)
+			assert np.array_equal(cap.waveforms[1].codes, original)
+			assert np.allclose(cap.waveforms[2].volts, np.linspace(-1, 1, 1000))
+
+def test_append_stream_on_driver_without_raw_support():
+	from constellation.instrument_control.oscilloscope.oscilloscope_ctg import Oscilloscope
+
+	osc = make_dummy_osc()
+	# A driver with only the default streaming path, whose get_waveform() takes no options
+	osc.iter_waveform_chunks = lambda channel, **kwargs: Oscilloscope.iter_waveform_chunks(osc, channel, **kwargs)
+	osc.get_waveform = lambda channel: {"time_s":np.arange(100)*1e-6, "volt_V":np.full(100, 0.25), "channel":channel}
+
+	with tempfile.TemporaryDirectory() as tmp:
+		fn = os.path.join(tmp, "captures.h5")
+
+		with WaveformArchive(fn, log=osc.log) as archive:
+			assert archive.append_stream(osc, channels=[1, 2]) == 0
+
+			# Nothing read - nothing queued
+			osc.get_waveform = lambda channel: None
+			assert archive.append_stream(osc, channels=[1, 2]) is None
+			assert len(archive) == 1
+
+			cap = archive.read(0)
+			assert sorted(cap.waveforms.keys()) == [1, 2]
+			assert np.allclose(cap.waveforms[2].volt_V, 0.25)